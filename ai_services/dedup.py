@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Обнаружение почти-дубликатов документов до парсинга.
+
+Один и тот же кандидат часто присылает несколько немного отличающихся PDF.
+Для каждого извлеченного текста вычисляется подпись MinHash по словесным
+шинглам, а кандидаты в дубликаты находятся через LSH (разбиение подписи на
+полосы), поэтому проверка нового документа не требует сравнения со всеми
+сохраненными и не обращается к модели. Почти-дубликат связывается с
+каноническим документом и не парсится и не эмбеддится повторно.
+
+Подписи хранятся в data/dedup/<тип документа>.json вместе со связями
+"дубликат -> канонический документ" и счетчиками сэкономленных запросов.
+"""
+import os
+import re
+import json
+import zlib
+import logging
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from hr_utils.file_utils import create_temp_file
+
+logger = logging.getLogger('hr_system')
+
+# Параметры подписи; при их изменении сохраненные подписи сбрасываются
+NUM_PERM = 128
+BANDS = 16
+SHINGLE_SIZE = 5
+SEED = 1
+
+# Порог оценки сходства Жаккара, начиная с которого документы считаются дубликатами
+DEFAULT_THRESHOLD = 0.85
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(SEED)
+_PERM_A = _rng.integers(1, _PRIME, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _PRIME, size=NUM_PERM, dtype=np.uint64)
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """
+    Разбивает текст на словесные шинглы без учета регистра, пунктуации и переносов строк.
+
+    Args:
+        text: Текст документа
+        size: Количество слов в шингле
+
+    Returns:
+        Множество шинглов
+    """
+    words = re.findall(r'\w+', text.lower())
+    return {' '.join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+def minhash_signature(text: str) -> List[int]:
+    """
+    Вычисляет подпись MinHash текста.
+
+    Args:
+        text: Текст документа
+
+    Returns:
+        Подпись из NUM_PERM значений
+    """
+    hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles(text)), dtype=np.uint64)
+    hashes %= _PRIME
+    # (a * x + b) mod p для всех перестановок сразу; произведение помещается в uint64
+    permuted = (hashes[:, None] * _PERM_A + _PERM_B) % _PRIME
+    return permuted.min(axis=0).tolist()
+
+
+def estimate_similarity(signature_a: List[int], signature_b: List[int]) -> float:
+    """Оценивает сходство Жаккара по доле совпадающих значений подписей."""
+    return float(np.mean(np.asarray(signature_a) == np.asarray(signature_b)))
+
+
+class NearDuplicateIndex:
+    """LSH-индекс подписей MinHash документов одного типа."""
+
+    def __init__(self, index_file: str, threshold: float = DEFAULT_THRESHOLD):
+        """
+        Загружает индекс из файла (или создает пустой).
+
+        Args:
+            index_file: Путь к файлу индекса
+            threshold: Порог сходства для признания документов дубликатами
+        """
+        self.index_file = index_file
+        self.threshold = threshold
+        self.signatures: Dict[str, List[int]] = {}
+        self.canonical: Dict[str, str] = {}
+        self.stats = {'duplicates': 0, 'saved_parse_calls': 0, 'saved_embeddings': 0}
+        self._buckets: Dict[tuple, List[str]] = {}
+
+        if os.path.exists(index_file):
+            try:
+                with open(index_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('params') == self._params():
+                    self.signatures = data['signatures']
+                    self.canonical = data['canonical']
+                    self.stats.update(data.get('stats', {}))
+                else:
+                    logger.info(f"Параметры подписей в {index_file} изменились, индекс дубликатов строится заново")
+            except Exception as e:
+                error_msg = f"Ошибка при загрузке индекса дубликатов {index_file}: {str(e)}"
+                logger.error(error_msg)
+
+        for doc_id, signature in self.signatures.items():
+            self._add_to_buckets(doc_id, signature)
+
+    @staticmethod
+    def _params() -> Dict[str, int]:
+        return {'num_perm': NUM_PERM, 'bands': BANDS, 'shingle_size': SHINGLE_SIZE, 'seed': SEED}
+
+    @staticmethod
+    def _band_keys(signature: List[int]) -> List[tuple]:
+        rows = NUM_PERM // BANDS
+        return [(band, *signature[band * rows:(band + 1) * rows]) for band in range(BANDS)]
+
+    def _add_to_buckets(self, doc_id: str, signature: List[int]):
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(doc_id)
+
+    def find_duplicate(self, doc_id: str, signature: List[int]) -> Optional[str]:
+        """
+        Ищет канонический документ, почти-дубликатом которого является документ.
+
+        Args:
+            doc_id: Идентификатор проверяемого документа
+            signature: Подпись MinHash документа
+
+        Returns:
+            Идентификатор канонического документа или None
+        """
+        candidates = {candidate for key in self._band_keys(signature)
+                      for candidate in self._buckets.get(key, ())}
+        best_id, best_similarity = None, self.threshold
+        for candidate in candidates:
+            canonical_id = self.canonical.get(candidate, candidate)
+            # Повторная обработка того же файла - не дубликат
+            if candidate == doc_id or canonical_id == doc_id:
+                continue
+            similarity = estimate_similarity(signature, self.signatures[candidate])
+            if similarity >= best_similarity:
+                best_id, best_similarity = canonical_id, similarity
+        return best_id
+
+    def add(self, doc_id: str, signature: List[int], canonical_id: Optional[str] = None):
+        """
+        Добавляет подпись документа в индекс.
+
+        Args:
+            doc_id: Идентификатор документа
+            signature: Подпись MinHash документа
+            canonical_id: Канонический документ, если документ - почти-дубликат
+        """
+        if doc_id in self.signatures:
+            for key in self._band_keys(self.signatures[doc_id]):
+                bucket = self._buckets.get(key, [])
+                if doc_id in bucket:
+                    bucket.remove(doc_id)
+        self.signatures[doc_id] = signature
+        self._add_to_buckets(doc_id, signature)
+        if canonical_id:
+            self.canonical[doc_id] = canonical_id
+        else:
+            self.canonical.pop(doc_id, None)
+
+    def record_saving(self, parse_calls: int = 1, embeddings: int = 1):
+        """Учитывает запросы к модели, которые не понадобились благодаря дедупликации."""
+        self.stats['duplicates'] += 1
+        self.stats['saved_parse_calls'] += parse_calls
+        self.stats['saved_embeddings'] += embeddings
+
+    def duplicates_of(self, canonical_id: str) -> List[str]:
+        """Возвращает документы, связанные с каноническим документом."""
+        return sorted(doc_id for doc_id, target in self.canonical.items() if target == canonical_id)
+
+    def save(self):
+        """Атомарно сохраняет индекс в файл."""
+        directory = os.path.dirname(self.index_file) or '.'
+        os.makedirs(directory, exist_ok=True)
+        data = {'params': self._params(), 'signatures': self.signatures,
+                'canonical': self.canonical, 'stats': self.stats}
+        fd, tmp_path = create_temp_file(directory, prefix='.dedup_', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_file)
+        except Exception as e:
+            error_msg = f"Ошибка при сохранении индекса дубликатов {self.index_file}: {str(e)}"
+            logger.error(error_msg)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def load_dedup_stats(dedup_path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Загружает счетчики сэкономленных запросов по типам документов.
+
+    Args:
+        dedup_path: Директория индексов дубликатов
+
+    Returns:
+        Словарь {тип документа: счетчики}
+    """
+    stats = {}
+    if not os.path.isdir(dedup_path):
+        return stats
+    for filename in sorted(os.listdir(dedup_path)):
+        if filename.endswith('.json'):
+            try:
+                with open(os.path.join(dedup_path, filename), 'r', encoding='utf-8') as f:
+                    stats[filename[:-len('.json')]] = json.load(f).get('stats', {})
+            except Exception as e:
+                logger.error(f"Ошибка при чтении индекса дубликатов {filename}: {str(e)}")
+    return stats
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Конвейерное параллельное вычисление эмбеддингов.
+
+Тексты разбиваются на пакеты, несколько пакетов отправляются к API
+эмбеддингов одновременно (в пуле потоков) с ограничением числа запросов и
+токенов в минуту. Результаты выдаются по мере готовности пакетов, поэтому
+векторы добавляются в индекс, пока следующие пакеты еще вычисляются.
+Временные сбои пакета повторяются через hr_utils.resilience.
+
+Параметры задаются переменными окружения: EMBED_BATCH_SIZE (размер пакета),
+EMBED_CONCURRENCY (одновременных запросов), EMBED_RPM и EMBED_TPM (лимиты
+запросов и токенов в минуту, 0 - без ограничения).
+"""
+import os
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Iterator, Tuple, Optional, Callable, Any
+
+from hr_utils.metrics import metrics
+from hr_utils.resilience import RetryPolicy, DEFAULT_POLICY, call_with_retry, get_breaker
+
+logger = logging.getLogger('hr_system')
+
+DEFAULT_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+DEFAULT_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+DEFAULT_RPM = int(os.getenv("EMBED_RPM", "0"))
+DEFAULT_TPM = int(os.getenv("EMBED_TPM", "0"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка количества токенов текста (для лимита токенов в минуту)."""
+    return max(1, len(text) // 3)
+
+
+class RateLimiter:
+    """Ограничитель запросов и токенов в минуту (два "ведра токенов")."""
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        """
+        Args:
+            requests_per_minute: Лимит запросов в минуту (0 - без ограничения)
+            tokens_per_minute: Лимит токенов в минуту (0 - без ограничения)
+        """
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 0):
+        """
+        Ждет, пока запрос с указанным количеством токенов уложится в лимиты.
+
+        Args:
+            tokens: Оценка количества токенов запроса
+        """
+        if not self.rpm and not self.tpm:
+            return
+        # Пакет больше минутного лимита токенов пропускается, когда "ведро" заполнено целиком
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed, self._updated = now - self._updated, now
+                if self.rpm:
+                    self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+                if self.tpm:
+                    self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+                waits = []
+                if self.rpm and self._requests < 1:
+                    waits.append((1 - self._requests) * 60 / self.rpm)
+                if self.tpm and self._tokens < tokens:
+                    waits.append((tokens - self._tokens) * 60 / self.tpm)
+                if not waits:
+                    if self.rpm:
+                        self._requests -= 1
+                    if self.tpm:
+                        self._tokens -= tokens
+                    return
+                delay = max(waits)
+            time.sleep(delay)
+
+
+class EmbeddingStats:
+    """Статистика вычисления эмбеддингов."""
+
+    def __init__(self):
+        self.documents = 0
+        self.batches = 0
+        self.seconds = 0.0
+
+    @property
+    def docs_per_sec(self) -> float:
+        return self.documents / self.seconds if self.seconds else 0.0
+
+
+def iter_embeddings(texts: List[str], embeddings: Any, batch_size: Optional[int] = None,
+                    concurrency: Optional[int] = None, limiter: Optional[RateLimiter] = None,
+                    policy: RetryPolicy = DEFAULT_POLICY,
+                    stats: Optional[EmbeddingStats] = None) -> Iterator[Tuple[int, List[List[float]]]]:
+    """
+    Вычисляет эмбеддинги пакетами параллельно и выдает их по мере готовности.
+
+    Args:
+        texts: Тексты
+        embeddings: Модель эмбеддингов (например, OpenAIEmbeddings)
+        batch_size: Размер пакета (по умолчанию EMBED_BATCH_SIZE)
+        concurrency: Количество одновременных запросов (по умолчанию EMBED_CONCURRENCY)
+        limiter: Ограничитель запросов и токенов (по умолчанию по EMBED_RPM и EMBED_TPM)
+        policy: Параметры повторов пакета
+        stats: Объект для накопления статистики
+
+    Yields:
+        Кортежи (индекс первого текста пакета, векторы пакета) в порядке завершения пакетов
+
+    Raises:
+        ModelCallError: Если пакет не удалось вычислить
+    """
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+    concurrency = max(1, concurrency or DEFAULT_CONCURRENCY)
+    limiter = limiter or RateLimiter(DEFAULT_RPM, DEFAULT_TPM)
+    stats = stats if stats is not None else EmbeddingStats()
+    breaker = get_breaker('embeddings')
+    starts = list(range(0, len(texts), batch_size))
+    if not starts:
+        return
+
+    def embed_batch(start: int) -> List[List[float]]:
+        batch = texts[start:start + batch_size]
+        limiter.acquire(sum(estimate_tokens(text) for text in batch))
+        started = time.monotonic()
+        vectors = call_with_retry(lambda timeout: embeddings.embed_documents(batch), policy, breaker, 'embeddings')
+        metrics.observe('embed.batch', time.monotonic() - started)
+        return vectors
+
+    started = time.monotonic()
+    pending = {}
+    next_batch = 0
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='embed') as executor:
+        try:
+            while next_batch < len(starts) or pending:
+                # В работе не больше concurrency пакетов: остальные ждут, не занимая память результатами
+                while next_batch < len(starts) and len(pending) < concurrency:
+                    # Контекст учета (сессия, задание, этап) передается в поток, чтобы запрос попал в журнал расходов
+                    future = executor.submit(contextvars.copy_context().run, embed_batch, starts[next_batch])
+                    pending[future] = starts[next_batch]
+                    next_batch += 1
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start = pending.pop(future)
+                    vectors = future.result()
+                    stats.documents += len(vectors)
+                    stats.batches += 1
+                    stats.seconds = time.monotonic() - started
+                    yield start, vectors
+        finally:
+            for future in pending:
+                future.cancel()
+    logger.info(f"Вычислены эмбеддинги {stats.documents} текстов пакетами по {batch_size}: "
+                f"{stats.docs_per_sec:.1f} док/с")
+
+
+def embed_texts(texts: List[str], embeddings: Any, on_batch: Optional[Callable[[int, List[List[float]]], None]] = None,
+                stats: Optional[EmbeddingStats] = None, **kwargs) -> List[List[float]]:
+    """
+    Вычисляет эмбеддинги всех текстов параллельными пакетами.
+
+    Args:
+        texts: Тексты
+        embeddings: Модель эмбеддингов
+        on_batch: Функция, вызываемая для каждого готового пакета (индекс первого текста, векторы)
+        stats: Объект для накопления статистики
+        **kwargs: Параметры iter_embeddings (batch_size, concurrency, limiter, policy)
+
+    Returns:
+        Векторы в порядке текстов
+    """
+    vectors: List[Optional[List[float]]] = [None] * len(texts)
+    for start, batch_vectors in iter_embeddings(texts, embeddings, stats=stats, **kwargs):
+        vectors[start:start + len(batch_vectors)] = batch_vectors
+        if on_batch is not None:
+            on_batch(start, batch_vectors)
+    return vectors
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Локальный разбор вакансий и резюме по заголовкам разделов.
+
+Большинство PDF приходит с одних и тех же сайтов вакансий с предсказуемыми
+заголовками ("Обязанности", "Требования", "Ключевые навыки", "Опыт работы",
+"Желаемая должность и зарплата"). Текст разбивается на разделы по этим
+заголовкам, недостающие поля дополняются регулярными выражениями и словарем
+навыков. Для каждого поля схемы (hr_models/schema.py) оценивается надежность
+извлечения, их среднее - уверенность разбора. Документы с низкой
+уверенностью разбираются моделью (см. ai_services.parser.parse_document).
+"""
+import re
+from typing import Dict, List, Tuple, Optional
+
+# Заголовки разделов, из которых извлекаются поля схемы
+SECTION_HEADINGS: Dict[str, Tuple[str, ...]] = {
+    'position': ('желаемая должность и зарплата', 'желаемая должность', 'должность', 'позиция', 'вакансия',
+                 'desired position', 'position', 'job title'),
+    'skills': ('ключевые навыки', 'навыки', 'профессиональные навыки', 'технические навыки', 'стек технологий',
+               'стек', 'технологии', 'key skills', 'skills', 'tech stack'),
+    'requirements': ('требования', 'требования к кандидату', 'мы ожидаем', 'что мы ждем', 'что мы ждем от вас',
+                     'ожидания от кандидата', 'будет плюсом', 'преимуществом будет', 'requirements',
+                     'qualifications', 'nice to have'),
+    'responsibilities': ('обязанности', 'задачи', 'чем предстоит заниматься', 'что нужно делать',
+                         'функциональные обязанности', 'responsibilities', 'what you will do'),
+    'experience': ('опыт работы', 'профессиональный опыт', 'work experience', 'experience',
+                   'employment history'),
+}
+
+# Разделы, которые завершают предыдущий раздел, но в поля схемы не попадают
+OTHER_HEADINGS: Tuple[str, ...] = (
+    'условия', 'условия работы', 'мы предлагаем', 'что мы предлагаем', 'о компании', 'о нас', 'образование',
+    'основное образование', 'высшее образование', 'повышение квалификации, курсы', 'курсы', 'сертификаты',
+    'тесты, экзамены', 'знание языков', 'языки', 'о себе', 'обо мне', 'дополнительная информация', 'контакты',
+    'гражданство, время в пути до работы', 'специализации', 'рекомендации', 'портфолио',
+    'benefits', 'we offer', 'about us', 'about', 'education', 'languages', 'contacts', 'certificates',
+)
+
+# Словарь навыков для поиска в тексте, если раздела навыков нет
+SKILL_DICTIONARY: Tuple[str, ...] = (
+    'Python', 'Java', 'Kotlin', 'Scala', 'Go', 'Golang', 'C++', 'C#', '.NET', 'PHP', 'Ruby', 'Rust', 'Swift',
+    'JavaScript', 'TypeScript', 'Node.js', 'React', 'Vue', 'Angular', 'HTML', 'CSS', 'SQL', 'NoSQL',
+    'PostgreSQL', 'MySQL', 'Oracle', 'MS SQL', 'MongoDB', 'Redis', 'ClickHouse', 'Elasticsearch', 'Kafka',
+    'RabbitMQ', 'Docker', 'Kubernetes', 'Linux', 'Git', 'CI/CD', 'Jenkins', 'GitLab', 'Ansible', 'Terraform',
+    'AWS', 'Azure', 'GCP', 'Django', 'Flask', 'FastAPI', 'Spring', 'Hibernate', 'REST', 'GraphQL', 'gRPC',
+    'Microservices', 'Pandas', 'NumPy', 'scikit-learn', 'PyTorch', 'TensorFlow', 'Keras', 'Spark', 'Hadoop',
+    'Airflow', 'Machine Learning', 'Deep Learning', 'NLP', 'Computer Vision', 'LLM', 'Power BI', 'Tableau',
+    'Excel', '1С', '1C', 'SAP', 'Jira', 'Confluence', 'Agile', 'Scrum', 'Kanban', 'Figma', 'Photoshop',
+    'Illustrator', 'UX', 'UI', 'Selenium', 'Pytest', 'QA', 'ETL', 'DWH', 'BPMN', 'UML', 'MS Office',
+    'Английский язык', 'Управление проектами', 'Управление командой', 'Ведение переговоров', 'Продажи',
+    'CRM', 'Бухгалтерский учет', 'МСФО', 'Налоговый учет', 'Маркетинг', 'SEO', 'SMM', 'Аналитика',
+)
+
+# Минимальная длина текстового раздела, который считается надежно извлеченным
+MIN_SECTION_LENGTH = 30
+
+# Надежность должности, взятой из первой строки документа (только для вакансий)
+FIRST_LINE_POSITION_SCORE = 0.6
+
+# Явное указание должности в строке ("Должность: ...")
+_POSITION_RE = re.compile(r'^\s*(?:желаемая\s+)?(?:должность|позиция|вакансия|position|job title)\s*[:—-]\s*(.+)$',
+                          re.IGNORECASE | re.MULTILINE)
+
+# Фамилия, имя и отчество вместо должности в первой строке ("Иванов Иван Иванович")
+_PERSON_NAME_RE = re.compile(r'^[А-ЯЁ][а-яё]+(?:-[А-ЯЁ][а-яё]+)?(?:\s+[А-ЯЁ][а-яё]+){1,2}$')
+
+# Зарплата в строке должности ("Python-разработчик 250 000 ₽")
+_SALARY_RE = re.compile(r'\s*(?:от|до|from|to)?\s*\d[\d\s]*(?:₽|руб\.?|rub|\$|€|usd|eur).*$', re.IGNORECASE)
+
+_SKILL_PATTERNS = [(skill, re.compile(r'(?<![\w+#.])' + re.escape(skill) + r'(?![\w+#])', re.IGNORECASE))
+                   for skill in SKILL_DICTIONARY]
+
+
+def _normalize(line: str) -> str:
+    """Приводит строку к виду для сравнения с заголовками: нижний регистр, без нумерации и маркеров."""
+    line = re.sub(r'^[\s\d.)•·*\-–—]+', '', line.lower())
+    return re.sub(r'\s+', ' ', line).strip()
+
+
+_HEADINGS: List[Tuple[str, Optional[str]]] = sorted(
+    [(heading, field) for field, headings in SECTION_HEADINGS.items() for heading in headings] +
+    [(heading, None) for heading in OTHER_HEADINGS],
+    key=lambda item: -len(item[0]))
+
+
+def _match_heading(line: str) -> Optional[Tuple[Optional[str], str]]:
+    """
+    Проверяет, является ли строка заголовком раздела.
+
+    Returns:
+        Кортеж (поле схемы или None для прочих разделов, текст после заголовка) или None
+    """
+    normalized = _normalize(line)
+    for heading, field in _HEADINGS:
+        if normalized == heading or normalized == heading + ':':
+            return field, ''
+        if normalized.startswith(heading) and normalized[len(heading):].lstrip()[:1] in (':', '—', '–'):
+            # Заголовок с содержимым в той же строке ("Требования: опыт от 3 лет")
+            return field, re.split(r'[:—–]', line, maxsplit=1)[1].strip()
+    return None
+
+
+def split_sections(text: str) -> Dict[str, str]:
+    """
+    Разбивает текст на разделы по известным заголовкам.
+
+    Args:
+        text: Текст документа
+
+    Returns:
+        Словарь {поле схемы: текст раздела}; разделы одного поля объединяются
+    """
+    sections: Dict[str, List[str]] = {}
+    current: Optional[str] = None
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        match = _match_heading(line) if len(line) < 120 else None
+        if match is not None:
+            current, rest = match
+            if current is not None:
+                sections.setdefault(current, [])
+                if rest:
+                    sections[current].append(rest)
+            continue
+        if current is not None:
+            sections[current].append(line.strip())
+    return {field: '\n'.join(lines).strip() for field, lines in sections.items() if lines}
+
+
+def find_skills(text: str) -> List[str]:
+    """
+    Находит в тексте навыки из словаря.
+
+    Args:
+        text: Текст документа
+
+    Returns:
+        Найденные навыки в порядке словаря
+    """
+    return [skill for skill, pattern in _SKILL_PATTERNS if pattern.search(text)]
+
+
+def _clean_position(line: str) -> str:
+    return _SALARY_RE.sub('', line).strip(' ,.;:—–-')
+
+
+def _extract_position(text: str, sections: Dict[str, str], first_line: bool) -> Tuple[str, float]:
+    if sections.get('position'):
+        position = _clean_position(sections['position'].splitlines()[0])
+        if position:
+            return position, 1.0
+    match = _POSITION_RE.search(text)
+    if match:
+        return _clean_position(match.group(1)), 1.0
+    if not first_line:
+        return '', 0.0
+    # Первая строка документа: на сайтах вакансий это обычно название должности
+    # (в резюме - имя кандидата, поэтому для резюме эта эвристика не используется)
+    for line in text.splitlines():
+        line = line.strip()
+        if line:
+            if len(line) <= 80 and _match_heading(line) is None and not _PERSON_NAME_RE.match(line):
+                return _clean_position(line), FIRST_LINE_POSITION_SCORE
+            break
+    return '', 0.0
+
+
+def _extract_skills(text: str, sections: Dict[str, str]) -> Tuple[str, float]:
+    section = sections.get('skills', '')
+    if section:
+        # Навыки на сайтах вакансий перечисляются через переводы строк или несколько пробелов
+        items = [item.strip(' ,;•·') for item in re.split(r'\n|\s{2,}|[,;•·]', section)]
+        items = [item for item in items if item]
+        if items:
+            return ', '.join(dict.fromkeys(items)), 1.0
+    skills = find_skills(text)
+    if skills:
+        return ', '.join(skills), 0.6 if len(skills) >= 3 else 0.3
+    return '', 0.0
+
+
+def heuristic_parse(text: str, fields: List[str], first_line_position: bool = False) -> Tuple[Dict[str, str], float]:
+    """
+    Извлекает поля схемы из текста документа без обращения к модели.
+
+    Args:
+        text: Текст документа
+        fields: Поля схемы (например, position, skills, requirements, responsibilities)
+        first_line_position: Брать ли должность из первой строки, если явного указания нет
+            (для вакансий; в резюме первая строка - обычно имя кандидата)
+
+    Returns:
+        Кортеж (словарь полей, уверенность от 0 до 1); ненайденные поля имеют значение 'None'
+    """
+    sections = split_sections(text)
+    result: Dict[str, str] = {}
+    scores: List[float] = []
+    for field in fields:
+        if field == 'position':
+            value, score = _extract_position(text, sections, first_line_position)
+        elif field == 'skills':
+            value, score = _extract_skills(text, sections)
+        else:
+            value = sections.get(field, '')
+            score = 1.0 if len(value) >= MIN_SECTION_LENGTH else (0.5 if value else 0.0)
+        result[field] = value or 'None'
+        scores.append(score)
+    confidence = sum(scores) / len(scores) if scores else 0.0
+    return result, confidence
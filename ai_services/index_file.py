@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Версионированный двоичный формат векторного индекса с отображением в память.
+
+Файл <имя>.vindex состоит из префикса (сигнатура, версия формата, длина
+заголовка), JSON-заголовка и выровненных разделов:
+
+    vectors - матрица векторов float32 (count x dim)
+    norms   - квадраты норм векторов float32 (для расстояния L2)
+    ids     - идентификаторы документов (байтовые строки фиксированной ширины)
+    hashes  - хеши текстов чанков (16 байт)
+
+В заголовке записаны модель эмбеддингов, размерность, количество документов,
+смещения разделов и контрольная сумма данных. Файл открывается через
+np.memmap: открытие занимает миллисекунды независимо от размера индекса,
+страницы читаются с диска при первом обращении и разделяются между
+процессами через кэш страниц. Контрольная сумма проверяется при
+преобразовании и по запросу (verify_index_file), а не при каждом открытии,
+чтобы не читать весь файл при запуске.
+"""
+import os
+import json
+import struct
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger('hr_system')
+
+INDEX_SUFFIX = '.vindex'
+FORMAT_MAGIC = b'HRVIDX'
+FORMAT_VERSION = 1
+
+# Префикс файла: сигнатура, версия формата (uint16), длина заголовка (uint32)
+_PREFIX = struct.Struct('<6sHI')
+_ALIGNMENT = 64
+_HASH_WIDTH = 16
+
+
+class IndexFormatError(Exception):
+    """Файл индекса поврежден или записан в неподдерживаемой версии формата."""
+
+
+class MappedVectors:
+    """Точный поиск L2 по векторам, отображенным в память (интерфейс как у индекса FAISS)."""
+
+    def __init__(self, vectors: np.ndarray, norms: np.ndarray):
+        """
+        Args:
+            vectors: Матрица векторов (count x dim)
+            norms: Квадраты норм векторов
+        """
+        self.vectors = vectors
+        self.norms = norms
+
+    @property
+    def ntotal(self) -> int:
+        return self.vectors.shape[0]
+
+    @property
+    def d(self) -> int:
+        return self.vectors.shape[1]
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Ищет k ближайших векторов для каждого запроса.
+
+        Args:
+            queries: Матрица векторов запросов (nq x dim)
+            k: Количество результатов
+
+        Returns:
+            Кортеж (квадраты расстояний L2, позиции); недостающие позиции равны -1, как в FAISS
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.d)
+        distances = np.empty((len(queries), k), dtype=np.float32)
+        positions = np.full((len(queries), k), -1, dtype=np.int64)
+        distances.fill(np.inf)
+        n = min(k, self.ntotal)
+        if n == 0:
+            return distances, positions
+        # ||v - q||^2 = ||v||^2 - 2 v·q + ||q||^2
+        scores = self.norms[None, :] - 2 * (queries @ self.vectors.T) + (queries ** 2).sum(axis=1)[:, None]
+        np.maximum(scores, 0, out=scores)
+        top = np.argpartition(scores, n - 1, axis=1)[:, :n] if n < self.ntotal else \
+            np.tile(np.arange(self.ntotal), (len(queries), 1))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(top_scores, axis=1, kind='stable')
+        positions[:, :n] = np.take_along_axis(top, order, axis=1)
+        distances[:, :n] = np.take_along_axis(top_scores, order, axis=1)
+        return distances, positions
+
+    def reconstruct_n(self, start: int, n: int) -> np.ndarray:
+        """Возвращает копию n векторов, начиная с позиции start."""
+        return np.array(self.vectors[start:start + n], dtype=np.float32)
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _checksum(sections: List[bytes]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for data in sections:
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def write_index_file(path: str, vectors: np.ndarray, ids: List[str], hashes: List[str], doc_type: str,
+                     embedding_model: str = ''):
+    """
+    Атомарно записывает индекс в версионированном формате.
+
+    Args:
+        path: Путь к файлу .vindex
+        vectors: Матрица векторов
+        ids: Идентификаторы документов
+        hashes: Хеши текстов чанков
+        doc_type: Тип документов ('vacancy' или 'resume')
+        embedding_model: Модель, которой вычислены эмбеддинги
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+    encoded_ids = [doc_id.encode('utf-8') for doc_id in ids]
+    id_width = max((len(doc_id) for doc_id in encoded_ids), default=1)
+    sections = {
+        'vectors': vectors.tobytes(),
+        'norms': (vectors ** 2).sum(axis=1, dtype=np.float32).astype(np.float32).tobytes(),
+        'ids': np.array(encoded_ids, dtype=f'S{id_width}').tobytes(),
+        'hashes': np.array([text_hash.encode('ascii') for text_hash in hashes], dtype=f'S{_HASH_WIDTH}').tobytes(),
+    }
+    header = {
+        'format': 'hr-vector-index',
+        'version': FORMAT_VERSION,
+        'embedding_model': embedding_model,
+        'dim': int(vectors.shape[1]) if len(ids) else 0,
+        'count': len(ids),
+        'doc_type': doc_type,
+        'metric': 'l2',
+        'id_width': id_width,
+        'checksum': _checksum(list(sections.values())),
+        'created': datetime.now().isoformat(timespec='seconds'),
+    }
+
+    # Смещения разделов зависят от длины заголовка, а заголовок - от смещений:
+    # заголовок дополняется пробелами до выровненной длины
+    layout: Dict[str, List[int]] = {}
+    header_size = _align(_PREFIX.size + len(json.dumps(header).encode('utf-8')) + 256)
+    offset = header_size
+    for name, data in sections.items():
+        layout[name] = [offset, len(data)]
+        offset = _align(offset + len(data))
+    header['sections'] = layout
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    header_bytes += b' ' * (header_size - _PREFIX.size - len(header_bytes))
+
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(_PREFIX.pack(FORMAT_MAGIC, FORMAT_VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            for name, data in sections.items():
+                f.seek(layout[name][0])
+                f.write(data)
+            f.truncate(offset)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_index_header(path: str) -> Dict[str, Any]:
+    """
+    Читает заголовок файла индекса.
+
+    Args:
+        path: Путь к файлу .vindex
+
+    Returns:
+        Заголовок индекса
+
+    Raises:
+        IndexFormatError: Если файл не является индексом или его версия не поддерживается
+    """
+    with open(path, 'rb') as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            raise IndexFormatError(f"файл {path} слишком короткий")
+        magic, version, header_length = _PREFIX.unpack(prefix)
+        if magic != FORMAT_MAGIC:
+            raise IndexFormatError(f"файл {path} не является индексом")
+        if version > FORMAT_VERSION:
+            raise IndexFormatError(f"версия формата {version} файла {path} не поддерживается "
+                                   f"(поддерживается до {FORMAT_VERSION})")
+        header = json.loads(f.read(header_length).decode('utf-8'))
+    size = os.path.getsize(path)
+    for name, (offset, length) in header['sections'].items():
+        if offset + length > size:
+            raise IndexFormatError(f"раздел {name} файла {path} обрезан")
+    return header
+
+
+def open_index_file(path: str) -> Tuple[Dict[str, Any], MappedVectors, np.ndarray, np.ndarray]:
+    """
+    Открывает индекс с отображением разделов в память.
+
+    Args:
+        path: Путь к файлу .vindex
+
+    Returns:
+        Кортеж (заголовок, векторы, идентификаторы документов, хеши текстов)
+
+    Raises:
+        IndexFormatError: Если файл поврежден или версия формата не поддерживается
+    """
+    header = read_index_header(path)
+    count, dim, sections = header['count'], header['dim'], header['sections']
+
+    def section(name: str, dtype: str, shape: Tuple[int, ...]) -> np.ndarray:
+        if not count:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', offset=sections[name][0], shape=shape)
+
+    vectors = section('vectors', 'float32', (count, dim))
+    norms = section('norms', 'float32', (count,))
+    ids = section('ids', f"S{header['id_width']}", (count,))
+    hashes = section('hashes', f'S{_HASH_WIDTH}', (count,))
+    return header, MappedVectors(vectors, norms), ids, hashes
+
+
+def verify_index_file(path: str) -> bool:
+    """
+    Проверяет контрольную сумму данных индекса (читает весь файл).
+
+    Args:
+        path: Путь к файлу .vindex
+
+    Returns:
+        True, если данные совпадают с контрольной суммой из заголовка
+    """
+    try:
+        header = read_index_header(path)
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for name in ('vectors', 'norms', 'ids', 'hashes'):
+                offset, length = header['sections'][name]
+                f.seek(offset)
+                while length > 0:
+                    data = f.read(min(length, 1 << 20))
+                    if not data:
+                        return False
+                    digest.update(data)
+                    length -= len(data)
+        return digest.hexdigest() == header['checksum']
+    except Exception as e:
+        error_msg = f"Ошибка при проверке индекса {path}: {str(e)}"
+        logger.error(error_msg)
+        return False
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Учет запросов к модели эмбеддингов в журнале использования.
+
+MeteredEmbeddings оборачивает модель эмбеддингов langchain и записывает в
+hr_utils.usage_ledger каждый выполненный запрос: построение и перестроение
+индексов (в том числе шардов), эмбеддинги вопросов кандидатов для кэша
+ответов и поиска по базе ответов HR, подбор роли в банке вопросов и
+поисковые запросы. langchain не возвращает количество токенов запроса
+эмбеддингов, поэтому оно оценивается по тексту, а запись помечается как
+оценка. До каждого запроса (каждого пакета при построении индекса)
+проверяется и резервируется бюджет сессии или задания: при превышении
+запрос не выполняется (BudgetExceededError). Модуль загружается только там,
+где создается модель эмбеддингов.
+"""
+from typing import List, Any, Callable, Awaitable
+
+from langchain_core.embeddings import Embeddings
+
+from hr_utils.metrics import current_stage
+from hr_utils.usage_ledger import ledger, estimate_tokens
+
+
+class MeteredEmbeddings(Embeddings):
+    """Модель эмбеддингов, записывающая каждый запрос в журнал использования."""
+
+    def __init__(self, embeddings: Embeddings):
+        """
+        Args:
+            embeddings: Модель эмбеддингов (например, OpenAIEmbeddings)
+        """
+        self.embeddings = embeddings
+        # Название модели сохраняется в манифестах индексов (см. embedding_model_name)
+        self.model = str(getattr(embeddings, 'model', '') or '')
+
+    def _check_budget(self, texts: List[str]) -> int:
+        """Проверяет и резервирует бюджет запроса, возвращает оценку количества токенов."""
+        tokens = sum(estimate_tokens(text) for text in texts)
+        ledger.check_budget(self.model or 'embeddings', prompt_tokens=tokens, completion_tokens=0)
+        return tokens
+
+    def _record(self, tokens: int):
+        ledger.record(self.model or 'embeddings', tokens, 0, stage=current_stage() or 'embedding', estimated=True)
+
+    def _embed(self, call: Callable[[], Any], texts: List[str]) -> Any:
+        tokens = self._check_budget(texts)
+        try:
+            result = call()
+        except BaseException:
+            # Запрос не выполнен: резерв бюджета снимается
+            ledger.release()
+            raise
+        self._record(tokens)
+        return result
+
+    async def _aembed(self, call: Callable[[], Awaitable[Any]], texts: List[str]) -> Any:
+        tokens = self._check_budget(texts)
+        try:
+            result = await call()
+        except BaseException:
+            ledger.release()
+            raise
+        self._record(tokens)
+        return result
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(lambda: self.embeddings.embed_documents(texts), texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(lambda: self.embeddings.embed_query(text), [text])
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self._aembed(lambda: self.embeddings.aembed_documents(texts), texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self._aembed(lambda: self.embeddings.aembed_query(text), [text])
+
+
+def openai_embeddings() -> MeteredEmbeddings:
+    """
+    Создает модель эмбеддингов OpenAI с учетом запросов в журнале использования.
+
+    Returns:
+        Экземпляр MeteredEmbeddings над OpenAIEmbeddings
+    """
+    from langchain_openai import OpenAIEmbeddings
+
+    return MeteredEmbeddings(OpenAIEmbeddings())
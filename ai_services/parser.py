@@ -1,16 +1,22 @@
 # -*- coding: utf-8 -*-
 import logging
-from typing import Type, Dict, Any, Optional
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_core.pydantic_v1 import BaseModel
+from typing import Type, Dict, Any, Optional, TYPE_CHECKING
 
 from hr_utils.api_utils import generate_answer
+from ai_services.heuristic_parser import heuristic_parse
+from hr_utils.metrics import metrics, span
+from hr_utils.usage_ledger import ledger
+from hr_utils.resilience import DEFAULT_POLICY, ModelCallError, get_breaker, call_with_retry
 
-logger = logging.getLogger('hr_system')
+if TYPE_CHECKING:
+    from langchain_core.pydantic_v1 import BaseModel
 
-def to_dict_parser(text: str, parser_class: Type[BaseModel], model: str = 'gpt-3.5-turbo') -> Dict[str, Any]:
+logger = logging.getLogger('hr_system.parser')
+
+# Уверенность локального разбора, начиная с которой модель не вызывается
+DEFAULT_CONFIDENCE_THRESHOLD = 0.75
+
+def to_dict_parser(text: str, parser_class: Type['BaseModel'], model: str = 'gpt-3.5-turbo') -> Dict[str, Any]:
     """
     Парсит текст с использованием модели LLM и заданного парсера.
     
@@ -20,31 +26,92 @@ def to_dict_parser(text: str, parser_class: Type[BaseModel], model: str = 'gpt-3
         model: Имя модели для генерации текста (по умолчанию 'gpt-3.5-turbo')
         
     Returns:
-        Словарь с распарсенными данными
+        Словарь с распарсенными данными (пустой, если модель недоступна или не ответила)
+        
+    Raises:
+        BudgetExceededError: Если запрос превысил бы бюджет задания
     """
     try:
-        # Экземпляр JsonOutputParser
-        parser = JsonOutputParser(pydantic_object=parser_class)
+        from langchain_core.output_parsers import JsonOutputParser
+        from langchain_core.prompts import PromptTemplate
+        from langchain_openai import ChatOpenAI
+        from langchain_community.callbacks import get_openai_callback
+    except ImportError as e:
+        logger.error(f"Парсинг моделью недоступен: {str(e)}")
+        return {}
 
-        # Создаем шаблон промпта
-        prompt = PromptTemplate(
-            input_variables=["query"],
-            template="Follow the instructions:\n{format_instructions}\n{query}\n",
-            partial_variables={"format_instructions": parser.get_format_instructions()})
+    # Проверка бюджета задания (может заменить модель на более дешевую)
+    model = ledger.check_budget(model, text)
 
-        # Создаем цепочку: шаблон -> модель -> парсер
-        llm = ChatOpenAI(model=model, temperature=0)
-        chain = prompt | llm | parser
+    # Экземпляр JsonOutputParser
+    parser = JsonOutputParser(pydantic_object=parser_class)
+
+    # Создаем шаблон промпта
+    prompt = PromptTemplate(
+        input_variables=["query"],
+        template="Follow the instructions:\n{format_instructions}\n{query}\n",
+        partial_variables={"format_instructions": parser.get_format_instructions()})
 
-        # Вызываем цепочку для парсинга текста
-        result = chain.invoke({"query": text})
+    def call(timeout):
+        # Повторы выполняет hr_utils.resilience, а не клиент
+        llm = ChatOpenAI(model=model, temperature=0, timeout=timeout, max_retries=0)
+        chain = prompt | llm | parser
+        with get_openai_callback() as callback:
+            return chain.invoke({"query": text}), callback
 
-        logger.info(f"Успешный парсинг с использованием {parser_class.__name__}")
-        return result
-    except Exception as e:
+    try:
+        # Вызываем цепочку шаблон -> модель -> парсер для парсинга текста
+        with span('llm.parse'):
+            result, callback = call_with_retry(call, DEFAULT_POLICY, get_breaker(model), name=model)
+    except ModelCallError as e:
+        # Запрос не выполнен: резерв бюджета снимается
+        ledger.release()
         error_msg = f"Ошибка при парсинге текста: {str(e)}"
         logger.error(error_msg)
         return {}
+    metrics.add_tokens(callback.prompt_tokens, callback.completion_tokens)
+    ledger.record(model, callback.prompt_tokens, callback.completion_tokens, stage='llm.parse')
+
+    logger.info(f"Успешный парсинг с использованием {parser_class.__name__}")
+    return result
+
+def _schema_fields(parser_class: Type['BaseModel']) -> list:
+    """Возвращает имена полей схемы (pydantic v1 или v2)."""
+    fields = getattr(parser_class, '__fields__', None) or getattr(parser_class, 'model_fields', {})
+    return list(fields)
+
+def parse_document(text: str, parser_class: Type['BaseModel'], model: str = 'gpt-3.5-turbo',
+                   min_confidence: float = DEFAULT_CONFIDENCE_THRESHOLD,
+                   first_line_position: bool = False) -> Dict[str, Any]:
+    """
+    Парсит документ локально по заголовкам разделов, а модель вызывает только при низкой уверенности.
+    
+    Args:
+        text: Текст для парсинга
+        parser_class: Класс парсера (например, Vacancy или Resume)
+        model: Имя модели для документов с низкой уверенностью (по умолчанию 'gpt-3.5-turbo')
+        min_confidence: Минимальная уверенность локального разбора (0 - модель не вызывается, 
+            значение больше 1 - модель вызывается всегда)
+        first_line_position: Брать ли должность из первой строки документа (для вакансий)
+        
+    Returns:
+        Словарь с распарсенными данными и полями parsed_by ('heuristic' или 'llm') и parse_confidence
+    """
+    with span('parse.heuristic'):
+        result, confidence = heuristic_parse(text, _schema_fields(parser_class), first_line_position)
+    confidence = round(confidence, 3)
+
+    if confidence >= min_confidence:
+        logger.info(f"Локальный разбор {parser_class.__name__} с уверенностью {confidence}")
+        return dict(result, parsed_by='heuristic', parse_confidence=confidence)
+
+    llm_result = to_dict_parser(text, parser_class=parser_class, model=model)
+    if not llm_result:
+        # Модель недоступна - используется локальный разбор, чтобы документ не потерялся
+        logger.warning(f"Парсинг моделью не удался, используется локальный разбор "
+                       f"с уверенностью {confidence}")
+        return dict(result, parsed_by='heuristic', parse_confidence=confidence)
+    return dict(llm_result, parsed_by='llm', parse_confidence=confidence)
 
 def analyze_text_with_prompt(text: str, system_prompt: str, user_prompt: str, 
                             model: str = 'gpt-3.5-turbo', temp: float = 0.1) -> str:
@@ -60,22 +127,21 @@ def analyze_text_with_prompt(text: str, system_prompt: str, user_prompt: str,
         
     Returns:
         Результат анализа текста
-    """
-    try:
-        # Формируем полный пользовательский промпт с текстом
-        full_user_prompt = f"{user_prompt}\n\nТЕКСТ ДЛЯ АНАЛИЗА:\n{text}"
         
-        # Генерируем ответ
-        response = generate_answer(
-            prompt_system=system_prompt,
-            prompt_user=full_user_prompt,
-            model=model,
-            temp=temp
-        )
-        
-        logger.info("Успешный анализ текста")
-        return response
-    except Exception as e:
-        error_msg = f"Ошибка при анализе текста: {str(e)}"
-        logger.error(error_msg)
-        return f"Произошла ошибка при анализе: {str(e)}"
+    Raises:
+        BudgetExceededError: Если запрос превысил бы бюджет сессии или задания
+        ModelCallError: Если модель не ответила после всех повторов
+    """
+    # Формируем полный пользовательский промпт с текстом
+    full_user_prompt = f"{user_prompt}\n\nТЕКСТ ДЛЯ АНАЛИЗА:\n{text}"
+    
+    # Генерируем ответ
+    response = generate_answer(
+        prompt_system=system_prompt,
+        prompt_user=full_user_prompt,
+        model=model,
+        temp=temp
+    )
+    
+    logger.info("Успешный анализ текста")
+    return response
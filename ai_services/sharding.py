@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+"""
+Шардированные векторные индексы резюме и вакансий.
+
+Документы одного типа распределяются по шардам: по семейству должностей
+(разработка, продажи, HR и т. д.) или по хешу идентификатора. Каждый шард -
+отдельный файл индекса (ai_services/slim_index.py) в директории
+db_faiss/<имя индекса>/, поэтому при
+обработке новых документов перестраиваются только шарды, состав которых
+изменился, а векторы неизмененных документов переиспользуются без повторных
+запросов эмбеддингов. Состав шардов хранится в manifest.json.
+
+Маршрутизатор запросов (ShardRouter) вычисляет эмбеддинг запроса один раз,
+ищет во всех шардах параллельно в пуле потоков (поиск освобождает GIL)
+и объединяет k лучших результатов.
+"""
+import os
+import json
+import heapq
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from hr_utils.metrics import span
+from hr_utils.file_utils import create_temp_file
+from ai_services.slim_index import (SlimIndex, save_slim_index, load_index, index_doc_ids, index_format, index_path,
+                                     remove_index, embedding_model_name)
+from ai_services.embedding import iter_embeddings, EmbeddingStats
+
+if TYPE_CHECKING:
+    from hr_models.document_store import DocumentStore
+
+logger = logging.getLogger('hr_system')
+
+SHARD_MANIFEST = 'manifest.json'
+
+# Стратегия шардирования по умолчанию: 'family' (семейство должностей) или 'hash'
+DEFAULT_STRATEGY = os.getenv("VECTOR_SHARDING", "family")
+
+# Количество шардов для стратегии 'hash'
+DEFAULT_NUM_SHARDS = int(os.getenv("VECTOR_SHARDS", "8"))
+
+# Количество потоков для параллельного поиска по шардам
+SEARCH_WORKERS = int(os.getenv("SHARD_SEARCH_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+# Семейства должностей и фрагменты названий позиций (проверяются по порядку)
+POSITION_FAMILIES: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ('hr', ('hr', 'персонал', 'кадр', 'рекрут', 'recruit', 'talent')),
+    ('sales', ('продаж', 'sales', 'коммерческ', 'по работе с клиентами', 'account manager', 'key account')),
+    ('marketing', ('маркет', 'market', 'smm', 'seo', 'pr-', 'бренд', 'brand', 'контент')),
+    ('finance', ('бухгалтер', 'финанс', 'financ', 'экономист', 'аудит', 'казначей', 'accountant')),
+    ('it', ('разработчик', 'программист', 'developer', 'engineer', 'инженер', 'devops', 'тестировщик', 'qa',
+            'аналитик', 'analyst', 'data', 'python', 'java', 'frontend', 'backend', 'архитектор', 'администратор')),
+    ('management', ('руководитель', 'директор', 'head', 'director', 'manager', 'менеджер', 'начальник')),
+)
+
+
+def position_family(position: str) -> str:
+    """
+    Определяет семейство должностей по названию позиции.
+
+    Args:
+        position: Название позиции
+
+    Returns:
+        Название семейства или 'other'
+    """
+    position = (position or '').lower()
+    for family, fragments in POSITION_FAMILIES:
+        if any(fragment in position for fragment in fragments):
+            return family
+    return 'other'
+
+
+def shard_key(doc_id: str, doc: Dict[str, Any], strategy: str, num_shards: int) -> str:
+    """
+    Возвращает шард документа.
+
+    Args:
+        doc_id: Идентификатор документа
+        doc: JSON документа
+        strategy: Стратегия шардирования ('family' или 'hash')
+        num_shards: Количество шардов для стратегии 'hash'
+
+    Returns:
+        Имя шарда
+    """
+    if strategy == 'hash':
+        digest = hashlib.blake2b(doc_id.encode('utf-8'), digest_size=8).hexdigest()
+        return f"h{int(digest, 16) % num_shards:02d}"
+    return position_family(doc.get('position', ''))
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _index_vectors(db: Any) -> Dict[str, Tuple[str, np.ndarray]]:
+    """Возвращает {идентификатор документа: (хеш текста чанка, вектор)} для индекса."""
+    vectors = db.index.reconstruct_n(0, db.index.ntotal)
+    if isinstance(db, SlimIndex):
+        hashes = db.hashes
+    else:
+        hashes = [_text_hash(db.docstore.search(db.index_to_docstore_id[i]).page_content)
+                  for i in range(db.index.ntotal)]
+    return {doc_id: (text_hash, vectors[i]) for i, (doc_id, text_hash) in enumerate(zip(index_doc_ids(db), hashes))}
+
+
+class ShardedIndex:
+    """Набор шардов векторной базы документов одного типа."""
+
+    def __init__(self, db_path: str, index_name: str, strategy: Optional[str] = None,
+                 num_shards: Optional[int] = None):
+        """
+        Args:
+            db_path: Директория векторных баз
+            index_name: Имя индекса (например, 'db_resumes')
+            strategy: Стратегия шардирования ('family' или 'hash')
+            num_shards: Количество шардов для стратегии 'hash'
+        """
+        self.db_path = db_path
+        self.index_name = index_name
+        self.path = os.path.join(db_path, index_name)
+        self.strategy = strategy or DEFAULT_STRATEGY
+        self.num_shards = num_shards or DEFAULT_NUM_SHARDS
+        self.manifest = load_shard_manifest(self.path)
+
+    def _same_layout(self) -> bool:
+        return (self.manifest.get('strategy') == self.strategy and
+                (self.strategy != 'hash' or self.manifest.get('num_shards') == self.num_shards))
+
+    def _same_model(self, model: str) -> bool:
+        # Векторы другой модели эмбеддингов несовместимы с новыми и не переиспользуются
+        return self.manifest.get('embedding_model') in (None, '', model) or not model
+
+    def update(self, document_store: 'DocumentStore', doc_type: str) -> Dict[str, Any]:
+        """
+        Перестраивает шарды, состав или документы которых изменились.
+
+        Args:
+            document_store: Хранилище документов
+            doc_type: Тип документа ('vacancy' или 'resume')
+
+        Returns:
+            Сводка: количество шардов, перестроенные шарды, количество новых эмбеддингов
+            и скорость их вычисления (документов в секунду)
+        """
+        from ai_services.metered_embeddings import openai_embeddings
+
+        embeddings = openai_embeddings()
+        model = embedding_model_name(embeddings)
+        same_model = self._same_model(model)
+        same_layout = self._same_layout() and same_model
+        old_docs = self.manifest.get('docs', {}) if same_layout else {}
+        old_shards = self.manifest.get('shards', {})
+
+        # Документы, JSON которых не менялся, не перечитываются
+        docs: Dict[str, Dict[str, Any]] = {}
+        chunks: Dict[str, Any] = {}
+        for doc_id in sorted(document_store.list_documents(doc_type)):
+            mtime = document_store.document_mtime(doc_id, doc_type)
+            entry = old_docs.get(doc_id)
+            if entry and entry['mtime'] == mtime:
+                docs[doc_id] = entry
+                continue
+            data = document_store.load_document_json(doc_id, doc_type)
+            if not data:
+                continue
+            entry = {'mtime': mtime, 'shard': None, 'hash': None}
+            # Почти-дубликаты не добавляются в векторную базу
+            if not data.get('duplicate_of'):
+                chunk = document_store.document_to_chunk(doc_id, doc_type)
+                if chunk:
+                    chunks[doc_id] = chunk
+                    entry['shard'] = shard_key(doc_id, data, self.strategy, self.num_shards)
+                    entry['hash'] = _text_hash(chunk.page_content)
+            docs[doc_id] = entry
+
+        members: Dict[str, Dict[str, str]] = {}
+        for doc_id, entry in docs.items():
+            if entry['shard']:
+                members.setdefault(entry['shard'], {})[doc_id] = entry['hash']
+        previous: Dict[str, Dict[str, str]] = {}
+        for doc_id, entry in old_docs.items():
+            if entry['shard']:
+                previous.setdefault(entry['shard'], {})[doc_id] = entry['hash']
+        dirty = [key for key in sorted(members) if members[key] != previous.get(key) or key not in old_shards
+                 or index_format(self.path, f"shard_{key}") != 'mapped']
+
+        # Векторы неизмененных документов берутся из прежних шардов (или из прежнего единого индекса)
+        reuse: Dict[str, Tuple[str, np.ndarray]] = {}
+        if not same_model:
+            sources = []
+        elif same_layout:
+            sources = [f"shard_{key}" for key in old_shards if key in dirty or key not in members]
+        elif self.manifest:
+            sources = [f"shard_{key}" for key in old_shards]
+        elif index_path(self.db_path, self.index_name):
+            sources = [None]
+        else:
+            sources = []
+        for source in sources if dirty else []:
+            db = (load_index(self.db_path, self.index_name) if source is None
+                  else load_index(self.path, source))
+            if db is not None:
+                reuse.update(_index_vectors(db))
+
+        os.makedirs(self.path, exist_ok=True)
+        shard_ids: Dict[str, List[str]] = {}
+        shard_vectors: Dict[str, List[Any]] = {}
+        remaining: Dict[str, int] = {}
+        # Тексты без готовых векторов из всех перестраиваемых шардов: (шард, позиция в шарде)
+        missing_texts: List[str] = []
+        missing_slots: List[Tuple[str, int]] = []
+        for key in dirty:
+            ids = shard_ids[key] = sorted(members[key])
+            for doc_id in ids:
+                if doc_id not in chunks:
+                    chunks[doc_id] = document_store.document_to_chunk(doc_id, doc_type)
+            vectors = shard_vectors[key] = [reuse[doc_id][1] if doc_id in reuse else None for doc_id in ids]
+            for i, doc_id in enumerate(ids):
+                if doc_id not in reuse or reuse[doc_id][0] != members[key][doc_id]:
+                    vectors[i] = None
+                    missing_texts.append(chunks[doc_id].page_content)
+                    missing_slots.append((key, i))
+            remaining[key] = sum(vector is None for vector in vectors)
+
+        def build_shard(key: str):
+            ids = shard_ids[key]
+            save_slim_index(self.path, f"shard_{key}", np.array(shard_vectors[key], dtype=np.float32), ids,
+                            [members[key][doc_id] for doc_id in ids], doc_type, model)
+            logger.info(f"Перестроен шард {key} индекса {self.index_name}: {len(ids)} документов")
+
+        for key in dirty:
+            if not remaining[key]:
+                build_shard(key)
+
+        # Эмбеддинги всех шардов вычисляются одним конвейером; шард строится, как только готовы его векторы
+        stats = EmbeddingStats()
+        with span('embed'):
+            for start, vectors in iter_embeddings(missing_texts, embeddings, stats=stats):
+                completed = set()
+                for (key, i), vector in zip(missing_slots[start:start + len(vectors)], vectors):
+                    shard_vectors[key][i] = vector
+                    remaining[key] -= 1
+                    if not remaining[key]:
+                        completed.add(key)
+                for key in sorted(completed):
+                    build_shard(key)
+                    del shard_vectors[key]
+
+        # Шарды, в которых не осталось документов, удаляются
+        for key in set(old_shards) - set(members):
+            remove_index(self.path, f"shard_{key}")
+
+        built = datetime.now().isoformat(timespec='seconds')
+        self.manifest = {
+            'strategy': self.strategy,
+            'num_shards': self.num_shards,
+            'embedding_model': model,
+            'shards': {key: {'docs': len(members[key]),
+                             'built': built if key in dirty else old_shards.get(key, {}).get('built', built)}
+                       for key in sorted(members)},
+            'docs': docs,
+        }
+        save_shard_manifest(self.path, self.manifest)
+        return {'shards': len(members), 'rebuilt': dirty, 'embedded': stats.documents,
+                'docs_per_sec': stats.docs_per_sec, 'documents': sum(len(ids) for ids in members.values())}
+
+
+def load_shard_manifest(path: str) -> Dict[str, Any]:
+    """
+    Загружает состав шардов индекса.
+
+    Args:
+        path: Директория шардов индекса
+
+    Returns:
+        Состав шардов или пустой словарь, если индекс не шардирован
+    """
+    manifest_file = os.path.join(path, SHARD_MANIFEST)
+    if not os.path.exists(manifest_file):
+        return {}
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        error_msg = f"Ошибка при загрузке состава шардов {manifest_file}: {str(e)}"
+        logger.error(error_msg)
+        return {}
+
+
+def save_shard_manifest(path: str, manifest: Dict[str, Any]):
+    """Атомарно сохраняет состав шардов индекса."""
+    fd, tmp_path = create_temp_file(path, prefix='.manifest_', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(path, SHARD_MANIFEST))
+    except Exception as e:
+        error_msg = f"Ошибка при сохранении состава шардов {path}: {str(e)}"
+        logger.error(error_msg)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+_search_pool: Optional[ThreadPoolExecutor] = None
+_search_pool_lock = threading.Lock()
+
+
+def _get_search_pool() -> ThreadPoolExecutor:
+    global _search_pool
+    with _search_pool_lock:
+        if _search_pool is None:
+            _search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix='shard-search')
+        return _search_pool
+
+
+class ShardRouter:
+    """Параллельный поиск по шардам индекса с объединением лучших результатов."""
+
+    def __init__(self, db_path: str, index_name: str, document_store: Optional['DocumentStore'] = None):
+        """
+        Args:
+            db_path: Директория векторных баз
+            index_name: Имя индекса (например, 'db_resumes')
+            document_store: Хранилище документов для загрузки текста найденных документов
+        """
+        self.db_path = db_path
+        self.index_name = index_name
+        self.path = os.path.join(db_path, index_name)
+        self.document_store = document_store
+        # Загруженные шарды: {имя шарда: (mtime файла, база)}
+        self._shards: Dict[str, Tuple[Optional[float], Any]] = {}
+        self._lock = threading.Lock()
+
+    def _shard_names(self) -> List[str]:
+        manifest = load_shard_manifest(self.path)
+        if manifest:
+            return [f"shard_{key}" for key in manifest.get('shards', {})]
+        # Индекс, построенный до шардирования, используется как единственный шард
+        if index_path(self.db_path, self.index_name):
+            return ['']
+        return []
+
+    def databases(self) -> Dict[str, Any]:
+        """
+        Возвращает базы шардов, загружая измененные на диске.
+
+        Returns:
+            Словарь {имя шарда: индекс шарда}
+        """
+        dbs = {}
+        for name in self._shard_names():
+            folder, index_name = (self.path, name) if name else (self.db_path, self.index_name)
+            try:
+                mtime = os.path.getmtime(index_path(folder, index_name) or '')
+            except OSError:
+                continue
+            with self._lock:
+                cached = self._shards.get(name)
+            if cached and cached[0] == mtime:
+                dbs[name] = cached[1]
+                continue
+            db = load_index(folder, index_name, self.document_store)
+            if db is not None:
+                with self._lock:
+                    self._shards[name] = (mtime, db)
+                dbs[name] = db
+        with self._lock:
+            for name in set(self._shards) - set(dbs):
+                del self._shards[name]
+        return dbs
+
+    def search(self, query: str, k: int = 3) -> Tuple[List[float], List[str]]:
+        """
+        Ищет k наиболее похожих документов во всех шардах.
+
+        Args:
+            query: Текст запроса
+            k: Количество результатов
+
+        Returns:
+            Кортеж (список оценок, список идентификаторов документов); меньшая оценка - ближе
+        """
+        dbs = list(self.databases().values())
+        if not dbs:
+            return [], []
+        try:
+            with span('search'):
+                # Эмбеддинг запроса вычисляется один раз для всех шардов
+                embedding = dbs[0].embeddings.embed_query(query)
+                if len(dbs) == 1:
+                    results = [dbs[0].similarity_search_with_score_by_vector(embedding, k=k)]
+                else:
+                    pool = _get_search_pool()
+                    results = list(pool.map(lambda db: db.similarity_search_with_score_by_vector(embedding, k=k),
+                                            dbs))
+                best = heapq.nsmallest(k, (item for shard in results for item in shard), key=lambda item: item[1])
+            logger.info(f"Найдено {len(best)} документов по запросу в {len(dbs)} шардах")
+            return [float(score) for _, score in best], [doc.metadata['meta'] for doc, _ in best]
+        except Exception as e:
+            error_msg = f"Ошибка при поиске в шардах индекса {self.index_name}: {str(e)}"
+            logger.error(error_msg)
+            return [], []
+
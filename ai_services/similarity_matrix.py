@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+"""
+Матрица схожести "резюме × вакансии" с таблицами лучших совпадений.
+
+Матрица строится по векторам, уже сохраненным в индексах FAISS резюме и
+вакансий (без повторных запросов эмбеддингов), блоками строк и хранится на
+диске как отображаемый в память файл .npy. Для каждой строки и каждого
+столбца заранее вычисляются k лучших совпадений, поэтому запросы "лучшие
+вакансии для резюме" и "лучшие резюме для вакансии" сводятся к чтению памяти.
+При добавлении или изменении документов пересчитываются только новые и
+измененные строки и столбцы, остальные значения копируются из прежней матрицы.
+
+Каждое построение записывает матрицу и таблицы в новую директорию поколения
+(gen_<дата>_<время>_<суффикс>), а meta.json, указывающий на поколение,
+заменяется последним. Читатель видит либо прежнее, либо новое поколение
+целиком, а не новую матрицу с прежними таблицами и метаданными.
+"""
+import os
+import csv
+import json
+import shutil
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple, Union, TYPE_CHECKING
+
+import numpy as np
+
+from hr_utils.metrics import span
+from hr_utils.file_utils import create_temp_file
+from ai_services.slim_index import index_doc_ids
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+logger = logging.getLogger('hr_system')
+
+# Версия формата матрицы: матрицы других версий перестраиваются полностью
+MATRIX_VERSION = 2
+
+# Количество строк матрицы, обрабатываемых за один шаг
+BLOCK_ROWS = 1024
+
+MATRIX_FILE = 'matrix.npy'
+META_FILE = 'meta.json'
+TOP_FILES = {
+    'vacancies': ('top_vacancies.npy', 'top_vacancies_scores.npy'),
+    'resumes': ('top_resumes.npy', 'top_resumes_scores.npy'),
+}
+
+# Префикс директорий поколений матрицы
+GENERATION_PREFIX = 'gen_'
+
+
+def document_vectors(db: Union['FAISS', List['FAISS']]) -> Tuple[List[str], np.ndarray]:
+    """
+    Извлекает из индекса FAISS (или из всех шардов индекса) идентификаторы документов и нормированные векторы.
+
+    Args:
+        db: Векторная база данных FAISS или список баз шардов
+
+    Returns:
+        Кортеж (список идентификаторов документов, матрица векторов float32)
+    """
+    dbs = db if isinstance(db, list) else [db]
+    vectors = np.concatenate([shard.index.reconstruct_n(0, shard.index.ntotal).astype(np.float32)
+                              for shard in dbs]) if dbs else np.empty((0, 0), dtype=np.float32)
+    ids = [doc_id for shard in dbs for doc_id in index_doc_ids(shard)]
+
+    # Каждый документ хранится в индексе одним чанком; при повторах берется последний вектор
+    positions = {doc_id: i for i, doc_id in enumerate(ids)}
+    order = sorted(positions.values())
+    vectors = vectors[order]
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms == 0, 1, norms)
+    return [ids[i] for i in order], vectors
+
+
+def _checksums(vectors: np.ndarray) -> List[str]:
+    """Вычисляет контрольные суммы векторов для обнаружения измененных документов."""
+    return [hashlib.blake2b(vector.tobytes(), digest_size=8).hexdigest() for vector in vectors]
+
+
+def _reuse_map(ids: List[str], checksums: List[str], old_ids: List[str], old_checksums: List[str]) -> np.ndarray:
+    """Возвращает для каждого документа индекс в прежней матрице или -1, если значения нужно пересчитать."""
+    old_positions = {doc_id: i for i, doc_id in enumerate(old_ids)}
+    reuse = np.full(len(ids), -1, dtype=np.int64)
+    for i, (doc_id, checksum) in enumerate(zip(ids, checksums)):
+        j = old_positions.get(doc_id)
+        if j is not None and old_checksums[j] == checksum:
+            reuse[i] = j
+    return reuse
+
+
+def _generation_path(matrix_path: str, meta: Dict[str, Any]) -> str:
+    """Возвращает директорию поколения матрицы, на которое указывают метаданные."""
+    return os.path.join(matrix_path, meta['generation'])
+
+
+def _load_matrix(matrix_path: str, meta: Dict[str, Any]) -> np.ndarray:
+    """
+    Открывает матрицу поколения в режиме отображения в память и проверяет ее размер.
+
+    Raises:
+        ValueError: Если размер матрицы не совпадает с метаданными
+    """
+    matrix = np.load(os.path.join(_generation_path(matrix_path, meta), MATRIX_FILE), mmap_mode='r')
+    expected = (len(meta['resume_ids']), len(meta['vacancy_ids']))
+    if matrix.shape != expected:
+        raise ValueError(f"Размер матрицы схожести {matrix.shape} не совпадает с метаданными {expected}")
+    return matrix
+
+
+def _remove_stale(matrix_path: str, keep: List[str]):
+    """Удаляет прежние поколения (кроме keep) и файлы матриц прежнего формата."""
+    for name in os.listdir(matrix_path):
+        path = os.path.join(matrix_path, name)
+        if name.startswith(GENERATION_PREFIX) and name not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+        elif name == MATRIX_FILE or any(name in files for files in TOP_FILES.values()):
+            os.remove(path)
+
+
+def _top_k_rows(matrix: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Вычисляет k лучших столбцов для каждой строки матрицы, обрабатывая строки блоками."""
+    rows, cols = matrix.shape
+    k = min(k, cols)
+    indices = np.empty((rows, k), dtype=np.int32)
+    scores = np.empty((rows, k), dtype=np.float32)
+    for start in range(0, rows, BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + BLOCK_ROWS])
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        indices[start:start + len(block)] = np.take_along_axis(top, order, axis=1)
+        scores[start:start + len(block)] = np.take_along_axis(top_scores, order, axis=1)
+    return indices, scores
+
+
+def _top_k_columns(matrix: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Вычисляет k лучших строк для каждого столбца за один проход по блокам строк."""
+    rows, cols = matrix.shape
+    k = min(k, rows)
+    best_scores = np.full((0, cols), -np.inf, dtype=np.float32)
+    best_rows = np.empty((0, cols), dtype=np.int32)
+    for start in range(0, rows, BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + BLOCK_ROWS])
+        block_rows = np.broadcast_to(np.arange(start, start + len(block), dtype=np.int32)[:, None], block.shape)
+        candidates = np.concatenate([best_scores, block])
+        candidate_rows = np.concatenate([best_rows, block_rows])
+        keep = min(k, len(candidates))
+        top = np.argpartition(-candidates, keep - 1, axis=0)[:keep]
+        best_scores = np.take_along_axis(candidates, top, axis=0)
+        best_rows = np.take_along_axis(candidate_rows, top, axis=0)
+    order = np.argsort(-best_scores, axis=0)
+    return (np.take_along_axis(best_rows, order, axis=0).T.copy(),
+            np.take_along_axis(best_scores, order, axis=0).T.copy())
+
+
+def _write_generation(generation_path: str, resume_ids: List[str], vacancy_ids: List[str],
+                      resume_vectors: np.ndarray, vacancy_vectors: np.ndarray, row_reuse: np.ndarray,
+                      col_reuse: np.ndarray, old_matrix: Optional[np.ndarray], k: int, summary: Dict[str, Any]):
+    """Записывает матрицу и таблицы лучших совпадений в директорию поколения."""
+    matrix_file = os.path.join(generation_path, MATRIX_FILE)
+    with span('similarity_matrix.build'):
+        matrix = np.lib.format.open_memmap(matrix_file, mode='w+', dtype=np.float32,
+                                           shape=(len(resume_ids), len(vacancy_ids)))
+        reused_cols = np.flatnonzero(col_reuse >= 0)
+        new_cols = np.flatnonzero(col_reuse < 0)
+        for start in range(0, len(resume_ids), BLOCK_ROWS):
+            stop = min(start + BLOCK_ROWS, len(resume_ids))
+            block_reuse = row_reuse[start:stop]
+            reused_rows = np.flatnonzero(block_reuse >= 0)
+            new_rows = np.flatnonzero(block_reuse < 0)
+            block = np.empty((stop - start, len(vacancy_ids)), dtype=np.float32)
+
+            # Неизмененные пары копируются, новые строки и столбцы вычисляются
+            if len(reused_rows) and len(reused_cols):
+                old_block = np.asarray(old_matrix[block_reuse[reused_rows]])
+                block[np.ix_(reused_rows, reused_cols)] = old_block[:, col_reuse[reused_cols]]
+            if len(reused_rows) and len(new_cols):
+                block[np.ix_(reused_rows, new_cols)] = (resume_vectors[start + reused_rows] @
+                                                        vacancy_vectors[new_cols].T)
+            if len(new_rows):
+                block[new_rows] = resume_vectors[start + new_rows] @ vacancy_vectors.T
+            summary['computed'] += len(new_rows) * len(vacancy_ids) + len(reused_rows) * len(new_cols)
+
+            matrix[start:stop] = block
+        matrix.flush()
+        del matrix
+
+    with span('similarity_matrix.top_k'):
+        matrix = np.load(matrix_file, mmap_mode='r')
+        for axis, (indices_file, scores_file) in TOP_FILES.items():
+            indices, scores = _top_k_rows(matrix, k) if axis == 'vacancies' else _top_k_columns(matrix, k)
+            np.save(os.path.join(generation_path, indices_file), indices)
+            np.save(os.path.join(generation_path, scores_file), scores)
+        del matrix
+
+
+def build_similarity_matrix(db_resumes: Union['FAISS', List['FAISS']], db_vacancies: Union['FAISS', List['FAISS']],
+                            matrix_path: str, k: int = 10) -> Dict[str, Any]:
+    """
+    Строит или обновляет матрицу схожести и таблицы лучших совпадений.
+
+    Значения для пар документов, векторы которых не изменились, копируются из
+    прежней матрицы; пересчитываются только новые и измененные строки и столбцы.
+
+    Args:
+        db_resumes: Векторная база резюме (или список баз шардов)
+        db_vacancies: Векторная база вакансий (или список баз шардов)
+        matrix_path: Директория для файлов матрицы
+        k: Количество лучших совпадений в таблицах
+
+    Returns:
+        Сводка: количество резюме и вакансий, число пересчитанных значений
+    """
+    os.makedirs(matrix_path, exist_ok=True)
+    resume_ids, resume_vectors = document_vectors(db_resumes)
+    vacancy_ids, vacancy_vectors = document_vectors(db_vacancies)
+    resume_checksums = _checksums(resume_vectors)
+    vacancy_checksums = _checksums(vacancy_vectors)
+
+    old_meta = _load_meta(matrix_path)
+    old_matrix = None
+    if old_meta and old_meta.get('version') == MATRIX_VERSION:
+        try:
+            old_matrix = _load_matrix(matrix_path, old_meta)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Прежняя матрица схожести не используется: {str(e)}")
+            old_meta = None
+    old_generation = old_meta['generation'] if old_matrix is not None else None
+    if old_matrix is not None:
+        row_reuse = _reuse_map(resume_ids, resume_checksums, old_meta['resume_ids'], old_meta['resume_checksums'])
+        col_reuse = _reuse_map(vacancy_ids, vacancy_checksums, old_meta['vacancy_ids'], old_meta['vacancy_checksums'])
+    else:
+        row_reuse = np.full(len(resume_ids), -1, dtype=np.int64)
+        col_reuse = np.full(len(vacancy_ids), -1, dtype=np.int64)
+
+    summary = {'resumes': len(resume_ids), 'vacancies': len(vacancy_ids), 'computed': 0}
+    unchanged = (old_matrix is not None and old_meta.get('k') == k
+                 and old_meta['resume_ids'] == resume_ids and old_meta['vacancy_ids'] == vacancy_ids
+                 and (row_reuse >= 0).all() and (col_reuse >= 0).all())
+    if unchanged:
+        logger.info("Матрица схожести актуальна, пересчет не требуется")
+        return summary
+
+    # Новое поколение не видно читателям, пока meta.json не указывает на него
+    generation = f"{GENERATION_PREFIX}{datetime.now():%Y%m%d_%H%M%S}_{os.urandom(3).hex()}"
+    generation_path = os.path.join(matrix_path, generation)
+    os.makedirs(generation_path)
+    try:
+        _write_generation(generation_path, resume_ids, vacancy_ids, resume_vectors, vacancy_vectors,
+                          row_reuse, col_reuse, old_matrix, k, summary)
+        del old_matrix
+
+        meta = {
+            'version': MATRIX_VERSION,
+            'k': k,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'generation': generation,
+            'resume_ids': resume_ids,
+            'vacancy_ids': vacancy_ids,
+            'resume_checksums': resume_checksums,
+            'vacancy_checksums': vacancy_checksums,
+        }
+        fd, tmp_meta = create_temp_file(matrix_path, prefix='.meta-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp_meta, os.path.join(matrix_path, META_FILE))
+        except BaseException:
+            if os.path.exists(tmp_meta):
+                os.remove(tmp_meta)
+            raise
+    except BaseException:
+        shutil.rmtree(generation_path, ignore_errors=True)
+        raise
+
+    # Прежнее поколение сохраняется для читателей, успевших прочитать прежний meta.json
+    _remove_stale(matrix_path, [generation, old_generation])
+
+    logger.info(f"Матрица схожести {len(resume_ids)}×{len(vacancy_ids)} обновлена, "
+                f"пересчитано значений: {summary['computed']}")
+    return summary
+
+
+def _load_meta(matrix_path: str) -> Optional[Dict[str, Any]]:
+    """Загружает метаданные матрицы или возвращает None, если матрица не построена."""
+    meta_file = os.path.join(matrix_path, META_FILE)
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class SimilarityMatrix:
+    """Доступ к построенной матрице схожести и таблицам лучших совпадений (только чтение)."""
+
+    def __init__(self, matrix_path: str):
+        """
+        Открывает матрицу схожести в режиме отображения в память.
+
+        Args:
+            matrix_path: Директория с файлами матрицы
+
+        Raises:
+            FileNotFoundError: Если матрица не построена
+            ValueError: Если размеры файлов матрицы не совпадают с метаданными
+        """
+        meta = _load_meta(matrix_path)
+        if meta is None or meta.get('version') != MATRIX_VERSION:
+            raise FileNotFoundError(f"Матрица схожести в {matrix_path} не построена")
+
+        self.k = meta['k']
+        self.resume_ids = meta['resume_ids']
+        self.vacancy_ids = meta['vacancy_ids']
+        self._resume_index = {doc_id: i for i, doc_id in enumerate(self.resume_ids)}
+        self._vacancy_index = {doc_id: i for i, doc_id in enumerate(self.vacancy_ids)}
+        self.matrix = _load_matrix(matrix_path, meta)
+        generation_path = _generation_path(matrix_path, meta)
+        self._top = {axis: (np.load(os.path.join(generation_path, indices_file), mmap_mode='r'),
+                            np.load(os.path.join(generation_path, scores_file), mmap_mode='r'))
+                     for axis, (indices_file, scores_file) in TOP_FILES.items()}
+        rows = {'vacancies': len(self.resume_ids), 'resumes': len(self.vacancy_ids)}
+        for axis, (indices, scores) in self._top.items():
+            if indices.shape != scores.shape or indices.shape[0] != rows[axis]:
+                raise ValueError(f"Размер таблицы лучших совпадений {axis} {indices.shape} "
+                                 f"не совпадает с метаданными")
+
+    def score(self, resume_id: str, vacancy_id: str) -> Optional[float]:
+        """
+        Возвращает схожесть резюме и вакансии.
+
+        Args:
+            resume_id: Идентификатор резюме
+            vacancy_id: Идентификатор вакансии
+
+        Returns:
+            Косинусная схожесть или None, если документа нет в матрице
+        """
+        i, j = self._resume_index.get(resume_id), self._vacancy_index.get(vacancy_id)
+        if i is None or j is None:
+            return None
+        return float(self.matrix[i, j])
+
+    def top_vacancies_for_resume(self, resume_id: str, k: int = 3) -> List[Tuple[str, float]]:
+        """
+        Возвращает лучшие вакансии для резюме.
+
+        Args:
+            resume_id: Идентификатор резюме
+            k: Количество результатов
+
+        Returns:
+            Список (ID вакансии, схожесть) по убыванию схожести
+        """
+        i = self._resume_index.get(resume_id)
+        if i is None:
+            return []
+        if k <= self.k:
+            indices, scores = self._top['vacancies']
+            return [(self.vacancy_ids[j], float(s)) for j, s in zip(indices[i][:k], scores[i][:k])]
+        row = np.asarray(self.matrix[i])
+        order = np.argsort(-row)[:k]
+        return [(self.vacancy_ids[j], float(row[j])) for j in order]
+
+    def top_resumes_for_vacancy(self, vacancy_id: str, k: int = 3) -> List[Tuple[str, float]]:
+        """
+        Возвращает лучшие резюме для вакансии.
+
+        Args:
+            vacancy_id: Идентификатор вакансии
+            k: Количество результатов
+
+        Returns:
+            Список (ID резюме, схожесть) по убыванию схожести
+        """
+        j = self._vacancy_index.get(vacancy_id)
+        if j is None:
+            return []
+        if k <= self.k:
+            indices, scores = self._top['resumes']
+            return [(self.resume_ids[i], float(s)) for i, s in zip(indices[j][:k], scores[j][:k])]
+        column = np.asarray(self.matrix[:, j])
+        order = np.argsort(-column)[:k]
+        return [(self.resume_ids[i], float(column[i])) for i in order]
+
+    def export_top_k(self, output_dir: str) -> List[str]:
+        """
+        Выгружает таблицы лучших совпадений в CSV для дашбордов.
+
+        Args:
+            output_dir: Директория для CSV-файлов
+
+        Returns:
+            Пути к созданным файлам
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        exports = [
+            ('top_vacancies_per_resume.csv', ('resume_id', 'rank', 'vacancy_id', 'similarity'),
+             self.resume_ids, self.vacancy_ids, self._top['vacancies']),
+            ('top_resumes_per_vacancy.csv', ('vacancy_id', 'rank', 'resume_id', 'similarity'),
+             self.vacancy_ids, self.resume_ids, self._top['resumes']),
+        ]
+        paths = []
+        for filename, header, row_ids, col_ids, (indices, scores) in exports:
+            path = os.path.join(output_dir, filename)
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                for row_id, row_indices, row_scores in zip(row_ids, indices, scores):
+                    for rank, (j, score) in enumerate(zip(row_indices, row_scores), 1):
+                        writer.writerow((row_id, rank, col_ids[j], f"{score:.6f}"))
+            paths.append(path)
+        return paths
@@ -0,0 +1,449 @@
+# -*- coding: utf-8 -*-
+"""
+Индекс нормализованных навыков для предварительного отбора резюме без моделей.
+
+Навыки в JSON резюме и вакансий хранятся свободным текстом ("Python3,
+Postgres, k8s"). Словарь синонимов сводит написания и синонимы к
+каноническим навыкам ("postgres", "постгрес" -> PostgreSQL); навыки, которых
+нет в словаре, сравниваются по нормализованному тексту. Навыки всех
+резюме хранятся как разреженная матрица "резюме × навыки" в формате CSR
+(массивы NumPy), поэтому ранжирование всего пула под вакансию - одно
+векторное вычисление без запросов эмбеддингов и моделей.
+
+Оценка резюме - доля навыков вакансии, которыми владеет кандидат, с весами
+IDF по пулу резюме: редкий навык весит больше распространенного.
+
+Индекс обновляется инкрементально: навыки заново извлекаются только из
+JSON, измененных после предыдущего построения. При изменении словаря
+синонимов индекс перестраивается полностью.
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+
+import numpy as np
+
+from hr_utils.metrics import span
+from ai_services.heuristic_parser import SKILL_DICTIONARY
+
+logger = logging.getLogger('hr_system')
+
+# Версия формата индекса: индексы других версий перестраиваются полностью
+SKILL_INDEX_VERSION = 1
+
+# Файл дополнительных синонимов в data/add_data: {"PostgreSQL": ["postgres", "постгрес"]}
+SYNONYMS_FILE = 'skill_synonyms.json'
+
+# Синонимы и написания навыков словаря: {канонический навык: написания}
+SKILL_SYNONYMS: Dict[str, Tuple[str, ...]] = {
+    'Python': ('python3', 'python 3', 'питон', 'пайтон'),
+    'Java': ('java se', 'java ee', 'джава'),
+    'Go': ('golang',),
+    'C++': ('cpp', 'c plus plus', 'си++'),
+    'C#': ('csharp', 'c sharp', 'си шарп'),
+    '.NET': ('dotnet', 'dot net', 'asp.net', '.net core'),
+    'JavaScript': ('js', 'java script', 'ecmascript', 'es6'),
+    'Node.js': ('nodejs', 'node js'),
+    'React': ('react.js', 'reactjs', 'react js'),
+    'Vue': ('vue.js', 'vuejs', 'vue js'),
+    'Angular': ('angularjs', 'angular.js'),
+    'PostgreSQL': ('postgres', 'postgre', 'psql', 'постгрес', 'postgre sql'),
+    'MySQL': ('my sql', 'mariadb'),
+    'MS SQL': ('mssql', 'ms sql server', 'sql server', 'microsoft sql server', 't-sql', 'tsql'),
+    'MongoDB': ('mongo', 'монго'),
+    'ClickHouse': ('click house', 'кликхаус'),
+    'Elasticsearch': ('elastic search', 'elastic', 'opensearch'),
+    'Kubernetes': ('k8s', 'кубернетес', 'кубер'),
+    'Docker': ('докер', 'docker compose', 'docker-compose'),
+    'Git': ('гит',),
+    'GitLab': ('gitlab ci', 'gitlab-ci'),
+    'CI/CD': ('ci cd', 'cicd', 'непрерывная интеграция'),
+    'AWS': ('amazon web services',),
+    'GCP': ('google cloud', 'google cloud platform'),
+    'Azure': ('microsoft azure',),
+    'REST': ('rest api', 'restful', 'restful api'),
+    'Microservices': ('микросервисы', 'микросервисная архитектура', 'microservice'),
+    'scikit-learn': ('sklearn', 'scikit learn'),
+    'PyTorch': ('torch',),
+    'TensorFlow': ('tensor flow',),
+    'Pandas': ('пандас',),
+    'Spark': ('apache spark', 'pyspark'),
+    'Airflow': ('apache airflow',),
+    'Kafka': ('apache kafka', 'кафка'),
+    'Machine Learning': ('ml', 'машинное обучение'),
+    'Deep Learning': ('глубокое обучение',),
+    'NLP': ('обработка естественного языка', 'natural language processing'),
+    'Computer Vision': ('компьютерное зрение',),
+    'LLM': ('large language models', 'большие языковые модели'),
+    'Power BI': ('powerbi',),
+    'Excel': ('ms excel', 'microsoft excel', 'эксель'),
+    '1С': ('1c', '1с:предприятие', '1c:enterprise', '1с предприятие'),
+    'MS Office': ('microsoft office', 'офисные программы', 'пакет ms office'),
+    'Английский язык': ('английский', 'english', 'англ'),
+    'Управление проектами': ('project management', 'управление проектом'),
+    'Управление командой': ('team management', 'управление персоналом', 'руководство командой'),
+    'Ведение переговоров': ('переговоры', 'negotiations'),
+    'Продажи': ('активные продажи', 'sales', 'b2b продажи', 'b2b-продажи'),
+    'CRM': ('crm-системы', 'crm системы', 'amocrm', 'битрикс24', 'bitrix24'),
+    'Бухгалтерский учет': ('бухучет', 'бухгалтерия'),
+    'Аналитика': ('анализ данных', 'data analysis', 'аналитика данных'),
+    'Figma': ('фигма',),
+    'Pytest': ('py.test',),
+    'QA': ('тестирование', 'testing', 'quality assurance'),
+    'Jira': ('джира',),
+    'Linux': ('линукс', 'unix'),
+    'SQL': ('язык sql', 'sql запросы'),
+}
+
+# Разделители навыков в свободном тексте поля skills
+_ITEM_SPLIT_RE = re.compile(r'[,;\n•·|]+|\s{2,}')
+_TOKEN_RE = re.compile(r'[\w.+#/]+')
+
+# Навык, не найденный в словаре, сравнивается по тексту, если он не длиннее этого числа слов
+MAX_FREE_SKILL_WORDS = 4
+
+# Значения, которыми модель обозначает отсутствующее поле
+_EMPTY_VALUES = ('', 'none', 'null', 'не указаны', 'не указано')
+
+
+def _tokens(text: str) -> Tuple[str, ...]:
+    """Разбивает текст на слова для сравнения навыков (нижний регистр, ё -> е, без точек по краям)."""
+    text = text.lower().replace('ё', 'е').replace('-', ' ').replace('_', ' ')
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        # Точка в начале значима (.net), в конце - знак препинания
+        token = token.rstrip('.')
+        if token and token not in ('/', '.'):
+            tokens.append(token)
+    return tuple(tokens)
+
+
+def _canonical_id(skill: str) -> str:
+    return ' '.join(_tokens(skill))
+
+
+def load_skill_synonyms(add_data_path: Optional[str] = None) -> Dict[str, Tuple[str, ...]]:
+    """
+    Возвращает словарь синонимов: встроенный, дополненный навыками словаря разбора и файлом skill_synonyms.json.
+
+    Args:
+        add_data_path: Директория дополнительных данных (data/add_data)
+
+    Returns:
+        Словарь {канонический навык: написания}
+    """
+    # Навыки словаря разбора, записанные в SKILL_SYNONYMS как написания (Golang, 1C), отдельными навыками не считаются
+    aliased = {_tokens(alias) for aliases in SKILL_SYNONYMS.values() for alias in aliases}
+    synonyms: Dict[str, List[str]] = {skill: [] for skill in SKILL_DICTIONARY if _tokens(skill) not in aliased}
+    for skill, aliases in SKILL_SYNONYMS.items():
+        synonyms.setdefault(skill, []).extend(aliases)
+
+    synonyms_file = os.path.join(add_data_path, SYNONYMS_FILE) if add_data_path else None
+    if synonyms_file and os.path.exists(synonyms_file):
+        try:
+            with open(synonyms_file, 'r', encoding='utf-8') as f:
+                for skill, aliases in json.load(f).items():
+                    synonyms.setdefault(skill, []).extend(aliases)
+        except Exception as e:
+            error_msg = f"Ошибка при загрузке синонимов навыков {synonyms_file}: {str(e)}"
+            logger.error(error_msg)
+    return {skill: tuple(aliases) for skill, aliases in synonyms.items()}
+
+
+class SkillNormalizer:
+    """Приведение навыков из свободного текста к каноническим идентификаторам."""
+
+    def __init__(self, synonyms: Dict[str, Iterable[str]]):
+        """
+        Компилирует словарь синонимов.
+
+        Args:
+            synonyms: Словарь {канонический навык: написания}
+        """
+        self.labels: Dict[str, str] = {}
+        self._aliases: Dict[Tuple[str, ...], str] = {}
+        for skill, aliases in synonyms.items():
+            skill_id = _canonical_id(skill)
+            if not skill_id:
+                continue
+            self.labels[skill_id] = skill
+            for alias in (skill, *aliases):
+                tokens = _tokens(alias)
+                # Первое определение написания побеждает: синоним не переопределяет навык словаря
+                if tokens and tokens not in self._aliases:
+                    self._aliases[tokens] = skill_id
+        self._max_words = max((len(tokens) for tokens in self._aliases), default=1)
+
+        # Отпечаток словаря: индекс, построенный с другим словарем, перестраивается
+        digest = hashlib.blake2b(digest_size=8)
+        for tokens, skill_id in sorted(self._aliases.items()):
+            digest.update(f"{' '.join(tokens)}={skill_id}\n".encode('utf-8'))
+        self.fingerprint = digest.hexdigest()
+
+    def label(self, skill_id: str) -> str:
+        """Возвращает название навыка для вывода."""
+        return self.labels.get(skill_id, skill_id)
+
+    def _scan(self, tokens: Tuple[str, ...]) -> List[str]:
+        """Находит в последовательности слов написания навыков (самое длинное совпадение первым)."""
+        found = []
+        i = 0
+        while i < len(tokens):
+            for length in range(min(self._max_words, len(tokens) - i), 0, -1):
+                skill_id = self._aliases.get(tokens[i:i + length])
+                if skill_id is not None:
+                    found.append(skill_id)
+                    i += length
+                    break
+            else:
+                i += 1
+        return found
+
+    def normalize(self, skills: str) -> List[str]:
+        """
+        Приводит перечень навыков к каноническим идентификаторам.
+
+        Каждый элемент перечня сначала ищется в словаре целиком и по словам;
+        короткий элемент без известных навыков сохраняется как отдельный навык.
+
+        Args:
+            skills: Навыки через запятую, точку с запятой или с новой строки
+
+        Returns:
+            Идентификаторы навыков без повторов в порядке появления
+        """
+        found: Dict[str, None] = {}
+        for item in _ITEM_SPLIT_RE.split(skills or ''):
+            tokens = _tokens(item)
+            if not tokens:
+                continue
+            item_skills = self._scan(tokens)
+            if not item_skills and len(tokens) <= MAX_FREE_SKILL_WORDS:
+                item_skills = [' '.join(tokens)]
+            found.update(dict.fromkeys(item_skills))
+        return list(found)
+
+    def find(self, text: str) -> List[str]:
+        """
+        Находит в произвольном тексте только навыки из словаря.
+
+        Args:
+            text: Текст документа
+
+        Returns:
+            Идентификаторы навыков без повторов
+        """
+        return list(dict.fromkeys(self._scan(_tokens(text or ''))))
+
+    def document_skills(self, data: Dict[str, Any], doc_type: str) -> List[str]:
+        """
+        Извлекает навыки из JSON документа.
+
+        Используется поле skills; если оно пустое, навыки словаря ищутся в
+        требованиях вакансии или в тексте документа.
+
+        Args:
+            data: Данные документа
+            doc_type: Тип документа ('vacancy' или 'resume')
+
+        Returns:
+            Идентификаторы навыков
+        """
+        skills = data.get('skills')
+        if isinstance(skills, list):
+            skills = ', '.join(str(skill) for skill in skills)
+        if isinstance(skills, str) and skills.strip().lower() not in _EMPTY_VALUES:
+            found = self.normalize(skills)
+            if found:
+                return found
+        fallback = data.get('requirements') if doc_type == 'vacancy' else None
+        return self.find(fallback if isinstance(fallback, str) and fallback.strip() else data.get(doc_type, ''))
+
+
+def _index_file(index_path: str, doc_type: str) -> str:
+    return os.path.join(index_path, f"{doc_type}_skills.npz")
+
+
+def _load_arrays(index_file: str) -> Optional[Dict[str, Any]]:
+    """Загружает массивы индекса или возвращает None, если индекса нет или он поврежден."""
+    if not os.path.exists(index_file):
+        return None
+    try:
+        with np.load(index_file, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        return arrays if int(arrays['version']) == SKILL_INDEX_VERSION else None
+    except Exception as e:
+        error_msg = f"Ошибка при загрузке индекса навыков {index_file}: {str(e)}"
+        logger.error(error_msg)
+        return None
+
+
+def build_skill_index(document_store, doc_type: str, index_path: str,
+                      normalizer: SkillNormalizer) -> Dict[str, Any]:
+    """
+    Строит или обновляет индекс навыков документов.
+
+    Навыки документов, JSON которых не менялся, берутся из прежнего индекса.
+
+    Args:
+        document_store: Хранилище документов
+        doc_type: Тип документов ('vacancy' или 'resume')
+        index_path: Директория индекса навыков
+        normalizer: Нормализатор навыков
+
+    Returns:
+        Сводка: количество документов, разобранных документов и навыков
+    """
+    os.makedirs(index_path, exist_ok=True)
+    index_file = _index_file(index_path, doc_type)
+    doc_ids = sorted(document_store.list_documents(doc_type))
+    mtimes = [document_store.document_mtime(doc_id, doc_type) or 0.0 for doc_id in doc_ids]
+
+    # Прежний индекс используется, только если он построен с тем же словарем синонимов
+    old = _load_arrays(index_file)
+    if old is not None and str(old['fingerprint']) != normalizer.fingerprint:
+        old = None
+    vocabulary: List[str] = [str(skill_id) for skill_id in old['vocabulary']] if old is not None else []
+    old_rows: Dict[str, Tuple[float, np.ndarray]] = {}
+    if old is not None:
+        for i, doc_id in enumerate(old['ids']):
+            old_rows[str(doc_id)] = (float(old['mtimes'][i]), old['indices'][old['indptr'][i]:old['indptr'][i + 1]])
+    columns = {skill_id: i for i, skill_id in enumerate(vocabulary)}
+
+    summary = {'documents': len(doc_ids), 'parsed': 0, 'skills': 0}
+    rows: List[np.ndarray] = []
+    with span('skill_index.build'):
+        for doc_id, mtime in zip(doc_ids, mtimes):
+            cached = old_rows.get(doc_id)
+            if cached is not None and cached[0] == mtime:
+                rows.append(cached[1])
+                continue
+            data = document_store.load_document_json(doc_id, doc_type) or {}
+            row = []
+            for skill_id in normalizer.document_skills(data, doc_type):
+                if skill_id not in columns:
+                    columns[skill_id] = len(vocabulary)
+                    vocabulary.append(skill_id)
+                row.append(columns[skill_id])
+            rows.append(np.array(sorted(row), dtype=np.int32))
+            summary['parsed'] += 1
+
+    if old is not None and not summary['parsed'] and [str(doc_id) for doc_id in old['ids']] == doc_ids:
+        summary['skills'] = len(vocabulary)
+        logger.info(f"Индекс навыков ({doc_type}) актуален, обновление не требуется")
+        return summary
+
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(row) for row in rows])
+    indices = np.concatenate(rows).astype(np.int32) if rows else np.empty(0, dtype=np.int32)
+    tmp_file = index_file + '.tmp'
+    try:
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, version=np.array(SKILL_INDEX_VERSION), fingerprint=np.array(normalizer.fingerprint),
+                     created=np.array(datetime.now().isoformat(timespec='seconds')),
+                     ids=np.array(doc_ids, dtype=str), mtimes=np.array(mtimes, dtype=np.float64),
+                     indptr=indptr, indices=indices, vocabulary=np.array(vocabulary, dtype=str))
+        os.replace(tmp_file, index_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+    summary['skills'] = len(vocabulary)
+    logger.info(f"Индекс навыков ({doc_type}) обновлен: документов {len(doc_ids)}, "
+                f"разобрано {summary['parsed']}, навыков {len(vocabulary)}")
+    return summary
+
+
+class SkillIndex:
+    """Ранжирование документов по покрытию навыков (только чтение)."""
+
+    def __init__(self, index_path: str, doc_type: str = 'resume'):
+        """
+        Загружает индекс навыков.
+
+        Args:
+            index_path: Директория индекса навыков
+            doc_type: Тип документов индекса
+
+        Raises:
+            FileNotFoundError: Если индекс не построен
+        """
+        arrays = _load_arrays(_index_file(index_path, doc_type))
+        if arrays is None:
+            raise FileNotFoundError(f"Индекс навыков ({doc_type}) в {index_path} не построен")
+
+        self.doc_type = doc_type
+        self.fingerprint = str(arrays['fingerprint'])
+        self.ids: List[str] = arrays['ids'].tolist()
+        self.vocabulary: List[str] = arrays['vocabulary'].tolist()
+        self._columns = {skill_id: i for i, skill_id in enumerate(self.vocabulary)}
+        self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self.indptr = arrays['indptr']
+        self.indices = arrays['indices']
+        # Номер строки каждого ненулевого элемента: суммы по строкам считаются одним bincount
+        self._rows = np.repeat(np.arange(len(self.ids), dtype=np.int32), np.diff(self.indptr))
+
+        # IDF навыка по пулу документов; навык, которого нет ни у кого, получает максимальный вес
+        frequency = np.bincount(self.indices, minlength=len(self.vocabulary))
+        self.idf = (np.log((len(self.ids) + 1) / (frequency + 1)) + 1).astype(np.float64)
+        self._missing_idf = float(np.log(len(self.ids) + 1) + 1)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def skills(self, doc_id: str) -> List[str]:
+        """Возвращает идентификаторы навыков документа."""
+        i = self._positions.get(doc_id)
+        if i is None:
+            return []
+        return [self.vocabulary[j] for j in self.indices[self.indptr[i]:self.indptr[i + 1]]]
+
+    def scores(self, skill_ids: List[str]) -> np.ndarray:
+        """
+        Вычисляет покрытие навыков для всех документов пула.
+
+        Args:
+            skill_ids: Идентификаторы требуемых навыков
+
+        Returns:
+            Массив оценок от 0 до 1 (доля веса требуемых навыков, которыми владеет кандидат)
+        """
+        query = np.zeros(len(self.vocabulary), dtype=np.float64)
+        total = 0.0
+        for skill_id in dict.fromkeys(skill_ids):
+            column = self._columns.get(skill_id)
+            if column is None:
+                total += self._missing_idf
+            else:
+                query[column] = self.idf[column]
+                total += self.idf[column]
+        if total == 0 or not len(self.ids):
+            return np.zeros(len(self.ids), dtype=np.float64)
+        return np.bincount(self._rows, weights=query[self.indices], minlength=len(self.ids)) / total
+
+    def rank(self, skill_ids: List[str], k: int = 10) -> List[Tuple[str, float, List[str]]]:
+        """
+        Ранжирует документы пула по покрытию требуемых навыков.
+
+        Args:
+            skill_ids: Идентификаторы требуемых навыков
+            k: Количество результатов
+
+        Returns:
+            Список (ID документа, оценка, совпавшие навыки) по убыванию оценки
+        """
+        scores = self.scores(skill_ids)
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        # При равной оценке порядок определяется идентификатором документа
+        top = top[np.lexsort((top, -scores[top]))]
+        wanted = set(skill_ids)
+        return [(self.ids[i], float(scores[i]), [skill_id for skill_id in self.skills(self.ids[i])
+                                                  if skill_id in wanted])
+                for i in top]
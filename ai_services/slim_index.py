@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+Компактный формат векторного индекса документов.
+
+FAISS.save_local сохраняет вместе с индексом pickle со всеми чанками
+(полный текст каждого документа), который при загрузке приходится
+распаковывать целиком с allow_dangerous_deserialization=True, хотя поиск
+использует только идентификатор документа. Индексы документов хранятся
+без текста, в одном из форматов (в порядке предпочтения):
+
+    <имя>.vindex               - версионированный файл, открываемый через
+                                 отображение в память (ai_services/index_file.py)
+    <имя>.faiss + <имя>.ids.npz - индекс FAISS и массивы идентификаторов
+                                 документов и хешей текстов чанков
+    <имя>.faiss + <имя>.pkl    - прежний формат LangChain (только чтение)
+
+Новые индексы записываются в формате .vindex, прежние преобразуются при
+перестроении шардов или функцией convert_indexes. Текст найденного
+документа при необходимости загружается из DocumentStore по идентификатору.
+"""
+import os
+import logging
+from typing import Dict, Any, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from hr_utils.metrics import span
+from ai_services.index_file import INDEX_SUFFIX, write_index_file, open_index_file, verify_index_file
+
+if TYPE_CHECKING:
+    from hr_models.document_store import DocumentStore
+
+logger = logging.getLogger('hr_system')
+
+IDS_SUFFIX = '.ids.npz'
+
+# Расширения файлов индекса во всех форматах
+INDEX_EXTENSIONS = (INDEX_SUFFIX, '.faiss', IDS_SUFFIX, '.pkl')
+
+
+class IndexedDocument:
+    """Найденный документ: идентификатор и тип, текст загружается из хранилища при обращении."""
+
+    __slots__ = ('metadata', '_document_store', '_page_content')
+
+    def __init__(self, doc_id: str, doc_type: str, document_store: Optional['DocumentStore'] = None):
+        self.metadata = {'meta': doc_id, 'type': doc_type}
+        self._document_store = document_store
+        self._page_content: Optional[str] = None
+
+    @property
+    def page_content(self) -> str:
+        if self._page_content is None:
+            chunk = None
+            if self._document_store is not None:
+                chunk = self._document_store.document_to_chunk(self.metadata['meta'], self.metadata['type'])
+            self._page_content = chunk.page_content if chunk else ''
+        return self._page_content
+
+
+class SlimIndex:
+    """Векторный индекс с компактной таблицей идентификаторов документов."""
+
+    def __init__(self, index: Any, ids: np.ndarray, hashes: np.ndarray, doc_type: str,
+                 embeddings: Any = None, document_store: Optional['DocumentStore'] = None,
+                 embedding_model: Optional[str] = None):
+        """
+        Args:
+            index: Индекс FAISS или векторы, отображенные в память (MappedVectors)
+            ids: Идентификаторы документов по позициям индекса (байтовые строки UTF-8)
+            hashes: Хеши текстов чанков по позициям индекса
+            doc_type: Тип документов ('vacancy' или 'resume')
+            embeddings: Модель эмбеддингов для запросов
+            document_store: Хранилище документов для загрузки текста
+            embedding_model: Модель, которой вычислены векторы индекса (None - неизвестна)
+        """
+        self.index = index
+        self._ids = ids
+        self._hashes = hashes
+        self.doc_type = doc_type
+        self.embeddings = embeddings
+        self.document_store = document_store
+        self.embedding_model = embedding_model
+
+    def doc_id(self, position: int) -> str:
+        """Возвращает идентификатор документа по позиции в индексе."""
+        return self._ids[position].decode('utf-8')
+
+    @property
+    def ids(self) -> List[str]:
+        return [doc_id.decode('utf-8') for doc_id in self._ids]
+
+    @property
+    def hashes(self) -> List[str]:
+        return [text_hash.decode('ascii') for text_hash in self._hashes]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float],
+                                               k: int = 4) -> List[Tuple[IndexedDocument, float]]:
+        """
+        Ищет k ближайших документов к вектору (L2, как индекс LangChain FAISS по умолчанию).
+
+        Args:
+            embedding: Вектор запроса
+            k: Количество результатов
+
+        Returns:
+            Список пар (документ, оценка); меньшая оценка - ближе
+        """
+        scores, positions = self.index.search(np.asarray([embedding], dtype=np.float32), k)
+        return [(IndexedDocument(self.doc_id(position), self.doc_type, self.document_store), float(score))
+                for score, position in zip(scores[0], positions[0]) if position != -1]
+
+    def similarity_search_with_score(self, query: str, k: int = 4) -> List[Tuple[IndexedDocument, float]]:
+        return self.similarity_search_with_score_by_vector(self.embeddings.embed_query(query), k=k)
+
+
+def embedding_model_name(embeddings: Any) -> str:
+    """Возвращает название модели эмбеддингов (пустая строка, если неизвестно)."""
+    return str(getattr(embeddings, 'model', '') or '')
+
+
+def index_format(folder: str, index_name: str) -> Optional[str]:
+    """
+    Определяет формат сохраненного индекса.
+
+    Args:
+        folder: Директория индекса
+        index_name: Имя индекса
+
+    Returns:
+        'mapped', 'slim', 'langchain' или None, если индекса нет
+    """
+    base = os.path.join(folder, index_name)
+    if os.path.exists(f"{base}{INDEX_SUFFIX}"):
+        return 'mapped'
+    if os.path.exists(f"{base}.faiss"):
+        return 'slim' if os.path.exists(f"{base}{IDS_SUFFIX}") else 'langchain'
+    return None
+
+
+def index_path(folder: str, index_name: str) -> Optional[str]:
+    """
+    Возвращает путь к основному файлу индекса (по времени его изменения перезагружаются шарды).
+
+    Args:
+        folder: Директория индекса
+        index_name: Имя индекса
+
+    Returns:
+        Путь к файлу или None, если индекса нет
+    """
+    index_type = index_format(folder, index_name)
+    if index_type is None:
+        return None
+    return os.path.join(folder, f"{index_name}{INDEX_SUFFIX if index_type == 'mapped' else '.faiss'}")
+
+
+def remove_index(folder: str, index_name: str, keep: str = ''):
+    """
+    Удаляет файлы индекса во всех форматах.
+
+    Args:
+        folder: Директория индекса
+        index_name: Имя индекса
+        keep: Расширение файла, который нужно оставить
+    """
+    for extension in INDEX_EXTENSIONS:
+        path = os.path.join(folder, f"{index_name}{extension}")
+        if extension != keep and os.path.exists(path):
+            os.remove(path)
+
+
+def save_slim_index(folder: str, index_name: str, vectors: np.ndarray, ids: List[str], hashes: List[str],
+                    doc_type: str, embedding_model: str = ''):
+    """
+    Сохраняет индекс в версионированном формате с отображением в память и
+    удаляет файлы прежних форматов.
+
+    Args:
+        folder: Директория индекса
+        index_name: Имя индекса
+        vectors: Матрица векторов
+        ids: Идентификаторы документов
+        hashes: Хеши текстов чанков
+        doc_type: Тип документов
+        embedding_model: Модель, которой вычислены векторы
+    """
+    with span('index_build'):
+        write_index_file(os.path.join(folder, f"{index_name}{INDEX_SUFFIX}"), vectors, ids, hashes, doc_type,
+                         embedding_model)
+    remove_index(folder, index_name, keep=INDEX_SUFFIX)
+
+
+def load_slim_index(folder: str, index_name: str, document_store: Optional['DocumentStore'] = None,
+                    embeddings: Any = None) -> Optional[SlimIndex]:
+    """
+    Загружает индекс в формате .vindex (отображение в память) или .faiss + .ids.npz.
+
+    Args:
+        folder: Директория индекса
+        index_name: Имя индекса
+        document_store: Хранилище документов для загрузки текста найденных документов
+        embeddings: Модель эмбеддингов для запросов (по умолчанию OpenAIEmbeddings)
+
+    Returns:
+        Индекс или None в случае ошибки
+    """
+    try:
+        if embeddings is None:
+            from ai_services.metered_embeddings import openai_embeddings
+            embeddings = openai_embeddings()
+        base = os.path.join(folder, index_name)
+        with span('index_load'):
+            if index_format(folder, index_name) == 'mapped':
+                header, index, ids, hashes = open_index_file(f"{base}{INDEX_SUFFIX}")
+                doc_type, model = header['doc_type'], header['embedding_model'] or None
+                current_model = embedding_model_name(embeddings)
+                if model and current_model and model != current_model:
+                    logger.warning(f"Индекс {folder}/{index_name} построен моделью {model}, "
+                                   f"запросы вычисляются моделью {current_model}")
+            else:
+                import faiss
+
+                with np.load(f"{base}{IDS_SUFFIX}", allow_pickle=False) as data:
+                    ids, hashes, doc_type = data['ids'], data['hashes'], data['doc_type'].item().decode('utf-8')
+                index, model = faiss.read_index(f"{base}.faiss"), None
+        if index.ntotal != len(ids):
+            raise ValueError(f"в индексе {index.ntotal} векторов, в таблице идентификаторов {len(ids)}")
+        logger.info(f"Загружена векторная база данных: {folder}/{index_name}")
+        return SlimIndex(index, ids, hashes, doc_type, embeddings, document_store, model)
+    except Exception as e:
+        error_msg = f"Ошибка при загрузке векторной базы данных {folder}/{index_name}: {str(e)}"
+        logger.error(error_msg)
+        return None
+
+
+def load_index(folder: str, index_name: str, document_store: Optional['DocumentStore'] = None) -> Any:
+    """
+    Загружает индекс документов в компактном формате или, если он еще не
+    преобразован, в прежнем формате LangChain FAISS.
+
+    Args:
+        folder: Директория индекса
+        index_name: Имя индекса
+        document_store: Хранилище документов для загрузки текста найденных документов
+
+    Returns:
+        Индекс или None в случае ошибки
+    """
+    if index_format(folder, index_name) in ('mapped', 'slim'):
+        return load_slim_index(folder, index_name, document_store)
+    from ai_services.vector_store import load_vector_db
+
+    return load_vector_db(folder, index_name)
+
+
+def index_doc_ids(db: Any) -> List[str]:
+    """
+    Возвращает идентификаторы документов по позициям индекса.
+
+    Args:
+        db: Компактный индекс или база LangChain FAISS прежнего формата
+
+    Returns:
+        Список идентификаторов документов
+    """
+    if isinstance(db, SlimIndex):
+        return db.ids
+    return [db.docstore.search(db.index_to_docstore_id[i]).metadata['meta'] for i in range(db.index.ntotal)]
+
+
+def convert_index(folder: str, index_name: str, embedding_model: str = '') -> Dict[str, Any]:
+    """
+    Преобразует индекс документов прежнего формата (.faiss + .pkl или .ids.npz) в формат .vindex.
+
+    Векторы переносятся без повторных запросов эмбеддингов. Индексы, чанки
+    которых не связаны с документами хранилища (например, база знаний HR),
+    не преобразуются: их текст хранится только в pickle.
+
+    Args:
+        folder: Директория индекса
+        index_name: Имя индекса
+        embedding_model: Модель, которой были вычислены векторы (записывается в заголовок)
+
+    Returns:
+        Результат: {'index', 'status' ('converted', 'current', 'skipped', 'error'), 'documents', 'message'}
+    """
+    result = {'index': os.path.join(folder, index_name), 'status': 'skipped', 'documents': 0, 'message': ''}
+    try:
+        source_format = index_format(folder, index_name)
+        if source_format == 'mapped':
+            result['status'] = 'current'
+            return result
+        base = os.path.join(folder, index_name)
+        if source_format == 'slim':
+            import faiss
+
+            with np.load(f"{base}{IDS_SUFFIX}", allow_pickle=False) as data:
+                ids = [doc_id.decode('utf-8') for doc_id in data['ids']]
+                hashes = [text_hash.decode('ascii') for text_hash in data['hashes']]
+                doc_type = data['doc_type'].item().decode('utf-8')
+            index = faiss.read_index(f"{base}.faiss")
+        elif source_format == 'langchain':
+            from langchain_core.embeddings import FakeEmbeddings
+            from langchain_community.vectorstores import FAISS
+            from ai_services.sharding import _text_hash
+
+            # Pickle индекса записан самой системой; распаковывается один раз при преобразовании.
+            # Эмбеддинги запросов для преобразования не нужны
+            db = FAISS.load_local(folder_path=folder, embeddings=FakeEmbeddings(size=1), index_name=index_name,
+                                  allow_dangerous_deserialization=True)
+            index = db.index
+            docs = [db.docstore.search(db.index_to_docstore_id[i]) for i in range(index.ntotal)]
+            if any('meta' not in doc.metadata for doc in docs):
+                result['message'] = "чанки не связаны с документами хранилища"
+                return result
+            ids = [doc.metadata['meta'] for doc in docs]
+            hashes = [_text_hash(doc.page_content) for doc in docs]
+            doc_type = docs[0].metadata.get('type', '') if docs else ''
+        else:
+            result['message'] = "индекс не найден"
+            return result
+
+        vectors = index.reconstruct_n(0, index.ntotal)
+        path = f"{base}{INDEX_SUFFIX}"
+        write_index_file(path, vectors, ids, hashes, doc_type, embedding_model)
+        if not verify_index_file(path):
+            os.remove(path)
+            raise ValueError("контрольная сумма записанного индекса не совпадает")
+        remove_index(folder, index_name, keep=INDEX_SUFFIX)
+        result.update(status='converted', documents=len(ids))
+        logger.info(f"Индекс {folder}/{index_name} преобразован в формат {INDEX_SUFFIX}: {len(ids)} документов")
+    except Exception as e:
+        error_msg = f"Ошибка при преобразовании индекса {folder}/{index_name}: {str(e)}"
+        logger.error(error_msg)
+        result.update(status='error', message=str(e))
+    return result
+
+
+def convert_indexes(db_path: str, embedding_model: str = '') -> List[Dict[str, Any]]:
+    """
+    Преобразует все индексы директории векторных баз (включая шарды в поддиректориях) в формат .vindex.
+
+    Args:
+        db_path: Директория векторных баз (data/db_faiss)
+        embedding_model: Модель, которой были вычислены векторы
+
+    Returns:
+        Результаты преобразования по индексам
+    """
+    results = []
+    folders = [db_path] + sorted(os.path.join(db_path, name) for name in os.listdir(db_path)
+                                 if os.path.isdir(os.path.join(db_path, name)))
+    for folder in folders:
+        for file_name in sorted(os.listdir(folder)):
+            if file_name.endswith('.faiss'):
+                results.append(convert_index(folder, file_name[:-len('.faiss')], embedding_model))
+    return results
@@ -1,15 +1,53 @@
 # -*- coding: utf-8 -*-
 import os
 import logging
-from typing import List, Tuple, Optional
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_community.docstore.document import Document
-from langchain_text_splitters import MarkdownHeaderTextSplitter
+from typing import List, Tuple, Optional, TYPE_CHECKING
+
+from hr_utils.metrics import span
+
+# Тяжелые зависимости (langchain, faiss) загружаются при первом обращении к базе
+if TYPE_CHECKING:
+    from langchain_openai import OpenAIEmbeddings
+    from langchain_community.vectorstores import FAISS
+    from langchain_community.docstore.document import Document
 
 logger = logging.getLogger('hr_system')
 
-def create_vector_db(documents: List[Document], save_path: str = None, index_name: str = 'index') -> FAISS:
+def _build_faiss(documents: List['Document'], embeddings: 'OpenAIEmbeddings') -> 'FAISS':
+    """
+    Строит индекс FAISS, добавляя векторы по мере готовности пакетов эмбеддингов.
+    
+    Args:
+        documents: Список документов
+        embeddings: Модель эмбеддингов
+        
+    Returns:
+        Векторная база данных FAISS
+    """
+    from langchain_community.vectorstores import FAISS
+    from ai_services.embedding import iter_embeddings, EmbeddingStats
+    
+    texts = [doc.page_content for doc in documents]
+    metadatas = [doc.metadata for doc in documents]
+    
+    db = None
+    stats = EmbeddingStats()
+    with span('embed'):
+        # Пакеты вычисляются параллельно; готовые добавляются в индекс, пока остальные в работе
+        for start, vectors in iter_embeddings(texts, embeddings, stats=stats):
+            pairs = list(zip(texts[start:start + len(vectors)], vectors))
+            batch_metadatas = metadatas[start:start + len(vectors)]
+            with span('index_build'):
+                if db is None:
+                    db = FAISS.from_embeddings(pairs, embeddings, metadatas=batch_metadatas)
+                else:
+                    db.add_embeddings(pairs, metadatas=batch_metadatas)
+    if db is None:
+        raise ValueError("Нет документов для построения векторной базы")
+    logger.info(f"Эмбеддинги {stats.documents} документов: {stats.docs_per_sec:.1f} док/с")
+    return db
+
+def create_vector_db(documents: List['Document'], save_path: str = None, index_name: str = 'index') -> 'FAISS':
     """
     Создает векторную базу данных из документов.
     
@@ -22,9 +60,11 @@ def create_vector_db(documents: List[Document], save_path: str = None, index_nam
         Векторная база данных FAISS
     """
     try:
+        from ai_services.metered_embeddings import openai_embeddings
+        
         # Создание векторной базы данных
-        embeddings = OpenAIEmbeddings()
-        db = FAISS.from_documents(documents, embeddings)
+        embeddings = openai_embeddings()
+        db = _build_faiss(documents, embeddings)
         
         # Сохранение базы, если указан путь
         if save_path:
@@ -39,7 +79,7 @@ def create_vector_db(documents: List[Document], save_path: str = None, index_nam
         logger.error(error_msg)
         raise
 
-def load_vector_db(load_path: str, index_name: str = 'index') -> Optional[FAISS]:
+def load_vector_db(load_path: str, index_name: str = 'index') -> Optional['FAISS']:
     """
     Загружает векторную базу данных.
     
@@ -51,13 +91,17 @@ def load_vector_db(load_path: str, index_name: str = 'index') -> Optional[FAISS]
         Векторная база данных FAISS или None в случае ошибки
     """
     try:
-        embeddings = OpenAIEmbeddings()
-        db = FAISS.load_local(
-            folder_path=load_path,
-            allow_dangerous_deserialization=True,
-            embeddings=embeddings,
-            index_name=index_name
-        )
+        from langchain_community.vectorstores import FAISS
+        from ai_services.metered_embeddings import openai_embeddings
+        
+        embeddings = openai_embeddings()
+        with span('index_load'):
+            db = FAISS.load_local(
+                folder_path=load_path,
+                allow_dangerous_deserialization=True,
+                embeddings=embeddings,
+                index_name=index_name
+            )
         logger.info(f"Загружена векторная база данных: {load_path}/{index_name}")
         return db
     except Exception as e:
@@ -65,7 +109,7 @@ def load_vector_db(load_path: str, index_name: str = 'index') -> Optional[FAISS]
         logger.error(error_msg)
         return None
 
-def similarity_search(query: str, db: FAISS, k: int = 3) -> Tuple[List[float], List[str]]:
+def similarity_search(query: str, db: 'FAISS', k: int = 3) -> Tuple[List[float], List[str]]:
     """
     Поиск наиболее похожих документов в векторной базе данных.
     
@@ -79,7 +123,8 @@ def similarity_search(query: str, db: FAISS, k: int = 3) -> Tuple[List[float], L
     """
     try:
         # Поиск наиболее похожих документов
-        docs_and_scores = db.similarity_search_with_score(query, k=k)
+        with span('search'):
+            docs_and_scores = db.similarity_search_with_score(query, k=k)
         
         # Извлечение оценок и метаданных
         scores = [doc[1] for doc in docs_and_scores]
@@ -92,7 +137,7 @@ def similarity_search(query: str, db: FAISS, k: int = 3) -> Tuple[List[float], L
         logger.error(error_msg)
         return [], []
 
-def db_from_markdown_file(markdown_file: str, save_path: str = None, index_name: str = 'index') -> Optional[FAISS]:
+def db_from_markdown_file(markdown_file: str, save_path: str = None, index_name: str = 'index') -> Optional['FAISS']:
     """
     Создает векторную базу данных из Markdown файла.
     
@@ -105,6 +150,8 @@ def db_from_markdown_file(markdown_file: str, save_path: str = None, index_name:
         Векторная база данных FAISS или None в случае ошибки
     """
     try:
+        from langchain_text_splitters import MarkdownHeaderTextSplitter
+        
         # Чтение Markdown файла
         with open(markdown_file, 'r', encoding='utf-8') as f:
             markdown_info = f.read()
@@ -120,8 +167,10 @@ def db_from_markdown_file(markdown_file: str, save_path: str = None, index_name:
         chunks = splitter.split_text(markdown_info)
 
         # Создание векторной базы данных
-        embeddings = OpenAIEmbeddings()
-        db = FAISS.from_documents(chunks, embeddings)
+        from ai_services.metered_embeddings import openai_embeddings
+        
+        embeddings = openai_embeddings()
+        db = _build_faiss(chunks, embeddings)
         
         # Сохранение базы, если указан путь
         if save_path:
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Нагрузочная проверка параллельной записи в хранилище документов.
+
+Несколько процессов записи сохраняют JSON документов с пересекающимися
+идентификаторами, а процесс чтения в это время непрерывно читает их, как
+сервис поиска. Сравниваются три способа записи:
+
+    inplace - прежняя запись open(..., 'w') поверх файла
+    atomic  - DocumentStore.save_document_json (временный файл и os.replace)
+    batch   - DocumentStore.commit_documents пакетами
+
+Для каждого способа выводится скорость записи, количество прочитанных
+поврежденных (обрезанных) файлов и количество поврежденных файлов после
+завершения записи.
+
+Использование:
+    python benchmarks/bench_document_store.py --writers 4 --docs 2000 --ids 200 --check
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+import multiprocessing
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from hr_models.document_store import DocumentStore
+
+MODES = ('inplace', 'atomic', 'batch')
+
+
+def make_document(doc_id: str, writer: int, version: int, text_kb: int):
+    return {'id': doc_id, 'writer': writer, 'version': version, 'position': 'Разработчик',
+            'skills': 'Python, SQL', 'resume': 'x' * (text_kb * 1024)}
+
+
+def write(base_path: str, mode: str, writer: int, docs: int, ids: int, text_kb: int, batch_size: int):
+    """Процесс записи: сохраняет docs документов со случайными идентификаторами из ids."""
+    logging.getLogger('hr_system').setLevel(logging.CRITICAL)
+    store = DocumentStore(base_path=base_path)
+    rng = random.Random(writer)
+    pending = []
+    for version in range(docs):
+        doc_id = f"resume_{rng.randrange(ids)}"
+        data = make_document(doc_id, writer, version, text_kb)
+        if mode == 'inplace':
+            with open(os.path.join(store.resumes_json_path, f"{doc_id}.json"), 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        elif mode == 'atomic':
+            store.save_document_json(data, doc_id, 'resume')
+        else:
+            pending.append((data, doc_id, 'resume'))
+            if len(pending) >= batch_size:
+                store.commit_documents(pending)
+                pending = []
+    if pending:
+        store.commit_documents(pending)
+
+
+def read(base_path: str, ids: int, stop, counters):
+    """Процесс чтения: читает документы, пока идет запись, и считает поврежденные."""
+    json_path = os.path.join(base_path, 'resumes_json')
+    rng = random.Random(-1)
+    reads = corrupt = 0
+    while not stop.is_set():
+        path = os.path.join(json_path, f"resume_{rng.randrange(ids)}.json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                json.load(f)
+            reads += 1
+        except FileNotFoundError:
+            continue
+        except ValueError:
+            reads += 1
+            corrupt += 1
+    counters['reads'] = reads
+    counters['corrupt'] = corrupt
+
+
+def run(mode: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        DocumentStore(base_path=tmp)
+        manager = multiprocessing.Manager()
+        counters = manager.dict()
+        stop = multiprocessing.Event()
+        reader = multiprocessing.Process(target=read, args=(tmp, args.ids, stop, counters))
+        reader.start()
+
+        started = time.perf_counter()
+        writers = [multiprocessing.Process(target=write, args=(tmp, mode, writer, args.docs, args.ids, args.text_kb,
+                                                                args.batch_size))
+                   for writer in range(args.writers)]
+        for process in writers:
+            process.start()
+        for process in writers:
+            process.join()
+        seconds = time.perf_counter() - started
+        stop.set()
+        reader.join()
+
+        json_path = os.path.join(tmp, 'resumes_json')
+        broken = 0
+        for file_name in os.listdir(json_path):
+            try:
+                with open(os.path.join(json_path, file_name), 'r', encoding='utf-8') as f:
+                    json.load(f)
+            except ValueError:
+                broken += 1
+        leftovers = [f for f in os.listdir(json_path) if f.endswith('.tmp')]
+        return {'docs_per_sec': args.writers * args.docs / seconds, 'reads': counters.get('reads', 0),
+                'corrupt_reads': counters.get('corrupt', 0), 'broken_files': broken, 'tmp_files': len(leftovers)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочная проверка параллельной записи документов')
+    parser.add_argument('--writers', type=int, default=4, help='Количество процессов записи')
+    parser.add_argument('--docs', type=int, default=2000, help='Документов на процесс записи')
+    parser.add_argument('--ids', type=int, default=200, help='Количество различных идентификаторов')
+    parser.add_argument('--text-kb', type=int, default=8, help='Размер текста документа, КБ')
+    parser.add_argument('--batch-size', type=int, default=32, help='Размер пакета для способа batch')
+    parser.add_argument('--check', action='store_true',
+                        help='Код возврата 1, если атомарная запись дала поврежденные файлы')
+    args = parser.parse_args()
+
+    results = {mode: run(mode, args) for mode in MODES}
+    print(f"Процессов записи: {args.writers}, документов: {args.writers * args.docs}, "
+          f"идентификаторов: {args.ids}, текст {args.text_kb} КБ")
+    print(f"{'способ':<8} {'док/с':>9} {'чтений':>8} {'повреждено при чтении':>22} {'повреждено после':>17}")
+    for mode in MODES:
+        result = results[mode]
+        print(f"{mode:<8} {result['docs_per_sec']:>9.0f} {result['reads']:>8} {result['corrupt_reads']:>22} "
+              f"{result['broken_files']:>17}")
+    failed = any(results[mode]['corrupt_reads'] or results[mode]['broken_files'] or results[mode]['tmp_files']
+                 for mode in ('atomic', 'batch'))
+    if args.check and failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
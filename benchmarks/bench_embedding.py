@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Замер скорости вычисления эмбеддингов: один синхронный вызов против конвейера.
+
+API эмбеддингов заменено заглушкой с задержкой на пакет (сетевое время
+ответа плюс время на каждый текст) и ограничением размера запроса, как у
+OpenAI. Сравнивается прежний вариант (embed_documents последовательными
+запросами по chunk_size текстов) и параллельный конвейер
+ai_services.embedding с пакетами заданного размера. Выводится скорость в
+документах в секунду и проверяется, что векторы совпадают.
+
+Использование:
+    python benchmarks/bench_embedding.py --docs 5000 --latency 0.3 --concurrency 4
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+from typing import List
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from ai_services.embedding import embed_texts, EmbeddingStats, RateLimiter
+
+
+def slow_embeddings(dim: int, latency: float, per_text: float, chunk_size: int):
+    """Создает заглушку эмбеддингов с задержкой ответа вместо запросов к API."""
+    from langchain_core.embeddings import Embeddings
+
+    class SlowEmbeddings(Embeddings):
+        def _vector(self, text: str) -> List[float]:
+            rng = np.random.default_rng(abs(hash(text)) % (2 ** 32))
+            return rng.normal(size=dim).astype(np.float32).tolist()
+
+        def embed_documents(self, texts: List[str]) -> List[List[float]]:
+            # Как OpenAIEmbeddings: длинный список отправляется запросами по chunk_size текстов
+            vectors = []
+            for start in range(0, len(texts), chunk_size):
+                batch = texts[start:start + chunk_size]
+                time.sleep(latency + per_text * len(batch))
+                vectors.extend(self._vector(text) for text in batch)
+            return vectors
+
+        def embed_query(self, text: str) -> List[float]:
+            return self._vector(text)
+
+    return SlowEmbeddings()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер скорости вычисления эмбеддингов')
+    parser.add_argument('--docs', type=int, default=5000, help='Количество документов')
+    parser.add_argument('--dim', type=int, default=256, help='Размерность векторов')
+    parser.add_argument('--latency', type=float, default=0.3, help='Задержка ответа на запрос, с')
+    parser.add_argument('--per-text', type=float, default=0.0005, help='Дополнительная задержка на текст, с')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='Текстов в одном запросе к API')
+    parser.add_argument('--batch-size', type=int, default=256, help='Размер пакета конвейера')
+    parser.add_argument('--concurrency', type=int, default=4, help='Одновременных запросов конвейера')
+    parser.add_argument('--rpm', type=int, default=0, help='Лимит запросов в минуту (0 - без ограничения)')
+    parser.add_argument('--min-speedup', type=float, default=0.0,
+                        help='Минимальное ускорение; при меньшем код возврата 1')
+    args = parser.parse_args()
+
+    logging.getLogger('hr_system').setLevel(logging.WARNING)
+    texts = [f"Резюме {i}: опыт работы {i % 17} лет, навыки python sql {i}" for i in range(args.docs)]
+    embeddings = slow_embeddings(args.dim, args.latency, args.per_text, args.chunk_size)
+
+    started = time.perf_counter()
+    serial = embeddings.embed_documents(texts)
+    serial_seconds = time.perf_counter() - started
+
+    stats = EmbeddingStats()
+    first_batch = []
+    started = time.perf_counter()
+    pipelined = embed_texts(texts, embeddings, batch_size=args.batch_size, concurrency=args.concurrency,
+                            limiter=RateLimiter(args.rpm), stats=stats,
+                            on_batch=lambda start, vectors: first_batch.append(time.perf_counter() - started))
+    pipelined_seconds = time.perf_counter() - started
+
+    speedup = serial_seconds / pipelined_seconds
+    print(f"Документов: {args.docs}, задержка запроса {args.latency} с, пакет {args.batch_size}, "
+          f"одновременных запросов {args.concurrency}")
+    print(f"{'режим':<12} {'время, с':>9} {'док/с':>9} {'первые векторы, с':>18}")
+    print(f"{'синхронный':<12} {serial_seconds:>9.2f} {args.docs / serial_seconds:>9.1f} {serial_seconds:>18.2f}")
+    print(f"{'конвейер':<12} {pipelined_seconds:>9.2f} {stats.docs_per_sec:>9.1f} {first_batch[0]:>18.2f}")
+    print(f"Ускорение: {speedup:.1f}x, пакетов: {stats.batches}, векторы совпадают: {serial == pipelined}")
+    if speedup < args.min_speedup or serial != pipelined:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
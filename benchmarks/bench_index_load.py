@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Замер загрузки индекса в трех форматах: прежний формат LangChain (FAISS +
+pickle с текстами чанков), FAISS + таблица идентификаторов (.ids.npz) и
+версионированный файл с отображением в память (.vindex).
+
+Строятся все варианты индекса на случайных векторах для документов с
+текстом заданного размера. Каждый индекс загружается в отдельном процессе,
+чтобы измерить время загрузки, прирост резидентной памяти процесса (RSS) и
+время первого запроса.
+Запросы к OpenAI не выполняются: эмбеддинги заменены заглушкой.
+
+Использование:
+    python benchmarks/bench_index_load.py --docs 20000 --text-kb 4
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import resource
+import tempfile
+import subprocess
+from typing import List
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from ai_services.slim_index import IDS_SUFFIX, save_slim_index, load_slim_index
+
+FORMATS = (('legacy', 'LangChain'), ('npz', 'FAISS + ids'), ('mapped', '.vindex'))
+
+
+def stub_embeddings():
+    """Создает заглушку эмбеддингов вместо запросов к API."""
+    from langchain_core.embeddings import Embeddings
+
+    class StubEmbeddings(Embeddings):
+        def embed_documents(self, texts: List[str]) -> List[List[float]]:
+            return [[0.0] for _ in texts]
+
+        def embed_query(self, text: str) -> List[float]:
+            return [0.0]
+
+    return StubEmbeddings()
+
+
+def build(folder: str, docs: int, dim: int, text_kb: int):
+    from langchain_community.vectorstores import FAISS
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(docs, dim)).astype(np.float32)
+    ids = [f"resume_{i}" for i in range(docs)]
+    texts = [f"1.Позиция: разработчик {i}. 3.Опыт: " + "x" * (text_kb * 1024) for i in range(docs)]
+    db = FAISS.from_embeddings(list(zip(texts, vectors.tolist())), stub_embeddings(),
+                               metadatas=[{'meta': doc_id, 'type': 'resume'} for doc_id in ids])
+    db.save_local(folder_path=folder, index_name='legacy')
+    save_slim_index(folder, 'mapped', vectors, ids, ['0' * 16] * docs, 'resume')
+
+    # Формат FAISS + таблица идентификаторов, записывавшийся до перехода на .vindex
+    import faiss
+    index = faiss.IndexFlatL2(dim)
+    index.add(vectors)
+    faiss.write_index(index, os.path.join(folder, 'npz.faiss'))
+    np.savez(os.path.join(folder, f'npz{IDS_SUFFIX}'), ids=np.array([doc_id.encode('utf-8') for doc_id in ids]),
+             hashes=np.array([b'0' * 16] * docs), doc_type=np.array(b'resume'))
+
+
+def current_rss_mb() -> float:
+    """Текущий размер резидентной памяти процесса (Linux), иначе пиковый."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load(folder: str, index_format: str):
+    """Загружает индекс и печатает JSON со временем и приростом памяти (в дочернем процессе)."""
+    embeddings = stub_embeddings()
+    import faiss  # noqa: F401 (импорт библиотек не входит в замер)
+    from langchain_community.vectorstores import FAISS
+
+    rss_before = current_rss_mb()
+    started = time.perf_counter()
+    if index_format == 'legacy':
+        db = FAISS.load_local(folder_path=folder, embeddings=embeddings, index_name='legacy',
+                              allow_dangerous_deserialization=True)
+    else:
+        db = load_slim_index(folder, index_format, embeddings=embeddings)
+    seconds = time.perf_counter() - started
+    rss_after = current_rss_mb()
+
+    query = np.random.default_rng(1).normal(size=db.index.d).astype(np.float32).tolist()
+    started = time.perf_counter()
+    db.similarity_search_with_score_by_vector(query, k=10)
+    query_seconds = time.perf_counter() - started
+    print(json.dumps({'seconds': seconds, 'rss_mb': rss_after - rss_before, 'query_seconds': query_seconds,
+                      'docs': db.index.ntotal}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер загрузки индекса в прежнем и компактном формате')
+    parser.add_argument('--docs', type=int, default=20000, help='Количество документов')
+    parser.add_argument('--dim', type=int, default=1536, help='Размерность векторов')
+    parser.add_argument('--text-kb', type=int, default=4, help='Размер текста документа, КБ')
+    parser.add_argument('--load', choices=[name for name, _ in FORMATS], help=argparse.SUPPRESS)
+    parser.add_argument('--folder', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.getLogger('hr_system').setLevel(logging.WARNING)
+    if args.load:
+        load(args.folder, args.load)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        build(tmp, args.docs, args.dim, args.text_kb)
+        sizes = {name: sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp) if f.startswith(name))
+                 for name, _ in FORMATS}
+        results = {}
+        for index_format, _ in FORMATS:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--load', index_format,
+                                     '--folder', tmp], capture_output=True, text=True, check=True).stdout
+            results[index_format] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"Документов: {args.docs}, размерность {args.dim}, текст {args.text_kb} КБ на документ")
+    print(f"{'формат':<12} {'на диске, МБ':>13} {'загрузка, мс':>13} {'прирост RSS, МБ':>16} "
+          f"{'первый запрос, мс':>18}")
+    for index_format, title in FORMATS:
+        result = results[index_format]
+        print(f"{title:<12} {sizes[index_format] / 2 ** 20:>13.1f} {result['seconds'] * 1000:>13.1f} "
+              f"{result['rss_mb']:>16.1f} {result['query_seconds'] * 1000:>18.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Сравнение синхронного и фонового журналирования при параллельной обработке.
+
+Несколько потоков (как рабочие потоки обработки документов) пишут записи
+журнала и аудита. Замеряется время, которое рабочие потоки проводят в
+вызовах журналирования: с синхронными FileHandler/StreamHandler (как
+раньше в logging.basicConfig) и с очередью и фоновым потоком записи
+(hr_utils/log_utils.py). Журналы пишутся во временную директорию.
+
+Использование:
+    python benchmarks/bench_logging.py --threads 8 --records 2000
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from hr_utils import log_utils
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def run_workers(threads: int, records: int, audit_file: str, audit_every: int) -> float:
+    """Запускает рабочие потоки и возвращает время до их завершения в секундах."""
+    logger = logging.getLogger('hr_system.store')
+    barrier = threading.Barrier(threads)
+
+    def worker(worker_id: int):
+        barrier.wait()
+        for i in range(records):
+            logger.info(f"Сохранен resume с ID resume_{worker_id}_{i}")
+            if audit_every and i % audit_every == 0:
+                log_utils.write_audit(f"Ответ кандидата {i} " * 20, f"Поток {worker_id}", audit_file)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, range(threads)))
+    return time.perf_counter() - started
+
+
+def sync_audit(text: str, title: str, log_file: str):
+    """Прежняя запись аудита: открытие файла, форматирование и дозапись в вызывающем потоке."""
+    from hr_utils.file_utils import format_text
+
+    with open(log_file, "a", encoding='utf-8') as file:
+        file.write(f'\n\n{time.strftime("%Y-%m-%d %H:%M")}. {title}.\n\n{format_text(text)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение синхронного и фонового журналирования')
+    parser.add_argument('--threads', type=int, default=8, help='Количество рабочих потоков')
+    parser.add_argument('--records', type=int, default=2000, help='Записей журнала на поток')
+    parser.add_argument('--audit-every', type=int, default=50, help='Запись аудита через каждые N записей журнала')
+    args = parser.parse_args()
+
+    total = args.threads * args.records
+    with tempfile.TemporaryDirectory() as tmp:
+        # Консольный вывод направляется в файл, чтобы не зависеть от скорости терминала
+        with open(os.path.join(tmp, 'console.txt'), 'w', encoding='utf-8') as console:
+            reset_root()
+            formatter = logging.Formatter(log_utils.LOG_FORMAT)
+            handlers = [logging.FileHandler(os.path.join(tmp, 'sync.log'), encoding='utf-8'),
+                        logging.StreamHandler(console)]
+            for handler in handlers:
+                handler.setFormatter(formatter)
+                logging.getLogger().addHandler(handler)
+            logging.getLogger().setLevel(logging.INFO)
+            write_audit = log_utils.write_audit
+            log_utils.write_audit = sync_audit
+            sync_seconds = run_workers(args.threads, args.records, os.path.join(tmp, 'sync_audit.txt'),
+                                       args.audit_every)
+            log_utils.write_audit = write_audit
+            reset_root()
+
+            log_utils.setup_logging(os.path.join(tmp, 'async.log'), level='INFO')
+            log_utils.get_writer().handlers[1].setStream(console)
+            async_seconds = run_workers(args.threads, args.records, os.path.join(tmp, 'async_audit.txt'),
+                                        args.audit_every)
+            started = time.perf_counter()
+            log_utils.get_writer().stop()
+            drain_seconds = time.perf_counter() - started
+            reset_root()
+
+        with open(os.path.join(tmp, 'async.log'), encoding='utf-8') as f:
+            written = sum(1 for _ in f)
+
+    print(f"Записей журнала: {total}, потоков: {args.threads}")
+    print(f"{'режим':<12} {'время потоков, с':>17} {'мкс на запись':>14}")
+    print(f"{'синхронный':<12} {sync_seconds:>17.3f} {sync_seconds / total * 1e6:>14.1f}")
+    print(f"{'фоновый':<12} {async_seconds:>17.3f} {async_seconds / total * 1e6:>14.1f}")
+    print(f"\nДозапись очереди после завершения потоков: {drain_seconds:.3f} с; "
+          f"записано строк: {written}, отброшено при переполнении: {log_utils.get_writer().dropped}")
+
+
+if __name__ == '__main__':
+    main()
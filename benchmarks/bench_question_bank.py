@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Замер подбора вопросов по позиции в банке вопросов разного размера.
+
+Генерируется синтетический general_questions.json с заданным числом ролей
+(у каждой роли ключевые слова и вопросы с тегами навыков). Сравниваются
+прежний линейный просмотр названий ролей и скомпилированный банк
+(interview/question_bank.py); отдельно замеряется повторная загрузка
+банка из неизмененного файла. Также проверяется, что для встроенных
+ролей банк выбирает те же вопросы, что и прежний алгоритм.
+
+Использование:
+    python benchmarks/bench_question_bank.py --roles 2000 --budget-us 1000
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+from typing import Dict, Any, List, Callable
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from interview.question_bank import QuestionBank, load_question_bank, FALLBACK_QUESTIONS
+
+BUILTIN_QUESTIONS = {
+    'Python_Dev': ["1. Расскажите о вашем опыте работы с Python."],
+    'Head_of_sales': ["1. Расскажите о вашем опыте управления продажами."],
+    'HR_Director': ["1. Расскажите о вашем опыте в HR."],
+}
+
+# Позиции и роли, выбранные прежним алгоритмом
+BUILTIN_CASES = [
+    ('Python-разработчик (Senior)', 'Python_Dev'),
+    ('Ведущий программист', 'Python_Dev'),
+    ('Руководитель отдела продаж', 'Head_of_sales'),
+    ('Коммерческий директор', 'Head_of_sales'),
+    ('HR-менеджер', 'HR_Director'),
+    ('Специалист по кадрам', 'HR_Director'),
+    ('Бухгалтер', None),
+]
+
+
+def legacy_select(position: str, questions_dict: Dict[str, List[str]]) -> List[str]:
+    """Прежний подбор: линейный просмотр названий ролей и ключевые слова трех ролей."""
+    position_lower = position.lower()
+    for key in questions_dict:
+        if key.lower() in position_lower:
+            return questions_dict[key]
+    if any(word in position_lower for word in ["python", "разработчик", "программист", "developer"]):
+        return questions_dict.get('Python_Dev', [])
+    elif any(word in position_lower for word in ["продаж", "sales", "коммерческий"]):
+        return questions_dict.get('Head_of_sales', [])
+    elif any(word in position_lower for word in ["hr", "персонал", "кадр"]):
+        return questions_dict.get('HR_Director', [])
+    return FALLBACK_QUESTIONS
+
+
+def synthetic_bank(roles: int, seed: int = 0) -> Dict[str, Any]:
+    """Создает банк вопросов с заданным количеством ролей."""
+    rng = random.Random(seed)
+    skills = ['Python', 'Java', 'SQL', 'Docker', 'Kafka', 'Spark', 'Excel', 'CRM', '1С', 'Figma']
+    bank: Dict[str, Any] = dict(BUILTIN_QUESTIONS)
+    for i in range(roles):
+        bank[f'Role_{i}'] = {
+            'keywords': [f'специальность{i}', f'role{i} lead'],
+            'questions': [{'text': f"{q + 1}. Вопрос {q} для роли {i}", 'skills': rng.sample(skills, 2)}
+                          if q % 3 == 0 else f"{q + 1}. Вопрос {q} для роли {i}" for q in range(10)],
+        }
+    return bank
+
+
+def timed(func: Callable[[], Any], repeat: int) -> float:
+    """Возвращает среднее время вызова в микросекундах."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер подбора вопросов по позиции')
+    parser.add_argument('--roles', type=int, default=2000, help='Количество ролей в синтетическом банке')
+    parser.add_argument('--repeat', type=int, default=200, help='Количество повторов замера')
+    parser.add_argument('--budget-us', type=float, default=None,
+                        help='Завершиться с ошибкой, если подбор дольше указанного времени (мкс)')
+    args = parser.parse_args()
+
+    logging.getLogger('hr_system').setLevel(logging.WARNING)
+
+    failures = []
+    builtin = QuestionBank(BUILTIN_QUESTIONS)
+    for position, expected in BUILTIN_CASES:
+        if builtin.match_role(position) != expected:
+            failures.append(f"для позиции '{position}' выбрана роль {builtin.match_role(position)}, "
+                            f"ожидалась {expected}")
+
+    bank_dict = synthetic_bank(args.roles)
+    legacy_dict = {role: entry['questions'] if isinstance(entry, dict) else entry
+                   for role, entry in bank_dict.items()}
+    positions = ['Руководитель отдела продаж', f'Ведущий специальность{args.roles - 1}',
+                 f'Role{args.roles // 2} Lead', 'Бухгалтер']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        questions_file = os.path.join(tmp, 'general_questions.json')
+        with open(questions_file, 'w', encoding='utf-8') as f:
+            json.dump(bank_dict, f, ensure_ascii=False)
+
+        started = time.perf_counter()
+        bank = load_question_bank(questions_file)
+        compile_ms = (time.perf_counter() - started) * 1000
+        reload_us = timed(lambda: load_question_bank(questions_file), args.repeat)
+
+    print(f"Банк: {len(bank.roles)} ролей, {len(bank)} вопросов; загрузка и компиляция {compile_ms:.1f} мс, "
+          f"повторное обращение к неизмененному файлу {reload_us:.1f} мкс\n")
+    print(f"{'позиция':<32} {'роль':<16} {'прежний, мкс':>13} {'банк, мкс':>10}")
+    worst = 0.0
+    for position in positions:
+        legacy_us = timed(lambda: legacy_select(position, legacy_dict), args.repeat)
+        bank_us = timed(lambda: bank.select(position, skills='Python, SQL'), args.repeat)
+        worst = max(worst, bank_us)
+        print(f"{position:<32} {str(bank.match_role(position)):<16} {legacy_us:>13.1f} {bank_us:>10.1f}")
+
+    if args.budget_us is not None and worst > args.budget_us:
+        failures.append(f"подбор занял {worst:.1f} мкс при бюджете {args.budget_us:.0f} мкс")
+    if failures:
+        print("\nОжидания не выполнены: " + "; ".join(failures))
+        sys.exit(1)
+    print("\nВсе ожидания выполнены")
+
+
+if __name__ == '__main__':
+    main()
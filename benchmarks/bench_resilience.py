@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка устойчивого слоя обращений к моделям на локальной заглушке с внедрением сбоев.
+
+Заглушка имитирует API чата: задержки ответа с тяжелым хвостом, ошибки
+сервиса (500), превышение лимита (429) и полный отказ. Для нескольких
+политик (без повторов, с повторами, с повторами и хеджированием)
+выводятся доля успешных вызовов и перцентили задержки; отдельно
+проверяется размыкание выключателя при отказе сервиса и то, что
+generate_answer_async выбрасывает типизированную ошибку вместо текста.
+Запросы к OpenAI не выполняются.
+
+Использование:
+    python benchmarks/bench_resilience.py --calls 300 --check
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+from types import SimpleNamespace
+from typing import Dict, Any, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from hr_utils.resilience import (RetryPolicy, CircuitBreaker, CircuitOpenError, ModelCallError,
+                                 call_with_retry_async)
+
+
+class StubAPIError(Exception):
+    """Ошибка заглушки с HTTP-статусом, как у исключений клиента OpenAI."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class FaultInjectingStub:
+    """Заглушка API чата с настраиваемыми задержками и сбоями."""
+
+    def __init__(self, latency: float = 0.02, tail_rate: float = 0.05, tail_latency: float = 0.5,
+                 error_rate: float = 0.1, rate_limit_rate: float = 0.05, outage: bool = False, seed: int = 0):
+        self.latency = latency
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.outage = outage
+        self.requests = 0
+        self._random = random.Random(seed)
+
+    async def create(self, timeout: float = None, **kwargs):
+        self.requests += 1
+        if self.outage:
+            await asyncio.sleep(self.latency)
+            raise StubAPIError(503)
+        roll = self._random.random()
+        delay = self.tail_latency if self._random.random() < self.tail_rate else self.latency
+        await asyncio.sleep(delay * self._random.uniform(0.8, 1.2))
+        if roll < self.error_rate:
+            raise StubAPIError(500)
+        if roll < self.error_rate + self.rate_limit_rate:
+            raise StubAPIError(429)
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+        message = SimpleNamespace(content="Ответ заглушки")
+        return SimpleNamespace(usage=usage, choices=[SimpleNamespace(message=message)])
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run_scenario(policy: RetryPolicy, calls: int, concurrency: int, **stub_kwargs) -> Dict[str, Any]:
+    """Выполняет вызовы через call_with_retry_async к заглушке и собирает статистику."""
+    stub = FaultInjectingStub(**stub_kwargs)
+    breaker = CircuitBreaker(failure_threshold=10 ** 6)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                await call_with_retry_async(lambda timeout: stub.create(timeout=timeout), policy, breaker, 'stub')
+                latencies.append(time.monotonic() - started)
+            except ModelCallError:
+                errors += 1
+
+    await asyncio.gather(*(one() for _ in range(calls)))
+    return {'success': len(latencies) / calls, 'p50': percentile(latencies, 0.5),
+            'p95': percentile(latencies, 0.95), 'p99': percentile(latencies, 0.99),
+            'requests_per_call': stub.requests / calls}
+
+
+async def run_outage(calls: int) -> Dict[str, Any]:
+    """Проверяет, что при отказе сервиса выключатель размыкается и вызовы отклоняются сразу."""
+    stub = FaultInjectingStub(outage=True, latency=0.005)
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=60)
+    policy = RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.01, deadline=1.0, attempt_timeout=0.5)
+    rejected = 0
+    for _ in range(calls):
+        try:
+            await call_with_retry_async(lambda timeout: stub.create(timeout=timeout), policy, breaker, 'stub')
+        except CircuitOpenError:
+            rejected += 1
+        except ModelCallError:
+            pass
+    return {'requests': stub.requests, 'rejected': rejected, 'state': breaker.state}
+
+
+async def run_generate_answer() -> str:
+    """Проверяет, что generate_answer_async выбрасывает типизированную ошибку, а не возвращает ее текст."""
+    from hr_utils import api_utils
+    from hr_utils.resilience import get_breaker
+
+    stub = FaultInjectingStub(outage=True, latency=0.001)
+    client = SimpleNamespace(chat=SimpleNamespace(completions=stub))
+    api_utils._async_clients[asyncio.get_running_loop()] = client
+    policy = RetryPolicy(max_attempts=2, base_delay=0.001, deadline=1.0, attempt_timeout=0.5)
+    try:
+        result = await api_utils.generate_answer_async("system", "user", model='stub-model', policy=policy)
+        return f"возвращен текст: {result!r}"
+    except ModelCallError as e:
+        return f"{type(e).__name__}: {e}"
+    finally:
+        get_breaker('stub-model').record_success()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Проверка повторов, хеджирования и выключателя на заглушке')
+    parser.add_argument('--calls', type=int, default=300, help='Количество вызовов в сценарии')
+    parser.add_argument('--concurrency', type=int, default=32, help='Количество одновременных вызовов')
+    parser.add_argument('--check', action='store_true', help='Завершиться с ошибкой, если ожидания не выполнены')
+    args = parser.parse_args()
+
+    # Сообщения о повторах заглушки не выводятся
+    logging.getLogger('hr_system').setLevel(logging.CRITICAL)
+
+    retry = dict(base_delay=0.01, max_delay=0.1, deadline=2.0, attempt_timeout=1.0)
+    scenarios = [
+        ('без повторов', RetryPolicy(max_attempts=1, **retry)),
+        ('повторы', RetryPolicy(max_attempts=4, **retry)),
+        ('повторы + хеджирование', RetryPolicy(max_attempts=4, hedge_after=0.06, **retry)),
+    ]
+    results = {}
+    print(f"{'политика':<26} {'успех':>7} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'запросов/вызов':>15}")
+    for title, policy in scenarios:
+        result = results[title] = asyncio.run(run_scenario(policy, args.calls, args.concurrency))
+        print(f"{title:<26} {result['success']:>7.1%} {result['p50'] * 1000:>9.0f} {result['p95'] * 1000:>9.0f} "
+              f"{result['p99'] * 1000:>9.0f} {result['requests_per_call']:>15.2f}")
+
+    outage = asyncio.run(run_outage(calls=20))
+    print(f"\nОтказ сервиса: запросов к API {outage['requests']}, отклонено выключателем {outage['rejected']}, "
+          f"состояние {outage['state']}")
+
+    generate_answer_result = asyncio.run(run_generate_answer())
+    print(f"generate_answer_async при отказе: {generate_answer_result}")
+
+    if args.check:
+        failures = []
+        if results['повторы']['success'] <= results['без повторов']['success']:
+            failures.append("повторы не повысили долю успешных вызовов")
+        if results['повторы + хеджирование']['p95'] >= results['повторы']['p95']:
+            failures.append("хеджирование не снизило p95")
+        if outage['state'] != 'open' or not outage['rejected']:
+            failures.append("выключатель не разомкнулся при отказе сервиса")
+        if generate_answer_result.startswith("возвращен текст"):
+            failures.append("generate_answer_async вернул текст вместо ошибки")
+        if failures:
+            print("\nОжидания не выполнены: " + "; ".join(failures))
+            sys.exit(1)
+        print("\nВсе ожидания выполнены")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Замер поиска по единому индексу и по шардам с параллельным опросом.
+
+Строятся индексы FAISS на случайных векторах (размерность как у эмбеддингов
+OpenAI): один общий индекс и несколько шардов с тем же набором документов.
+Для запросов сравнивается задержка поиска в общем индексе и через
+ShardRouter (эмбеддинг запроса один раз, параллельный поиск по шардам,
+объединение k лучших), а также проверяется, что результаты совпадают.
+Запросы к OpenAI не выполняются: эмбеддинги заменены детерминированной заглушкой.
+
+Использование:
+    python benchmarks/bench_shards.py --docs 50000 --shards 8 --queries 50
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+from typing import List
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from ai_services.sharding import ShardRouter, save_shard_manifest
+from ai_services.slim_index import save_slim_index
+
+
+def random_embeddings(dim: int):
+    """Создает детерминированные случайные эмбеддинги вместо запросов к API."""
+    from langchain_core.embeddings import Embeddings
+
+    class RandomEmbeddings(Embeddings):
+        def __init__(self, dim: int):
+            self.dim = dim
+
+        def _vector(self, text: str) -> List[float]:
+            rng = np.random.default_rng(abs(hash(text)) % (2 ** 32))
+            return rng.normal(size=self.dim).astype(np.float32).tolist()
+
+        def embed_documents(self, texts: List[str]) -> List[List[float]]:
+            return [self._vector(text) for text in texts]
+
+        def embed_query(self, text: str) -> List[float]:
+            return self._vector(text)
+
+    return RandomEmbeddings(dim)
+
+
+def build_index(vectors: np.ndarray, ids: List[str], folder: str, index_name: str):
+    os.makedirs(folder, exist_ok=True)
+    save_slim_index(folder, index_name, vectors, ids, ['0' * 16] * len(ids), 'resume')
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер поиска по шардам')
+    parser.add_argument('--docs', type=int, default=50000, help='Количество документов')
+    parser.add_argument('--shards', type=int, default=8, help='Количество шардов')
+    parser.add_argument('--dim', type=int, default=1536, help='Размерность векторов')
+    parser.add_argument('--queries', type=int, default=50, help='Количество запросов')
+    parser.add_argument('--k', type=int, default=10, help='Количество результатов')
+    args = parser.parse_args()
+
+    logging.getLogger('hr_system').setLevel(logging.WARNING)
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(args.docs, args.dim)).astype(np.float32)
+    ids = [f"resume_{i}" for i in range(args.docs)]
+    embeddings = random_embeddings(args.dim)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        single_dir, sharded_dir = os.path.join(tmp, 'single'), os.path.join(tmp, 'sharded')
+        os.makedirs(os.path.join(sharded_dir, 'db_resumes'))
+        started = time.perf_counter()
+        build_index(vectors, ids, single_dir, 'db_resumes')
+        single_build = time.perf_counter() - started
+
+        shards = {}
+        started = time.perf_counter()
+        for shard in range(args.shards):
+            key = f"h{shard:02d}"
+            build_index(vectors[shard::args.shards], ids[shard::args.shards],
+                        os.path.join(sharded_dir, 'db_resumes'), f"shard_{key}")
+            shards[key] = {'docs': len(ids[shard::args.shards])}
+        sharded_build = time.perf_counter() - started
+        save_shard_manifest(os.path.join(sharded_dir, 'db_resumes'),
+                            {'strategy': 'hash', 'num_shards': args.shards, 'shards': shards, 'docs': {}})
+
+        # Один шард - то же, что единый индекс, построенный до шардирования
+        single, sharded = ShardRouter(single_dir, 'db_resumes'), ShardRouter(sharded_dir, 'db_resumes')
+        for router in (single, sharded):
+            router.databases()
+            # Заглушка эмбеддингов подменяет OpenAIEmbeddings, сохраненный вместе с базой
+            for db in router.databases().values():
+                db.embeddings = embeddings
+
+        queries = [f"запрос {i}" for i in range(args.queries)]
+        timings = {'единый индекс': [], f'{args.shards} шардов': []}
+        mismatches = 0
+        for query in queries:
+            results = []
+            for title, router in zip(timings, (single, sharded)):
+                started = time.perf_counter()
+                results.append(router.search(query, k=args.k)[1])
+                timings[title].append(time.perf_counter() - started)
+            mismatches += results[0] != results[1]
+
+    print(f"Документов: {args.docs}, размерность {args.dim}, запросов {args.queries}, k={args.k}")
+    print(f"Построение: единый индекс {single_build:.1f} с, шарды {sharded_build:.1f} с "
+          f"(при изменении перестраивается только шард с новыми документами)")
+    print(f"{'индекс':<16} {'p50, мс':>9} {'p95, мс':>9}")
+    for title, values in timings.items():
+        print(f"{title:<16} {percentile(values, 0.5) * 1000:>9.2f} {percentile(values, 0.95) * 1000:>9.2f}")
+    print(f"Запросов с разными результатами: {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Замер предварительного отбора резюме по навыкам (ai_services.skill_index).
+
+Создается синтетический пул резюме: навыки выбираются из словаря и
+записываются случайными написаниями и синонимами ("Postgres", "постгрес",
+"k8s"). Замеряется построение индекса навыков (полное и повторное, без
+изменений), затем ранжирование всего пула под вакансии. Оценки сверяются
+с прямым вычислением по множествам навыков.
+Запросы к OpenAI не выполняются.
+
+Использование:
+    python benchmarks/bench_skill_search.py --resumes 20000 --queries 200 --budget-ms 20
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from hr_models.document_store import DocumentStore
+from ai_services.skill_index import SkillNormalizer, SkillIndex, build_skill_index, load_skill_synonyms
+
+
+def write_pool(document_store: DocumentStore, resumes: int, skills_per_resume: int, seed: int):
+    """Записывает JSON синтетических резюме с навыками в разных написаниях."""
+    rng = random.Random(seed)
+    synonyms = load_skill_synonyms()
+    skills = list(synonyms)
+    for i in range(resumes):
+        chosen = rng.sample(skills, rng.randint(1, skills_per_resume))
+        spelled = [rng.choice((skill, *synonyms[skill])) for skill in chosen]
+        with open(os.path.join(document_store.resumes_json_path, f"resume_{i}.json"), 'w', encoding='utf-8') as f:
+            json.dump({'position': 'Специалист', 'skills': ', '.join(spelled), 'resume': ''}, f, ensure_ascii=False)
+
+
+def reference_scores(index: SkillIndex, required: list) -> np.ndarray:
+    """Прямое вычисление покрытия навыков по множествам (для сверки)."""
+    frequency = {}
+    for doc_id in index.ids:
+        for skill_id in index.skills(doc_id):
+            frequency[skill_id] = frequency.get(skill_id, 0) + 1
+    weight = {skill_id: np.log((len(index) + 1) / (frequency.get(skill_id, 0) + 1)) + 1
+              for skill_id in required}
+    total = sum(weight.values())
+    return np.array([sum(weight[s] for s in set(index.skills(doc_id)) & set(required)) / total
+                     for doc_id in index.ids])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер отбора резюме по навыкам')
+    parser.add_argument('--resumes', type=int, default=20000, help='Количество резюме в пуле')
+    parser.add_argument('--skills-per-resume', type=int, default=15, help='Максимум навыков в резюме')
+    parser.add_argument('--queries', type=int, default=200, help='Количество вакансий для ранжирования')
+    parser.add_argument('--k', type=int, default=50, help='Количество результатов на вакансию')
+    parser.add_argument('--budget-ms', type=float, default=0.0,
+                        help='Бюджет медианного времени ранжирования, мс; при превышении код возврата 1')
+    args = parser.parse_args()
+
+    logging.getLogger('hr_system').setLevel(logging.WARNING)
+    normalizer = SkillNormalizer(load_skill_synonyms())
+    with tempfile.TemporaryDirectory() as tmp:
+        document_store = DocumentStore(base_path=tmp)
+        write_pool(document_store, args.resumes, args.skills_per_resume, seed=0)
+        index_path = os.path.join(tmp, 'skill_index')
+
+        started = time.perf_counter()
+        summary = build_skill_index(document_store, 'resume', index_path, normalizer)
+        build_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        build_skill_index(document_store, 'resume', index_path, normalizer)
+        rebuild_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index = SkillIndex(index_path)
+        load_seconds = time.perf_counter() - started
+
+    rng = random.Random(1)
+    vocabulary = list(normalizer.labels)
+    queries = [rng.sample(vocabulary, rng.randint(3, 10)) for _ in range(args.queries)]
+    timings = []
+    for required in queries:
+        started = time.perf_counter()
+        index.rank(required, k=args.k)
+        timings.append(time.perf_counter() - started)
+    timings_ms = np.array(timings) * 1000
+
+    matches = np.allclose(index.scores(queries[0]), reference_scores(index, queries[0]))
+    median = float(np.median(timings_ms))
+    print(f"Резюме: {summary['documents']}, навыков в словаре индекса: {summary['skills']}, "
+          f"ненулевых элементов: {len(index.indices)}")
+    print(f"Построение индекса: {build_seconds:.2f} с, повторное без изменений: {rebuild_seconds * 1000:.1f} мс, "
+          f"загрузка: {load_seconds * 1000:.1f} мс")
+    print(f"Ранжирование пула под вакансию (top-{args.k}): медиана {median:.2f} мс, "
+          f"p95 {np.percentile(timings_ms, 95):.2f} мс")
+    print(f"Оценки совпадают с прямым вычислением: {matches}")
+    if not matches or (args.budget_ms and median > args.budget_ms):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Замер времени запуска действий командной строки НейроHR.
+
+Для каждого действия запускается отдельный процесс `python -X importtime`,
+который импортирует main и загружает зависимости действия (preload_action).
+В отчет попадают общее время запуска, время импортов и самые тяжелые
+пакеты верхнего уровня. Для сравнения замеряется "жадный" запуск, при
+котором загружаются зависимости всех действий сразу (как до перехода на
+ленивые импорты).
+
+Использование:
+    python benchmarks/bench_startup.py --budget-ms 1500 --top 10
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+from typing import Dict, Any, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """
+    Разбирает вывод `-X importtime`.
+
+    Args:
+        stderr: Поток ошибок процесса
+
+    Returns:
+        Список (пакет, собственное время мкс, накопленное время мкс) для пакетов верхнего уровня
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, package = line[len('import time:'):].split('|', 2)
+        except ValueError:
+            continue
+        # Вложенные импорты выводятся с отступом, учитываем только верхний уровень
+        if package.startswith('  '):
+            continue
+        entries.append((package.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def measure(code: str) -> Dict[str, Any]:
+    """
+    Запускает код в отдельном процессе с `-X importtime` и замеряет запуск.
+
+    Args:
+        code: Код для выполнения
+
+    Returns:
+        Словарь с временем запуска, временем импортов и списком пакетов
+    """
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                             cwd=REPO_ROOT, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    entries = parse_importtime(process.stderr)
+    return {
+        'ok': process.returncode == 0,
+        'error': process.stderr.strip().splitlines()[-1] if process.returncode else '',
+        'wall_ms': wall_ms,
+        'import_ms': sum(cumulative for _, _, cumulative in entries) / 1000,
+        'packages': sorted(entries, key=lambda entry: entry[2], reverse=True),
+    }
+
+
+def main():
+    """Запускает замеры и печатает отчет."""
+    sys.path.insert(0, REPO_ROOT)
+    from main import ACTION_MODULES
+
+    parser = argparse.ArgumentParser(description='Замер времени запуска действий НейроHR')
+    parser.add_argument('--actions', nargs='*', default=list(ACTION_MODULES), help='Действия для замера')
+    parser.add_argument('--top', type=int, default=10, help='Количество самых тяжелых пакетов в отчете')
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help='Бюджет времени запуска для действий search-* (мс)')
+    args = parser.parse_args()
+
+    all_modules = sorted({module for modules in ACTION_MODULES.values() for module in modules})
+    # Недоступные в окружении модули пропускаются, чтобы базовый замер оставался сопоставимым
+    eager = measure("import importlib, main\n"
+                    f"for m in {all_modules!r}:\n"
+                    "    try:\n        importlib.import_module(m)\n"
+                    "    except ImportError as e:\n        print(e)")
+    print(f"Жадный запуск (все зависимости): {eager['wall_ms']:.0f} мс, импорты {eager['import_ms']:.0f} мс")
+
+    over_budget = []
+    for action in args.actions:
+        result = measure(f"import main\nmain.preload_action({action!r})")
+        ratio = f", {result['wall_ms'] / eager['wall_ms']:.0%} от жадного" if eager['ok'] and result['ok'] else ''
+        print(f"\n{action}: запуск {result['wall_ms']:.0f} мс, импорты {result['import_ms']:.0f} мс{ratio}")
+        if not result['ok']:
+            print(f"  ошибка: {result['error']}")
+            continue
+
+        print(f"  {'пакет':<40} {'накопл., мс':>12} {'собств., мс':>12}")
+        for package, self_us, cumulative_us in result['packages'][:args.top]:
+            print(f"  {package:<40} {cumulative_us / 1000:>12.1f} {self_us / 1000:>12.1f}")
+
+        if args.budget_ms is not None and action.startswith('search-') and result['wall_ms'] > args.budget_ms:
+            over_budget.append(action)
+
+    if over_budget:
+        print(f"\nПревышен бюджет {args.budget_ms:.0f} мс: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка локального разбора документов (ai_services.heuristic_parser).
+
+Для набора образцов вакансий и резюме проверяется извлеченная должность и
+решение о вызове модели (уверенность относительно порога). Среди образцов -
+резюме, первая строка которого - имя кандидата: такой документ не должен
+разбираться локально с именем вместо должности.
+
+Использование:
+    python benchmarks/check_heuristic_parser.py --check
+"""
+import os
+import sys
+import argparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from ai_services.heuristic_parser import heuristic_parse
+
+# Порог уверенности локального разбора (ai_services.parser.DEFAULT_CONFIDENCE_THRESHOLD)
+THRESHOLD = 0.75
+
+VACANCY_FIELDS = ['position', 'skills', 'requirements', 'responsibilities']
+RESUME_FIELDS = ['position', 'skills', 'experience']
+
+EXPERIENCE = ("Опыт работы\nООО Ромашка, 2019 - настоящее время\n"
+              "Разработка backend-сервисов на Python, проектирование API, code review.\n")
+SKILLS = "Ключевые навыки\nPython  Django  PostgreSQL  Docker\n"
+
+# (название, текст, поля, вакансия ли, ожидаемая должность или None, ожидается ли локальный разбор)
+SAMPLES = [
+    ("резюме: имя в первой строке",
+     "Иванов Иван Иванович\nМосква, +7 900 000-00-00\n" + SKILLS + EXPERIENCE,
+     RESUME_FIELDS, False, None, False),
+    ("резюме: желаемая должность",
+     "Петрова Анна Сергеевна\nЖелаемая должность и зарплата\nPython-разработчик 250 000 ₽\n" + SKILLS + EXPERIENCE,
+     RESUME_FIELDS, False, "Python-разработчик", True),
+    ("вакансия: название в первой строке",
+     "Python-разработчик\nОбязанности\nРазработка и поддержка backend-сервисов компании.\n"
+     "Требования\nОпыт коммерческой разработки на Python от 3 лет.\n" + SKILLS,
+     VACANCY_FIELDS, True, "Python-разработчик", True),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Проверка локального разбора документов')
+    parser.add_argument('--check', action='store_true', help='Код возврата 1 при ошибке проверки')
+    args = parser.parse_args()
+
+    failed = 0
+    for name, text, fields, is_vacancy, expected_position, expected_local in SAMPLES:
+        result, confidence = heuristic_parse(text, fields, first_line_position=is_vacancy)
+        position = result['position'] if result['position'] != 'None' else None
+        local = confidence >= THRESHOLD
+        ok = position == expected_position and local == expected_local
+        failed += not ok
+        print(f"{'OK ' if ok else 'ERR'} {name}: должность {position!r}, уверенность {confidence:.3f}, "
+              f"{'локально' if local else 'моделью'}")
+    if args.check and failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка профилирования действий (hr_utils.profiling) на текущей версии Python.
+
+Под ActionProfiler запускается пул потоков с нагрузкой в этапах span().
+Проверяется, что все задачи пула завершаются за отведенное время (с Python
+3.12 cProfile работает через sys.monitoring и второй профиль включить
+нельзя), что функции потоков пула попали в cpu.pstats и что время CPU
+учтено по этапам. Запускать на каждой поддерживаемой версии Python:
+
+    python3.11 benchmarks/check_profiling.py --check
+    python3.13 benchmarks/check_profiling.py --check
+"""
+import os
+import sys
+import json
+import pstats
+import logging
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, wait
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from hr_utils.metrics import span
+from hr_utils.profiling import ActionProfiler, PER_THREAD_PROFILES
+
+
+def busy(n: int) -> int:
+    with span('check.busy'):
+        return sum(i * i for i in range(n))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Проверка профилирования в пуле потоков')
+    parser.add_argument('--threads', type=int, default=4, help='Количество потоков пула')
+    parser.add_argument('--tasks', type=int, default=16, help='Количество задач')
+    parser.add_argument('--n', type=int, default=100000, help='Размер задачи')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Время на выполнение задач, с')
+    parser.add_argument('--check', action='store_true', help='Код возврата 1 при ошибке проверки')
+    args = parser.parse_args()
+
+    logging.getLogger('hr_system').setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        profiler = ActionProfiler(tmp)
+        profiler.start()
+        executor = ThreadPoolExecutor(args.threads)
+        futures = [executor.submit(busy, args.n) for _ in range(args.tasks)]
+        done, pending = wait(futures, timeout=args.timeout)
+        summary = profiler.stop()
+        failed_tasks = sum(1 for future in done if future.exception() is not None)
+
+        pstats_file = os.path.join(tmp, 'cpu.pstats')
+        busy_calls = 0
+        if os.path.exists(pstats_file):
+            stats = pstats.Stats(pstats_file).stats
+            busy_calls = sum(value[1] for key, value in stats.items() if key[2] == 'busy')
+        stage = next((row for row in summary['stages'] if row['stage'] == 'check.busy'), None)
+
+    problems = []
+    if pending:
+        problems.append(f"не завершено задач: {len(pending)}")
+    if failed_tasks:
+        problems.append(f"задач с ошибкой: {failed_tasks}")
+    if busy_calls != args.tasks:
+        problems.append(f"вызовов busy в профиле: {busy_calls} из {args.tasks}")
+    if stage is None or stage['count'] != args.tasks or stage['cpu_seconds'] <= 0:
+        problems.append(f"этап check.busy учтен неверно: {json.dumps(stage, ensure_ascii=False)}")
+
+    print(f"Python {sys.version.split()[0]}, профиль на поток: {PER_THREAD_PROFILES}, "
+          f"потоков: {summary['threads']}, вызовов busy в профиле: {busy_calls}")
+    print("Ошибки: " + '; '.join(problems) if problems else "Проверка пройдена")
+    if pending:
+        # Зависшие потоки пула не дадут процессу завершиться обычным образом
+        sys.stdout.flush()
+        os._exit(1)
+    executor.shutdown()
+    if args.check and problems:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
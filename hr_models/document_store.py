@@ -1,21 +1,62 @@
 # -*- coding: utf-8 -*-
+"""
+Хранилище документов (JSON вакансий и резюме, комплекты собеседования).
+
+Файлы записываются атомарно: данные пишутся во временный файл в той же
+директории и заменяют прежний файл одной операцией os.replace, поэтому
+параллельный читатель (поиск, построение индексов) видит либо прежнюю,
+либо новую версию целиком. Замена выполняется под блокировкой документа
+(блокировки распределены по файлам data/.locks по хешу идентификатора и
+действуют между потоками и процессами), поэтому несколько процессов
+обработки и сервис поиска могут работать с одной директорией данных.
+Пакет документов (DocumentBatch) фиксируется одной операцией: файлы
+сериализуются вне блокировок, затем заменяются все сразу.
+"""
 import os
 import json
+import zlib
 import logging
-from typing import List, Dict, Any, Optional
-from langchain_community.docstore.document import Document
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple, Iterable, TYPE_CHECKING
+
+from hr_utils.file_utils import create_temp_file
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки действуют только между потоками процесса
+    fcntl = None
+
+if TYPE_CHECKING:
+    from langchain_community.docstore.document import Document
+
+logger = logging.getLogger('hr_system.store')
+
+# Суффикс файла комплекта собеседования, хранящегося рядом с JSON вакансии
+KIT_SUFFIX = '.kit.json'
+
+# Журнал обработанных файлов из архивов
+ARCHIVE_MANIFEST = 'archive_manifest.json'
+
+# Директория файлов блокировок и их количество (документы распределяются по хешу идентификатора)
+LOCKS_DIR = '.locks'
+LOCK_STRIPES = 64
+
+class DocumentCommitError(Exception):
+    """Документы пакета не сохранены (ни один файл пакета не отмечен сохраненным)."""
 
-logger = logging.getLogger('hr_system')
 
 class DocumentStore:
     """Класс для управления хранилищем документов (резюме и вакансий)."""
     
-    def __init__(self, base_path='./data'):
+    def __init__(self, base_path='./data', fsync: Optional[bool] = None):
         """
         Инициализация хранилища документов.
         
         Args:
             base_path: Базовый путь для хранения данных
+            fsync: Сбрасывать ли записанные файлы на диск (по умолчанию - переменная DOCUMENT_FSYNC=1);
+                без сброса замена атомарна для читателей, но не гарантирует сохранность при сбое питания
         """
         self.base_path = base_path
         self.vacancies_pdf_path = os.path.join(base_path, 'vacancies_pdf')
@@ -24,6 +65,14 @@ class DocumentStore:
         self.resumes_json_path = os.path.join(base_path, 'resumes_json')
         self.db_path = os.path.join(base_path, 'db_faiss')
         self.add_data_path = os.path.join(base_path, 'add_data')
+        self.locks_path = os.path.join(base_path, LOCKS_DIR)
+        self.fsync = os.getenv("DOCUMENT_FSYNC") == "1" if fsync is None else fsync
+        
+        # Блокировки между потоками процесса; между процессами - flock на файлах блокировок.
+        # Дескрипторы файлов блокировок открываются один раз на процесс
+        self._thread_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._lock_fds: Dict[int, int] = {}
+        self._lock_pid = os.getpid()
         
         # Создаем все необходимые директории
         self._create_directories()
@@ -37,38 +86,215 @@ class DocumentStore:
             self.resumes_pdf_path,
             self.resumes_json_path,
             self.db_path,
-            self.add_data_path
+            self.add_data_path,
+            self.locks_path
         ]
         
         for path in paths:
-            os.makedirs(path, exist_ok=True)
-            logger.info(f"Создана директория: {path}")
+            if not os.path.isdir(path):
+                os.makedirs(path, exist_ok=True)
+                logger.debug(f"Создана директория: {path}")
+    
+    def pdf_path(self, doc_type: str) -> Optional[str]:
+        """
+        Возвращает директорию с PDF-файлами документов указанного типа.
+        
+        Args:
+            doc_type: Тип документа ('vacancy' или 'resume')
+            
+        Returns:
+            Путь к директории или None для неизвестного типа
+        """
+        if doc_type == 'vacancy':
+            return self.vacancies_pdf_path
+        elif doc_type == 'resume':
+            return self.resumes_pdf_path
+        logger.error(f"Неизвестный тип документа: {doc_type}")
+        return None
+            
+    def _json_path(self, doc_id: str, doc_type: str) -> Optional[str]:
+        """Возвращает путь к JSON документа или None для неизвестного типа."""
+        if doc_type == 'vacancy':
+            return os.path.join(self.vacancies_json_path, f"{doc_id}.json")
+        elif doc_type == 'resume':
+            return os.path.join(self.resumes_json_path, f"{doc_id}.json")
+        logger.error(f"Неизвестный тип документа: {doc_type}")
+        return None
+    
+    @staticmethod
+    def _stripe(key: str) -> int:
+        return zlib.crc32(key.encode('utf-8')) % LOCK_STRIPES
+    
+    def _lock_fd(self, stripe: int) -> int:
+        """Возвращает дескриптор файла блокировки (вызывается под блокировкой потоков этого файла)."""
+        if self._lock_pid != os.getpid():
+            # Дочерний процесс после fork: унаследованные дескрипторы разделяют flock с родителем
+            self._lock_fds = {}
+            self._lock_pid = os.getpid()
+        fd = self._lock_fds.get(stripe)
+        if fd is None:
+            fd = os.open(os.path.join(self.locks_path, f"{stripe:02d}.lock"), os.O_RDWR | os.O_CREAT)
+            self._lock_fds[stripe] = fd
+        return fd
+    
+    @contextmanager
+    def _locked(self, stripes: Iterable[int]):
+        """Захватывает блокировки в порядке номеров (без взаимоблокировок при пакетной записи)."""
+        held: List[Tuple[threading.Lock, Optional[int]]] = []
+        try:
+            for stripe in sorted(set(stripes)):
+                thread_lock = self._thread_locks[stripe]
+                thread_lock.acquire()
+                fd = None
+                try:
+                    if fcntl is not None:
+                        fd = self._lock_fd(stripe)
+                        fcntl.flock(fd, fcntl.LOCK_EX)
+                except BaseException:
+                    thread_lock.release()
+                    raise
+                held.append((thread_lock, fd))
+            yield
+        finally:
+            for thread_lock, fd in reversed(held):
+                if fd is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                thread_lock.release()
+    
+    def document_lock(self, doc_id: str, doc_type: str):
+        """
+        Возвращает контекстный менеджер блокировки документа.
+        
+        Сохранение документа захватывает ее само; вызывающему коду она нужна для
+        последовательностей "прочитать - изменить - записать".
+        
+        Args:
+            doc_id: Идентификатор документа
+            doc_type: Тип документа
+            
+        Returns:
+            Контекстный менеджер
+        """
+        return self._locked([self._stripe(f"{doc_type}/{doc_id}")])
+    
+    def _write_temp(self, path: str, data: Any) -> str:
+        """Сериализует данные во временный файл рядом с целевым и возвращает его путь."""
+        fd, tmp_path = create_temp_file(os.path.dirname(path), prefix=f".{os.path.basename(path)}.",
+                                          suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path
+    
+    def _sync_directories(self, paths: Iterable[str]):
+        """Сбрасывает на диск записи директорий о замененных файлах (один раз на директорию)."""
+        if not self.fsync:
+            return
+        for directory in {os.path.dirname(path) for path in paths}:
+            try:
+                fd = os.open(directory, os.O_RDONLY)
+            except OSError:
+                # Директории нельзя открыть для fsync (Windows)
+                return
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+    
+    def _replace_files(self, entries: List[Tuple[str, str, Any]]) -> int:
+        """
+        Атомарно записывает файлы: сериализует их вне блокировок и заменяет под блокировками.
+        
+        Args:
+            entries: Список (ключ блокировки, путь к файлу, данные)
             
+        Returns:
+            Количество замененных файлов
+        """
+        written: List[Tuple[str, str]] = []
+        replaced = 0
+        try:
+            for _, path, data in entries:
+                written.append((self._write_temp(path, data), path))
+            with self._locked(self._stripe(key) for key, _, _ in entries):
+                for tmp_path, path in written:
+                    os.replace(tmp_path, path)
+                    replaced += 1
+            self._sync_directories(path for _, path in written)
+            return replaced
+        finally:
+            for tmp_path, _ in written[replaced:]:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+    
     def save_document_json(self, data: Dict[str, Any], doc_id: str, doc_type: str):
         """
-        Сохраняет данные документа в JSON формате.
+        Атомарно сохраняет данные документа в JSON формате.
         
         Args:
             data: Данные для сохранения
             doc_id: Идентификатор документа
             doc_type: Тип документа ('vacancy' или 'resume')
+            
+        Returns:
+            True при успешном сохранении
         """
-        if doc_type == 'vacancy':
-            save_path = os.path.join(self.vacancies_json_path, f"{doc_id}.json")
-        elif doc_type == 'resume':
-            save_path = os.path.join(self.resumes_json_path, f"{doc_id}.json")
-        else:
-            logger.error(f"Неизвестный тип документа: {doc_type}")
+        save_path = self._json_path(doc_id, doc_type)
+        if save_path is None:
             return False
         
         try:
-            with open(save_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            logger.info(f"Сохранен {doc_type} с ID {doc_id}")
+            self._replace_files([(f"{doc_type}/{doc_id}", save_path, data)])
+            logger.debug(f"Сохранен {doc_type} с ID {doc_id}")
             return True
         except Exception as e:
             logger.error(f"Ошибка при сохранении {doc_type} {doc_id}: {str(e)}")
             return False
+    
+    def commit_documents(self, documents: List[Tuple[Dict[str, Any], str, str]]) -> int:
+        """
+        Атомарно сохраняет несколько документов одной фиксацией.
+        
+        Все файлы сериализуются до захвата блокировок, затем заменяются под
+        блокировками своих документов; при ошибке сериализации ни один документ
+        не заменяется.
+        
+        Args:
+            documents: Список (данные, идентификатор документа, тип документа)
+            
+        Returns:
+            Количество сохраненных документов
+            
+        Raises:
+            DocumentCommitError: Если документы не удалось сохранить; вызывающий код
+                не должен отмечать их обработанными (журнал архивов, индекс дубликатов)
+        """
+        entries = []
+        for data, doc_id, doc_type in documents:
+            save_path = self._json_path(doc_id, doc_type)
+            if save_path is not None:
+                entries.append((f"{doc_type}/{doc_id}", save_path, data))
+        if not entries:
+            return 0
+        
+        try:
+            replaced = self._replace_files(entries)
+            logger.debug(f"Сохранено документов одной фиксацией: {replaced}")
+            return replaced
+        except Exception as e:
+            error_msg = f"Ошибка при пакетном сохранении документов: {str(e)}"
+            logger.error(error_msg)
+            raise DocumentCommitError(error_msg) from e
+    
+    def batch(self) -> 'DocumentBatch':
+        """Создает пакет документов для сохранения одной фиксацией."""
+        return DocumentBatch(self)
             
     def load_document_json(self, doc_id: str, doc_type: str) -> Optional[Dict[str, Any]]:
         """
@@ -81,12 +307,8 @@ class DocumentStore:
         Returns:
             Словарь с данными документа или None в случае ошибки
         """
-        if doc_type == 'vacancy':
-            load_path = os.path.join(self.vacancies_json_path, f"{doc_id}.json")
-        elif doc_type == 'resume':
-            load_path = os.path.join(self.resumes_json_path, f"{doc_id}.json")
-        else:
-            logger.error(f"Неизвестный тип документа: {doc_type}")
+        load_path = self._json_path(doc_id, doc_type)
+        if load_path is None:
             return None
         
         try:
@@ -96,12 +318,114 @@ class DocumentStore:
                 
             with open(load_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-            logger.info(f"Загружен {doc_type} с ID {doc_id}")
+            logger.debug(f"Загружен {doc_type} с ID {doc_id}")
             return data
         except Exception as e:
             logger.error(f"Ошибка при загрузке {doc_type} {doc_id}: {str(e)}")
             return None
             
+    def document_mtime(self, doc_id: str, doc_type: str) -> Optional[float]:
+        """
+        Возвращает время изменения JSON-файла документа.
+        
+        Args:
+            doc_id: Идентификатор документа
+            doc_type: Тип документа ('vacancy' или 'resume')
+            
+        Returns:
+            Время изменения файла или None, если файл не найден
+        """
+        path = self.vacancies_json_path if doc_type == 'vacancy' else self.resumes_json_path
+        try:
+            return os.path.getmtime(os.path.join(path, f"{doc_id}.json"))
+        except OSError:
+            return None
+    
+    def save_interview_kit(self, kit: Dict[str, Any], vacancy_id: str) -> bool:
+        """
+        Атомарно сохраняет комплект собеседования рядом с JSON вакансии.
+        
+        Args:
+            kit: Комплект собеседования
+            vacancy_id: Идентификатор вакансии
+            
+        Returns:
+            True при успешном сохранении
+        """
+        save_path = os.path.join(self.vacancies_json_path, f"{vacancy_id}{KIT_SUFFIX}")
+        try:
+            self._replace_files([(f"kit/{vacancy_id}", save_path, kit)])
+            logger.debug(f"Сохранен комплект собеседования для вакансии {vacancy_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении комплекта собеседования {vacancy_id}: {str(e)}")
+            return False
+    
+    def load_interview_kit(self, vacancy_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Загружает комплект собеседования для вакансии.
+        
+        Args:
+            vacancy_id: Идентификатор вакансии
+            
+        Returns:
+            Комплект собеседования или None, если он не найден
+        """
+        load_path = os.path.join(self.vacancies_json_path, f"{vacancy_id}{KIT_SUFFIX}")
+        if not os.path.exists(load_path):
+            return None
+        try:
+            with open(load_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке комплекта собеседования {vacancy_id}: {str(e)}")
+            return None
+            
+    def load_archive_manifest(self) -> Dict[str, Any]:
+        """
+        Загружает журнал файлов, уже обработанных из архивов.
+        
+        Returns:
+            Словарь {"<архив>/<файл>": {'crc', 'size', 'doc_id', 'ingested'}}
+        """
+        load_path = os.path.join(self.base_path, ARCHIVE_MANIFEST)
+        if not os.path.exists(load_path):
+            return {}
+        try:
+            with open(load_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке журнала архивов: {str(e)}")
+            return {}
+    
+    def save_archive_manifest(self, manifest: Dict[str, Any]) -> bool:
+        """
+        Атомарно сохраняет журнал файлов, обработанных из архивов.
+        
+        Журнал объединяется с записанным на диске под блокировкой, поэтому
+        параллельные процессы обработки не затирают записи друг друга.
+        
+        Args:
+            manifest: Журнал файлов
+            
+        Returns:
+            True при успешном сохранении
+        """
+        save_path = os.path.join(self.base_path, ARCHIVE_MANIFEST)
+        tmp_path = None
+        try:
+            with self._locked([self._stripe(ARCHIVE_MANIFEST)]):
+                merged = dict(self.load_archive_manifest(), **manifest)
+                tmp_path = self._write_temp(save_path, merged)
+                os.replace(tmp_path, save_path)
+            self._sync_directories([save_path])
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении журнала архивов: {str(e)}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+    
     def list_documents(self, doc_type: str) -> List[str]:
         """
         Возвращает список идентификаторов документов указанного типа.
@@ -121,13 +445,15 @@ class DocumentStore:
             return []
         
         try:
-            files = [f.split('.')[0] for f in os.listdir(path) if f.endswith('.json')]
+            # Комплекты собеседования хранятся рядом с вакансиями и документами не являются
+            files = [f[:-len('.json')] for f in os.listdir(path)
+                     if f.endswith('.json') and not f.endswith(KIT_SUFFIX)]
             return files
         except Exception as e:
             logger.error(f"Ошибка при получении списка документов {doc_type}: {str(e)}")
             return []
             
-    def document_to_chunk(self, doc_id: str, doc_type: str) -> Optional[Document]:
+    def document_to_chunk(self, doc_id: str, doc_type: str) -> Optional['Document']:
         """
         Преобразует документ в чанк для векторной базы данных.
         
@@ -155,7 +481,9 @@ class DocumentStore:
             else:
                 logger.error(f"Неизвестный тип документа: {doc_type}")
                 return None
-                
+            
+            from langchain_community.docstore.document import Document
+            
             return Document(
                 page_content=chunk,
                 metadata={"meta": doc_id, "type": doc_type}
@@ -163,3 +491,79 @@ class DocumentStore:
         except Exception as e:
             logger.error(f"Ошибка при создании чанка для {doc_type} {doc_id}: {str(e)}")
             return None
+
+
+class DocumentBatch:
+    """
+    Пакет документов, сохраняемых одной фиксацией.
+
+    Документы накапливаются в памяти и записываются при вызове commit или
+    при выходе из блока with без исключения; при исключении пакет
+    отбрасывается. До фиксации документы пакета видны только через load.
+    """
+
+    def __init__(self, store: DocumentStore):
+        """
+        Args:
+            store: Хранилище документов
+        """
+        self.store = store
+        self._pending: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def save(self, data: Dict[str, Any], doc_id: str, doc_type: str):
+        """
+        Добавляет документ в пакет (повторное добавление заменяет документ).
+
+        Args:
+            data: Данные документа
+            doc_id: Идентификатор документа
+            doc_type: Тип документа ('vacancy' или 'resume')
+        """
+        self._pending[(doc_type, doc_id)] = data
+
+    def load(self, doc_id: str, doc_type: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает документ из пакета, а если его там нет - из хранилища.
+
+        Args:
+            doc_id: Идентификатор документа
+            doc_type: Тип документа ('vacancy' или 'resume')
+
+        Returns:
+            Данные документа или None
+        """
+        pending = self._pending.get((doc_type, doc_id))
+        return pending if pending is not None else self.store.load_document_json(doc_id, doc_type)
+
+    def commit(self) -> int:
+        """
+        Сохраняет документы пакета и очищает его.
+
+        Returns:
+            Количество сохраненных документов
+
+        Raises:
+            DocumentCommitError: Если документы не удалось сохранить (пакет при этом не очищается)
+        """
+        if not self._pending:
+            return 0
+        documents = [(data, doc_id, doc_type) for (doc_type, doc_id), data in self._pending.items()]
+        committed = self.store.commit_documents(documents)
+        self._pending.clear()
+        return committed
+
+    def discard(self):
+        """Отбрасывает несохраненные документы пакета."""
+        self._pending.clear()
+
+    def __enter__(self) -> 'DocumentBatch':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
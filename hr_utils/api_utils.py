@@ -1,9 +1,15 @@
 # -*- coding: utf-8 -*-
 import os
-import openai
+import asyncio
 import logging
+import weakref
 from dotenv import load_dotenv
 
+from hr_utils.metrics import metrics
+from hr_utils.usage_ledger import ledger, calculate_cost, estimate_tokens
+from hr_utils.resilience import (RetryPolicy, DEFAULT_POLICY, get_breaker, call_with_retry,
+                                 call_with_retry_async)
+
 logger = logging.getLogger('hr_system')
 
 # Загрузка переменных окружения
@@ -12,7 +18,7 @@ load_dotenv()
 # Установка API-ключа OpenAI
 openai_api_key = os.getenv("OPENAI_API_KEY")
 if openai_api_key:
-    openai.api_key = openai_api_key
+    # Клиент openai загружается лениво и читает ключ из окружения
     os.environ["OPENAI_API_KEY"] = openai_api_key
 else:
     logger.warning("OPENAI_API_KEY не найден в переменных окружения!")
@@ -25,43 +31,28 @@ def print_tokens_count_and_price(completion, model):
         completion: Ответ от API OpenAI
         model: Название используемой модели
     """
-    # Цены на токены в долларах за 1 миллион токенов
-    model_prices = {
-        "gpt-4o": {"input": 5, "output": 15},
-        "gpt-4o-mini": {"input": 0.15, "output": 0.60},
-        "gpt-3.5-turbo": {"input": 0.0005, "output": 0.0015}
-    }
-
-    if model in model_prices:
-        input_price = model_prices[model]["input"]
-        output_price = model_prices[model]["output"]
-    else:
-        print(f"Неизвестная модель: {model}, используются цены для gpt-4o-mini")
-        input_price, output_price = 0.15, 0.60
-
-    price = input_price * completion.usage.prompt_tokens / 1e6 +             output_price * completion.usage.completion_tokens / 1e6
+    price = calculate_cost(model, completion.usage.prompt_tokens, completion.usage.completion_tokens)
+    price_info = f'$ {round(price, 5)}' if price is not None else 'цена неизвестна'
 
     message = (f'Использовано токенов: {completion.usage.prompt_tokens} (ввод) + '
                f'{completion.usage.completion_tokens} (вывод) = '
                f'{completion.usage.total_tokens} (всего). '
-               f'*** {model} *** $ {round(price, 5)}')
+               f'*** {model} *** {price_info}')
 
     print(message)
     return message
 
-def generate_answer(prompt_system, prompt_user, prompt_assistant='', model='gpt-3.5-turbo', temp=0.1):
+def _build_messages(prompt_system, prompt_user, prompt_assistant=''):
     """
-    Генерирует ответ с использованием API OpenAI.
+    Формирует список сообщений для запроса к модели.
     
     Args:
         prompt_system: Системный промпт
         prompt_user: Пользовательский промпт
-        prompt_assistant: Предыдущий ответ ассистента (по умолчанию пустая строка)
-        model: Модель OpenAI (по умолчанию 'gpt-3.5-turbo')
-        temp: Температура генерации (по умолчанию 0.1)
+        prompt_assistant: Предыдущий ответ ассистента
         
     Returns:
-        Текст ответа от модели
+        Список сообщений
     """
     messages = [
         {"role": "system", "content": prompt_system}
@@ -72,19 +63,157 @@ def generate_answer(prompt_system, prompt_user, prompt_assistant='', model='gpt-
         messages.append({"role": "assistant", "content": prompt_assistant})
 
     messages.append({"role": "user", "content": prompt_user})
+    return messages
 
-    try:
-        response = openai.chat.completions.create(
+def _account_response(response, model):
+    """
+    Учитывает токены ответа в метриках и журнале использования.
+    
+    Args:
+        response: Ответ от API OpenAI
+        model: Использованная модель
+        
+    Returns:
+        Текст ответа модели
+    """
+    # Учет токенов в метриках текущего этапа и в журнале использования
+    metrics.add_tokens(response.usage.prompt_tokens, response.usage.completion_tokens)
+    ledger.record(model, response.usage.prompt_tokens, response.usage.completion_tokens)
+
+    # Вывод количества используемых токенов и стоимость
+    tokens_info = print_tokens_count_and_price(response, model=model)
+    logger.info(f"Запрос к API OpenAI успешен. {tokens_info}")
+
+    return response.choices[0].message.content
+
+# Синхронный клиент OpenAI; повторы выполняет hr_utils.resilience, а не клиент
+_sync_client = None
+
+def get_client():
+    """
+    Возвращает общий синхронный клиент OpenAI.
+    
+    Returns:
+        Экземпляр openai.OpenAI
+    """
+    global _sync_client
+    
+    if _sync_client is None:
+        import openai
+        
+        _sync_client = openai.OpenAI(max_retries=0)
+    return _sync_client
+
+def generate_answer(prompt_system, prompt_user, prompt_assistant='', model='gpt-3.5-turbo', temp=0.1,
+                    policy: RetryPolicy = None):
+    """
+    Генерирует ответ с использованием API OpenAI.
+    
+    Args:
+        prompt_system: Системный промпт
+        prompt_user: Пользовательский промпт
+        prompt_assistant: Предыдущий ответ ассистента (по умолчанию пустая строка)
+        model: Модель OpenAI (по умолчанию 'gpt-3.5-turbo')
+        temp: Температура генерации (по умолчанию 0.1)
+        policy: Параметры повторов и сроков (по умолчанию DEFAULT_POLICY)
+        
+    Returns:
+        Текст ответа от модели
+        
+    Raises:
+        BudgetExceededError: Если запрос превысил бы бюджет сессии или задания
+        ModelCallError: Если модель не ответила после всех повторов
+    """
+    # Проверка бюджета до выполнения запроса (может заменить модель на более дешевую)
+    model = ledger.check_budget(model, prompt_system + prompt_assistant + prompt_user)
+    messages = _build_messages(prompt_system, prompt_user, prompt_assistant)
+
+    def call(timeout):
+        return get_client().chat.completions.create(
             model=model,
             messages=messages,
             temperature=temp,
+            timeout=timeout,
         )
-        # Вывод количества используемых токенов и стоимость
-        tokens_info = print_tokens_count_and_price(response, model=model)
-        logger.info(f"Запрос к API OpenAI успешен. {tokens_info}")
+
+    try:
+        response = call_with_retry(call, policy or DEFAULT_POLICY, get_breaker(model), name=model)
+    except Exception as e:
+        # Запрос не выполнен: резерв бюджета снимается
+        ledger.release()
+        error_msg = f"Ошибка при запросе к API OpenAI: {str(e)}"
+        logger.error(error_msg)
+        raise
+    return _account_response(response, model)
+
+# Асинхронные клиенты OpenAI по циклам событий: один пул соединений на цикл
+_async_clients = weakref.WeakKeyDictionary()
+
+def get_async_client():
+    """
+    Возвращает общий асинхронный клиент OpenAI для текущего цикла событий.
+    
+    Все сессии, работающие в одном цикле, используют один клиент и его пул соединений.
+    
+    Returns:
+        Экземпляр openai.AsyncOpenAI
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        import openai
         
-        return response.choices[0].message.content
+        client = _async_clients[loop] = openai.AsyncOpenAI(max_retries=0)
+    return client
+
+async def generate_answer_async(prompt_system, prompt_user, prompt_assistant='', model='gpt-3.5-turbo', temp=0.1,
+                                policy: RetryPolicy = None):
+    """
+    Асинхронно генерирует ответ с использованием API OpenAI.
+    
+    Args:
+        prompt_system: Системный промпт
+        prompt_user: Пользовательский промпт
+        prompt_assistant: Предыдущий ответ ассистента (по умолчанию пустая строка)
+        model: Модель OpenAI (по умолчанию 'gpt-3.5-turbo')
+        temp: Температура генерации (по умолчанию 0.1)
+        policy: Параметры повторов, сроков и хеджирования (по умолчанию DEFAULT_POLICY)
+        
+    Returns:
+        Текст ответа от модели
+        
+    Raises:
+        BudgetExceededError: Если запрос превысил бы бюджет сессии или задания
+        ModelCallError: Если модель не ответила после всех повторов
+    """
+    prompt_text = prompt_system + prompt_assistant + prompt_user
+    model = ledger.check_budget(model, prompt_text)
+    messages = _build_messages(prompt_system, prompt_user, prompt_assistant)
+
+    async def call(timeout):
+        try:
+            return await get_async_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temp,
+                timeout=timeout,
+            )
+        except asyncio.CancelledError:
+            # Отмененный запрос (проигравший при хеджировании или превысивший срок попытки) уже
+            # отправлен и оплачивается: ответа нет, поэтому записываются оцененные токены ввода
+            ledger.record(model, estimate_tokens(prompt_text), 0, estimated=True)
+            raise
+
+    try:
+        response = await call_with_retry_async(call, policy or DEFAULT_POLICY, get_breaker(model), name=model)
+    except asyncio.CancelledError:
+        # Отмененный запрос уже записан в журнал (см. call); иначе резерв бюджета снимается
+        ledger.release()
+        raise
     except Exception as e:
+        # Запрос не выполнен: резерв бюджета снимается
+        ledger.release()
         error_msg = f"Ошибка при запросе к API OpenAI: {str(e)}"
         logger.error(error_msg)
-        return f"Произошла ошибка: {str(e)}"
+        raise
+    return _account_response(response, model)
@@ -1,11 +1,12 @@
 # -*- coding: utf-8 -*-
 import os
 import logging
-from gtts import gTTS
-from IPython.display import Audio
+
+from hr_utils.metrics import traced
 
 logger = logging.getLogger('hr_system')
 
+@traced('tts')
 def google_tts(text, lang='ru', slow=False, output_dir='./audio'):
     """
     Преобразует текст в речь с использованием Google Text-to-Speech.
@@ -20,6 +21,8 @@ def google_tts(text, lang='ru', slow=False, output_dir='./audio'):
         Путь к созданному аудиофайлу
     """
     try:
+        from gtts import gTTS
+        
         # Убираем префикс "Рекрутер: " из текста, если он есть
         if text.startswith("Рекрутер: "):
             text = text[10:]
@@ -42,3 +45,14 @@ def google_tts(text, lang='ru', slow=False, output_dir='./audio'):
         error_msg = f"Ошибка при создании аудио: {str(e)}"
         logger.error(error_msg)
         return None
+
+def play_audio(audio_file):
+    """
+    Воспроизводит аудиофайл в Jupyter Notebook/Colab.
+    
+    Args:
+        audio_file: Путь к аудиофайлу
+    """
+    from IPython.display import Audio, display
+    
+    display(Audio(audio_file))
@@ -1,14 +1,50 @@
 # -*- coding: utf-8 -*-
 import os
 import json
-import PyPDF2
 from io import BytesIO
-import rarfile
 import logging
-from datetime import datetime
+import tempfile
 import textwrap
+from typing import List, Dict, Any, Tuple, Union
 
-logger = logging.getLogger('hr_system')
+from hr_utils.metrics import traced
+from hr_utils.log_utils import write_audit
+
+logger = logging.getLogger('hr_system.files')
+
+# Расширения архивов, из которых PDF-файлы читаются без распаковки
+ARCHIVE_EXTENSIONS = ('.zip', '.rar')
+
+# Права файлов, создаваемых open() с учетом umask процесса. umask читается один раз при импорте:
+# os.umask меняет его для всех потоков, поэтому позже его читать небезопасно
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+def create_temp_file(directory: str, prefix: str = '', suffix: str = '.tmp') -> Tuple[int, str]:
+    """
+    Создает временный файл для атомарной замены (os.replace) целевого файла.
+    
+    tempfile.mkstemp создает файлы с правами 0600; права временного файла
+    приводятся к правам обычного файла (0666 с учетом umask), чтобы после
+    замены файл оставался доступен другим пользователям, как при записи open().
+    
+    Args:
+        directory: Директория (та же, что у целевого файла)
+        prefix: Префикс имени файла
+        suffix: Суффикс имени файла
+        
+    Returns:
+        Кортеж (дескриптор файла, путь к файлу)
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=prefix, suffix=suffix)
+    try:
+        os.chmod(tmp_path, FILE_MODE)
+    except BaseException:
+        os.close(fd)
+        os.remove(tmp_path)
+        raise
+    return fd, tmp_path
 
 def format_text(text, width=120):
     """
@@ -30,7 +66,7 @@ def format_text(text, width=120):
 
 def add_log_file(text, title='', log_file=None, path='./data'):
     """
-    Записывает логи в файл с временной меткой.
+    Записывает логи в файл с временной меткой (без ожидания записи на диск).
     
     Args:
         text: Текст для записи в лог
@@ -41,31 +77,103 @@ def add_log_file(text, title='', log_file=None, path='./data'):
     if log_file is None:
         log_file = os.path.join(path, 'log.txt')
 
-    time_now = f"{datetime.now().strftime('%Y-%m-%d %H:%M')}"
-    with open(log_file, "a", encoding='utf-8') as file:
-        file.write(f'\n\n{time_now}. {title}.\n\n{format_text(text)}')
+    # Форматирование и дозапись выполняются фоновым потоком записи журнала
+    write_audit(text, title, log_file)
     print(f"Запись в лог: {title}")
 
-def read_pdf(pdf_file):
+@traced('pdf_read')
+def read_pdf(pdf_file, name=None):
     """
     Извлекает текст из PDF файла.
     
     Args:
-        pdf_file: Путь к PDF файлу
+        pdf_file: Путь к PDF файлу, содержимое файла (bytes) или поток BytesIO
+        name: Имя файла для журнала (по умолчанию путь к файлу)
         
     Returns:
         Извлеченный текст
     """
+    if isinstance(pdf_file, (bytes, bytearray)):
+        pdf_file = BytesIO(pdf_file)
+    name = name or pdf_file
     try:
+        import PyPDF2
+        
         reader = PyPDF2.PdfReader(pdf_file)
         text = ' '.join([page.extract_text() for page in reader.pages if page.extract_text()])
-        logger.info(f"PDF успешно прочитан: {pdf_file}")
+        logger.info(f"PDF успешно прочитан: {name}")
         return text
     except Exception as e:
-        error_msg = f"Ошибка при чтении PDF {pdf_file}: {str(e)}"
+        error_msg = f"Ошибка при чтении PDF {name}: {str(e)}"
         logger.error(error_msg)
         return ""
 
+def _open_archive(archive_path):
+    """Открывает ZIP- или RAR-архив для чтения."""
+    if archive_path.lower().endswith('.rar'):
+        import rarfile
+        return rarfile.RarFile(archive_path)
+    
+    import zipfile
+    return zipfile.ZipFile(archive_path)
+
+def list_archive_pdfs(archive_path) -> List[Dict[str, Any]]:
+    """
+    Возвращает PDF-файлы, содержащиеся в архиве.
+    
+    Args:
+        archive_path: Путь к ZIP- или RAR-архиву
+        
+    Returns:
+        Список файлов архива: имя ('member'), контрольная сумма ('crc') и размер ('size')
+    """
+    try:
+        with _open_archive(archive_path) as archive:
+            return [{'member': info.filename, 'crc': info.CRC, 'size': info.file_size}
+                    for info in archive.infolist()
+                    if not info.is_dir() and info.filename.lower().endswith('.pdf')]
+    except Exception as e:
+        error_msg = f"Ошибка при чтении архива {archive_path}: {str(e)}"
+        logger.error(error_msg)
+        return []
+
+def read_archive_pdf(archive_path, member):
+    """
+    Извлекает текст PDF-файла из архива, не распаковывая его на диск.
+    
+    Args:
+        archive_path: Путь к ZIP- или RAR-архиву
+        member: Имя PDF-файла в архиве
+        
+    Returns:
+        Извлеченный текст
+    """
+    name = f"{os.path.basename(archive_path)}/{member}"
+    try:
+        with _open_archive(archive_path) as archive:
+            data = archive.read(member)
+    except Exception as e:
+        error_msg = f"Ошибка при чтении {name} из архива: {str(e)}"
+        logger.error(error_msg)
+        return ""
+    return read_pdf(BytesIO(data), name=name)
+
+def read_pdf_source(source: Union[str, Tuple[str, str]]):
+    """
+    Извлекает текст из PDF-файла на диске или из файла в архиве.
+    
+    Функция верхнего уровня, поэтому ее можно передавать в пул процессов.
+    
+    Args:
+        source: Путь к PDF файлу или кортеж (путь к архиву, имя файла в архиве)
+        
+    Returns:
+        Извлеченный текст
+    """
+    if isinstance(source, tuple):
+        return read_archive_pdf(*source)
+    return read_pdf(source)
+
 def unrar(path):
     """
     Распаковывает все RAR-архивы в указанной папке.
@@ -74,6 +182,8 @@ def unrar(path):
         path: Путь к папке с архивами
     """
     try:
+        import rarfile
+        
         extracted_files = []
         for rar in os.listdir(path):
             if rar.endswith('.rar'):
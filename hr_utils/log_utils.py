@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Неблокирующая запись журналов и аудита.
+
+Записи журнала помещаются в очередь (QueueHandler) и записываются на диск
+фоновым потоком пакетами: несколько записей - одна запись в файл и один
+сброс буфера. Файл журнала ротируется по размеру. Записи аудита
+(add_log_file) проходят через ту же очередь, поэтому форматирование текста
+и дозапись в файл не выполняются в рабочих потоках.
+
+Уровни журналирования задаются по подсистемам (логгеры 'hr_system.<подсистема>'),
+например LOG_LEVELS="hr_system.store=WARNING,hr_system.parser=DEBUG".
+"""
+import os
+import sys
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Максимальное количество записей, записываемых на диск за один раз
+BATCH_SIZE = 256
+
+# Размер очереди; при переполнении записи журнала отбрасываются, а не блокируют поток
+QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "50000"))
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class BatchingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Файловый обработчик с ротацией по размеру, записывающий записи пакетами."""
+
+    def handle_batch(self, records: List[logging.LogRecord]):
+        """
+        Записывает пакет записей одной операцией записи.
+
+        Args:
+            records: Записи журнала
+        """
+        lines = []
+        for record in records:
+            if record.levelno >= self.level and self.filter(record):
+                try:
+                    lines.append(self.format(record) + self.terminator)
+                except Exception:
+                    self.handleError(record)
+        if not lines:
+            return
+        text = ''.join(lines)
+        self.acquire()
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            if self.maxBytes > 0 and self.stream.tell() + len(text.encode(self.encoding or 'utf-8')) > self.maxBytes:
+                self.doRollover()
+            self.stream.write(text)
+            self.stream.flush()
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
+
+
+class AuditFormatter(logging.Formatter):
+    """Формат записей аудита: заголовок с временем и текст с переносом строк."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        from hr_utils.file_utils import format_text
+
+        time_now = datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M')
+        return f'\n\n{time_now}. {record.audit_title}.\n\n{format_text(record.getMessage())}'
+
+
+class AsyncLogWriter:
+    """Фоновый поток, записывающий журнал и аудит из очереди."""
+
+    def __init__(self, handlers: Optional[List[logging.Handler]] = None, queue_size: int = QUEUE_SIZE):
+        """
+        Args:
+            handlers: Обработчики журнала (файл, консоль)
+            queue_size: Размер очереди записей
+        """
+        self.handlers = handlers or []
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self._reported_dropped = 0
+        self._audit_handlers: Dict[str, BatchingRotatingFileHandler] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='hr-log-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Записывает оставшиеся записи и останавливает поток."""
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join()
+        self._thread = None
+        for handler in list(self._audit_handlers.values()) + self.handlers:
+            handler.close()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            records = [record for record in batch if record is not None]
+            if self.dropped != self._reported_dropped:
+                records.append(logging.makeLogRecord({
+                    'name': 'hr_system', 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': f"Очередь журнала переполнена, отброшено записей: {self.dropped - self._reported_dropped}"}))
+                self._reported_dropped = self.dropped
+            self._write(records)
+            if stop:
+                return
+
+    def _write(self, records: List[logging.LogRecord]):
+        audit: Dict[str, List[logging.LogRecord]] = {}
+        log_records = []
+        for record in records:
+            audit_file = getattr(record, 'audit_file', None)
+            if audit_file:
+                audit.setdefault(audit_file, []).append(record)
+            else:
+                log_records.append(record)
+
+        for handler in self.handlers:
+            if isinstance(handler, BatchingRotatingFileHandler):
+                handler.handle_batch(log_records)
+            else:
+                for record in log_records:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+
+        for audit_file, audit_records in audit.items():
+            handler = self._audit_handlers.get(audit_file)
+            if handler is None:
+                handler = BatchingRotatingFileHandler(audit_file, encoding='utf-8', delay=True)
+                handler.terminator = ''
+                handler.setFormatter(AuditFormatter())
+                self._audit_handlers[audit_file] = handler
+            handler.handle_batch(audit_records)
+
+    def enqueue(self, record: logging.LogRecord, block: bool = False):
+        """
+        Помещает запись в очередь.
+
+        Args:
+            record: Запись журнала или аудита
+            block: Ждать места в очереди (для аудита) вместо отбрасывания записи
+        """
+        try:
+            self.queue.put(record, block=block)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _WriterQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который при переполнении очереди отбрасывает запись, а не блокирует поток."""
+
+    def enqueue(self, record: logging.LogRecord):
+        get_writer().enqueue(record)
+
+
+_writer: Optional[AsyncLogWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> AsyncLogWriter:
+    """Возвращает общий фоновый поток записи, запуская его при первом обращении."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AsyncLogWriter()
+            _writer.start()
+        return _writer
+
+
+def _shutdown():
+    with _writer_lock:
+        if _writer is not None:
+            _writer.stop()
+
+
+def _restart_after_fork():
+    # В дочернем процессе (пул процессов) поток записи не существует - запускается новый
+    global _writer, _writer_lock
+    _writer_lock = threading.Lock()
+    if _writer is not None:
+        for handler in _writer.handlers:
+            if isinstance(handler, BatchingRotatingFileHandler):
+                # Файл журнала ротирует только основной процесс
+                handler.maxBytes = 0
+        _writer = AsyncLogWriter(_writer.handlers, queue_size=_writer.queue.maxsize)
+        _writer.start()
+
+
+atexit.register(_shutdown)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """
+    Разбирает уровни журналирования подсистем.
+
+    Args:
+        spec: Строка вида "hr_system.store=WARNING,hr_system.parser=DEBUG"
+
+    Returns:
+        Словарь {имя логгера: уровень}
+    """
+    levels = {}
+    for item in spec.split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return {name: level for name, level in levels.items() if isinstance(level, int)}
+
+
+def setup_logging(log_file: str = "hr_system.log", level: Optional[str] = None,
+                  levels: Optional[Dict[str, int]] = None, max_bytes: Optional[int] = None,
+                  backup_count: Optional[int] = None):
+    """
+    Настраивает неблокирующее журналирование в файл с ротацией и в консоль.
+
+    Args:
+        log_file: Путь к файлу журнала
+        level: Общий уровень (по умолчанию LOG_LEVEL или INFO)
+        levels: Уровни подсистем (по умолчанию из LOG_LEVELS)
+        max_bytes: Размер файла журнала для ротации (по умолчанию LOG_MAX_BYTES или 10 МБ)
+        backup_count: Количество архивных файлов журнала (по умолчанию LOG_BACKUP_COUNT или 5)
+    """
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    levels = parse_levels(os.getenv("LOG_LEVELS", "")) if levels is None else levels
+    max_bytes = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))) if max_bytes is None else max_bytes
+    backup_count = int(os.getenv("LOG_BACKUP_COUNT", "5")) if backup_count is None else backup_count
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = BatchingRotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
+                                               encoding='utf-8', delay=True)
+    console_handler = logging.StreamHandler(sys.stderr)
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+
+    writer = get_writer()
+    writer.handlers = [file_handler, console_handler]
+
+    root = logging.getLogger()
+    if not any(isinstance(handler, _WriterQueueHandler) for handler in root.handlers):
+        root.addHandler(_WriterQueueHandler(writer.queue))
+    root.setLevel(level.upper())
+    for name, subsystem_level in levels.items():
+        logging.getLogger(name).setLevel(subsystem_level)
+
+
+def write_audit(text: str, title: str, log_file: str):
+    """
+    Дописывает запись аудита в файл в фоновом потоке.
+
+    Args:
+        text: Текст записи
+        title: Заголовок записи
+        log_file: Путь к файлу аудита
+    """
+    record = logging.LogRecord('hr_system.audit', logging.INFO, __file__, 0, str(text), None, None)
+    record.audit_file = os.path.abspath(log_file)
+    record.audit_title = title
+    get_writer().enqueue(record, block=True)
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+Легковесная трассировка этапов обработки и экспорт метрик.
+
+Спаны (span) оборачивают этапы конвейера: чтение PDF, парсинг, эмбеддинг,
+построение индекса, поиск, этапы LLM и синтез речи. Для каждого этапа
+собирается гистограмма длительностей и счетчики токенов. Метрики
+экспортируются в текстовом формате Prometheus или в JSON.
+
+Пока сбор выключен, span() возвращает общий пустой контекстный менеджер,
+поэтому накладные расходы сводятся к одной проверке флага.
+"""
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from functools import wraps
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+logger = logging.getLogger('hr_system')
+
+# Границы корзин гистограммы длительностей (в секундах)
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                                      1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Текущий этап трассировки (используется для привязки токенов к этапу)
+_current_stage: contextvars.ContextVar = contextvars.ContextVar('hr_current_stage', default=None)
+
+
+class _StageStats:
+    """Накопленная статистика по одному этапу."""
+
+    __slots__ = ('bucket_counts', 'count', 'total', 'max', 'errors',
+                 'prompt_tokens', 'completion_tokens')
+
+    def __init__(self, n_buckets: int):
+        self.bucket_counts = [0] * n_buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+
+class _NullSpan:
+    """Пустой спан, используемый при выключенном сборе метрик."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """Спан, замеряющий длительность этапа."""
+
+    __slots__ = ('_registry', '_stage', '_start', '_token')
+
+    def __init__(self, registry: 'MetricsRegistry', stage: str):
+        self._registry = registry
+        self._stage = stage
+        self._start = 0.0
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current_stage.set(self._stage)
+        hook = self._registry.span_hook
+        if hook is not None:
+            hook(self._stage, self, True)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        hook = self._registry.span_hook
+        if hook is not None:
+            hook(self._stage, self, False)
+        _current_stage.reset(self._token)
+        self._registry.observe(self._stage, elapsed, error=exc_type is not None)
+        return False
+
+
+class MetricsRegistry:
+    """Реестр метрик по этапам: гистограммы длительностей и счетчики токенов."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Инициализация реестра метрик.
+
+        Args:
+            buckets: Границы корзин гистограммы длительностей в секундах
+        """
+        self.enabled = False
+        self.buckets = tuple(sorted(buckets))
+        # Функция (этап, спан, вход), вызываемая на границах этапов (используется профилировщиком)
+        self.span_hook: Optional[Callable[[str, Any, bool], None]] = None
+        self._stages: Dict[str, _StageStats] = {}
+        self._lock = threading.Lock()
+
+    def enable(self, enabled: bool = True):
+        """Включает или выключает сбор метрик."""
+        self.enabled = enabled
+
+    def reset(self):
+        """Очищает накопленные метрики."""
+        with self._lock:
+            self._stages = {}
+
+    def span(self, stage: str):
+        """
+        Возвращает контекстный менеджер, замеряющий длительность этапа.
+
+        Args:
+            stage: Название этапа (например, 'pdf_read' или 'llm.final_assessment')
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage)
+
+    def _stats(self, stage: str) -> _StageStats:
+        stats = self._stages.get(stage)
+        if stats is None:
+            stats = self._stages[stage] = _StageStats(len(self.buckets))
+        return stats
+
+    def observe(self, stage: str, seconds: float, error: bool = False):
+        """
+        Регистрирует длительность выполнения этапа.
+
+        Args:
+            stage: Название этапа
+            seconds: Длительность в секундах
+            error: Завершился ли этап исключением
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._stats(stage)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    stats.bucket_counts[i] += 1
+                    break
+            stats.count += 1
+            stats.total += seconds
+            stats.max = max(stats.max, seconds)
+            if error:
+                stats.errors += 1
+
+    def add_tokens(self, prompt_tokens: int, completion_tokens: int, stage: Optional[str] = None):
+        """
+        Добавляет количество токенов к этапу.
+
+        Args:
+            prompt_tokens: Количество токенов ввода
+            completion_tokens: Количество токенов вывода
+            stage: Название этапа (по умолчанию - текущий спан или 'llm')
+        """
+        if not self.enabled:
+            return
+        stage = stage or _current_stage.get() or 'llm'
+        with self._lock:
+            stats = self._stats(stage)
+            stats.prompt_tokens += int(prompt_tokens or 0)
+            stats.completion_tokens += int(completion_tokens or 0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Возвращает снимок метрик в виде словаря.
+
+        Returns:
+            Словарь {этап: статистика}
+        """
+        with self._lock:
+            result = {}
+            for stage, stats in sorted(self._stages.items()):
+                cumulative, buckets = 0, {}
+                for bound, count in zip(self.buckets, stats.bucket_counts):
+                    cumulative += count
+                    buckets[str(bound)] = cumulative
+                buckets['+Inf'] = stats.count
+                result[stage] = {
+                    'count': stats.count,
+                    'errors': stats.errors,
+                    'total_seconds': round(stats.total, 6),
+                    'mean_seconds': round(stats.total / stats.count, 6) if stats.count else 0.0,
+                    'max_seconds': round(stats.max, 6),
+                    'buckets': buckets,
+                    'prompt_tokens': stats.prompt_tokens,
+                    'completion_tokens': stats.completion_tokens,
+                }
+            return result
+
+    def to_prometheus(self, prefix: str = 'neurohr') -> str:
+        """
+        Возвращает метрики в текстовом формате Prometheus.
+
+        Args:
+            prefix: Префикс имен метрик
+
+        Returns:
+            Текст в формате Prometheus exposition
+        """
+        snapshot = self.to_dict()
+        duration = f'{prefix}_stage_duration_seconds'
+        lines: List[str] = [
+            f'# HELP {duration} Длительность этапов обработки',
+            f'# TYPE {duration} histogram',
+        ]
+        for stage, stats in snapshot.items():
+            for bound, count in stats['buckets'].items():
+                lines.append(f'{duration}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{duration}_sum{{stage="{stage}"}} {stats["total_seconds"]}')
+            lines.append(f'{duration}_count{{stage="{stage}"}} {stats["count"]}')
+
+        errors = f'{prefix}_stage_errors_total'
+        lines += [f'# HELP {errors} Количество этапов, завершившихся ошибкой',
+                  f'# TYPE {errors} counter']
+        for stage, stats in snapshot.items():
+            lines.append(f'{errors}{{stage="{stage}"}} {stats["errors"]}')
+
+        tokens = f'{prefix}_stage_tokens_total'
+        lines += [f'# HELP {tokens} Количество токенов LLM по этапам',
+                  f'# TYPE {tokens} counter']
+        for stage, stats in snapshot.items():
+            if stats['prompt_tokens'] or stats['completion_tokens']:
+                lines.append(f'{tokens}{{stage="{stage}",kind="prompt"}} {stats["prompt_tokens"]}')
+                lines.append(f'{tokens}{{stage="{stage}",kind="completion"}} {stats["completion_tokens"]}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, file_path: str) -> str:
+        """
+        Сохраняет метрики в файл. Формат определяется расширением:
+        '.json' - JSON, иначе - текстовый формат Prometheus.
+
+        Args:
+            file_path: Путь к файлу
+
+        Returns:
+            Путь к сохраненному файлу
+        """
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if file_path.endswith('.json'):
+            content = json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+        else:
+            content = self.to_prometheus()
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        logger.info(f"Метрики сохранены в файл: {file_path}")
+        return file_path
+
+
+# Глобальный реестр метрик приложения
+metrics = MetricsRegistry()
+
+
+def span(stage: str):
+    """
+    Контекстный менеджер для замера этапа в глобальном реестре.
+
+    Args:
+        stage: Название этапа
+    """
+    if not metrics.enabled:
+        return _NULL_SPAN
+    return _Span(metrics, stage)
+
+
+def traced(stage: str):
+    """
+    Декоратор, оборачивающий вызов функции в спан этапа.
+
+    Args:
+        stage: Название этапа
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            with _Span(metrics, stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_stage() -> Optional[str]:
+    """Возвращает название текущего этапа трассировки (или None)."""
+    return _current_stage.get()
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Профилирование действий командной строки (опция --profile).
+
+На время действия включаются:
+
+    cProfile     - профиль CPU основного потока и всех потоков, запущенных
+                   после старта профилирования (до Python 3.12 - отдельный
+                   профиль на поток, с 3.12 - один профиль на процесс);
+                   профили объединяются в файл cpu.pstats для python -m pstats
+                   или snakeviz;
+    этапы        - время CPU потока по этапам span() из hr_utils.metrics:
+                   полное и собственное (без вложенных этапов), вместе с
+                   временем выполнения этапа из метрик;
+    tracemalloc  - снимок памяти в конце действия: крупнейшие места
+                   выделения памяти и пиковый объем.
+
+В директорию профиля записываются cpu.pstats, memory.txt, summary.json и
+summary.txt - сводные таблицы этапов, самых затратных функций модулей
+проекта и мест выделения памяти. Работа в пулах процессов не
+профилируется; для асинхронных этапов время CPU включает работу других
+задач, выполнявшихся во время ожидания. tracemalloc замедляет выполнение,
+поэтому абсолютное время под профилированием больше обычного.
+"""
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from hr_utils.metrics import metrics
+
+logger = logging.getLogger('hr_system')
+
+# Корень проекта и его пакеты: функции из них выводятся в таблице самых затратных
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT_PACKAGES: Tuple[str, ...] = ('ai_services', 'hr_models', 'hr_utils', 'interview', 'service', 'main.py')
+
+# Сам профилировщик в таблицы не включается
+SELF_MODULE = os.path.join('hr_utils', 'profiling.py')
+
+# Количество строк в таблицах сводки
+DEFAULT_TOP = 25
+
+# Глубина стека, сохраняемая tracemalloc для каждого выделения памяти
+MEMORY_FRAMES = 1
+
+# До Python 3.12 профиль cProfile видит только свой поток, поэтому в каждом новом потоке
+# включается отдельный профиль. С 3.12 cProfile работает через sys.monitoring: один профиль
+# получает события всех потоков, а включить второй нельзя (ValueError)
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+
+def project_module(filename: str) -> Optional[str]:
+    """
+    Возвращает путь файла относительно корня проекта, если файл принадлежит пакетам проекта.
+
+    Args:
+        filename: Путь к файлу модуля
+
+    Returns:
+        Относительный путь или None для стандартной библиотеки и сторонних пакетов
+    """
+    path = os.path.abspath(filename)
+    if not path.startswith(PROJECT_ROOT + os.sep):
+        return None
+    relative = os.path.relpath(path, PROJECT_ROOT)
+    return relative if relative.split(os.sep)[0] in PROJECT_PACKAGES else None
+
+
+def _profile_stats(profile: cProfile.Profile) -> pstats.Stats:
+    """Снимает статистику профиля, не выключая его (профиль может работать в другом потоке)."""
+    profile.snapshot_stats()
+    stats = pstats.Stats()
+    stats.stats = profile.stats
+    stats.get_top_level_stats()
+    return stats
+
+
+def _format_table(header: List[str], rows: List[List[str]]) -> str:
+    """Форматирует таблицу: первый столбец выравнивается влево, остальные вправо."""
+    widths = [max(len(str(row[i])) for row in [header] + rows) for i in range(len(header))]
+    lines = []
+    for row in [header] + rows:
+        cells = [str(cell).ljust(widths[i]) if i == 0 else str(cell).rjust(widths[i]) for i, cell in enumerate(row)]
+        lines.append('  '.join(cells).rstrip())
+    lines.insert(1, '  '.join('-' * width for width in widths))
+    return '\n'.join(lines)
+
+
+class ActionProfiler:
+    """Профилировщик действия: CPU по функциям и этапам, снимок памяти."""
+
+    def __init__(self, output_dir: str, top: int = DEFAULT_TOP):
+        """
+        Args:
+            output_dir: Директория для файлов профиля
+            top: Количество строк в таблицах сводки
+        """
+        self.output_dir = output_dir
+        self.top = top
+        self._profiles: List[cProfile.Profile] = []
+        self._main_profile: Optional[cProfile.Profile] = None
+        self._threads = 1
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # {этап: [количество, полное время CPU, собственное время CPU]}
+        self._stages: Dict[str, List[float]] = {}
+        self._metrics_enabled = False
+        self._started = 0.0
+        self._cpu_started = 0.0
+
+    # ------------------------------------------------------------------
+    # Сбор
+    # ------------------------------------------------------------------
+
+    def _thread_bootstrap(self, frame, event, arg):
+        # Вызывается в новом потоке при первом событии: поток учитывается, и до Python 3.12
+        # в нем включается собственный профиль
+        sys.setprofile(None)
+        with self._lock:
+            self._threads += 1
+        if not PER_THREAD_PROFILES:
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Активен другой профилировщик: поток не профилируется, но продолжает работу
+            return
+        with self._lock:
+            self._profiles.append(profile)
+
+    def _on_span(self, stage: str, span, entering: bool):
+        # Стек открытых этапов потока: [спан, этап, время CPU на входе, время CPU вложенных этапов]
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        now = time.thread_time()
+        if entering:
+            stack.append([span, stage, now, 0.0])
+            return
+
+        # Асинхронные этапы могут завершаться не в порядке входа: этап ищется по спану
+        for i in range(len(stack) - 1, -1, -1):
+            if stack[i][0] is span:
+                _, _, started, nested = stack.pop(i)
+                break
+        else:
+            return
+        total = now - started
+        if i > 0:
+            stack[i - 1][3] += total
+        with self._lock:
+            entry = self._stages.setdefault(stage, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += total
+            entry[2] += max(total - nested, 0.0)
+
+    def start(self):
+        """Включает профилирование CPU, учет этапов и трассировку памяти."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._metrics_enabled = metrics.enabled
+        metrics.enable()
+        metrics.span_hook = self._on_span
+        tracemalloc.start(MEMORY_FRAMES)
+        threading.setprofile(self._thread_bootstrap)
+        self._main_profile = cProfile.Profile()
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time()
+        try:
+            self._main_profile.enable()
+        except ValueError as e:
+            # Действие уже выполняется под другим профилировщиком: собираются только этапы и память
+            logger.warning(f"Профиль CPU не собирается: {str(e)}")
+            self._main_profile = None
+
+    def stop(self) -> Dict[str, Any]:
+        """
+        Останавливает профилирование и записывает файлы профиля.
+
+        Returns:
+            Сводка профиля (также записывается в summary.json)
+        """
+        if self._main_profile is not None:
+            self._main_profile.disable()
+        wall_seconds = time.perf_counter() - self._started
+        cpu_seconds = time.process_time() - self._cpu_started
+        threading.setprofile(None)
+        metrics.span_hook = None
+
+        snapshot = tracemalloc.take_snapshot()
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        stats = _profile_stats(self._main_profile) if self._main_profile is not None else pstats.Stats()
+        with self._lock:
+            for profile in self._profiles:
+                stats.add(_profile_stats(profile))
+            threads = self._threads
+        if stats.stats:
+            stats.dump_stats(os.path.join(self.output_dir, 'cpu.pstats'))
+
+        summary = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'wall_seconds': round(wall_seconds, 3),
+            'cpu_seconds': round(cpu_seconds, 3),
+            'threads': threads,
+            'stages': self._stage_summary(),
+            'functions': self._function_summary(stats),
+            'memory': self._memory_summary(snapshot, current_memory, peak_memory),
+        }
+        if not self._metrics_enabled:
+            metrics.enable(False)
+
+        with open(os.path.join(self.output_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        with open(os.path.join(self.output_dir, 'summary.txt'), 'w', encoding='utf-8') as f:
+            f.write(self.format_summary(summary))
+        logger.info(f"Профиль сохранен в директорию: {self.output_dir}")
+        return summary
+
+    # ------------------------------------------------------------------
+    # Сводка
+    # ------------------------------------------------------------------
+
+    def _stage_summary(self) -> List[Dict[str, Any]]:
+        """Этапы по убыванию собственного времени CPU, со временем выполнения из метрик."""
+        wall = metrics.to_dict()
+        with self._lock:
+            stages = dict(self._stages)
+        rows = []
+        for stage in set(stages) | set(wall):
+            count, total, own = stages.get(stage, (0, 0.0, 0.0))
+            rows.append({
+                'stage': stage,
+                'count': wall.get(stage, {}).get('count', count),
+                'wall_seconds': wall.get(stage, {}).get('total_seconds', 0.0),
+                'cpu_seconds': round(total, 6),
+                'own_cpu_seconds': round(own, 6),
+            })
+        rows.sort(key=lambda row: (-row['own_cpu_seconds'], -row['wall_seconds']))
+        return rows
+
+    def _function_summary(self, stats: pstats.Stats) -> List[Dict[str, Any]]:
+        """Самые затратные функции модулей проекта по собственному времени."""
+        rows = []
+        for (filename, line, name), (_, calls, own, total, _) in stats.stats.items():
+            module = project_module(filename)
+            if module is None or module == SELF_MODULE:
+                continue
+            rows.append({'function': f"{module}:{line}({name})", 'calls': calls,
+                         'own_seconds': round(own, 6), 'total_seconds': round(total, 6)})
+        rows.sort(key=lambda row: -row['own_seconds'])
+        return rows[:self.top]
+
+    def _memory_summary(self, snapshot: tracemalloc.Snapshot, current: int, peak: int) -> Dict[str, Any]:
+        """Крупнейшие места выделения памяти в конце действия (все и в модулях проекта)."""
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                          tracemalloc.Filter(False, __file__)])
+        lines = snapshot.statistics('lineno')
+        with open(os.path.join(self.output_dir, 'memory.txt'), 'w', encoding='utf-8') as f:
+            f.write(f"Выделено при завершении: {current / 2 ** 20:.1f} МБ, пик: {peak / 2 ** 20:.1f} МБ\n\n")
+            for stat in lines[:self.top * 4]:
+                f.write(f"{stat}\n")
+
+        def row(stat) -> Dict[str, Any]:
+            frame = stat.traceback[0]
+            location = project_module(frame.filename) or frame.filename
+            return {'location': f"{location}:{frame.lineno}", 'size_mb': round(stat.size / 2 ** 20, 3),
+                    'blocks': stat.count}
+
+        return {
+            'current_mb': round(current / 2 ** 20, 3),
+            'peak_mb': round(peak / 2 ** 20, 3),
+            'top': [row(stat) for stat in lines[:self.top]],
+            'project': [row(stat) for stat in lines if project_module(stat.traceback[0].filename)][:self.top],
+        }
+
+    def format_summary(self, summary: Dict[str, Any]) -> str:
+        """
+        Форматирует сводку профиля в виде текстовых таблиц.
+
+        Args:
+            summary: Сводка профиля (см. stop)
+
+        Returns:
+            Текст сводки
+        """
+        parts = [f"Профиль: время {summary['wall_seconds']:.2f} с, CPU {summary['cpu_seconds']:.2f} с, "
+                 f"потоков {summary['threads']}"]
+
+        stage_rows = [[row['stage'], row['count'], f"{row['wall_seconds']:.3f}", f"{row['cpu_seconds']:.3f}",
+                       f"{row['own_cpu_seconds']:.3f}"] for row in summary['stages'][:self.top]]
+        if stage_rows:
+            parts.append("Этапы:\n" + _format_table(
+                ['этап', 'вызовов', 'время, с', 'CPU, с', 'собственное CPU, с'], stage_rows))
+
+        function_rows = [[row['function'], row['calls'], f"{row['own_seconds']:.3f}", f"{row['total_seconds']:.3f}"]
+                         for row in summary['functions']]
+        if function_rows:
+            parts.append("Самые затратные функции проекта:\n" + _format_table(
+                ['функция', 'вызовов', 'собственное, с', 'всего, с'], function_rows))
+
+        memory = summary['memory']
+        memory_rows = [[row['location'], f"{row['size_mb']:.3f}", row['blocks']] for row in memory['top']]
+        parts.append(f"Память: выделено при завершении {memory['current_mb']:.1f} МБ, "
+                     f"пик {memory['peak_mb']:.1f} МБ")
+        if memory_rows:
+            parts.append("Крупнейшие места выделения памяти:\n" + _format_table(
+                ['место', 'МБ', 'блоков'], memory_rows))
+        project_rows = [[row['location'], f"{row['size_mb']:.3f}", row['blocks']] for row in memory['project']]
+        if project_rows:
+            parts.append("Выделение памяти в модулях проекта:\n" + _format_table(
+                ['место', 'МБ', 'блоков'], project_rows))
+        return '\n\n'.join(parts) + '\n'
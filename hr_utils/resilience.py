@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+Устойчивые обращения к моделям: типизированные ошибки, повторы, сроки и хеджирование.
+
+Ошибки клиента OpenAI приводятся к иерархии ModelCallError, поэтому
+вызывающий код отличает временные сбои (таймаут, лимит запросов, ошибка
+сервиса) от ошибок запроса и не принимает текст ошибки за ответ модели.
+Временные сбои повторяются с экспоненциальной задержкой со случайным
+разбросом (full jitter) в пределах общего срока вызова. Автоматический
+выключатель (circuit breaker) на модель после серии сбоев подряд на время
+отклоняет запросы без обращения к API. Для интерактивных этапов можно
+включить хеджирование: если ответ не получен за hedge_after секунд,
+параллельно отправляется второй запрос и используется первый полученный ответ.
+"""
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, Optional, Any, Awaitable
+
+from hr_utils.metrics import metrics
+from hr_utils.usage_ledger import BudgetExceededError
+
+logger = logging.getLogger('hr_system')
+
+
+class ModelCallError(Exception):
+    """Запрос к модели завершился ошибкой."""
+
+    retryable = False
+
+
+class ModelTimeoutError(ModelCallError):
+    """Модель не ответила в отведенное время."""
+
+    retryable = True
+
+
+class ModelRateLimitError(ModelCallError):
+    """Превышен лимит запросов к API."""
+
+    retryable = True
+
+
+class ModelServiceError(ModelCallError):
+    """Временная ошибка сервиса или соединения."""
+
+    retryable = True
+
+
+class ModelRequestError(ModelCallError):
+    """Ошибка запроса (неверные параметры, ключ, модель); повтор не поможет."""
+
+
+class CircuitOpenError(ModelCallError):
+    """Запросы к модели временно отклоняются после серии сбоев."""
+
+
+def classify_error(error: BaseException) -> ModelCallError:
+    """
+    Приводит исключение клиента API к типизированной ошибке.
+
+    Классы клиента определяются по именам, поэтому модуль не импортирует openai.
+
+    Args:
+        error: Исключение, возникшее при запросе
+
+    Returns:
+        Экземпляр ModelCallError
+    """
+    if isinstance(error, ModelCallError):
+        return error
+
+    names = {cls.__name__ for cls in type(error).__mro__}
+    status = getattr(error, 'status_code', None)
+    message = f"{type(error).__name__}: {error}"
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)) or 'APITimeoutError' in names:
+        return ModelTimeoutError(message)
+    if 'RateLimitError' in names or status == 429:
+        return ModelRateLimitError(message)
+    if names & {'APIConnectionError', 'InternalServerError'} or (status is not None and (status >= 500 or status in (408, 409))):
+        return ModelServiceError(message)
+    return ModelRequestError(message)
+
+
+class RetryPolicy:
+    """Параметры повторов, сроков и хеджирования запросов к модели."""
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 0.5, max_delay: float = 8.0,
+                 deadline: float = 120.0, attempt_timeout: Optional[float] = 60.0,
+                 hedge_after: Optional[float] = None):
+        """
+        Args:
+            max_attempts: Максимальное количество попыток
+            base_delay: Базовая задержка перед повтором в секундах
+            max_delay: Максимальная задержка перед повтором в секундах
+            deadline: Общий срок вызова со всеми повторами в секундах
+            attempt_timeout: Срок одной попытки в секундах
+            hedge_after: Через сколько секунд без ответа отправлять второй запрос (None - без хеджирования)
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.hedge_after = hedge_after
+
+    def backoff(self, attempt: int) -> float:
+        """Задержка перед повтором номер attempt (с нуля) со случайным разбросом."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Автоматический выключатель запросов к одной модели."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold: Количество временных сбоев подряд, после которого выключатель размыкается
+            reset_timeout: Через сколько секунд пропускается пробный запрос
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self, name: str = ''):
+        """
+        Проверяет, можно ли отправить запрос.
+
+        Raises:
+            CircuitOpenError: Если выключатель разомкнут (или пробный запрос уже отправлен)
+        """
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return
+            if state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+        raise CircuitOpenError(f"Запросы к модели {name} временно отклоняются после серии сбоев")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """Снимает отметку пробного запроса, если он был отменен без результата."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                if self.opened_at is None:
+                    logger.error(f"Выключатель запросов разомкнут после {self.failures} сбоев подряд")
+                self.opened_at = time.monotonic()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """
+    Возвращает общий выключатель для модели.
+
+    Args:
+        name: Название модели
+
+    Returns:
+        Экземпляр CircuitBreaker
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(
+                failure_threshold=int(os.getenv("LLM_BREAKER_THRESHOLD", "5")),
+                reset_timeout=float(os.getenv("LLM_BREAKER_RESET", "30")))
+        return breaker
+
+
+def _attempt_timeout(policy: RetryPolicy, remaining: float) -> float:
+    return min(policy.attempt_timeout, remaining) if policy.attempt_timeout else remaining
+
+
+def call_with_retry(call: Callable[[float], Any], policy: RetryPolicy, breaker: CircuitBreaker,
+                    name: str = '') -> Any:
+    """
+    Выполняет запрос с повторами временных сбоев в пределах срока вызова.
+
+    Args:
+        call: Функция запроса, принимающая срок попытки в секундах
+        policy: Параметры повторов
+        breaker: Выключатель модели
+        name: Название модели для сообщений
+
+    Returns:
+        Результат запроса
+
+    Raises:
+        ModelCallError: Если запрос не удался
+        BudgetExceededError: Если запрос отклонен по бюджету (передается без изменений)
+    """
+    deadline = time.monotonic() + policy.deadline
+    for attempt in range(policy.max_attempts):
+        breaker.allow(name)
+        remaining = deadline - time.monotonic()
+        try:
+            result = call(_attempt_timeout(policy, remaining))
+        except BudgetExceededError:
+            # Отказ по бюджету - не сбой модели: не повторяется и не размыкает выключатель
+            breaker.release_probe()
+            raise
+        except Exception as e:
+            error = classify_error(e)
+            delay = _after_failure(error, attempt, policy, breaker, deadline, name)
+            if delay is None:
+                raise error from e
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+    raise ModelCallError(f"Запрос к модели {name} не выполнен")
+
+
+async def call_with_retry_async(call: Callable[[float], Awaitable[Any]], policy: RetryPolicy,
+                                breaker: CircuitBreaker, name: str = '') -> Any:
+    """
+    Асинхронно выполняет запрос с повторами, сроком попытки и хеджированием.
+
+    Проигравший хеджированный запрос отменяется. Запрос call должен сам учитывать
+    отмену (CancelledError), если отправленный запрос нужно записать в журнал
+    использования (см. generate_answer_async).
+
+    Args:
+        call: Корутинная функция запроса, принимающая срок попытки в секундах
+        policy: Параметры повторов и хеджирования
+        breaker: Выключатель модели
+        name: Название модели для сообщений
+
+    Returns:
+        Результат запроса
+
+    Raises:
+        ModelCallError: Если запрос не удался
+        BudgetExceededError: Если запрос отклонен по бюджету (передается без изменений)
+    """
+    deadline = time.monotonic() + policy.deadline
+    for attempt in range(policy.max_attempts):
+        breaker.allow(name)
+        timeout = _attempt_timeout(policy, deadline - time.monotonic())
+        try:
+            if policy.hedge_after is not None and policy.hedge_after < timeout:
+                result = await _hedged(call, timeout, policy.hedge_after, name)
+            else:
+                result = await asyncio.wait_for(call(timeout), timeout)
+        except (asyncio.CancelledError, BudgetExceededError):
+            breaker.release_probe()
+            raise
+        except Exception as e:
+            error = classify_error(e)
+            delay = _after_failure(error, attempt, policy, breaker, deadline, name)
+            if delay is None:
+                raise error from e
+            await asyncio.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+    raise ModelCallError(f"Запрос к модели {name} не выполнен")
+
+
+def _after_failure(error: ModelCallError, attempt: int, policy: RetryPolicy, breaker: CircuitBreaker,
+                   deadline: float, name: str) -> Optional[float]:
+    """Учитывает сбой и возвращает задержку перед повтором или None, если повторять не нужно."""
+    if not error.retryable:
+        # Сервис ответил (ошибка в самом запросе), поэтому выключатель не размыкается
+        breaker.record_success()
+        return None
+    breaker.record_failure()
+    delay = policy.backoff(attempt)
+    if attempt + 1 >= policy.max_attempts or time.monotonic() + delay >= deadline:
+        return None
+    logger.warning(f"Сбой запроса к модели {name} (попытка {attempt + 1}/{policy.max_attempts}): "
+                   f"{error}. Повтор через {delay:.2f} с")
+    metrics.observe('llm.retry_delay', delay)
+    return delay
+
+
+async def _hedged(call: Callable[[float], Awaitable[Any]], timeout: float, hedge_after: float, name: str) -> Any:
+    """Выполняет запрос и, если он не завершился за hedge_after секунд, параллельно его дублирует."""
+    started = time.monotonic()
+    tasks = [asyncio.ensure_future(call(timeout))]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if not done:
+            logger.info(f"Ответ модели {name} не получен за {hedge_after} с, отправлен дублирующий запрос")
+            metrics.observe('llm.hedge', hedge_after)
+            tasks.append(asyncio.ensure_future(call(timeout - hedge_after)))
+
+        error: Optional[BaseException] = None
+        pending = set(tasks)
+        while pending:
+            remaining = timeout - (time.monotonic() - started)
+            done, pending = await asyncio.wait(pending, timeout=max(remaining, 0),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                raise ModelTimeoutError(f"Модель {name} не ответила за {timeout:.1f} с")
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+def _env_policy(prefix: str, **defaults) -> RetryPolicy:
+    """Создает политику, параметры которой можно переопределить переменными окружения."""
+    overrides = {}
+    for key, value in defaults.items():
+        env_value = os.getenv(f"{prefix}_{key.upper()}")
+        if env_value:
+            overrides[key] = type(value)(env_value)
+    return RetryPolicy(**dict(defaults, **overrides))
+
+
+# Политика по умолчанию (генерация вопросов, оценка, парсинг)
+DEFAULT_POLICY = _env_policy('LLM', max_attempts=4, deadline=180.0, attempt_timeout=90.0)
+
+# Интерактивные этапы: кандидат ждет ответа, поэтому сроки короче, а медленный запрос дублируется
+INTERACTIVE_POLICY = _env_policy('LLM_INTERACTIVE', max_attempts=3, deadline=30.0, attempt_timeout=20.0,
+                                 hedge_after=6.0)
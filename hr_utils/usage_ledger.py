@@ -0,0 +1,497 @@
+# -*- coding: utf-8 -*-
+"""
+Журнал использования токенов и стоимости запросов к моделям.
+
+Каждый запрос к модели записывается в локальный JSONL-журнал с привязкой к
+этапу, модели, сессии собеседования и заданию обработки. Журнал позволяет
+агрегировать расходы и ограничивать их бюджетами на собеседование и на
+задание: при превышении бюджета запрос либо отклоняется, либо выполняется
+более дешевой моделью. Проверка бюджета резервирует оценку стоимости запроса
+до его записи в журнал, поэтому одновременные запросы одной сессии или
+задания не проходят проверку по одному и тому же остатку.
+
+В памяти хранятся только накопительные суммы по группам (этап, модель,
+сессия, задание). Они сохраняются в сводку рядом с журналом вместе со
+смещением в журнале, до которого посчитаны, поэтому при запуске читается
+только хвост журнала, записанный после предыдущей сводки.
+"""
+import os
+import json
+import logging
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from hr_utils.metrics import current_stage
+from hr_utils.file_utils import create_temp_file
+
+logger = logging.getLogger('hr_system')
+
+# Цены на токены в долларах за 1 миллион токенов
+MODEL_PRICES: Dict[str, Dict[str, float]] = {
+    "gpt-4o": {"input": 5, "output": 15},
+    "gpt-4o-mini": {"input": 0.15, "output": 0.60},
+    "gpt-3.5-turbo": {"input": 0.50, "output": 1.50},
+    "text-embedding-ada-002": {"input": 0.10, "output": 0},
+    "text-embedding-3-small": {"input": 0.02, "output": 0},
+    "text-embedding-3-large": {"input": 0.13, "output": 0},
+}
+
+# Более дешевые замены моделей при исчерпании бюджета
+MODEL_DOWNGRADES: Dict[str, str] = {
+    "gpt-4o": "gpt-4o-mini",
+    "gpt-4-turbo": "gpt-4o-mini",
+    "gpt-4": "gpt-4o-mini",
+}
+
+# Ожидаемое количество токенов ответа при оценке стоимости запроса
+EXPECTED_COMPLETION_TOKENS = 1000
+
+BUDGET_POLICIES = ('fail', 'downgrade')
+
+# Поля групп накопительных сумм: агрегаты по любому их подмножеству выводятся из групп
+GROUP_FIELDS = ('stage', 'model', 'session_id', 'job_id')
+
+# Версия формата сводки журнала
+SUMMARY_VERSION = 1
+
+# Контекст учета: сессия собеседования и задание обработки
+_session_id: contextvars.ContextVar = contextvars.ContextVar('hr_usage_session', default=None)
+_job_id: contextvars.ContextVar = contextvars.ContextVar('hr_usage_job', default=None)
+# Резерв бюджета запроса, проверенного в текущем контексте и еще не записанного в журнал
+_reservation: contextvars.ContextVar = contextvars.ContextVar('hr_usage_reservation', default=None)
+
+
+class BudgetExceededError(Exception):
+    """Запрос к модели превысил бы установленный бюджет."""
+
+
+def model_price(model: str) -> Optional[Tuple[float, float]]:
+    """
+    Возвращает цены модели за 1 миллион токенов.
+
+    Args:
+        model: Название модели
+
+    Returns:
+        Кортеж (цена ввода, цена вывода) или None для неизвестной модели
+    """
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    return prices["input"], prices["output"]
+
+
+def calculate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """
+    Рассчитывает стоимость запроса в долларах.
+
+    Args:
+        model: Название модели
+        prompt_tokens: Количество токенов ввода
+        completion_tokens: Количество токенов вывода
+
+    Returns:
+        Стоимость запроса или None, если цены модели неизвестны
+    """
+    prices = model_price(model)
+    if prices is None:
+        return None
+    input_price, output_price = prices
+    return input_price * prompt_tokens / 1e6 + output_price * completion_tokens / 1e6
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Грубо оценивает количество токенов в тексте (без обращения к токенизатору).
+
+    Args:
+        text: Текст запроса
+
+    Returns:
+        Оценка количества токенов
+    """
+    # Для русского текста один токен в среднем соответствует 2-3 символам
+    return len(text) // 2 + 1
+
+
+def summary_path(ledger_file: str) -> str:
+    """Возвращает путь к сводке журнала (ledger.jsonl -> ledger.summary.json)."""
+    return os.path.splitext(ledger_file)[0] + '.summary.json'
+
+
+def _new_group() -> Dict[str, Any]:
+    return {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cost_usd': 0.0, 'unpriced_calls': 0}
+
+
+@contextmanager
+def usage_context(session_id: Optional[str] = None, job_id: Optional[str] = None):
+    """
+    Привязывает запросы к моделям внутри блока к сессии или заданию.
+
+    Args:
+        session_id: Идентификатор сессии собеседования
+        job_id: Идентификатор задания обработки
+    """
+    tokens = []
+    if session_id is not None:
+        tokens.append((_session_id, _session_id.set(session_id)))
+    if job_id is not None:
+        tokens.append((_job_id, _job_id.set(job_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class UsageLedger:
+    """Журнал использования моделей с агрегацией и контролем бюджетов."""
+
+    def __init__(self, ledger_file: Optional[str] = None, session_budget: Optional[float] = None,
+                 job_budget: Optional[float] = None, policy: str = 'fail'):
+        """
+        Инициализация журнала.
+
+        Args:
+            ledger_file: Путь к JSONL-файлу журнала (если None, журнал хранится только в памяти)
+            session_budget: Бюджет на одну сессию собеседования в долларах
+            job_budget: Бюджет на одно задание обработки в долларах
+            policy: Поведение при превышении бюджета: 'fail' или 'downgrade'
+        """
+        self._lock = threading.Lock()
+        self.ledger_file = None
+        self._groups: Dict[Tuple, Dict[str, Any]] = {}
+        self._spent_by_session: Dict[str, float] = {}
+        self._spent_by_job: Dict[str, float] = {}
+        # Резервы бюджета: {номер: (сессия, задание, стоимость)}
+        self._reservations: Dict[int, Tuple[Optional[str], Optional[str], float]] = {}
+        self._reserved_by_session: Dict[str, float] = {}
+        self._reserved_by_job: Dict[str, float] = {}
+        self._reservation_ids = itertools.count(1)
+        self.configure(ledger_file, session_budget, job_budget, policy)
+
+    def configure(self, ledger_file: Optional[str] = None, session_budget: Optional[float] = None,
+                  job_budget: Optional[float] = None, policy: str = 'fail'):
+        """
+        Перенастраивает журнал: файл хранения, бюджеты и политику.
+
+        Args:
+            ledger_file: Путь к JSONL-файлу журнала
+            session_budget: Бюджет на одну сессию собеседования в долларах
+            job_budget: Бюджет на одно задание обработки в долларах
+            policy: Поведение при превышении бюджета: 'fail' или 'downgrade'
+        """
+        if policy not in BUDGET_POLICIES:
+            raise ValueError(f"Неизвестная политика бюджета: {policy}")
+
+        with self._lock:
+            self.session_budget = session_budget
+            self.job_budget = job_budget
+            self.policy = policy
+            if ledger_file != self.ledger_file:
+                self.ledger_file = ledger_file
+                self._groups = {}
+                self._spent_by_session = {}
+                self._spent_by_job = {}
+                self._reservations = {}
+                self._reserved_by_session = {}
+                self._reserved_by_job = {}
+                if ledger_file:
+                    self._load()
+
+    def _load(self):
+        """Загружает суммы из сводки журнала и дочитывает записи, добавленные после нее."""
+        offset = self._load_summary()
+        if not os.path.exists(self.ledger_file):
+            return
+        try:
+            changed = False
+            with open(self.ledger_file, 'rb') as f:
+                if os.fstat(f.fileno()).st_size < offset:
+                    # Журнал заменен или усечен: суммы пересчитываются с начала
+                    logger.warning(f"Журнал использования {self.ledger_file} короче сводки, сводка пересчитывается")
+                    self._groups, self._spent_by_session, self._spent_by_job = {}, {}, {}
+                    offset = 0
+                    changed = True
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        # Запись еще дописывается другим процессом
+                        break
+                    offset += len(line)
+                    line = line.strip()
+                    if line:
+                        self._account(json.loads(line))
+                        changed = True
+            if changed:
+                self._save_summary(offset)
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке журнала использования {self.ledger_file}: {str(e)}")
+
+    def _load_summary(self) -> int:
+        """Загружает сводку журнала и возвращает смещение в журнале, до которого она посчитана."""
+        path = summary_path(self.ledger_file)
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                summary = json.load(f)
+            if summary.get('version') != SUMMARY_VERSION:
+                return 0
+            for row in summary['groups']:
+                key = tuple(row[:len(GROUP_FIELDS)])
+                self._account_group(key, dict(zip(_new_group(), row[len(GROUP_FIELDS):])))
+            return int(summary['offset'])
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке сводки журнала использования {path}: {str(e)}")
+            self._groups, self._spent_by_session, self._spent_by_job = {}, {}, {}
+            return 0
+
+    def _save_summary(self, offset: int):
+        """Атомарно сохраняет накопительные суммы и смещение в журнале, до которого они посчитаны."""
+        path = summary_path(self.ledger_file)
+        summary = {
+            'version': SUMMARY_VERSION,
+            'offset': offset,
+            'groups': [list(key) + list(group.values()) for key, group in self._groups.items()],
+        }
+        fd, tmp_path = create_temp_file(os.path.dirname(path) or '.', prefix='.ledger-summary-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _account(self, entry: Dict[str, Any]):
+        """Добавляет запись журнала к накопительным суммам."""
+        cost = entry.get('cost_usd')
+        self._account_group(tuple(entry.get(field) for field in GROUP_FIELDS), {
+            'calls': 1,
+            'prompt_tokens': entry.get('prompt_tokens', 0),
+            'completion_tokens': entry.get('completion_tokens', 0),
+            'cost_usd': cost or 0.0,
+            'unpriced_calls': int(cost is None),
+        })
+
+    def _account_group(self, key: Tuple, totals: Dict[str, Any]):
+        """Прибавляет суммы к группе и к расходам ее сессии и задания."""
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = _new_group()
+        for field, value in totals.items():
+            group[field] += value
+        values = dict(zip(GROUP_FIELDS, key))
+        cost = totals['cost_usd']
+        if values['session_id']:
+            self._spent_by_session[values['session_id']] = self._spent_by_session.get(values['session_id'], 0.0) + cost
+        if values['job_id']:
+            self._spent_by_job[values['job_id']] = self._spent_by_job.get(values['job_id'], 0.0) + cost
+
+    def spent(self, session_id: Optional[str] = None, job_id: Optional[str] = None) -> float:
+        """
+        Возвращает сумму расходов сессии или задания.
+
+        Args:
+            session_id: Идентификатор сессии собеседования
+            job_id: Идентификатор задания обработки
+
+        Returns:
+            Сумма расходов в долларах
+        """
+        with self._lock:
+            if session_id is not None:
+                return self._spent_by_session.get(session_id, 0.0)
+            if job_id is not None:
+                return self._spent_by_job.get(job_id, 0.0)
+            return sum(group['cost_usd'] for group in self._groups.values())
+
+    def _remaining(self) -> Optional[float]:
+        """Возвращает остаток самого строгого из действующих бюджетов за вычетом резервов."""
+        remaining = []
+        session_id, job_id = _session_id.get(), _job_id.get()
+        if session_id and self.session_budget is not None:
+            remaining.append(self.session_budget - self._spent_by_session.get(session_id, 0.0)
+                             - self._reserved_by_session.get(session_id, 0.0))
+        if job_id and self.job_budget is not None:
+            remaining.append(self.job_budget - self._spent_by_job.get(job_id, 0.0)
+                             - self._reserved_by_job.get(job_id, 0.0))
+        return min(remaining) if remaining else None
+
+    def _reserve(self, cost: float):
+        """Резервирует стоимость запроса в бюджетах текущей сессии и задания."""
+        session_id, job_id = _session_id.get(), _job_id.get()
+        reservation = next(self._reservation_ids)
+        self._reservations[reservation] = (session_id, job_id, cost)
+        if session_id:
+            self._reserved_by_session[session_id] = self._reserved_by_session.get(session_id, 0.0) + cost
+        if job_id:
+            self._reserved_by_job[job_id] = self._reserved_by_job.get(job_id, 0.0) + cost
+        _reservation.set(reservation)
+
+    def _settle(self):
+        """Снимает резерв запроса текущего контекста, если он еще не снят."""
+        reserved = self._reservations.pop(_reservation.get(), None)
+        if reserved is None:
+            return
+        session_id, job_id, cost = reserved
+        if session_id:
+            self._reserved_by_session[session_id] -= cost
+            if self._reserved_by_session[session_id] < 1e-12:
+                del self._reserved_by_session[session_id]
+        if job_id:
+            self._reserved_by_job[job_id] -= cost
+            if self._reserved_by_job[job_id] < 1e-12:
+                del self._reserved_by_job[job_id]
+
+    def check_budget(self, model: str, prompt_text: str = '',
+                     completion_tokens: int = EXPECTED_COMPLETION_TOKENS,
+                     prompt_tokens: Optional[int] = None) -> str:
+        """
+        Проверяет, укладывается ли запрос в бюджет, до его выполнения, и резервирует его стоимость.
+
+        Резерв снимается записью запроса в журнал (record) или вызовом release,
+        если запрос не выполнен.
+
+        Args:
+            model: Запрашиваемая модель
+            prompt_text: Текст запроса для оценки количества токенов
+            completion_tokens: Ожидаемое количество токенов ответа
+            prompt_tokens: Оценка количества токенов запроса (вместо оценки по prompt_text)
+
+        Returns:
+            Модель, которую следует использовать (исходная или более дешевая)
+
+        Raises:
+            BudgetExceededError: Если запрос не укладывается в бюджет
+        """
+        if prompt_tokens is None:
+            prompt_tokens = estimate_tokens(prompt_text)
+        with self._lock:
+            # Резерв предыдущего запроса контекста, не дошедшего до журнала, больше не нужен
+            self._settle()
+            remaining = self._remaining()
+            if remaining is None:
+                return model
+
+            candidate = model
+            while candidate:
+                cost = calculate_cost(candidate, prompt_tokens, completion_tokens)
+                if cost is None:
+                    raise BudgetExceededError(
+                        f"Неизвестны цены модели {candidate}: невозможно соблюсти бюджет")
+                if cost <= remaining:
+                    if candidate != model:
+                        logger.warning(f"Бюджет почти исчерпан (остаток $ {remaining:.5f}): "
+                                       f"модель {model} заменена на {candidate}")
+                    self._reserve(cost)
+                    return candidate
+                if self.policy != 'downgrade':
+                    break
+                candidate = MODEL_DOWNGRADES.get(candidate)
+
+        raise BudgetExceededError(
+            f"Запрос к {model} (оценка ≥ $ {calculate_cost(model, prompt_tokens, completion_tokens):.5f}) "
+            f"превышает остаток бюджета $ {max(remaining, 0.0):.5f}")
+
+    def release(self):
+        """Снимает резерв бюджета запроса, который не будет записан в журнал (запрос не выполнен)."""
+        with self._lock:
+            self._settle()
+
+    def record(self, model: str, prompt_tokens: int, completion_tokens: int,
+               stage: Optional[str] = None, estimated: bool = False) -> Dict[str, Any]:
+        """
+        Записывает запрос к модели в журнал и снимает резерв бюджета запроса.
+
+        Args:
+            model: Использованная модель
+            prompt_tokens: Количество токенов ввода
+            completion_tokens: Количество токенов вывода
+            stage: Этап обработки (по умолчанию - текущий этап трассировки)
+            estimated: Токены оценены по тексту запроса, а не получены из ответа API
+
+        Returns:
+            Запись журнала
+        """
+        cost = calculate_cost(model, prompt_tokens, completion_tokens)
+        if cost is None:
+            logger.warning(f"Неизвестная модель: {model}, стоимость запроса не рассчитана")
+
+        entry = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'stage': stage or current_stage() or 'llm',
+            'model': model,
+            'session_id': _session_id.get(),
+            'job_id': _job_id.get(),
+            'prompt_tokens': int(prompt_tokens),
+            'completion_tokens': int(completion_tokens),
+            'cost_usd': round(cost, 8) if cost is not None else None,
+        }
+        if estimated:
+            entry['estimated'] = True
+
+        with self._lock:
+            self._settle()
+            self._account(entry)
+            if self.ledger_file:
+                try:
+                    directory = os.path.dirname(self.ledger_file)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    with open(self.ledger_file, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                except Exception as e:
+                    logger.error(f"Ошибка при записи в журнал использования: {str(e)}")
+        return entry
+
+    def aggregate(self, by: Tuple[str, ...] = ('stage', 'model'),
+                  session_id: Optional[str] = None, job_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Агрегирует записи журнала по заданным полям.
+
+        Args:
+            by: Поля группировки ('stage', 'model', 'session_id', 'job_id')
+            session_id: Отбор по сессии собеседования
+            job_id: Отбор по заданию обработки
+
+        Returns:
+            Список групп с количеством запросов, токенов и стоимостью
+        """
+        groups: Dict[Tuple, Dict[str, Any]] = {}
+        with self._lock:
+            totals = [(dict(zip(GROUP_FIELDS, key)), dict(group)) for key, group in self._groups.items()]
+
+        for values, total in totals:
+            if session_id is not None and values['session_id'] != session_id:
+                continue
+            if job_id is not None and values['job_id'] != job_id:
+                continue
+            key = tuple(values[field] for field in by)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = dict(zip(by, key), **_new_group())
+            for field, value in total.items():
+                group[field] += value
+
+        return sorted(groups.values(), key=lambda g: g['cost_usd'], reverse=True)
+
+
+def _env_float(name: str) -> Optional[float]:
+    """Читает необязательное число из переменной окружения."""
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+# Глобальный журнал использования приложения
+ledger = UsageLedger(
+    session_budget=_env_float("INTERVIEW_BUDGET_USD"),
+    job_budget=_env_float("JOB_BUDGET_USD"),
+    policy=os.getenv("BUDGET_POLICY", "fail")
+)
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""
+Семантический кэш ответов рекрутера на вопросы кандидатов.
+
+Кандидаты на одну позицию задают одни и те же вопросы (зарплата, удаленная
+работа, этапы отбора), а ответ строится только по базе знаний hr_answers.txt
+и позиции. Кэш хранит для каждой позиции пары (эмбеддинг вопроса, ответ):
+
+    - вопрос, совпадающий с сохраненным после нормализации текста,
+      отвечается без обращений к моделям;
+    - для остальных вопросов эмбеддинг сравнивается с эмбеддингами
+      сохраненных вопросов позиции; при косинусном сходстве не ниже порога
+      возвращается сохраненный ответ (модель ответа не вызывается, а
+      эмбеддинг используется и для поиска по базе знаний при промахе).
+
+Записи старше TTL не используются. Каждая запись помечена хешем файла
+hr_answers.txt, на основе которого получен ответ: при изменении файла
+записи с прежним хешем удаляются. Записи хранятся в SQLite
+(data/answer_cache/answers.db), эмбеддинги позиции держатся в памяти
+одной матрицей.
+"""
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger('hr_system')
+
+ANSWER_CACHE_DB = 'answers.db'
+
+# Минимальное косинусное сходство вопросов для использования сохраненного ответа
+DEFAULT_THRESHOLD = 0.95
+
+# Срок жизни записи, часов
+DEFAULT_TTL_HOURS = 168.0
+
+# Максимум записей на позицию (вытесняются самые старые)
+DEFAULT_MAX_ENTRIES = 500
+
+_WORD_RE = re.compile(r'\w+')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    position TEXT NOT NULL,
+    question TEXT NOT NULL,
+    normalized TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    embedding BLOB,
+    source_hash TEXT NOT NULL,
+    created REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS answers_position ON answers (position, created);
+"""
+
+
+def normalize_question(text: str) -> str:
+    """
+    Нормализует текст вопроса для точного сравнения: регистр, "ё", пунктуация и пробелы.
+
+    Args:
+        text: Текст вопроса
+
+    Returns:
+        Слова вопроса в нижнем регистре через пробел
+    """
+    return ' '.join(_WORD_RE.findall(text.lower().replace('ё', 'е')))
+
+
+def position_key(position: str) -> str:
+    """Ключ позиции в кэше (без учета регистра и пунктуации)."""
+    return normalize_question(position)
+
+
+def file_hash(file_path: str) -> str:
+    """
+    Возвращает хеш содержимого файла.
+
+    Args:
+        file_path: Путь к файлу
+
+    Returns:
+        SHA-256 содержимого или пустая строка, если файла нет
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return ''
+    return digest.hexdigest()
+
+
+class _PositionEntries:
+    """Записи одной позиции в памяти: точные тексты и матрица нормированных эмбеддингов."""
+
+    def __init__(self):
+        self.ids: List[int] = []
+        self.answers: List[str] = []
+        self.created: List[float] = []
+        self.normalized: Dict[str, int] = {}
+        # Строки матрицы соответствуют записям с эмбеддингами: (номер записи, вектор)
+        self.vector_rows: List[int] = []
+        self.vectors: List[Any] = []
+        self._matrix = None
+
+    def add(self, entry_id: int, normalized: str, answer: str, created: float, vector):
+        row = len(self.ids)
+        self.ids.append(entry_id)
+        self.answers.append(answer)
+        self.created.append(created)
+        self.normalized[normalized] = row
+        if vector is not None:
+            self.vector_rows.append(row)
+            self.vectors.append(vector)
+            self._matrix = None
+
+    def matrix(self):
+        import numpy as np
+
+        if self._matrix is None and self.vectors:
+            self._matrix = np.vstack(self.vectors)
+        return self._matrix
+
+
+class AnswerCache:
+    """Кэш ответов на вопросы кандидатов по позициям с порогом сходства, TTL и инвалидацией по файлу ответов."""
+
+    def __init__(self, cache_path: str, source_file: str, threshold: Optional[float] = None,
+                 ttl_hours: Optional[float] = None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Инициализация кэша ответов.
+
+        Args:
+            cache_path: Директория базы кэша
+            source_file: Файл базы знаний HR (hr_answers.txt), при изменении которого кэш сбрасывается
+            threshold: Минимальное косинусное сходство вопросов (по умолчанию ANSWER_CACHE_THRESHOLD или 0.95)
+            ttl_hours: Срок жизни записи в часах (по умолчанию ANSWER_CACHE_TTL_HOURS или 168)
+            max_entries: Максимум записей на позицию
+        """
+        self.cache_path = cache_path
+        self.source_file = source_file
+        self.threshold = threshold if threshold is not None else \
+            float(os.getenv("ANSWER_CACHE_THRESHOLD", str(DEFAULT_THRESHOLD)))
+        self.ttl_seconds = (ttl_hours if ttl_hours is not None else
+                            float(os.getenv("ANSWER_CACHE_TTL_HOURS", str(DEFAULT_TTL_HOURS)))) * 3600
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._positions: Dict[str, _PositionEntries] = {}
+        # Состояние файла ответов: ((mtime_ns, размер), хеш содержимого)
+        self._source_stat: Optional[Tuple[int, int]] = None
+        self._source_hash: Optional[str] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Одно соединение на кэш; запросы из разных потоков выполняются под блокировкой
+        if self._connection is None:
+            os.makedirs(self.cache_path, exist_ok=True)
+            connection = sqlite3.connect(os.path.join(self.cache_path, ANSWER_CACHE_DB), check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _current_source(self) -> str:
+        """Хеш файла ответов; файл перечитывается только при изменении времени модификации или размера."""
+        try:
+            stat = os.stat(self.source_file)
+            key = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            key = (0, 0)
+        if key != self._source_stat:
+            source_hash = file_hash(self.source_file)
+            if self._source_hash is not None and source_hash != self._source_hash:
+                logger.info("Файл ответов HR изменен, кэш ответов на вопросы кандидатов сброшен")
+            if source_hash != self._source_hash:
+                self._positions.clear()
+                self._connect().execute('DELETE FROM answers WHERE source_hash != ?', (source_hash,))
+                self._connect().commit()
+            self._source_stat, self._source_hash = key, source_hash
+        return self._source_hash
+
+    def _entries(self, position: str) -> _PositionEntries:
+        """Записи позиции (загружаются из базы при первом обращении)."""
+        import numpy as np
+
+        source_hash = self._current_source()
+        key = position_key(position)
+        entries = self._positions.get(key)
+        if entries is None:
+            entries = _PositionEntries()
+            expired = time.time() - self.ttl_seconds
+            self._connect().execute('DELETE FROM answers WHERE position = ? AND created < ?', (key, expired))
+            self._connect().commit()
+            rows = self._connect().execute(
+                'SELECT id, normalized, answer, created, embedding FROM answers '
+                'WHERE position = ? AND source_hash = ? AND created >= ? ORDER BY created',
+                (key, source_hash, expired)).fetchall()
+            for entry_id, normalized, answer, created, embedding in rows:
+                vector = np.frombuffer(embedding, dtype=np.float32) if embedding is not None else None
+                entries.add(entry_id, normalized, answer, created, vector)
+            self._positions[key] = entries
+        return entries
+
+    def _hit(self, entries: _PositionEntries, row: int) -> str:
+        self.hits += 1
+        self._connect().execute('UPDATE answers SET hits = hits + 1 WHERE id = ?', (entries.ids[row],))
+        self._connect().commit()
+        return entries.answers[row]
+
+    def _fresh(self, entries: _PositionEntries, row: int) -> bool:
+        return entries.created[row] >= time.time() - self.ttl_seconds
+
+    @staticmethod
+    def _normalized_vector(embedding: Sequence[float]):
+        import numpy as np
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def get(self, position: str, question: str) -> Optional[str]:
+        """
+        Ищет ответ на вопрос с тем же текстом (после нормализации).
+
+        Args:
+            position: Позиция кандидата
+            question: Вопрос кандидата
+
+        Returns:
+            Сохраненный ответ или None
+        """
+        try:
+            with self._lock:
+                entries = self._entries(position)
+                row = entries.normalized.get(normalize_question(question))
+                if row is not None and self._fresh(entries, row):
+                    logger.info(f"Ответ на вопрос кандидата взят из кэша (совпадение текста): {question}")
+                    return self._hit(entries, row)
+                self.misses += 1
+        except Exception as e:
+            error_msg = f"Ошибка при чтении кэша ответов: {str(e)}"
+            logger.error(error_msg)
+        return None
+
+    def search(self, position: str, embedding: Sequence[float]) -> Optional[str]:
+        """
+        Ищет ответ на самый похожий сохраненный вопрос позиции.
+
+        Args:
+            position: Позиция кандидата
+            embedding: Эмбеддинг вопроса кандидата
+
+        Returns:
+            Сохраненный ответ, если сходство не ниже порога, иначе None
+        """
+        try:
+            with self._lock:
+                entries = self._entries(position)
+                matrix = entries.matrix()
+                query = self._normalized_vector(embedding)
+                if matrix is not None and query is not None and matrix.shape[1] == query.shape[0]:
+                    scores = matrix @ query
+                    best = int(scores.argmax())
+                    row = entries.vector_rows[best]
+                    if scores[best] >= self.threshold and self._fresh(entries, row):
+                        logger.info(f"Ответ на вопрос кандидата взят из кэша (сходство {scores[best]:.3f})")
+                        return self._hit(entries, row)
+                self.misses += 1
+        except Exception as e:
+            error_msg = f"Ошибка при поиске в кэше ответов: {str(e)}"
+            logger.error(error_msg)
+        return None
+
+    def put(self, position: str, question: str, answer: str, embedding: Optional[Sequence[float]] = None):
+        """
+        Сохраняет ответ на вопрос кандидата.
+
+        Args:
+            position: Позиция кандидата
+            question: Вопрос кандидата
+            answer: Ответ рекрутера
+            embedding: Эмбеддинг вопроса (без него ответ находится только по точному тексту)
+        """
+        try:
+            with self._lock:
+                entries = self._entries(position)
+                vector = self._normalized_vector(embedding) if embedding is not None else None
+                matrix = entries.matrix()
+                if vector is not None and matrix is not None and matrix.shape[1] != vector.shape[0]:
+                    # Сменилась модель эмбеддингов: прежние векторы позиции несравнимы с новыми
+                    self._delete_position(position)
+                    entries = self._entries(position)
+
+                key = position_key(position)
+                created = time.time()
+                connection = self._connect()
+                cursor = connection.execute(
+                    'INSERT INTO answers (position, question, normalized, answer, embedding, source_hash, created) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (key, question, normalize_question(question), answer,
+                     vector.tobytes() if vector is not None else None, self._source_hash, created))
+                entries.add(cursor.lastrowid, normalize_question(question), answer, created, vector)
+
+                if len(entries.ids) > self.max_entries:
+                    connection.execute(
+                        'DELETE FROM answers WHERE position = ? AND id NOT IN '
+                        '(SELECT id FROM answers WHERE position = ? ORDER BY created DESC LIMIT ?)',
+                        (key, key, self.max_entries))
+                    del self._positions[key]
+                connection.commit()
+        except Exception as e:
+            error_msg = f"Ошибка при сохранении ответа в кэш: {str(e)}"
+            logger.error(error_msg)
+
+    def _delete_position(self, position: str):
+        key = position_key(position)
+        self._connect().execute('DELETE FROM answers WHERE position = ?', (key,))
+        self._positions.pop(key, None)
+
+    def clear(self, position: Optional[str] = None):
+        """
+        Удаляет записи кэша.
+
+        Args:
+            position: Позиция, записи которой удаляются (по умолчанию все записи)
+        """
+        with self._lock:
+            if position is None:
+                self._connect().execute('DELETE FROM answers')
+                self._positions.clear()
+            else:
+                self._delete_position(position)
+            self._connect().commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Возвращает статистику кэша.
+
+        Returns:
+            Словарь с количеством записей по позициям, попаданий и промахов
+            (учитываются обе проверки: по тексту в get и по сходству в search)
+        """
+        with self._lock:
+            self._current_source()
+            rows = self._connect().execute(
+                'SELECT position, COUNT(*), SUM(hits) FROM answers WHERE created >= ? GROUP BY position',
+                (time.time() - self.ttl_seconds,)).fetchall()
+        return {
+            'positions': {position: {'entries': count, 'hits': hits or 0} for position, count, hits in rows},
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -3,23 +3,24 @@ import os
 import logging
 import re
 from typing import Dict, Any, List, Optional
-from datetime import datetime
 
-from hr_utils.api_utils import generate_answer
+from hr_utils.api_utils import generate_answer_async
+from hr_utils.metrics import span
+from interview.channels import run_sync
+from interview.report_store import ReportStore
 
 logger = logging.getLogger('hr_system')
 
-def define_key_requirements(vacancy: str, candidate_position: str, model: str = 'gpt-4o') -> str:
+def _key_requirements_prompts(vacancy: str, candidate_position: str):
     """
-    Определяет ключевые требования к кандидату на основе вакансии.
+    Формирует промпты для определения ключевых требований.
     
     Args:
         vacancy: Текст вакансии
         candidate_position: Позиция кандидата
-        model: Модель для генерации (по умолчанию 'gpt-4o')
         
     Returns:
-        Текст с ключевыми требованиями
+        Кортеж (системный промпт, пользовательский промпт)
     """
     # Системный промпт для генерации требований
     system_key_requirements = f"""
@@ -48,37 +49,69 @@ def define_key_requirements(vacancy: str, candidate_position: str, model: str =
     7. Для управленческих позиций выдели требования к опыту руководства и коммуникативным навыкам
     """
 
-    try:
-        # Генерация ключевых требований
-        key_requirements = generate_answer(
+    return system_key_requirements, defining_key_requirements
+
+def define_key_requirements(vacancy: str, candidate_position: str, model: str = 'gpt-4o') -> str:
+    """
+    Определяет ключевые требования к кандидату на основе вакансии.
+    
+    Args:
+        vacancy: Текст вакансии
+        candidate_position: Позиция кандидата
+        model: Модель для генерации (по умолчанию 'gpt-4o')
+        
+    Returns:
+        Текст с ключевыми требованиями
+        
+    Raises:
+        BudgetExceededError: Если запрос превысил бы бюджет сессии или задания
+        ModelCallError: Если модель не ответила после всех повторов
+    """
+    return run_sync(define_key_requirements_async(vacancy, candidate_position, model=model))
+
+async def define_key_requirements_async(vacancy: str, candidate_position: str, model: str = 'gpt-4o') -> str:
+    """
+    Асинхронно определяет ключевые требования к кандидату на основе вакансии.
+    
+    Args:
+        vacancy: Текст вакансии
+        candidate_position: Позиция кандидата
+        model: Модель для генерации (по умолчанию 'gpt-4o')
+        
+    Returns:
+        Текст с ключевыми требованиями
+        
+    Raises:
+        BudgetExceededError: Если запрос превысил бы бюджет сессии или задания
+        ModelCallError: Если модель не ответила после всех повторов
+    """
+    system_key_requirements, defining_key_requirements = _key_requirements_prompts(vacancy, candidate_position)
+
+    # Генерация ключевых требований
+    with span('llm.key_requirements'):
+        key_requirements = await generate_answer_async(
             system_key_requirements,
             defining_key_requirements,
             model=model
         )
-        
-        logger.info(f"Сгенерированы ключевые требования для позиции {candidate_position}")
-        return key_requirements
-    except Exception as e:
-        error_msg = f"Ошибка при генерации ключевых требований: {str(e)}"
-        logger.error(error_msg)
-        return "Не удалось сгенерировать ключевые требования."
+    
+    logger.info(f"Сгенерированы ключевые требования для позиции {candidate_position}")
+    return key_requirements
 
-def generate_final_assessment(interview_summary: str, vacancy: str, key_requirements: str, 
-                             candidate_position: str, company_name: str = "компания", 
-                             model: str = 'gpt-4o') -> str:
+def _final_assessment_prompts(interview_summary: str, vacancy: str, key_requirements: str,
+                              candidate_position: str, company_name: str):
     """
-    Генерирует итоговую оценку кандидата на основе собеседования.
+    Формирует промпты для итоговой оценки кандидата.
     
     Args:
         interview_summary: Полный текст собеседования
         vacancy: Текст вакансии
         key_requirements: Ключевые требования к кандидату
         candidate_position: Позиция кандидата
-        company_name: Название компании (по умолчанию "компания")
-        model: Модель для генерации (по умолчанию 'gpt-4o')
+        company_name: Название компании
         
     Returns:
-        Текст с итоговой оценкой кандидата
+        Кортеж (системный промпт, пользовательский промпт)
     """
     # Системный промпт для анализа
     prompt_analysis = f"""
@@ -138,26 +171,73 @@ def generate_final_assessment(interview_summary: str, vacancy: str, key_requirem
     6. **Итоговая рекомендация**: Рекомендовать к найму / Рассмотреть после дополнительного собеседования / Отклонить
     """
 
-    try:
-        # Генерация итогового заключения
-        analysis = generate_answer(
+    return prompt_analysis, query_analysis
+
+def generate_final_assessment(interview_summary: str, vacancy: str, key_requirements: str, 
+                             candidate_position: str, company_name: str = "компания", 
+                             model: str = 'gpt-4o') -> str:
+    """
+    Генерирует итоговую оценку кандидата на основе собеседования.
+    
+    Args:
+        interview_summary: Полный текст собеседования
+        vacancy: Текст вакансии
+        key_requirements: Ключевые требования к кандидату
+        candidate_position: Позиция кандидата
+        company_name: Название компании (по умолчанию "компания")
+        model: Модель для генерации (по умолчанию 'gpt-4o')
+        
+    Returns:
+        Текст с итоговой оценкой кандидата
+        
+    Raises:
+        BudgetExceededError: Если запрос превысил бы бюджет сессии или задания
+        ModelCallError: Если модель не ответила после всех повторов
+    """
+    return run_sync(generate_final_assessment_async(interview_summary, vacancy, key_requirements,
+                                                     candidate_position, company_name, model=model))
+
+async def generate_final_assessment_async(interview_summary: str, vacancy: str, key_requirements: str,
+                                         candidate_position: str, company_name: str = "компания",
+                                         model: str = 'gpt-4o') -> str:
+    """
+    Асинхронно генерирует итоговую оценку кандидата на основе собеседования.
+    
+    Args:
+        interview_summary: Полный текст собеседования
+        vacancy: Текст вакансии
+        key_requirements: Ключевые требования к кандидату
+        candidate_position: Позиция кандидата
+        company_name: Название компании (по умолчанию "компания")
+        model: Модель для генерации (по умолчанию 'gpt-4o')
+        
+    Returns:
+        Текст с итоговой оценкой кандидата
+        
+    Raises:
+        BudgetExceededError: Если запрос превысил бы бюджет сессии или задания
+        ModelCallError: Если модель не ответила после всех повторов
+    """
+    prompt_analysis, query_analysis = _final_assessment_prompts(
+        interview_summary, vacancy, key_requirements, candidate_position, company_name)
+
+    # Генерация итогового заключения
+    with span('llm.final_assessment'):
+        analysis = await generate_answer_async(
             prompt_analysis,
             query_analysis,
             model=model
         )
-        
-        logger.info(f"Сгенерирована итоговая оценка кандидата на позицию {candidate_position}")
-        return analysis
-    except Exception as e:
-        error_msg = f"Ошибка при генерации итоговой оценки: {str(e)}"
-        logger.error(error_msg)
-        return f"Не удалось сгенерировать итоговую оценку кандидата: {str(e)}"
+    
+    logger.info(f"Сгенерирована итоговая оценка кандидата на позицию {candidate_position}")
+    return analysis
 
 def save_assessment_report(assessment: str, candidate_position: str, resume_id: str = None, 
                           company_name: str = "компания", resume_source: str = None,
-                          output_dir: str = "./data") -> str:
+                          output_dir: str = "./data", report_id: str = None, vacancy_id: str = None,
+                          session_id: str = None, report_store: ReportStore = None) -> str:
     """
-    Сохраняет отчет об оценке кандидата в файл.
+    Сохраняет отчет об оценке кандидата в хранилище отчетов.
     
     Args:
         assessment: Текст оценки кандидата
@@ -165,42 +245,25 @@ def save_assessment_report(assessment: str, candidate_position: str, resume_id:
         resume_id: Идентификатор резюме (если доступен)
         company_name: Название компании
         resume_source: Источник резюме
-        output_dir: Директория для сохранения файла
+        output_dir: Директория данных (если хранилище не передано, отчеты сохраняются в <output_dir>/reports)
+        report_id: Идентификатор отчета (по умолчанию формируется уникальный)
+        vacancy_id: Идентификатор вакансии
+        session_id: Идентификатор сессии собеседования
+        report_store: Хранилище отчетов
         
     Returns:
         Путь к созданному файлу отчета
     """
     try:
-        # Формируем имя файла с текущей датой и временем
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"assessment_{timestamp}.txt"
-        filepath = os.path.join(output_dir, filename)
-        
-        # Создаем директорию, если она не существует
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Формируем содержимое отчета
-        report_content = f"ИТОГОВОЕ ЗАКЛЮЧЕНИЕ О КАНДИДАТЕ\n"
-        report_content += f"{'=' * 50}\n\n"
-        report_content += f"Кандидат на позицию: {candidate_position}\n"
-        report_content += f"Компания: {company_name}\n"
-        
-        if resume_source:
-            report_content += f"Источник резюме: {resume_source}\n"
-        
-        if resume_id:
-            report_content += f"ID резюме: {resume_id}\n"
-            
-        report_content += f"Дата и время: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-        report_content += f"{'=' * 50}\n\n"
-        report_content += assessment
-        
-        # Записываем отчет в файл
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(report_content)
-        
-        logger.info(f"Отчет об оценке кандидата сохранен в файл: {filepath}")
-        return filepath
+        store = report_store or ReportStore(os.path.join(output_dir, 'reports'))
+        try:
+            record = store.save(assessment, candidate_position, resume_id=resume_id, vacancy_id=vacancy_id,
+                                company=company_name, source=resume_source, session_id=session_id,
+                                report_id=report_id)
+        finally:
+            if report_store is None:
+                store.close()
+        return record['file']
     except Exception as e:
         error_msg = f"Ошибка при сохранении отчета: {str(e)}"
         logger.error(error_msg)
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Пакетная оценка сохраненных стенограмм собеседований.
+
+Используется для повторной генерации оценок (например, после изменения
+критериев в generate_final_assessment) без повторного проведения
+собеседований. Стенограммы оцениваются параллельно с ограничением числа
+одновременных запросов к модели; ключевые требования определяются один раз
+на вакансию. Состояние пакета сохраняется в файл после каждой стенограммы,
+поэтому повторный запуск с той же выходной директорией продолжает работу
+с необработанных и неудачных стенограмм.
+"""
+import os
+import json
+import asyncio
+import logging
+import functools
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable
+
+from hr_utils.usage_ledger import BudgetExceededError
+from hr_utils.file_utils import create_temp_file
+from interview.assessment import define_key_requirements_async, generate_final_assessment_async, save_assessment_report
+from interview.report_store import ReportStore
+
+logger = logging.getLogger('hr_system')
+
+# Имя файла состояния пакета в выходной директории
+BATCH_STATE_FILE = 'batch_state.json'
+
+
+def collect_transcripts(transcripts_dir: str, vacancy_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Собирает стенограммы собеседований из директории.
+
+    Поддерживаются контрольные точки сессий (*.json, см. interview.checkpoint),
+    из которых берутся текст собеседования, ID резюме и ID вакансии, и текстовые
+    стенограммы (*.txt), для которых ID вакансии задается параметром vacancy_id.
+
+    Args:
+        transcripts_dir: Директория со стенограммами
+        vacancy_id: ID вакансии для стенограмм, в которых он не указан
+
+    Returns:
+        Список стенограмм (transcript_id, resume_id, vacancy_id, text, session_id)
+    """
+    transcripts = []
+    if not os.path.isdir(transcripts_dir):
+        logger.error(f"Директория {transcripts_dir} не существует")
+        return transcripts
+
+    for filename in sorted(os.listdir(transcripts_dir)):
+        path = os.path.join(transcripts_dir, filename)
+        transcript_id, extension = os.path.splitext(filename)
+        try:
+            if extension == '.json':
+                with open(path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                text = state.get('full_interview') or state.get('interview_summary')
+                transcript = {'transcript_id': transcript_id, 'resume_id': state.get('resume_id'),
+                              'vacancy_id': state.get('vacancy_id') or vacancy_id, 'text': text,
+                              'session_id': state.get('session_id')}
+            elif extension == '.txt':
+                with open(path, 'r', encoding='utf-8') as f:
+                    text = f.read()
+                transcript = {'transcript_id': transcript_id, 'resume_id': None,
+                              'vacancy_id': vacancy_id, 'text': text, 'session_id': None}
+            else:
+                continue
+        except Exception as e:
+            error_msg = f"Ошибка при чтении стенограммы {filename}: {str(e)}"
+            logger.error(error_msg)
+            continue
+
+        if not transcript['text'] or not transcript['vacancy_id']:
+            logger.warning(f"Стенограмма {filename} пропущена: нет текста собеседования или ID вакансии")
+            continue
+        transcripts.append(transcript)
+
+    return transcripts
+
+
+def load_batch_state(output_dir: str) -> Dict[str, Any]:
+    """
+    Загружает состояние пакета из выходной директории.
+
+    Args:
+        output_dir: Выходная директория пакета
+
+    Returns:
+        Словарь {transcript_id: {'status', 'report_id', 'assessment_file', 'error'}}
+    """
+    state_file = os.path.join(output_dir, BATCH_STATE_FILE)
+    if not os.path.exists(state_file):
+        return {}
+    with open(state_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_batch_state(output_dir: str, state: Dict[str, Any]):
+    """
+    Атомарно сохраняет состояние пакета в выходную директорию.
+
+    Args:
+        output_dir: Выходная директория пакета
+        state: Состояние пакета
+    """
+    fd, tmp_path = create_temp_file(output_dir, prefix='.batch_', suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(output_dir, BATCH_STATE_FILE))
+
+
+async def assess_transcripts(transcripts: List[Dict[str, Any]], load_vacancy: Callable[[str], Optional[Dict[str, Any]]],
+                             output_dir: str, concurrency: int = 8, model: str = 'gpt-4o',
+                             report_store: Optional[ReportStore] = None) -> Dict[str, int]:
+    """
+    Оценивает стенограммы собеседований с ограниченным параллелизмом.
+
+    Args:
+        transcripts: Стенограммы (см. collect_transcripts)
+        load_vacancy: Функция загрузки данных вакансии по ID (выполняется в пуле потоков)
+        output_dir: Директория для отчетов и файла состояния пакета
+        concurrency: Максимальное число одновременно оцениваемых стенограмм
+        model: Модель для генерации
+        report_store: Хранилище отчетов (по умолчанию <output_dir>/reports)
+
+    Returns:
+        Счетчики стенограмм: done, skipped, failed
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    state = load_batch_state(output_dir)
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    vacancies: Dict[str, asyncio.Future] = {}
+    counters = {'done': 0, 'skipped': 0, 'failed': 0}
+    budget_exceeded = asyncio.Event()
+
+    pending = [t for t in transcripts if state.get(t['transcript_id'], {}).get('status') != 'done']
+    counters['skipped'] = len(transcripts) - len(pending)
+    if counters['skipped']:
+        print(f"Пропущено уже оцененных стенограмм: {counters['skipped']}")
+
+    async def prepare_vacancy(vacancy_id: str) -> Dict[str, Any]:
+        # Ключевые требования не зависят от кандидата и запрашиваются один раз на вакансию
+        vacancy_data = await loop.run_in_executor(None, load_vacancy, vacancy_id)
+        if not vacancy_data:
+            raise ValueError(f"Не удалось загрузить вакансию {vacancy_id}")
+        position = vacancy_data.get('position', 'Специалист')
+        async with semaphore:
+            key_requirements = await define_key_requirements_async(vacancy_data.get('vacancy', ''), position,
+                                                                   model=model)
+        return {'data': vacancy_data, 'key_requirements': key_requirements}
+
+    async def assess(transcript: Dict[str, Any]):
+        transcript_id = transcript['transcript_id']
+        if budget_exceeded.is_set():
+            return
+        # Отчет пакета не заменяет отчет собеседования с тем же ID сессии: идентификатор отчета
+        # уникален и хранится в состоянии пакета, поэтому повторная попытка перезаписывает тот же отчет
+        report_id = state.get(transcript_id, {}).get('report_id') or ReportStore.new_report_id()
+        try:
+            vacancy_id = transcript['vacancy_id']
+            if vacancy_id not in vacancies:
+                vacancies[vacancy_id] = asyncio.ensure_future(prepare_vacancy(vacancy_id))
+            vacancy = await vacancies[vacancy_id]
+            vacancy_data = vacancy['data']
+            position = vacancy_data.get('position', 'Специалист')
+            company_name = vacancy_data.get('company', 'компания')
+
+            async with semaphore:
+                assessment = await generate_final_assessment_async(
+                    transcript['text'],
+                    vacancy_data.get('vacancy', ''),
+                    vacancy['key_requirements'],
+                    position,
+                    company_name,
+                    model=model
+                )
+
+            assessment_file = await loop.run_in_executor(
+                None, functools.partial(save_assessment_report, assessment, position, transcript['resume_id'],
+                                        company_name, 'Пакетная оценка', output_dir,
+                                        report_id=report_id, vacancy_id=vacancy_id,
+                                        session_id=transcript.get('session_id'), report_store=report_store))
+            if assessment_file is None:
+                raise RuntimeError("Не удалось сохранить отчет")
+
+            state[transcript_id] = {'status': 'done', 'report_id': report_id, 'assessment_file': assessment_file,
+                                    'error': None}
+            counters['done'] += 1
+            print(f"[{counters['done'] + counters['failed']}/{len(pending)}] {transcript_id}: {assessment_file}")
+        except BudgetExceededError as e:
+            budget_exceeded.set()
+            state[transcript_id] = {'status': 'failed', 'report_id': report_id, 'assessment_file': None,
+                                    'error': str(e)}
+            counters['failed'] += 1
+        except Exception as e:
+            error_msg = f"Ошибка при оценке стенограммы {transcript_id}: {str(e)}"
+            logger.error(error_msg)
+            state[transcript_id] = {'status': 'failed', 'report_id': report_id, 'assessment_file': None,
+                                    'error': str(e)}
+            counters['failed'] += 1
+            print(f"[{counters['done'] + counters['failed']}/{len(pending)}] {error_msg}")
+        state[transcript_id]['updated'] = datetime.now().isoformat(timespec='seconds')
+        save_batch_state(output_dir, state)
+
+    await asyncio.gather(*(assess(transcript) for transcript in pending))
+
+    if budget_exceeded.is_set():
+        print("Пакетная оценка остановлена: превышен бюджет задания")
+    return counters
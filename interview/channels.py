@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Транспорты (каналы ввода-вывода) для сессий собеседования.
+
+Сессия собеседования общается с кандидатом только через канал: отправляет
+реплики рекрутера и ожидает ответы кандидата. Это позволяет проводить
+собеседование в консоли/ноутбуке, через WebSocket/HTTP или по сценарию в
+тестах, а также запускать сотни сессий в одном цикле событий.
+"""
+import asyncio
+import logging
+import threading
+import contextvars
+from typing import List, Dict, Any, Optional, Iterable
+
+from hr_utils.audio_utils import google_tts, play_audio
+
+logger = logging.getLogger('hr_system')
+
+
+class ChannelClosedError(Exception):
+    """Канал закрыт: кандидат отключился или ответы сценария закончились."""
+
+
+class InterviewChannel:
+    """Базовый класс канала собеседования."""
+
+    async def send(self, text: str, speech: Optional[str] = None):
+        """
+        Отправляет реплику рекрутера кандидату.
+
+        Args:
+            text: Текст реплики
+            speech: Текст для озвучивания (если None, реплика не озвучивается)
+        """
+        raise NotImplementedError
+
+    async def receive(self, prompt: str = "Кандидат: ") -> str:
+        """
+        Ожидает ответ кандидата.
+
+        Args:
+            prompt: Приглашение к вводу
+
+        Returns:
+            Текст ответа кандидата
+
+        Raises:
+            ChannelClosedError: Если канал закрыт
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        """Закрывает канал."""
+
+
+class ConsoleChannel(InterviewChannel):
+    """Канал для консоли и Jupyter Notebook/Colab: print(), input() и озвучивание через gTTS."""
+
+    def __init__(self, speak: bool = True):
+        """
+        Инициализация консольного канала.
+
+        Args:
+            speak: Озвучивать ли реплики рекрутера
+        """
+        self.speak = speak
+
+    async def send(self, text: str, speech: Optional[str] = None):
+        if speech and self.speak:
+            loop = asyncio.get_running_loop()
+            audio_file = await loop.run_in_executor(None, google_tts, speech)
+            if audio_file:
+                play_audio(audio_file)
+                await asyncio.sleep(1)  # Пауза для корректного отображения
+        print(text, '\n')
+
+    async def receive(self, prompt: str = "Кандидат: ") -> str:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, input, prompt)
+        except EOFError:
+            raise ChannelClosedError("Ввод закрыт")
+
+
+class ScriptedChannel(InterviewChannel):
+    """Канал с заранее заданными ответами кандидата (для тестов и пакетных прогонов)."""
+
+    def __init__(self, answers: Iterable[str]):
+        """
+        Инициализация канала по сценарию.
+
+        Args:
+            answers: Последовательность ответов кандидата
+        """
+        self._answers = list(answers)
+        self.sent: List[str] = []
+        self.received: List[str] = []
+
+    async def send(self, text: str, speech: Optional[str] = None):
+        self.sent.append(text)
+
+    async def receive(self, prompt: str = "Кандидат: ") -> str:
+        if not self._answers:
+            raise ChannelClosedError("Ответы сценария закончились")
+        answer = self._answers.pop(0)
+        self.received.append(answer)
+        return answer
+
+
+class QueueChannel(InterviewChannel):
+    """
+    Канал на очередях asyncio для сетевых транспортов (WebSocket, HTTP long-polling).
+
+    Исходящие сообщения складываются в очередь outbox, ответы кандидата
+    передаются транспортом через feed().
+    """
+
+    def __init__(self):
+        self.outbox: asyncio.Queue = asyncio.Queue()
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.closed = False
+        self.awaiting_reply = False
+
+    async def send(self, text: str, speech: Optional[str] = None):
+        await self.outbox.put({'type': 'message', 'text': text})
+
+    async def receive(self, prompt: str = "Кандидат: ") -> str:
+        if self.closed:
+            raise ChannelClosedError("Канал закрыт")
+        await self.outbox.put({'type': 'prompt', 'text': prompt})
+        self.awaiting_reply = True
+        try:
+            answer = await self.inbox.get()
+        finally:
+            self.awaiting_reply = False
+        if answer is None:
+            raise ChannelClosedError("Кандидат отключился")
+        return answer
+
+    def feed(self, text: Optional[str]):
+        """
+        Передает ответ кандидата в сессию (None - отключение кандидата).
+
+        Args:
+            text: Текст ответа
+        """
+        self.inbox.put_nowait(text)
+
+    async def next_messages(self, timeout: float = 30.0) -> List[Dict[str, Any]]:
+        """
+        Ожидает исходящие сообщения (long-polling) и возвращает все накопленные.
+
+        Args:
+            timeout: Максимальное время ожидания первого сообщения в секундах
+
+        Returns:
+            Список сообщений (пустой, если за время ожидания сообщений не было)
+        """
+        messages = []
+        try:
+            messages.append(await asyncio.wait_for(self.outbox.get(), timeout))
+        except asyncio.TimeoutError:
+            return messages
+        while not self.outbox.empty():
+            messages.append(self.outbox.get_nowait())
+        return messages
+
+    async def close(self):
+        if not self.closed:
+            self.closed = True
+            await self.outbox.put({'type': 'closed', 'text': ''})
+
+
+def run_sync(coroutine):
+    """
+    Выполняет корутину из синхронного кода.
+
+    Если в текущем потоке уже работает цикл событий (например, в Jupyter),
+    корутина выполняется в отдельном потоке со своим циклом и копией
+    контекста (сессия учета расходов, текущий этап трассировки).
+
+    Args:
+        coroutine: Корутина для выполнения
+
+    Returns:
+        Результат корутины
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    result: Dict[str, Any] = {}
+
+    def runner():
+        try:
+            result['value'] = asyncio.run(coroutine)
+        except BaseException as e:
+            result['error'] = e
+
+    context = contextvars.copy_context()
+    thread = threading.Thread(target=context.run, args=(runner,), name='hr-interview')
+    thread.start()
+    thread.join()
+    if 'error' in result:
+        raise result['error']
+    return result.get('value')
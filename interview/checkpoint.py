@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Контрольные точки сессий собеседования.
+
+Состояние сессии (история диалога, дополнительные вопросы, ключевые
+требования, оценка) сохраняется в data/sessions/<session_id>.json после
+каждого ответа кандидата и каждого завершенного этапа. Прерванное
+собеседование продолжается с последнего незавершенного этапа без
+повторных запросов к модели.
+"""
+import os
+import json
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from hr_utils.file_utils import create_temp_file
+
+logger = logging.getLogger('hr_system')
+
+
+class CheckpointStore:
+    """Хранилище контрольных точек сессий собеседования."""
+
+    def __init__(self, sessions_path: str):
+        """
+        Инициализация хранилища контрольных точек.
+
+        Args:
+            sessions_path: Директория для файлов сессий
+        """
+        self.sessions_path = sessions_path
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.sessions_path, f"{session_id}.json")
+
+    def save(self, state: Dict[str, Any]):
+        """
+        Сохраняет состояние сессии.
+
+        Файл записывается во временный файл и заменяет предыдущую контрольную
+        точку атомарно, поэтому сбой во время записи не портит сохраненное состояние.
+
+        Args:
+            state: Состояние сессии (должно содержать session_id)
+        """
+        os.makedirs(self.sessions_path, exist_ok=True)
+        state['updated'] = datetime.now().isoformat(timespec='seconds')
+
+        fd, tmp_path = create_temp_file(self.sessions_path, prefix='.session_', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(state['session_id']))
+        except Exception as e:
+            error_msg = f"Ошибка при сохранении контрольной точки {state['session_id']}: {str(e)}"
+            logger.error(error_msg)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Загружает состояние сессии.
+
+        Args:
+            session_id: Идентификатор сессии
+
+        Returns:
+            Состояние сессии или None, если контрольная точка не найдена
+        """
+        path = self._path(session_id)
+        if not os.path.exists(path):
+            logger.warning(f"Контрольная точка {path} не существует")
+            return None
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            error_msg = f"Ошибка при загрузке контрольной точки {session_id}: {str(e)}"
+            logger.error(error_msg)
+            return None
+
+    def list_sessions(self, unfinished_only: bool = False) -> List[Dict[str, Any]]:
+        """
+        Возвращает краткие сведения о сохраненных сессиях.
+
+        Args:
+            unfinished_only: Возвращать только незавершенные сессии
+
+        Returns:
+            Список словарей (session_id, resume_id, vacancy_id, stage, status, updated), новые сессии первыми
+        """
+        if not os.path.isdir(self.sessions_path):
+            return []
+
+        sessions = []
+        for filename in os.listdir(self.sessions_path):
+            if not filename.endswith('.json'):
+                continue
+            state = self.load(filename[:-len('.json')])
+            if not state or (unfinished_only and state.get('status') == 'done'):
+                continue
+            sessions.append({field: state.get(field) for field in
+                             ('session_id', 'resume_id', 'vacancy_id', 'stage', 'status', 'updated')})
+        return sorted(sessions, key=lambda session: session['updated'] or '', reverse=True)
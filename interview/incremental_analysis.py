@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Инкрементальный анализ ответов кандидата.
+
+Вместо одного запроса с полной стенограммой после последнего ответа
+анализ обновляется в фоне после каждого ответа: модель получает краткие
+заметки по предыдущим ответам и новые пары "вопрос - ответ" и возвращает
+обновленные заметки и черновик дополнительных вопросов. Пока кандидат
+отвечает на следующий вопрос, обновление уже выполняется, поэтому
+дополнительные вопросы готовы практически сразу после последнего ответа.
+"""
+import asyncio
+import logging
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+from hr_utils.api_utils import generate_answer_async
+from hr_utils.metrics import span
+from hr_utils.usage_ledger import BudgetExceededError
+from interview.question_generator import _parse_questions
+
+logger = logging.getLogger('hr_system')
+
+# Разделитель разделов в ответе модели
+NOTES_HEADER = 'ЗАМЕТКИ:'
+QUESTIONS_HEADER = 'ВОПРОСЫ:'
+
+
+def _incremental_prompts(candidate_position: str, requirements: str, notes: str,
+                         new_answers: List[Tuple[str, str]], resume: Optional[str] = None):
+    """
+    Формирует промпты для обновления анализа.
+
+    Args:
+        candidate_position: Позиция кандидата
+        requirements: Ключевые требования (или текст вакансии)
+        notes: Заметки по предыдущим ответам
+        new_answers: Новые пары (вопрос, ответ)
+        resume: Текст резюме (передается только при первом обновлении)
+
+    Returns:
+        Кортеж (системный промпт, пользовательский промпт)
+    """
+    prompt_system = f"""
+    Ты опытный HR-специалист, который ведет собеседование на позицию {candidate_position} и по ходу
+    разговора делает краткие заметки: заявленные навыки и опыт, подтвержденные примерами факты,
+    пробелы относительно требований вакансии, противоречия и места, где кандидат хвалит себя без конкретики.
+    По заметкам ты готовишь 10 дополнительных вопросов о реальном опыте и конкретных ситуациях.
+    """
+
+    answers_text = "\n\n".join(f"{question}\nКандидат: {answer}" for question, answer in new_answers)
+    resume_text = f"\n    ## Резюме кандидата:\n    {resume}\n" if resume else ""
+
+    prompt_user = f"""
+    ## Требования вакансии:
+    {requirements}
+    {resume_text}
+    ## Текущие заметки:
+    {notes or 'Заметок пока нет.'}
+
+    ## Новые ответы кандидата:
+    {answers_text}
+
+    # Задача:
+    1. Обнови заметки с учетом новых ответов (не более 15 кратких пунктов, сохраняй важное из прежних заметок)
+    2. Сформулируй 10 дополнительных вопросов по всем заметкам: пробелы в навыках, проверка согласованности
+       ответов, 2-3 неудобных вопроса о слабых сторонах, мотивация и командная работа
+
+    # Формат вывода:
+    {NOTES_HEADER}
+    - пункт
+    {QUESTIONS_HEADER}
+    1. вопрос
+    """
+
+    return prompt_system, prompt_user
+
+
+class IncrementalAnalyzer:
+    """Фоновый анализ ответов кандидата с черновиком дополнительных вопросов."""
+
+    def __init__(self, candidate_position: str, requirements: str, resume: str,
+                 model: str = 'gpt-4o', on_update: Optional[Callable[['IncrementalAnalyzer'], Any]] = None):
+        """
+        Инициализация анализатора.
+
+        Args:
+            candidate_position: Позиция кандидата
+            requirements: Ключевые требования к кандидату (или текст вакансии)
+            resume: Текст резюме кандидата
+            model: Модель для обновления анализа (по умолчанию 'gpt-4o')
+            on_update: Функция, вызываемая после каждого успешного обновления
+        """
+        self.candidate_position = candidate_position
+        self.requirements = requirements
+        self.resume = resume
+        self.model = model
+        self.on_update = on_update
+        self.notes = ''
+        self.draft_questions: List[str] = []
+        self.analyzed = 0
+        self._pending: List[Tuple[str, str]] = []
+        self._worker: Optional[asyncio.Task] = None
+        self._disabled = False
+
+    def restore(self, notes: str, draft_questions: List[str], analyzed: int, answers: List[Tuple[str, str]]):
+        """
+        Восстанавливает анализ из контрольной точки и ставит непроанализированные ответы в очередь.
+
+        Args:
+            notes: Сохраненные заметки
+            draft_questions: Сохраненный черновик вопросов
+            analyzed: Количество ответов, учтенных в заметках
+            answers: Все полученные ответы (вопрос, ответ)
+        """
+        self.notes = notes
+        self.draft_questions = list(draft_questions)
+        self.analyzed = analyzed
+        self._pending = list(answers[analyzed:])
+
+    def on_answer(self, question: str, answer: str):
+        """
+        Добавляет ответ кандидата и запускает фоновое обновление анализа.
+
+        Args:
+            question: Вопрос рекрутера
+            answer: Ответ кандидата
+        """
+        if self._disabled:
+            return
+        self._pending.append((question, answer))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        """Обновляет анализ, пока есть необработанные ответы (накопленные ответы отправляются одним запросом)."""
+        while self._pending and not self._disabled:
+            batch = list(self._pending)
+            try:
+                await self._update(batch)
+            except BudgetExceededError as e:
+                logger.error(f"Инкрементальный анализ остановлен: {str(e)}")
+                self._disabled = True
+            except Exception as e:
+                error_msg = f"Ошибка при обновлении анализа ответов: {str(e)}"
+                logger.error(error_msg)
+                # Ответы остаются в очереди и будут учтены итоговым запросом
+                return
+
+    async def _update(self, batch: List[Tuple[str, str]]):
+        """Выполняет один запрос обновления заметок и черновика вопросов."""
+        prompt_system, prompt_user = _incremental_prompts(
+            self.candidate_position, self.requirements, self.notes, batch,
+            resume=self.resume if self.analyzed == 0 else None)
+
+        with span('llm.incremental_analysis'):
+            response = await generate_answer_async(prompt_system, prompt_user, model=self.model)
+
+        notes, _, questions_text = response.partition(QUESTIONS_HEADER)
+        questions = _parse_questions(questions_text)
+        if not questions:
+            raise RuntimeError("В ответе модели нет вопросов")
+
+        self.notes = notes.replace(NOTES_HEADER, '').strip()
+        self.draft_questions = questions
+        self.analyzed += len(batch)
+        del self._pending[:len(batch)]
+        logger.info(f"Анализ обновлен: учтено ответов {self.analyzed}, вопросов в черновике {len(questions)}")
+        if self.on_update is not None:
+            self.on_update(self)
+
+    async def finalize(self, wait: float = 3.0) -> Optional[List[str]]:
+        """
+        Возвращает дополнительные вопросы из текущего состояния анализа.
+
+        Ожидает завершения обновления по последним ответам не дольше wait секунд;
+        если оно не успело завершиться, используется черновик по предыдущим ответам.
+
+        Args:
+            wait: Максимальное время ожидания обновления в секундах
+
+        Returns:
+            Список вопросов или None, если черновика нет (нужна полная генерация)
+        """
+        if self._pending and not self._disabled and (self._worker is None or self._worker.done()):
+            # Очередь не обрабатывается (например, после восстановления или ошибки) - повторяем попытку
+            self._worker = asyncio.ensure_future(self._run())
+        if self._worker is not None and not self._worker.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(self._worker), wait)
+            except asyncio.TimeoutError:
+                logger.info(f"Обновление анализа не завершилось за {wait} с, используется черновик")
+
+        if not self.draft_questions:
+            return None
+        logger.info(f"Дополнительные вопросы взяты из инкрементального анализа "
+                    f"(учтено ответов {self.analyzed}, в очереди {len(self._pending)})")
+        return list(self.draft_questions)
+
+    def close(self):
+        """Останавливает фоновое обновление."""
+        self._disabled = True
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
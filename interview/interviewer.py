@@ -1,19 +1,22 @@
 # -*- coding: utf-8 -*-
+import asyncio
 import logging
-import time
 import re
-from typing import List, Dict, Any, Optional
-from IPython.display import Audio, display
+from typing import List, Dict, Any, Optional, Callable
 
-from hr_utils.audio_utils import google_tts
-from hr_utils.api_utils import generate_answer
+from hr_utils.api_utils import generate_answer_async
+from hr_utils.resilience import INTERACTIVE_POLICY
 from hr_utils.file_utils import format_text
+from hr_utils.metrics import span
+from hr_utils.usage_ledger import BudgetExceededError
+from interview.channels import InterviewChannel, ConsoleChannel, ChannelClosedError, run_sync
+from interview.answer_cache import AnswerCache
 
 logger = logging.getLogger('hr_system')
 
 def conduct_interview(resume: str, questions: List[str]):
     """
-    Проводит собеседование с кандидатом.
+    Проводит собеседование с кандидатом в консоли.
     
     Args:
         resume: Текст резюме кандидата
@@ -22,32 +25,76 @@ def conduct_interview(resume: str, questions: List[str]):
     Returns:
         Строка с историей диалога
     """
-    text_start = (f'Рекрутер: Здравствуйте! Давайте начнем собеседование. План собеседования следующий: \n'
-                 f' 1. Я задам Вам несколько вопросов. \n 2. Расскажу о нашей компании и имеющейся вакансии \n'
-                 f' 3. Отвечу на Ваши вопросы. \n Общайтесь пожалуйста со мной как с обычным рекрутером!')
-
-    # Озвучивание приветствия
-    audio_file = google_tts(text_start.replace("Рекрутер:", ""))
-    if audio_file:
-        display(Audio(audio_file))
-        time.sleep(1)
-
-    print(text_start, '\n')
+    return run_sync(conduct_interview_async(resume, questions, ConsoleChannel()))
 
-    # Сохранение резюме и истории диалога
-    interview_summary = [f"Резюме:\n{resume}\n", "Интервью:\n"]
+async def conduct_interview_async(resume: str, questions: List[str], channel: InterviewChannel,
+                                  on_answer: Optional[Callable[[str, str], Any]] = None):
+    """
+    Проводит собеседование с кандидатом через канал.
+    
+    Args:
+        resume: Текст резюме кандидата
+        questions: Список вопросов для собеседования
+        channel: Канал общения с кандидатом
+        on_answer: Функция, вызываемая после каждого ответа (вопрос, ответ)
+        
+    Returns:
+        Строка с историей диалога
+    """
+    await greet_candidate_async(channel)
 
     # Получение ответов на вопросы
-    interview_summary.extend(ask_questions(questions))
+    responses = await ask_questions_async(questions, channel, on_answer)
 
     logger.info("Собеседование успешно проведено")
 
     # Возвращаем резюме и историю диалога в текстовом виде
-    return "\n".join(interview_summary)
+    return build_interview_summary(resume, responses)
+
+async def greet_candidate_async(channel: InterviewChannel):
+    """
+    Приветствует кандидата и рассказывает план собеседования.
+    
+    Args:
+        channel: Канал общения с кандидатом
+    """
+    text_start = (f'Рекрутер: Здравствуйте! Давайте начнем собеседование. План собеседования следующий: \n'
+                 f' 1. Я задам Вам несколько вопросов. \n 2. Расскажу о нашей компании и имеющейся вакансии \n'
+                 f' 3. Отвечу на Ваши вопросы. \n Общайтесь пожалуйста со мной как с обычным рекрутером!')
+
+    # Приветствие с озвучиванием
+    await channel.send(text_start, speech=text_start.replace("Рекрутер:", ""))
+
+def build_interview_summary(resume: str, responses: List[str]) -> str:
+    """
+    Формирует текст первой части собеседования: резюме и историю диалога.
+    
+    Args:
+        resume: Текст резюме кандидата
+        responses: Записи истории диалога
+        
+    Returns:
+        Строка с резюме и историей диалога
+    """
+    return "\n".join([f"Резюме:\n{resume}\n", "Интервью:\n"] + list(responses))
+
+def format_dialog_entry(question: str, answer: str) -> str:
+    """
+    Форматирует пару "вопрос - ответ кандидата" для истории диалога.
+    
+    Args:
+        question: Вопрос рекрутера
+        answer: Ответ кандидата
+        
+    Returns:
+        Запись истории диалога
+    """
+    formatted_answer = format_text(f"Кандидат: {answer}")
+    return f"{question}\n\n{formatted_answer}\n\n"
 
 def ask_questions(questions: List[str]):
     """
-    Проводит диалог, задавая вопросы из списка и получая ответы пользователя.
+    Проводит диалог в консоли, задавая вопросы из списка и получая ответы пользователя.
     
     Args:
         questions: Список вопросов
@@ -55,6 +102,24 @@ def ask_questions(questions: List[str]):
     Returns:
         Список строк с историей диалога
     """
+    return run_sync(ask_questions_async(questions, ConsoleChannel()))
+
+async def ask_questions_async(questions: List[str], channel: InterviewChannel,
+                              on_answer: Optional[Callable[[str, str], Any]] = None):
+    """
+    Проводит диалог через канал, задавая вопросы из списка и получая ответы кандидата.
+    
+    Args:
+        questions: Список вопросов
+        channel: Канал общения с кандидатом
+        on_answer: Функция, вызываемая после каждого ответа (вопрос, ответ)
+    
+    Returns:
+        Список строк с историей диалога
+        
+    Raises:
+        ChannelClosedError: Если кандидат отключился
+    """
     responses = []
 
     for question in questions:
@@ -62,33 +127,41 @@ def ask_questions(questions: List[str]):
             # Очистка номера вопроса для озвучивания
             clean_question = re.sub(r'^\d+\.', '', question)
 
-            # Озвучивание вопроса
-            audio_file = google_tts(clean_question)
-            if audio_file:
-                display(Audio(audio_file))
-                time.sleep(1)  # Пауза для корректного отображения
-
-            # Вывод вопроса
-            print(format_text(f"Рекрутер: {question}"), '\n')
-
-            # Получение ответа пользователя
-            answer = input("Кандидат: ")
-            formatted_answer = format_text(f"Кандидат: {answer}")
+            # Вывод и озвучивание вопроса, получение ответа кандидата
+            await channel.send(format_text(f"Рекрутер: {question}"), speech=clean_question)
+            answer = await channel.receive("Кандидат: ")
 
             # Добавление истории диалога в список
-            responses.append(f"{question}\n\n{formatted_answer}\n\n")
-            print('\n')
+            responses.append(format_dialog_entry(question, answer))
+            if on_answer is not None:
+                on_answer(question, answer)
+        except ChannelClosedError:
+            raise
         except Exception as e:
             error_msg = f"Ошибка при обработке вопроса: {str(e)}"
             logger.error(error_msg)
-            print(error_msg)
+            await channel.send(error_msg)
 
     logger.info(f"Задано {len(questions)} вопросов, получены ответы")
     return responses
 
+def _split_questions(questions) -> List[str]:
+    """
+    Преобразует вопросы в список, если передана строка.
+    
+    Args:
+        questions: Строка или список с вопросами
+        
+    Returns:
+        Список вопросов
+    """
+    if isinstance(questions, str):
+        return [q.strip() for q in questions.split('\n') if q.strip() and re.match(r'^\d+\.', q.strip())]
+    return questions
+
 def ask_additional_questions(questions):
     """
-    Задает дополнительные вопросы, полученные после анализа ответов.
+    Задает в консоли дополнительные вопросы, полученные после анализа ответов.
     
     Args:
         questions: Строка или список с вопросами
@@ -96,44 +169,55 @@ def ask_additional_questions(questions):
     Returns:
         Список строк с историей диалога
     """
-    # Преобразуем вопросы в список, если передана строка
-    if isinstance(questions, str):
-        question_list = [q.strip() for q in questions.split('\n') if q.strip() and re.match(r'^\d+\.', q.strip())]
-    else:
-        question_list = questions
+    return run_sync(ask_additional_questions_async(questions, ConsoleChannel()))
+
+async def ask_additional_questions_async(questions, channel: InterviewChannel,
+                                         on_answer: Optional[Callable[[str, str], Any]] = None):
+    """
+    Задает через канал дополнительные вопросы, полученные после анализа ответов.
+    
+    Args:
+        questions: Строка или список с вопросами
+        channel: Канал общения с кандидатом
+        on_answer: Функция, вызываемая после каждого ответа (вопрос, ответ)
+        
+    Returns:
+        Список строк с историей диалога
+    """
+    question_list = _split_questions(questions)
         
     # Задаем вопросы и получаем ответы
-    responses = ask_questions(question_list)
+    responses = await ask_questions_async(question_list, channel, on_answer)
     
     logger.info(f"Задано {len(question_list)} дополнительных вопросов")
     return responses
 
 def present_company_and_vacancy(company_description: str):
     """
-    Представляет информацию о компании и вакансии.
+    Представляет в консоли информацию о компании и вакансии.
     
     Args:
         company_description: Описание компании и вакансии
     """
-    text_presentation = f'Рекрутер: Спасибо, что ответили на все дополнительные вопросы. Теперь я хочу подробнее рассказать Вам о нашей организации. Нажмите Enter, когда будете готовы.'
-    print(format_text(text_presentation), '\n')
-    input()
-    print(format_text(company_description), '\n\n')
-    
-    logger.info("Представлена информация о компании и вакансии")
+    run_sync(present_company_and_vacancy_async(company_description, ConsoleChannel()))
 
-def handle_candidate_questions(candidate_position: str, db_hr_answers, 
-                              model: str = 'gpt-3.5-turbo', temp: float = 0.3):
+async def present_company_and_vacancy_async(company_description: str, channel: InterviewChannel):
     """
-    Отвечает на вопросы кандидата о компании и вакансии.
+    Представляет информацию о компании и вакансии через канал.
     
     Args:
-        candidate_position: Позиция кандидата
-        db_hr_answers: Векторная база данных с ответами HR
-        model: Модель для генерации ответов (по умолчанию 'gpt-3.5-turbo')
-        temp: Температура генерации (по умолчанию 0.3)
+        company_description: Описание компании и вакансии
+        channel: Канал общения с кандидатом
     """
-    prompt_candidate_questions = f"""
+    text_presentation = f'Рекрутер: Спасибо, что ответили на все дополнительные вопросы. Теперь я хочу подробнее рассказать Вам о нашей организации. Нажмите Enter, когда будете готовы.'
+    await channel.send(format_text(text_presentation))
+    await channel.receive("")
+    await channel.send(format_text(company_description))
+    
+    logger.info("Представлена информация о компании и вакансии")
+
+# Системный промпт для ответов на вопросы кандидата
+PROMPT_CANDIDATE_QUESTIONS = """
     Ты являешься опытным рекрутером, который проводит собеседование на позицию {candidate_position}.
     Ты хорошо знаешь компанию, её ценности, процессы и требования к сотрудникам.
     Твоя задача - дать кандидату информативные, точные и честные ответы на вопросы о компании и вакансии.
@@ -142,7 +226,8 @@ def handle_candidate_questions(candidate_position: str, db_hr_answers,
     Если ты не знаешь точного ответа, не выдумывай информацию - лучше признай, что необходимо уточнить детали.
     """
 
-    query_candidate_questions_template = """
+# Шаблон запроса с вопросом кандидата
+QUERY_CANDIDATE_QUESTIONS_TEMPLATE = """
     ИНСТРУКЦИИ:
 
     1. Используй предоставленную Базу знаний для ответа на вопрос кандидата
@@ -157,52 +242,164 @@ def handle_candidate_questions(candidate_position: str, db_hr_answers,
     {candidate_question}
     """
 
+def _candidate_answer_prompts(candidate_question: str, candidate_position: str, docs):
+    """
+    Формирует промпты для ответа на вопрос кандидата по найденным фрагментам базы знаний.
+    
+    Args:
+        candidate_question: Вопрос кандидата
+        candidate_position: Позиция кандидата
+        docs: Найденные документы базы знаний
+        
+    Returns:
+        Кортеж (системный промпт, пользовательский промпт)
+    """
+    # Формирование запроса с промптом
+    query_template = QUERY_CANDIDATE_QUESTIONS_TEMPLATE.format(
+        candidate_position=candidate_position,
+        candidate_question=candidate_question
+    )
+
+    # Формирование контекста из найденных документов
+    message_content = '\n '.join([f'\nChank {i+1}:\n' +
+                                  doc.page_content + '\n' for i, doc in enumerate(docs)])
+    message_content = re.sub(r'\n{2}', ' ', message_content)
+
+    # Добавление контекста к запросу
+    query_with_context = f'# База знаний для ответов: \n{message_content} \n# {query_template}'
+    return PROMPT_CANDIDATE_QUESTIONS.format(candidate_position=candidate_position), query_with_context
+
+def answer_candidate_question(candidate_question: str, candidate_position: str, db_hr_answers,
+                              model: str = 'gpt-3.5-turbo', temp: float = 0.3,
+                              answer_cache: Optional[AnswerCache] = None) -> str:
+    """
+    Формирует ответ на один вопрос кандидата с использованием базы знаний HR.
+    
+    Args:
+        candidate_question: Вопрос кандидата
+        candidate_position: Позиция кандидата
+        db_hr_answers: Векторная база данных с ответами HR
+        model: Модель для генерации ответа (по умолчанию 'gpt-3.5-turbo')
+        temp: Температура генерации (по умолчанию 0.3)
+        answer_cache: Кэш ответов на вопросы кандидатов (необязательно)
+        
+    Returns:
+        Текст ответа рекрутера
+    """
+    return run_sync(answer_candidate_question_async(candidate_question, candidate_position, db_hr_answers,
+                                                    model=model, temp=temp, answer_cache=answer_cache))
+
+async def answer_candidate_question_async(candidate_question: str, candidate_position: str, db_hr_answers,
+                                          model: str = 'gpt-3.5-turbo', temp: float = 0.3,
+                                          answer_cache: Optional[AnswerCache] = None) -> str:
+    """
+    Асинхронно формирует ответ на один вопрос кандидата с использованием базы знаний HR.
+    
+    Args:
+        candidate_question: Вопрос кандидата
+        candidate_position: Позиция кандидата
+        db_hr_answers: Векторная база данных с ответами HR
+        model: Модель для генерации ответа (по умолчанию 'gpt-3.5-turbo')
+        temp: Температура генерации (по умолчанию 0.3)
+        answer_cache: Кэш ответов на вопросы кандидатов (необязательно)
+        
+    Returns:
+        Текст ответа рекрутера
+    """
+    full_question = f'Вопрос к позиции: {candidate_position}: {candidate_question}'
+    vector = None
+    # Кэш читает и записывает SQLite (с фиксацией транзакции), поэтому обращения к нему
+    # выполняются в пуле потоков, чтобы не останавливать цикл событий других сессий
+    loop = asyncio.get_running_loop()
+    if answer_cache is not None:
+        answer = await loop.run_in_executor(None, answer_cache.get, candidate_position, candidate_question)
+        if answer is not None:
+            return answer
+        embeddings = getattr(db_hr_answers, 'embeddings', None)
+        if embeddings is not None:
+            with span('embedding.candidate_question'):
+                vector = await embeddings.aembed_query(full_question)
+            answer = await loop.run_in_executor(None, answer_cache.search, candidate_position, vector)
+            if answer is not None:
+                return answer
+
+    with span('search.hr_answers'):
+        if vector is not None:
+            docs = await db_hr_answers.asimilarity_search_by_vector(vector, k=3)
+        else:
+            docs = await db_hr_answers.asimilarity_search(full_question, k=3)
+
+    prompt_system, prompt_user = _candidate_answer_prompts(candidate_question, candidate_position, docs)
+
+    # Кандидат ждет ответа: короткие сроки и дублирование медленного запроса
+    with span('llm.candidate_answer'):
+        answer = await generate_answer_async(prompt_system, prompt_user, model=model, temp=temp,
+                                             policy=INTERACTIVE_POLICY)
+    if answer_cache is not None:
+        await loop.run_in_executor(None, answer_cache.put, candidate_position, candidate_question, answer, vector)
+    return answer
+
+def handle_candidate_questions(candidate_position: str, db_hr_answers, 
+                              model: str = 'gpt-3.5-turbo', temp: float = 0.3,
+                              answer_cache: Optional[AnswerCache] = None):
+    """
+    Отвечает в консоли на вопросы кандидата о компании и вакансии.
+    
+    Args:
+        candidate_position: Позиция кандидата
+        db_hr_answers: Векторная база данных с ответами HR
+        model: Модель для генерации ответов (по умолчанию 'gpt-3.5-turbo')
+        temp: Температура генерации (по умолчанию 0.3)
+        answer_cache: Кэш ответов на вопросы кандидатов (необязательно)
+    """
+    run_sync(handle_candidate_questions_async(candidate_position, db_hr_answers, ConsoleChannel(),
+                                              model=model, temp=temp, answer_cache=answer_cache))
+
+async def handle_candidate_questions_async(candidate_position: str, db_hr_answers, channel: InterviewChannel,
+                                           model: str = 'gpt-3.5-turbo', temp: float = 0.3,
+                                           answer_cache: Optional[AnswerCache] = None):
+    """
+    Отвечает через канал на вопросы кандидата о компании и вакансии.
+    
+    Args:
+        candidate_position: Позиция кандидата
+        db_hr_answers: Векторная база данных с ответами HR
+        channel: Канал общения с кандидатом
+        model: Модель для генерации ответов (по умолчанию 'gpt-3.5-turbo')
+        temp: Температура генерации (по умолчанию 0.3)
+        answer_cache: Кэш ответов на вопросы кандидатов (необязательно)
+        
+    Returns:
+        Список строк с вопросами кандидата и ответами рекрутера
+    """
     text_candidate_questions = f'Рекрутер: Если у Вас остались какие-либо вопросы, задайте их, пожалуйста, и я постараюсь ответить. Если вопросов нет, просто напишите "вопросов нет", и мы завершим наше собеседование.'
-    print(format_text(text_candidate_questions), '\n\n')
+    await channel.send(format_text(text_candidate_questions))
 
+    dialog = []
     while True:
-        candidate_question = input("Кандидат: ")
-        print()
+        try:
+            candidate_question = await channel.receive("Кандидат: ")
+        except ChannelClosedError:
+            break
 
         if candidate_question.strip().lower() == 'вопросов нет':
-            print("Рекрутер: Спасибо за собеседование! Желаем Вам удачи!")
+            await channel.send("Рекрутер: Спасибо за собеседование! Желаем Вам удачи!")
             break
 
         try:
-            # Формирование полного вопроса с позицией
-            full_question = f'Вопрос к позиции: {candidate_position}: {candidate_question}'
-
-            # Формирование запроса с промптом
-            query_template = query_candidate_questions_template.format(
-                candidate_position=candidate_position,
-                candidate_question=candidate_question
-            )
-
-            # Поиск похожих документов в базе знаний
-            docs = db_hr_answers.similarity_search(full_question, k=3)
-
-            # Формирование контекста из найденных документов
-            message_content = '\n '.join([f'\nChank {i+1}:\n' +
-                                        doc.page_content + '\n' for i, doc in enumerate(docs)])
-            message_content = re.sub(r'\n{2}', ' ', message_content)
-
-            # Добавление контекста к запросу
-            query_with_context = f'# База знаний для ответов: \n{message_content} \n# {query_template}'
-
-            # Генерация ответа
-            answer = generate_answer(prompt_candidate_questions, query_with_context, model=model, temp=temp)
-
-            # Озвучивание ответа
-            audio_file = google_tts(answer)
-            if audio_file:
-                display(Audio(audio_file))
-                time.sleep(1)
-
-            print("Рекрутер: " + format_text(answer))
-            print()
+            # Генерация ответа с использованием базы знаний
+            answer = await answer_candidate_question_async(candidate_question, candidate_position, db_hr_answers,
+                                                           model=model, temp=temp, answer_cache=answer_cache)
+
+            # Вывод и озвучивание ответа
+            await channel.send("Рекрутер: " + format_text(answer), speech=answer)
+            dialog.append(f"Кандидат: {candidate_question}\n\nРекрутер: {answer}\n\n")
+        except BudgetExceededError:
+            raise
         except Exception as e:
             error_msg = f"Ошибка при обработке вопроса: {str(e)}"
             logger.error(error_msg)
-            print("Рекрутер: Извините, я не могу ответить на этот вопрос. Попробуйте задать другой вопрос.")
+            await channel.send("Рекрутер: Извините, я не могу ответить на этот вопрос. Попробуйте задать другой вопрос.")
             
     logger.info("Завершен этап ответов на вопросы кандидата")
+    return dialog
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Комплект собеседования (interview kit) для вакансии.
+
+Комплект содержит все данные собеседования, которые зависят только от
+вакансии: данные вакансии, вопросы для позиции, описание компании и
+ключевые требования. Он строится один раз (при обработке вакансий или
+действием prepare-vacancy), хранится рядом с JSON вакансии и загружается
+одним чтением. Ключевые требования запрашиваются у модели заново только
+при изменении текста вакансии.
+"""
+import json
+import hashlib
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+# Версия формата комплекта: комплекты других версий перестраиваются
+KIT_VERSION = 1
+
+# Поля вакансии, от которых зависят ключевые требования и описание компании
+FINGERPRINT_FIELDS = ('vacancy', 'position', 'company', 'skills')
+
+
+def vacancy_fingerprint(vacancy_data: Dict[str, Any]) -> str:
+    """
+    Вычисляет отпечаток вакансии по полям, влияющим на комплект.
+
+    Args:
+        vacancy_data: Данные вакансии
+
+    Returns:
+        Хэш SHA-256 в шестнадцатеричном виде
+    """
+    payload = json.dumps({field: vacancy_data.get(field) for field in FINGERPRINT_FIELDS},
+                         ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def is_kit_current(kit: Optional[Dict[str, Any]], vacancy_mtime: Optional[float],
+                   questions_mtime: Optional[float]) -> bool:
+    """
+    Проверяет без чтения вакансии, что комплект построен по текущим файлам.
+
+    Args:
+        kit: Комплект собеседования
+        vacancy_mtime: Время изменения JSON вакансии
+        questions_mtime: Время изменения файла общих вопросов
+
+    Returns:
+        True, если комплект можно использовать без перестроения
+    """
+    return (kit is not None and kit.get('version') == KIT_VERSION
+            and kit.get('vacancy_mtime') == vacancy_mtime
+            and kit.get('questions_mtime') == questions_mtime)
+
+
+def reusable_key_requirements(kit: Optional[Dict[str, Any]], fingerprint: str) -> Optional[str]:
+    """
+    Возвращает ключевые требования из комплекта, если текст вакансии не изменился.
+
+    Args:
+        kit: Прежний комплект собеседования
+        fingerprint: Отпечаток текущих данных вакансии
+
+    Returns:
+        Ключевые требования или None, если их нужно сгенерировать заново
+    """
+    if kit and kit.get('version') == KIT_VERSION and kit.get('vacancy_hash') == fingerprint:
+        return kit.get('key_requirements') or None
+    return None
+
+
+def build_interview_kit(vacancy_id: str, vacancy_data: Dict[str, Any], questions: List[str],
+                        company_description: str, key_requirements: str,
+                        vacancy_mtime: Optional[float], questions_mtime: Optional[float]) -> Dict[str, Any]:
+    """
+    Формирует комплект собеседования.
+
+    Args:
+        vacancy_id: Идентификатор вакансии
+        vacancy_data: Данные вакансии
+        questions: Вопросы для позиции
+        company_description: Описание компании и вакансии
+        key_requirements: Ключевые требования к кандидату
+        vacancy_mtime: Время изменения JSON вакансии
+        questions_mtime: Время изменения файла общих вопросов
+
+    Returns:
+        Комплект собеседования
+    """
+    return {
+        'version': KIT_VERSION,
+        'vacancy_id': vacancy_id,
+        'vacancy_hash': vacancy_fingerprint(vacancy_data),
+        'vacancy_mtime': vacancy_mtime,
+        'questions_mtime': questions_mtime,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'vacancy': vacancy_data,
+        'questions': questions,
+        'company_description': company_description,
+        'key_requirements': key_requirements,
+    }
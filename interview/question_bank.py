@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Банк вопросов для собеседований с быстрым подбором вопросов по позиции.
+
+Файл general_questions.json загружается один раз и перечитывается только
+после изменения (по времени модификации). Поддерживаются два формата ролей:
+
+    "Python_Dev": ["1. Вопрос", ...]
+    "Data_Engineer": {
+        "keywords": ["data engineer", "инженер данных"],
+        "questions": ["1. Вопрос", {"text": "2. Вопрос про Spark", "skills": ["Spark"]}]
+    }
+
+Названия ролей и ключевые слова компилируются в префиксное дерево по словам
+(многошаблонный поиск за один проход по словам позиции), поэтому время
+подбора не зависит от количества ролей в банке. Слово ключевой фразы
+совпадает со словом позиции целиком или как основа не короче MIN_STEM_LENGTH
+букв ("продаж" - "продажам"). Вопросы с тегами навыков включаются, только
+если навык есть в вакансии; если у роли не остается ни одного вопроса,
+используются общие вопросы. Если по ключевым словам роль не найдена, ее
+можно подобрать по сходству эмбеддингов названия позиции и описаний ролей.
+"""
+import os
+import re
+import json
+import logging
+import threading
+from typing import Dict, List, Any, Optional, Tuple, Callable, Union
+
+logger = logging.getLogger('hr_system')
+
+# Ключевые слова встроенных ролей (слова позиции сравниваются с ними по префиксу)
+DEFAULT_ROLE_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    'Python_Dev': ('python', 'разработчик', 'программист', 'developer'),
+    'Head_of_sales': ('продаж', 'sales', 'коммерческий'),
+    'HR_Director': ('hr', 'персонал', 'кадр'),
+}
+
+# Вопросы, если роль позиции определить не удалось
+FALLBACK_QUESTIONS: List[str] = [
+    "1. Расскажите, пожалуйста, о своем профессиональном опыте.",
+    "2. Какие ключевые навыки вы считаете своими сильными сторонами?",
+    "3. Расскажите о самом интересном проекте, над которым вы работали.",
+    "4. Какие инструменты и методики вы используете в своей работе?",
+    "5. Почему вы заинтересованы в этой позиции?"
+]
+
+# Минимальное косинусное сходство эмбеддингов для подбора роли
+EMBEDDING_MIN_SIMILARITY = 0.8
+
+# Минимальная длина основы слова позиции: более короткие основы ("ру" из "руководитель")
+# совпадали бы с короткими словами ключевых фраз, не связанными с позицией
+MIN_STEM_LENGTH = 4
+
+# Приоритеты совпадений: название роли важнее ключевого слова
+_KEY_MATCH = 0
+_KEYWORD_MATCH = 1
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower().replace('_', ' '))
+
+
+class QuestionBank:
+    """Скомпилированный банк вопросов по ролям и навыкам."""
+
+    def __init__(self, questions: Dict[str, Any],
+                 embed: Optional[Callable[[List[str]], List[List[float]]]] = None):
+        """
+        Компилирует банк вопросов.
+
+        Args:
+            questions: Содержимое general_questions.json
+            embed: Функция эмбеддинга списка текстов для подбора роли по сходству (необязательно)
+        """
+        self.roles: List[str] = []
+        # Описания ролей для эмбеддингов: название и ключевые слова
+        self._role_texts: List[str] = []
+        self._questions: List[List[Tuple[str, Tuple[str, ...]]]] = []
+        # Префиксное дерево ключевых фраз по словам: {слово: (совпадение (приоритет, роль), поддерево)}
+        self._trie: Dict[str, list] = {}
+        self._embed = embed
+        self._role_vectors = None
+        self._embedding_cache: Dict[str, Optional[int]] = {}
+
+        for role, entry in questions.items():
+            if isinstance(entry, dict):
+                items, keywords = entry.get('questions', []), entry.get('keywords', [])
+            else:
+                items, keywords = entry, []
+            role_id = len(self.roles)
+            self.roles.append(role)
+            self._role_texts.append(', '.join([role.replace('_', ' ')] + list(keywords)))
+            self._questions.append([(item, ()) if isinstance(item, str)
+                                    else (item['text'], tuple(s.lower() for s in item.get('skills', ())))
+                                    for item in items])
+            self._add_phrase(role, role_id, _KEY_MATCH)
+            for keyword in list(keywords) + list(DEFAULT_ROLE_KEYWORDS.get(role, ())):
+                self._add_phrase(keyword, role_id, _KEYWORD_MATCH)
+
+    def __len__(self) -> int:
+        return sum(len(items) for items in self._questions)
+
+    def _add_phrase(self, phrase: str, role_id: int, priority: int):
+        node = None
+        children = self._trie
+        for word in _tokens(phrase):
+            node = children.setdefault(word, [None, {}])
+            children = node[1]
+        if node is not None and (node[0] is None or (priority, role_id) < node[0]):
+            node[0] = (priority, role_id)
+
+    @staticmethod
+    def _stems(word: str) -> List[str]:
+        """Возвращает слово и его основы не короче MIN_STEM_LENGTH, отличающиеся от него буквенным окончанием."""
+        stems = [word]
+        for length in range(len(word) - 1, MIN_STEM_LENGTH - 1, -1):
+            if not word[length].isalpha():
+                break
+            stems.append(word[:length])
+        return stems
+
+    def match_role(self, position: str) -> Optional[str]:
+        """
+        Определяет роль банка для названия позиции.
+
+        Args:
+            position: Название позиции
+
+        Returns:
+            Название роли или None, если роль не найдена
+        """
+        role_id = self._match_role_id(position)
+        return self.roles[role_id] if role_id is not None else None
+
+    def _match_role_id(self, position: str) -> Optional[int]:
+        stems = [self._stems(word) for word in _tokens(position)]
+        best: Optional[Tuple[int, int]] = None
+        for start in range(len(stems)):
+            # Все фразы, начинающиеся с этого слова позиции, проходятся по дереву одновременно
+            frontier = [self._trie]
+            for word_stems in stems[start:]:
+                next_frontier = []
+                for children in frontier:
+                    for stem in word_stems:
+                        node = children.get(stem)
+                        if node is None:
+                            continue
+                        if node[0] is not None and (best is None or node[0] < best):
+                            best = node[0]
+                        if node[1]:
+                            next_frontier.append(node[1])
+                if not next_frontier:
+                    break
+                frontier = next_frontier
+        if best is not None:
+            return best[1]
+        if self._embed is not None:
+            return self._match_role_by_embedding(position)
+        return None
+
+    def _match_role_by_embedding(self, position: str) -> Optional[int]:
+        if position in self._embedding_cache:
+            return self._embedding_cache[position]
+        role_id = None
+        try:
+            import numpy as np
+
+            if self._role_vectors is None:
+                vectors = np.asarray(self._embed(self._role_texts), dtype=np.float32)
+                self._role_vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+            query = np.asarray(self._embed([position])[0], dtype=np.float32)
+            scores = self._role_vectors @ (query / np.linalg.norm(query))
+            if scores.size and scores.max() >= EMBEDDING_MIN_SIMILARITY:
+                role_id = int(scores.argmax())
+        except Exception as e:
+            error_msg = f"Ошибка при подборе роли по эмбеддингам для позиции {position}: {str(e)}"
+            logger.error(error_msg)
+        self._embedding_cache[position] = role_id
+        return role_id
+
+    def select(self, position: str, skills: Union[str, List[str], None] = None) -> List[str]:
+        """
+        Выбирает вопросы для позиции.
+
+        Args:
+            position: Название позиции
+            skills: Навыки вакансии (строка через запятую или список); вопросы с тегами
+                навыков включаются, только если навык указан
+
+        Returns:
+            Список вопросов для позиции (общие вопросы, если роль не найдена или
+            у роли нет вопросов для навыков вакансии)
+        """
+        role_id = self._match_role_id(position)
+        if role_id is None:
+            logger.info(f"Не удалось определить тип позиции, используются общие вопросы")
+            return list(FALLBACK_QUESTIONS)
+        logger.info(f"Выбраны вопросы для позиции: {self.roles[role_id]}")
+
+        if isinstance(skills, str):
+            skills = skills.split(',')
+        skill_set = {skill.strip().lower() for skill in skills or () if skill.strip()}
+        questions = [text for text, tags in self._questions[role_id]
+                     if not tags or skill_set.intersection(tags)]
+        if not questions:
+            # У роли только вопросы с тегами навыков, и ни один навык вакансии не подошел
+            logger.info(f"Для навыков вакансии нет вопросов роли {self.roles[role_id]}, используются общие вопросы")
+            return list(FALLBACK_QUESTIONS)
+        return questions
+
+
+_banks: Dict[Tuple[str, bool], Tuple[float, QuestionBank]] = {}
+_banks_lock = threading.Lock()
+
+
+def load_question_bank(file_path: str,
+                       embed: Optional[Callable[[List[str]], List[List[float]]]] = None) -> Optional[QuestionBank]:
+    """
+    Возвращает банк вопросов из файла, перечитывая его только после изменения.
+
+    Args:
+        file_path: Путь к JSON-файлу с вопросами
+        embed: Функция эмбеддинга для подбора роли по сходству (необязательно)
+
+    Returns:
+        Экземпляр QuestionBank или None в случае ошибки
+    """
+    try:
+        mtime = os.path.getmtime(file_path)
+        key = (file_path, embed is not None)
+        with _banks_lock:
+            cached = _banks.get(key)
+            if cached and cached[0] == mtime:
+                return cached[1]
+
+        with open(file_path, 'r', encoding='utf-8') as f:
+            bank = QuestionBank(json.load(f), embed=embed)
+        with _banks_lock:
+            _banks[key] = (mtime, bank)
+        logger.info(f"Загружен банк вопросов: {len(bank.roles)} ролей, {len(bank)} вопросов")
+        return bank
+    except Exception as e:
+        error_msg = f"Ошибка при загрузке банка вопросов {file_path}: {str(e)}"
+        logger.error(error_msg)
+        return None
@@ -5,7 +5,11 @@ import logging
 import re
 from typing import List, Dict, Any, Optional
 
-from hr_utils.api_utils import generate_answer
+from hr_utils.api_utils import generate_answer_async
+from hr_utils.metrics import span
+from hr_utils.usage_ledger import BudgetExceededError
+from interview.channels import run_sync
+from interview.question_bank import QuestionBank
 
 logger = logging.getLogger('hr_system')
 
@@ -55,6 +59,9 @@ def select_questions_for_position(position: str, questions_dict: Dict[str, List[
     """
     Выбирает подходящие вопросы для указанной позиции.
     
+    Банк вопросов компилируется при каждом вызове; при повторном подборе
+    из одного файла используйте load_question_bank (interview/question_bank.py).
+    
     Args:
         position: Название позиции
         questions_dict: Словарь с вопросами по категориям
@@ -62,48 +69,19 @@ def select_questions_for_position(position: str, questions_dict: Dict[str, List[
     Returns:
         Список вопросов для указанной позиции
     """
-    position_lower = position.lower()
-    
-    # Сначала проверяем прямое соответствие в ключах
-    for key in questions_dict:
-        if key.lower() in position_lower:
-            logger.info(f"Выбраны вопросы для позиции: {key}")
-            return questions_dict[key]
-    
-    # Если прямого соответствия нет, определяем по ключевым словам
-    if any(word in position_lower for word in ["python", "разработчик", "программист", "developer"]):
-        logger.info(f"Выбраны вопросы для Python разработчика")
-        return questions_dict.get('Python_Dev', [])
-    elif any(word in position_lower for word in ["продаж", "sales", "коммерческий"]):
-        logger.info(f"Выбраны вопросы для руководителя продаж")
-        return questions_dict.get('Head_of_sales', [])
-    elif any(word in position_lower for word in ["hr", "персонал", "кадр"]):
-        logger.info(f"Выбраны вопросы для HR специалиста")
-        return questions_dict.get('HR_Director', [])
-    
-    # Если не смогли определить тип, возвращаем универсальные вопросы
-    logger.info(f"Не удалось определить тип позиции, используются общие вопросы")
-    return [
-        "1. Расскажите, пожалуйста, о своем профессиональном опыте.",
-        "2. Какие ключевые навыки вы считаете своими сильными сторонами?",
-        "3. Расскажите о самом интересном проекте, над которым вы работали.",
-        "4. Какие инструменты и методики вы используете в своей работе?",
-        "5. Почему вы заинтересованы в этой позиции?"
-    ]
+    return QuestionBank(questions_dict).select(position)
 
-def generate_additional_questions(interview_summary: str, vacancy: str, candidate_position: str, 
-                                 model: str = 'gpt-4o') -> List[str]:
+def _additional_questions_prompts(interview_summary: str, vacancy: str, candidate_position: str):
     """
-    Генерирует дополнительные вопросы на основе анализа собеседования.
+    Формирует промпты для генерации дополнительных вопросов.
     
     Args:
         interview_summary: Текст собеседования
         vacancy: Текст вакансии
         candidate_position: Позиция кандидата
-        model: Модель для генерации (по умолчанию 'gpt-4o')
         
     Returns:
-        Список сгенерированных вопросов
+        Кортеж (системный промпт, пользовательский промпт)
     """
     prompt_system = f"""
     Ты опытный HR-специалист с более чем 10-летним опытом проведения собеседований на позицию {candidate_position}.
@@ -150,27 +128,78 @@ def generate_additional_questions(interview_summary: str, vacancy: str, candidat
     - Не добавляй комментарии, заголовки или пояснения к вопросам
     """
 
+    return prompt_system, prompt_user
+
+def _parse_questions(text: str) -> List[str]:
+    """
+    Извлекает из ответа модели только пронумерованные вопросы.
+    
+    Args:
+        text: Ответ модели
+        
+    Returns:
+        Список вопросов
+    """
+    questions_list = [q.strip() for q in text.split('\n') if q.strip()]
+    return [q for q in questions_list if re.match(r'^\d+\.', q)]
+
+# Вопросы на случай ошибки генерации
+FALLBACK_ADDITIONAL_QUESTIONS = [
+    "1. Можете ли вы привести конкретный пример, когда вам пришлось решать сложную техническую проблему?",
+    "2. Какие технологии вы изучаете сейчас и почему?",
+    "3. Расскажите о ситуации, когда вам приходилось работать с трудным коллегой.",
+    "4. Как вы обычно расставляете приоритеты в своей работе?",
+    "5. Чем именно вас привлекает эта позиция в нашей компании?"
+]
+
+def generate_additional_questions(interview_summary: str, vacancy: str, candidate_position: str, 
+                                 model: str = 'gpt-4o') -> List[str]:
+    """
+    Генерирует дополнительные вопросы на основе анализа собеседования.
+    
+    Args:
+        interview_summary: Текст собеседования
+        vacancy: Текст вакансии
+        candidate_position: Позиция кандидата
+        model: Модель для генерации (по умолчанию 'gpt-4o')
+        
+    Returns:
+        Список сгенерированных вопросов
+    """
+    return run_sync(generate_additional_questions_async(interview_summary, vacancy, candidate_position,
+                                                       model=model))
+
+async def generate_additional_questions_async(interview_summary: str, vacancy: str, candidate_position: str,
+                                              model: str = 'gpt-4o') -> List[str]:
+    """
+    Асинхронно генерирует дополнительные вопросы на основе анализа собеседования.
+    
+    Args:
+        interview_summary: Текст собеседования
+        vacancy: Текст вакансии
+        candidate_position: Позиция кандидата
+        model: Модель для генерации (по умолчанию 'gpt-4o')
+        
+    Returns:
+        Список сгенерированных вопросов
+    """
+    prompt_system, prompt_user = _additional_questions_prompts(interview_summary, vacancy, candidate_position)
+
     try:
-        # Генерация вопросов
-        additional_questions = generate_answer(
-            prompt_system=prompt_system,
-            prompt_user=prompt_user,
-            model=model
-        )
+        with span('llm.additional_questions'):
+            additional_questions = await generate_answer_async(
+                prompt_system=prompt_system,
+                prompt_user=prompt_user,
+                model=model
+            )
         
-        # Обработка результатов - извлечение только вопросов
-        questions_list = [q.strip() for q in additional_questions.split('\n') if q.strip()]
-        questions_list = [q for q in questions_list if re.match(r'^\d+\.', q)]
+        questions_list = _parse_questions(additional_questions)
         
         logger.info(f"Сгенерировано {len(questions_list)} дополнительных вопросов")
         return questions_list
+    except BudgetExceededError:
+        raise
     except Exception as e:
         error_msg = f"Ошибка при генерации дополнительных вопросов: {str(e)}"
         logger.error(error_msg)
-        return [
-            "1. Можете ли вы привести конкретный пример, когда вам пришлось решать сложную техническую проблему?",
-            "2. Какие технологии вы изучаете сейчас и почему?",
-            "3. Расскажите о ситуации, когда вам приходилось работать с трудным коллегой.",
-            "4. Как вы обычно расставляете приоритеты в своей работе?",
-            "5. Чем именно вас привлекает эта позиция в нашей компании?"
-        ]
+        return list(FALLBACK_ADDITIONAL_QUESTIONS)
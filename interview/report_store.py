@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+"""
+Индексированное хранилище отчетов об оценке кандидатов.
+
+Каждый отчет получает уникальный идентификатор и сохраняется в
+data/reports/<report_id>.txt в структурированном виде (заголовок с
+атрибутами и разделы заключения). Атрибуты отчета (резюме, вакансия,
+позиция, рекомендация, дата, разделы) записываются в базу SQLite
+data/reports/reports.db с индексами, поэтому выборка отчетов по резюме,
+вакансии, позиции, рекомендации или периоду выполняется одним запросом,
+без чтения файлов.
+"""
+import os
+import re
+import json
+import uuid
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from hr_utils.file_utils import create_temp_file
+
+logger = logging.getLogger('hr_system')
+
+REPORTS_DB = 'reports.db'
+
+# Разделы заключения в порядке формата итоговой оценки: (ключ, заголовок)
+REPORT_SECTIONS: Tuple[Tuple[str, str], ...] = (
+    ('summary', 'Общая характеристика кандидата'),
+    ('requirements', 'Оценка соответствия ключевым требованиям'),
+    ('experience', 'Анализ опыта работы'),
+    ('strengths', 'Сильные стороны'),
+    ('development', 'Области для развития'),
+    ('recommendation', 'Итоговая рекомендация'),
+)
+
+# Рекомендации и фрагменты текста, по которым они определяются (проверяются по порядку)
+RECOMMENDATIONS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ('additional_interview', ('дополнительного собеседования', 'дополнительное собеседование')),
+    ('reject', ('отклонить', 'не рекомендовать', 'не рекомендуется', 'не рекомендую')),
+    ('hire', ('рекомендовать к найму', 'рекомендуется к найму', 'рекомендую к найму', 'рекомендовать')),
+)
+
+RECOMMENDATION_LABELS = {
+    'hire': 'Рекомендовать к найму',
+    'additional_interview': 'Рассмотреть после дополнительного собеседования',
+    'reject': 'Отклонить',
+}
+
+_HEADING_PREFIX = re.compile(r'^[\s#*\d.)]*')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    report_id TEXT PRIMARY KEY,
+    created TEXT NOT NULL,
+    resume_id TEXT,
+    vacancy_id TEXT,
+    position TEXT,
+    company TEXT,
+    source TEXT,
+    session_id TEXT,
+    recommendation TEXT,
+    file TEXT NOT NULL,
+    sections TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_resume ON reports (resume_id, created);
+CREATE INDEX IF NOT EXISTS reports_vacancy ON reports (vacancy_id, created);
+CREATE INDEX IF NOT EXISTS reports_position ON reports (position COLLATE NOCASE, created);
+CREATE INDEX IF NOT EXISTS reports_recommendation ON reports (recommendation, created);
+CREATE INDEX IF NOT EXISTS reports_created ON reports (created);
+"""
+
+_COLUMNS = ('report_id', 'created', 'resume_id', 'vacancy_id', 'position', 'company', 'source', 'session_id',
+            'recommendation', 'file', 'sections')
+
+
+def parse_assessment_sections(assessment: str) -> Dict[str, str]:
+    """
+    Разбивает текст итоговой оценки на разделы по заголовкам формата заключения.
+
+    Args:
+        assessment: Текст итоговой оценки
+
+    Returns:
+        Словарь {ключ раздела: текст}; текст до первого заголовка попадает в раздел 'summary'
+    """
+    sections: Dict[str, List[str]] = {}
+    current = 'summary'
+    for line in assessment.splitlines():
+        # Заголовок раздела: "1. **Сильные стороны**", "## Итоговая рекомендация: ..." и т. п.
+        stripped = _HEADING_PREFIX.sub('', line)
+        marked = bool(line[:len(line) - len(stripped)].strip())
+        for key, title in REPORT_SECTIONS:
+            if not stripped.lower().startswith(title.lower()):
+                continue
+            rest = stripped[len(title):]
+            # Строка текста, начинающаяся с тех же слов, заголовком не считается
+            if marked or not rest.strip() or rest.lstrip('*').startswith(':'):
+                current = key
+                rest = rest.lstrip('*').lstrip(' :—–-').strip()
+                sections.setdefault(current, [])
+                if rest:
+                    sections[current].append(rest)
+                break
+        else:
+            sections.setdefault(current, []).append(line)
+    return {key: '\n'.join(lines).strip() for key, lines in sections.items() if '\n'.join(lines).strip()}
+
+
+def detect_recommendation(sections: Dict[str, str], assessment: str = '') -> Optional[str]:
+    """
+    Определяет итоговую рекомендацию по разделу рекомендации (или по всему тексту оценки).
+
+    Args:
+        sections: Разделы заключения
+        assessment: Полный текст оценки (если раздела рекомендации нет)
+
+    Returns:
+        'hire', 'additional_interview', 'reject' или None
+    """
+    text = (sections.get('recommendation') or assessment).lower()
+    for recommendation, fragments in RECOMMENDATIONS:
+        if any(fragment in text for fragment in fragments):
+            return recommendation
+    return None
+
+
+def render_report(record: Dict[str, Any]) -> str:
+    """
+    Формирует текст отчета: заголовок с атрибутами и разделы заключения.
+
+    Args:
+        record: Запись отчета (атрибуты и словарь sections)
+
+    Returns:
+        Текст отчета
+    """
+    lines = ["ИТОГОВОЕ ЗАКЛЮЧЕНИЕ О КАНДИДАТЕ", '=' * 50, '',
+             f"ID отчета: {record['report_id']}",
+             f"Кандидат на позицию: {record['position']}",
+             f"Компания: {record['company']}"]
+    if record.get('source'):
+        lines.append(f"Источник резюме: {record['source']}")
+    if record.get('resume_id'):
+        lines.append(f"ID резюме: {record['resume_id']}")
+    if record.get('vacancy_id'):
+        lines.append(f"ID вакансии: {record['vacancy_id']}")
+    if record.get('recommendation'):
+        lines.append(f"Рекомендация: {RECOMMENDATION_LABELS[record['recommendation']]}")
+    lines += [f"Дата и время: {record['created'].replace('T', ' ')}", '', '=' * 50, '']
+
+    titles = dict(REPORT_SECTIONS)
+    for key, text in record['sections'].items():
+        lines += [f"## {titles.get(key, key)}", '', text, '']
+    return '\n'.join(lines)
+
+
+class ReportStore:
+    """Хранилище отчетов об оценке с индексом в SQLite."""
+
+    def __init__(self, reports_path: str):
+        """
+        Инициализация хранилища отчетов.
+
+        Args:
+            reports_path: Директория для файлов отчетов и базы индекса
+        """
+        self.reports_path = reports_path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Одно соединение на хранилище; запросы из разных потоков выполняются под блокировкой
+        if self._connection is None:
+            os.makedirs(self.reports_path, exist_ok=True)
+            connection = sqlite3.connect(os.path.join(self.reports_path, REPORTS_DB), check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            # WAL: чтение из других процессов (сервис, пакетная оценка) не блокирует запись
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    @staticmethod
+    def new_report_id() -> str:
+        """Возвращает уникальный идентификатор отчета (дата, время и случайный суффикс)."""
+        return f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+    def _write_file(self, record: Dict[str, Any]):
+        os.makedirs(self.reports_path, exist_ok=True)
+        fd, tmp_path = create_temp_file(self.reports_path, prefix='.report_', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(render_report(record))
+            os.replace(tmp_path, record['file'])
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _insert(self, record: Dict[str, Any]):
+        values = [json.dumps(record[column], ensure_ascii=False) if column == 'sections' else record.get(column)
+                  for column in _COLUMNS]
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                # Повторное сохранение отчета с тем же ID (продолженная сессия) заменяет запись
+                connection.execute(f"INSERT OR REPLACE INTO reports ({', '.join(_COLUMNS)}) "
+                                   f"VALUES ({', '.join('?' * len(_COLUMNS))})", values)
+
+    def save(self, assessment: str, position: str, resume_id: Optional[str] = None,
+             vacancy_id: Optional[str] = None, company: str = "компания", source: Optional[str] = None,
+             session_id: Optional[str] = None, report_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Сохраняет отчет об оценке кандидата и добавляет его в индекс.
+
+        Args:
+            assessment: Текст итоговой оценки
+            position: Позиция кандидата
+            resume_id: Идентификатор резюме
+            vacancy_id: Идентификатор вакансии
+            company: Название компании
+            source: Источник резюме
+            session_id: Идентификатор сессии собеседования
+            report_id: Идентификатор отчета (по умолчанию формируется уникальный)
+
+        Returns:
+            Запись отчета (атрибуты, путь к файлу и разделы)
+        """
+        report_id = report_id or self.new_report_id()
+        sections = parse_assessment_sections(assessment)
+        record = {
+            'report_id': report_id,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'resume_id': resume_id,
+            'vacancy_id': vacancy_id,
+            'position': position,
+            'company': company,
+            'source': source,
+            'session_id': session_id,
+            'recommendation': detect_recommendation(sections, assessment),
+            'file': os.path.join(self.reports_path, f"{report_id}.txt"),
+            'sections': sections,
+        }
+        self._write_file(record)
+        self._insert(record)
+        logger.info(f"Отчет об оценке кандидата {report_id} сохранен в файл: {record['file']}")
+        return record
+
+    @staticmethod
+    def _record(row: sqlite3.Row, with_sections: bool = True) -> Dict[str, Any]:
+        record = dict(row)
+        if with_sections:
+            record['sections'] = json.loads(record['sections'])
+        else:
+            record.pop('sections', None)
+        return record
+
+    @staticmethod
+    def _where(resume_id: Optional[str] = None, vacancy_id: Optional[str] = None,
+               position: Optional[str] = None, recommendation: Optional[str] = None,
+               date_from: Optional[str] = None, date_to: Optional[str] = None) -> Tuple[str, List[str]]:
+        """Строит условие отбора отчетов (общее для find и counts) и его параметры."""
+        conditions, params = [], []
+        for column, value in (('resume_id', resume_id), ('vacancy_id', vacancy_id),
+                              ('recommendation', recommendation)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if position:
+            conditions.append("position = ? COLLATE NOCASE")
+            params.append(position)
+        if date_from:
+            conditions.append("created >= ?")
+            params.append(date_from)
+        if date_to:
+            # Дата без времени включает весь день
+            conditions.append("created <= ?")
+            params.append(date_to if 'T' in date_to else f"{date_to}T23:59:59")
+        return (f"WHERE {' AND '.join(conditions)}" if conditions else ''), params
+
+    def get(self, report_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает запись отчета по идентификатору.
+
+        Args:
+            report_id: Идентификатор отчета
+
+        Returns:
+            Запись отчета или None, если отчет не найден
+        """
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM reports WHERE report_id = ?", (report_id,)).fetchone()
+        return self._record(row) if row else None
+
+    def find(self, resume_id: Optional[str] = None, vacancy_id: Optional[str] = None,
+             position: Optional[str] = None, recommendation: Optional[str] = None,
+             date_from: Optional[str] = None, date_to: Optional[str] = None,
+             limit: int = 100, offset: int = 0, with_sections: bool = False) -> List[Dict[str, Any]]:
+        """
+        Выбирает отчеты по атрибутам одним запросом к индексу (новые отчеты первыми).
+
+        Args:
+            resume_id: Идентификатор резюме
+            vacancy_id: Идентификатор вакансии
+            position: Позиция (без учета регистра)
+            recommendation: Рекомендация ('hire', 'additional_interview' или 'reject')
+            date_from: Начало периода (дата или дата и время в формате ISO)
+            date_to: Конец периода включительно (дата или дата и время в формате ISO)
+            limit: Максимальное количество отчетов
+            offset: Количество пропускаемых отчетов (для постраничного вывода)
+            with_sections: Включать ли разделы заключения
+
+        Returns:
+            Список записей отчетов
+        """
+        where, params = self._where(resume_id, vacancy_id, position, recommendation, date_from, date_to)
+        columns = '*' if with_sections else ', '.join(column for column in _COLUMNS if column != 'sections')
+        query = f"SELECT {columns} FROM reports {where} ORDER BY created DESC, report_id DESC LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self._connect().execute(query, params + [limit, offset]).fetchall()
+        return [self._record(row, with_sections) for row in rows]
+
+    def counts(self, group_by: str = 'recommendation', **filters) -> Dict[Optional[str], int]:
+        """
+        Возвращает количество отчетов по значениям атрибута.
+
+        Args:
+            group_by: Атрибут группировки ('recommendation', 'position', 'vacancy_id' или 'resume_id')
+            **filters: Условия отбора, как в find: resume_id, vacancy_id, position, recommendation,
+                date_from, date_to
+
+        Returns:
+            Словарь {значение атрибута: количество отчетов}
+        """
+        if group_by not in ('recommendation', 'position', 'vacancy_id', 'resume_id'):
+            raise ValueError(f"Недопустимый атрибут группировки: {group_by}")
+        where, params = self._where(**filters)
+        with self._lock:
+            rows = self._connect().execute(f"SELECT {group_by}, COUNT(*) FROM reports {where} "
+                                           f"GROUP BY {group_by}", params).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def import_legacy(self, directory: str) -> int:
+        """
+        Добавляет в индекс отчеты прежнего формата (assessment_*.txt) из директории.
+
+        Файлы не перемещаются; атрибуты берутся из заголовка отчета, дата - из
+        заголовка или времени изменения файла. Уже добавленные файлы пропускаются.
+
+        Args:
+            directory: Директория с отчетами прежнего формата
+
+        Returns:
+            Количество добавленных отчетов
+        """
+        if not os.path.isdir(directory):
+            return 0
+        with self._lock:
+            known = {os.path.abspath(row[0]) for row in self._connect().execute("SELECT file FROM reports")}
+        imported = 0
+        for file_name in sorted(os.listdir(directory)):
+            path = os.path.abspath(os.path.join(directory, file_name))
+            if not (file_name.startswith('assessment_') and file_name.endswith('.txt')) or path in known:
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                header, _, assessment = content.partition(f"\n\n{'=' * 50}\n\n")
+                if not assessment:
+                    header, assessment = '', content
+                fields = dict(re.findall(r'^([^:\n]+): (.*)$', header, flags=re.MULTILINE))
+                created = fields.get('Дата и время')
+                created = (created.replace(' ', 'T') if created else
+                           datetime.fromtimestamp(os.path.getmtime(path)).isoformat(timespec='seconds'))
+                sections = parse_assessment_sections(assessment)
+                self._insert({
+                    'report_id': file_name[:-len('.txt')],
+                    'created': created,
+                    'resume_id': fields.get('ID резюме'),
+                    'vacancy_id': None,
+                    'position': fields.get('Кандидат на позицию'),
+                    'company': fields.get('Компания'),
+                    'source': fields.get('Источник резюме'),
+                    'session_id': None,
+                    'recommendation': detect_recommendation(sections, assessment),
+                    'file': path,
+                    'sections': sections,
+                })
+                imported += 1
+            except Exception as e:
+                error_msg = f"Ошибка при добавлении отчета {path} в индекс: {str(e)}"
+                logger.error(error_msg)
+        return imported
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+Сессия собеседования - асинхронный конечный автомат этапов интервью.
+
+Сессия хранит все промежуточные результаты в словаре state и общается с
+кандидатом только через канал (см. interview.channels), поэтому в одном
+цикле событий может выполняться множество независимых сессий: ожидание
+ответа кандидата или модели не блокирует остальные.
+
+Состояние сохраняется в контрольную точку после каждого ответа кандидата и
+каждого завершенного этапа (см. interview.checkpoint). Запись выполняется в
+пуле потоков, чтобы не останавливать цикл событий других сессий; записи
+одной сессии выполняются по очереди, поэтому более старый снимок состояния
+не заменяет более новый. Сессия, восстановленная из контрольной точки,
+продолжает работу с незавершенного этапа.
+"""
+import asyncio
+import logging
+import functools
+from typing import Dict, Any, List, Optional, Callable
+
+from hr_utils.metrics import span
+from hr_utils.usage_ledger import BudgetExceededError
+from interview.channels import InterviewChannel, ChannelClosedError
+from interview.interviewer import (greet_candidate_async, ask_questions_async, format_dialog_entry,
+                                   build_interview_summary, ask_additional_questions_async,
+                                   present_company_and_vacancy_async, handle_candidate_questions_async)
+from interview.question_generator import generate_additional_questions_async
+from interview.assessment import define_key_requirements_async, generate_final_assessment_async, save_assessment_report
+from interview.incremental_analysis import IncrementalAnalyzer
+from interview.report_store import ReportStore
+from interview.answer_cache import AnswerCache
+
+logger = logging.getLogger('hr_system')
+
+# Этапы собеседования в порядке выполнения
+STAGES = [
+    'base_questions',
+    'analysis',
+    'additional_questions',
+    'presentation',
+    'candidate_questions',
+    'key_requirements',
+    'assessment',
+    'report',
+    'done',
+]
+
+# Заголовки этапов для вывода оператору
+STAGE_TITLES = {
+    'analysis': 'Анализ ответов и генерация дополнительных вопросов',
+    'additional_questions': 'Продолжение собеседования с дополнительными вопросами',
+    'presentation': 'Презентация компании и вакансии',
+    'candidate_questions': 'Ответы на вопросы кандидата',
+    'key_requirements': 'Определение ключевых требований к кандидату',
+    'assessment': 'Генерация итоговой оценки кандидата',
+}
+
+
+class InterviewSession:
+    """Сессия собеседования одного кандидата на одну вакансию."""
+
+    def __init__(self, session_id: str, resume_id: str, vacancy_id: str,
+                 resume_data: Dict[str, Any], vacancy_data: Dict[str, Any], questions: List[str],
+                 company_description: str, hr_answers_loader: Callable[[], Any],
+                 channel: InterviewChannel, output_dir: str = "./data", verbose: bool = True,
+                 key_requirements: str = '', incremental_analysis: bool = False,
+                 report_store: Optional[ReportStore] = None, answer_cache: Optional[AnswerCache] = None):
+        """
+        Инициализация сессии собеседования.
+
+        Args:
+            session_id: Идентификатор сессии
+            resume_id: Идентификатор резюме
+            vacancy_id: Идентификатор вакансии
+            resume_data: Данные резюме
+            vacancy_data: Данные вакансии
+            questions: Базовые вопросы для позиции
+            company_description: Описание компании и вакансии для презентации
+            hr_answers_loader: Функция загрузки векторной базы ответов HR (выполняется в пуле потоков)
+            channel: Канал общения с кандидатом
+            output_dir: Директория для сохранения итоговой оценки
+            verbose: Выводить ли заголовки этапов в консоль
+            key_requirements: Заранее определенные ключевые требования (из комплекта собеседования)
+            incremental_analysis: Обновлять ли анализ ответов в фоне после каждого ответа
+            report_store: Хранилище отчетов (по умолчанию <output_dir>/reports)
+            answer_cache: Кэш ответов на вопросы кандидатов (необязательно)
+        """
+        self.resume_text = resume_data.get('resume', '')
+        self.vacancy_text = vacancy_data.get('vacancy', '')
+        self.company_description = company_description
+        self.hr_answers_loader = hr_answers_loader
+        self.channel = channel
+        self.output_dir = output_dir
+        self.report_store = report_store
+        self.answer_cache = answer_cache
+        self.verbose = verbose
+        self.on_answer: Optional[Callable[[str, str], Any]] = None
+        self.checkpoint: Optional[Callable[[Dict[str, Any]], Any]] = None
+        self._analyzer: Optional[IncrementalAnalyzer] = None
+        # Последний еще не записанный снимок состояния и задача записи контрольных точек
+        self._pending_snapshot: Optional[Dict[str, Any]] = None
+        self._saver: Optional[asyncio.Future] = None
+        self.state: Dict[str, Any] = {
+            'session_id': session_id,
+            'resume_id': resume_id,
+            'vacancy_id': vacancy_id,
+            'candidate_position': vacancy_data.get('position', 'Специалист'),
+            'company_name': vacancy_data.get('company', 'компания'),
+            'stage': STAGES[0],
+            'status': 'created',
+            'questions': list(questions),
+            'responses': [],
+            'base_answers': [],
+            'incremental_analysis': incremental_analysis,
+            'analysis_notes': '',
+            'draft_questions': [],
+            'analyzed_answers': 0,
+            'interview_summary': '',
+            'additional_questions': [],
+            'additional_responses': [],
+            'full_interview': '',
+            'candidate_dialog': [],
+            'key_requirements': key_requirements,
+            'assessment': '',
+            'assessment_file': None,
+            'error': None,
+        }
+
+    @property
+    def session_id(self) -> str:
+        return self.state['session_id']
+
+    @property
+    def done(self) -> bool:
+        return self.state['status'] in ('done', 'failed')
+
+    def restore(self, state: Dict[str, Any]):
+        """
+        Восстанавливает состояние сессии из контрольной точки.
+
+        Args:
+            state: Сохраненное состояние сессии
+        """
+        key_requirements = self.state['key_requirements']
+        self.state.update(state)
+        self.state['key_requirements'] = self.state['key_requirements'] or key_requirements
+        self.state['error'] = None
+
+    def _save(self):
+        """Запускает сохранение контрольной точки в пуле потоков, если хранилище задано."""
+        if self.checkpoint is None:
+            return
+        # Снимок копирует списки состояния: запись в потоке не видит изменений, сделанных после вызова
+        self._pending_snapshot = {key: list(value) if isinstance(value, list) else value
+                                  for key, value in self.state.items()}
+        if self._saver is None or self._saver.done():
+            self._saver = asyncio.ensure_future(self._write_checkpoints())
+
+    async def _write_checkpoints(self):
+        """Записывает снимки по очереди; снимки, накопившиеся за время записи, заменяются последним."""
+        loop = asyncio.get_running_loop()
+        while self._pending_snapshot is not None:
+            snapshot, self._pending_snapshot = self._pending_snapshot, None
+            await loop.run_in_executor(None, self.checkpoint, snapshot)
+
+    async def _flush(self):
+        """Дожидается записи последней контрольной точки."""
+        if self._saver is not None:
+            await self._saver
+
+    def _answer_recorder(self, key: str) -> Callable[[str, str], None]:
+        """Возвращает обработчик ответа, сохраняющий его в state[key] и в контрольную точку."""
+        def record(question: str, answer: str):
+            self.state[key].append(format_dialog_entry(question, answer))
+            self._save()
+            if self.on_answer is not None:
+                self.on_answer(question, answer)
+        return record
+
+    def _get_analyzer(self) -> IncrementalAnalyzer:
+        """Создает инкрементальный анализатор, восстанавливая его состояние из state."""
+        if self._analyzer is None:
+            def on_update(analyzer: IncrementalAnalyzer):
+                self.state['analysis_notes'] = analyzer.notes
+                self.state['draft_questions'] = analyzer.draft_questions
+                self.state['analyzed_answers'] = analyzer.analyzed
+                self._save()
+
+            self._analyzer = IncrementalAnalyzer(
+                self.state['candidate_position'],
+                self.state['key_requirements'] or self.vacancy_text,
+                self.resume_text,
+                on_update=on_update
+            )
+            self._analyzer.restore(self.state['analysis_notes'], self.state['draft_questions'],
+                                   self.state['analyzed_answers'],
+                                   [tuple(pair) for pair in self.state['base_answers']])
+        return self._analyzer
+
+    def _announce(self, text: str):
+        """Выводит заголовок этапа оператору (только в консольном режиме)."""
+        if self.verbose:
+            print(f"\n=== {text} ===\n")
+
+    async def run(self) -> Optional[str]:
+        """
+        Выполняет этапы собеседования, начиная с текущего этапа state['stage'].
+
+        Returns:
+            Путь к файлу с итоговой оценкой или None в случае ошибки
+        """
+        self.state['status'] = 'running'
+        try:
+            while self.state['stage'] != 'done':
+                stage = self.state['stage']
+                if stage in STAGE_TITLES:
+                    self._announce(STAGE_TITLES[stage])
+                await getattr(self, f'_stage_{stage}')()
+                self.state['stage'] = STAGES[STAGES.index(stage) + 1]
+                self._save()
+            self.state['status'] = 'done'
+            self._save()
+            await self._flush()
+            return self.state['assessment_file']
+        except ChannelClosedError as e:
+            error_msg = f"Собеседование {self.session_id} прервано: {str(e)}"
+        except BudgetExceededError as e:
+            error_msg = f"Собеседование {self.session_id} остановлено: {str(e)}"
+        except Exception as e:
+            error_msg = f"Ошибка при проведении собеседования: {str(e)}"
+        finally:
+            await self.channel.close()
+
+        logger.error(error_msg)
+        self.state['error'] = error_msg
+        self.state['status'] = 'failed'
+        self._save()
+        await self._flush()
+        if self.verbose:
+            print(error_msg)
+        return None
+
+    async def _stage_base_questions(self):
+        self._announce(f"Начало собеседования для кандидата на позицию {self.state['candidate_position']}")
+        responses = self.state['responses']
+        with span('interview.base_questions'):
+            if responses:
+                await self.channel.send("Рекрутер: Продолжим собеседование с того места, где мы остановились.")
+            else:
+                await greet_candidate_async(self.channel)
+            record = self._answer_recorder('responses')
+            analyzer = self._get_analyzer() if self.state['incremental_analysis'] else None
+
+            def on_answer(question: str, answer: str):
+                self.state['base_answers'].append([question, answer])
+                record(question, answer)
+                if analyzer is not None:
+                    analyzer.on_answer(question, answer)
+
+            # Вопросы, на которые кандидат уже ответил до прерывания, не повторяются
+            await ask_questions_async(self.state['questions'][len(responses):], self.channel, on_answer)
+        self.state['interview_summary'] = build_interview_summary(self.resume_text, responses)
+
+    async def _stage_analysis(self):
+        if self.state['incremental_analysis']:
+            # Вопросы берутся из фонового анализа, обновленного после последних ответов
+            analyzer = self._get_analyzer()
+            questions = await analyzer.finalize()
+            analyzer.close()
+            if questions:
+                self.state['additional_questions'] = questions
+                return
+            logger.info("Черновика инкрементального анализа нет, выполняется полная генерация вопросов")
+
+        self.state['additional_questions'] = await generate_additional_questions_async(
+            self.state['interview_summary'],
+            self.vacancy_text,
+            self.state['candidate_position'],
+            model='gpt-4o'
+        )
+
+    async def _stage_additional_questions(self):
+        additional_responses = self.state['additional_responses']
+        with span('interview.additional_questions'):
+            await ask_additional_questions_async(
+                self.state['additional_questions'][len(additional_responses):], self.channel,
+                self._answer_recorder('additional_responses'))
+        self.state['full_interview'] = (self.state['interview_summary'] +
+                                        "\n\nДополнительные вопросы и ответы:\n\n" +
+                                        "\n".join(additional_responses))
+
+    async def _stage_presentation(self):
+        await present_company_and_vacancy_async(self.company_description, self.channel)
+
+    async def _stage_candidate_questions(self):
+        loop = asyncio.get_running_loop()
+        db_hr_answers = await loop.run_in_executor(None, self.hr_answers_loader)
+        with span('interview.candidate_questions'):
+            self.state['candidate_dialog'] = await handle_candidate_questions_async(
+                self.state['candidate_position'], db_hr_answers, self.channel, model='gpt-4o',
+                answer_cache=self.answer_cache)
+
+    async def _stage_key_requirements(self):
+        # Требования из комплекта собеседования не запрашиваются повторно
+        if self.state['key_requirements']:
+            return
+        self.state['key_requirements'] = await define_key_requirements_async(
+            self.vacancy_text, self.state['candidate_position'])
+
+    async def _stage_assessment(self):
+        self.state['assessment'] = await generate_final_assessment_async(
+            self.state['full_interview'],
+            self.vacancy_text,
+            self.state['key_requirements'],
+            self.state['candidate_position'],
+            self.state['company_name']
+        )
+
+    async def _stage_report(self):
+        loop = asyncio.get_running_loop()
+        self.state['assessment_file'] = await loop.run_in_executor(
+            None, functools.partial(
+                save_assessment_report,
+                self.state['assessment'],
+                self.state['candidate_position'],
+                self.state['resume_id'],
+                self.state['company_name'],
+                'Локальная база',
+                self.output_dir,
+                # ID по сессии: при продолжении сессии отчет заменяется, а не дублируется
+                report_id=f"report_{self.session_id}",
+                vacancy_id=self.state['vacancy_id'],
+                session_id=self.session_id,
+                report_store=self.report_store
+            )
+        )
+        self._announce("Собеседование завершено!")
+        if self.verbose:
+            print(f"Итоговая оценка сохранена в файл: {self.state['assessment_file']}")
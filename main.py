@@ -8,38 +8,124 @@
 import os
 import logging
 import argparse
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
 from datetime import datetime
 import json
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("hr_system.log", encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+# Настройка логирования: записи пишутся на диск фоновым потоком (см. hr_utils/log_utils.py)
+from hr_utils.log_utils import setup_logging
+setup_logging("hr_system.log")
 logger = logging.getLogger('hr_system')
 
 # Импорт утилит
-from hr_utils.file_utils import read_pdf, unrar, format_text
+from hr_utils.file_utils import read_pdf, read_pdf_source, list_archive_pdfs, unrar, format_text, ARCHIVE_EXTENSIONS
 from hr_utils.api_utils import generate_answer
 from hr_utils.audio_utils import google_tts
+from hr_utils.metrics import metrics, span
+from hr_utils.profiling import ActionProfiler
+from hr_utils.usage_ledger import ledger, usage_context, BudgetExceededError
+from hr_utils.resilience import ModelCallError
 
-# Импорт моделей данных
-from hr_models.schema import Vacancy, Resume
-from hr_models.document_store import DocumentStore
+# Импорт моделей данных (схемы парсинга загружаются лениво, см. DOCUMENT_SETTINGS)
+from hr_models.document_store import DocumentStore, DocumentCommitError
 
 # Импорт AI сервисов
-from ai_services.parser import to_dict_parser, analyze_text_with_prompt
-from ai_services.vector_store import create_vector_db, load_vector_db, similarity_search, db_from_markdown_file
+from ai_services.parser import parse_document, analyze_text_with_prompt
+from ai_services.vector_store import load_vector_db, db_from_markdown_file
 
 # Импорт модулей интервью
-from interview.question_generator import load_general_questions, select_questions_for_position, generate_additional_questions
+from interview.question_generator import load_general_questions, generate_additional_questions
+from interview.question_bank import QuestionBank, load_question_bank
 from interview.interviewer import conduct_interview, ask_questions, ask_additional_questions, present_company_and_vacancy, handle_candidate_questions
 from interview.assessment import define_key_requirements, generate_final_assessment, save_assessment_report
+from interview.channels import InterviewChannel, ConsoleChannel, run_sync
+from interview.session import InterviewSession
+from interview.checkpoint import CheckpointStore
+from interview.report_store import ReportStore, RECOMMENDATION_LABELS
+from interview.answer_cache import AnswerCache
+from interview.kit import build_interview_kit, is_kit_current, reusable_key_requirements, vacancy_fingerprint
+from interview.batch_assessment import collect_transcripts, assess_transcripts
+
+# Тяжелые зависимости, необходимые каждому действию командной строки.
+# Модули проекта импортируют их лениво, поэтому действие загружает только свой набор.
+ACTION_MODULES = {
+    'process': ['PyPDF2', 'numpy', 'langchain_core.output_parsers', 'langchain_openai',
+                'langchain_community.vectorstores', 'hr_models.schema'],
+    'search-resumes': ['langchain_openai', 'langchain_community.vectorstores'],
+    # Поиск по навыкам не обращается к эмбеддингам и моделям
+    'search-resumes:skills': ['numpy'],
+    'search-vacancies': ['langchain_openai', 'langchain_community.vectorstores'],
+    'interview': ['openai', 'gtts', 'IPython.display', 'langchain_openai',
+                  'langchain_community.vectorstores', 'langchain_text_splitters'],
+    'resume-interview': ['openai', 'gtts', 'IPython.display', 'langchain_openai',
+                         'langchain_community.vectorstores', 'langchain_text_splitters'],
+    'prepare-vacancy': ['openai', 'langchain_openai', 'langchain_community.vectorstores',
+                        'langchain_text_splitters'],
+    'assess-batch': ['openai'],
+    'similarity-matrix': ['numpy', 'langchain_openai', 'langchain_community.vectorstores'],
+    'usage-report': [],
+    'serve': ['openai', 'langchain_openai', 'langchain_community.vectorstores',
+              'langchain_text_splitters', 'service.server'],
+    'convert-indexes': ['numpy', 'faiss', 'langchain_community.vectorstores'],
+    'reports': [],
+}
+
+def preload_action(action: str):
+    """
+    Загружает тяжелые зависимости, необходимые для действия.
+    
+    Args:
+        action: Действие командной строки
+    """
+    import importlib
+    
+    for module_name in ACTION_MODULES.get(action, []):
+        importlib.import_module(module_name)
+
+# Параметры обработки документов по типам
+DOCUMENT_SETTINGS = {
+    'vacancy': {
+        'parser_class': 'Vacancy',
+        'index_name': 'db_vacancies',
+        'label_genitive': 'вакансии',
+        'label_plural': 'вакансий',
+        'done_message': 'Обработана вакансия',
+        'dedup': False,
+        # Первая строка вакансии - обычно название должности, резюме - имя кандидата
+        'first_line_position': True,
+    },
+    'resume': {
+        'parser_class': 'Resume',
+        'index_name': 'db_resumes',
+        'label_genitive': 'резюме',
+        'label_plural': 'резюме',
+        'done_message': 'Обработано резюме',
+        'dedup': True,
+        'first_line_position': False,
+    },
+}
+
+def document_id(file) -> str:
+    """
+    Определяет идентификатор документа по PDF-файлу.
+    
+    Файл в директории получает имя без расширения. Файл из архива получает имя
+    архива и путь внутри архива без расширения через '__', поэтому одноименные
+    файлы из разных архивов и из директории не заменяют JSON друг друга.
+    
+    Args:
+        file: Имя PDF-файла или словарь файла в архиве ('archive', 'member')
+        
+    Returns:
+        Идентификатор документа
+    """
+    if not isinstance(file, dict):
+        return os.path.basename(file).split('.')[0]
+    archive = os.path.splitext(file['archive'])[0]
+    member = os.path.splitext(file['member'].replace('\\', '/'))[0]
+    return '__'.join([archive] + [part for part in member.split('/') if part])
 
 class HRSystem:
     """
@@ -57,148 +143,346 @@ class HRSystem:
         self.document_store = DocumentStore(base_path=data_path)
         self.model = os.getenv("DEFAULT_MODEL", "gpt-3.5-turbo")
         
+        # Кэш векторной базы ответов HR: (mtime файла ответов, база); индексы документов кэширует get_shard_router
+        self._hr_answers_db: Optional[Tuple[float, Any]] = None
+        self._cache_lock = threading.Lock()
+        
+        # Порог сходства текстов для признания резюме почти-дубликатами
+        self.dedup_threshold = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+        
+        # Уверенность локального разбора, ниже которой документ парсится моделью
+        self.parse_threshold = float(os.getenv("PARSE_CONFIDENCE_THRESHOLD", "0.75"))
+        
+        # Количество обработанных документов, сохраняемых одной фиксацией
+        self.document_batch_size = int(os.getenv("DOCUMENT_BATCH_SIZE", "32"))
+        
+        # Количество процессов для параллельного чтения PDF (1 - последовательное чтение)
+        self.pdf_read_workers = int(os.getenv("PDF_READ_WORKERS", str(os.cpu_count() or 1)))
+        
+        # Маршрутизаторы запросов по шардам векторных баз резюме и вакансий
+        self._shard_routers: Dict[str, Any] = {}
+        
+        # Открытая матрица схожести: (mtime метаданных, матрица)
+        self._similarity_matrix = None
+        
+        # Нормализатор навыков: (mtime файла синонимов, нормализатор) и открытый индекс навыков резюме
+        self._skill_normalizer = None
+        self._skill_index = None
+        
+        # Контрольные точки сессий собеседования
+        self.checkpoints = CheckpointStore(os.path.join(data_path, 'sessions'))
+        
+        # Индексированное хранилище отчетов об оценке
+        self.reports = ReportStore(os.path.join(data_path, 'reports'))
+        
+        # Кэш ответов на вопросы кандидатов (сбрасывается при изменении hr_answers.txt)
+        self.answer_cache = None
+        if os.getenv("ANSWER_CACHE", "1") != "0":
+            self.answer_cache = AnswerCache(os.path.join(data_path, 'answer_cache'),
+                                            os.path.join(self.document_store.add_data_path, 'hr_answers.txt'))
+        
+        # Журнал использования моделей хранится вместе с данными
+        ledger.configure(
+            ledger_file=os.path.join(data_path, 'usage', 'ledger.jsonl'),
+            session_budget=ledger.session_budget,
+            job_budget=ledger.job_budget,
+            policy=ledger.policy
+        )
+        
         # Инициализация системы
         logger.info(f"Инициализация системы НейроHR (путь к данным: {data_path})")
         
-    def process_pdf_files(self):
+    def process_pdf_files(self, executor: Optional[Executor] = None, prepare_kits: bool = True,
+                          dedup: bool = True):
         """
         Обрабатывает PDF-файлы вакансий и резюме, создает векторные базы данных.
+        
+        Args:
+            executor: Пул для параллельного чтения PDF (по умолчанию создается пул из PDF_READ_WORKERS процессов)
+            prepare_kits: Строить ли комплекты собеседования для обработанных вакансий
+            dedup: Пропускать ли парсинг почти-дубликатов уже обработанных резюме
         """
         logger.info("Начинаю обработку PDF-файлов...")
         
-        # Проверяем наличие файлов
-        vacancies_pdf_files = [f for f in os.listdir(self.document_store.vacancies_pdf_path) if f.endswith('.pdf')]
-        resumes_files = [f for f in os.listdir(self.document_store.resumes_pdf_path) if f.endswith('.pdf')]
+        # Проверяем наличие файлов (включая еще не обработанные PDF-файлы в архивах)
+        manifest = self.document_store.load_archive_manifest()
+        vacancies_pdf_files = self._pdf_sources('vacancy', manifest)
+        resumes_files = self._pdf_sources('resume', manifest)
         
         print(f"Найдено {len(vacancies_pdf_files)} PDF-файлов вакансий")
         print(f"Найдено {len(resumes_files)} PDF-файлов резюме")
         
-        # Обработка вакансий
-        if vacancies_pdf_files:
-            print("
-Парсинг PDF-файлов вакансий...")
-            self._process_vacancy_files()
+        job_id = f"ingest_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         
-        # Обработка резюме
-        if resumes_files:
-            print("
-Парсинг PDF-файлов резюме...")
-            self._process_resume_files()
+        # Без переданного пула PDF-файлы (в том числе из архивов) читаются собственным пулом процессов
+        own_executor = None
+        if executor is None and self.pdf_read_workers > 1 and len(vacancies_pdf_files) + len(resumes_files) > 1:
+            own_executor = executor = ProcessPoolExecutor(max_workers=self.pdf_read_workers)
+        try:
+            with usage_context(job_id=job_id):
+                # Обработка вакансий
+                if vacancies_pdf_files:
+                    print("\nПарсинг PDF-файлов вакансий...")
+                    vacancy_ids = self._process_documents('vacancy', vacancies_pdf_files, executor, dedup=dedup,
+                                                          manifest=manifest)
+                    
+                    # Комплекты собеседования строятся заранее; для неизмененных вакансий модель не вызывается
+                    if prepare_kits and vacancy_ids:
+                        print("\nПодготовка комплектов собеседования...")
+                        for vacancy_id in vacancy_ids:
+                            self.prepare_vacancy(vacancy_id)
+                
+                # Обработка резюме
+                if resumes_files:
+                    print("\nПарсинг PDF-файлов резюме...")
+                    self._process_documents('resume', resumes_files, executor, dedup=dedup, manifest=manifest)
+            
+            # Матрица схожести дополняется строками и столбцами новых документов
+            if vacancies_pdf_files or resumes_files:
+                self.build_similarity_matrix()
+            
+            # Навыки извлекаются только из новых и измененных резюме
+            if resumes_files:
+                self.build_skill_index()
+        except BudgetExceededError as e:
+            error_msg = f"Обработка остановлена, бюджет задания {job_id} исчерпан: {str(e)}"
+            logger.error(error_msg)
+            print(error_msg)
+        except DocumentCommitError as e:
+            # Файлы несохраненного пакета не отмечены обработанными и будут обработаны при следующем запуске
+            error_msg = f"Обработка остановлена, документы не сохранены: {str(e)}"
+            logger.error(error_msg)
+            print(error_msg)
+        finally:
+            if own_executor is not None:
+                own_executor.shutdown()
         
-        print("
-Обработка PDF-файлов завершена!")
+        print(f"Расходы задания {job_id}: $ {ledger.spent(job_id=job_id):.5f}")
+        print("\nОбработка PDF-файлов завершена!")
     
-    def _process_vacancy_files(self):
+    def _pdf_sources(self, doc_type: str, manifest: Dict[str, Any]) -> List[Any]:
         """
-        Обрабатывает PDF-файлы вакансий и создает векторную базу.
-        """
-        chunks_vacancies = []
+        Собирает PDF-файлы документов одного типа: файлы в директории и файлы в ZIP/RAR-архивах.
         
-        for file in os.listdir(self.document_store.vacancies_pdf_path):
-            if file.endswith('.pdf'):
-                try:
-                    # Полный путь к файлу
-                    file_path = os.path.join(self.document_store.vacancies_pdf_path, file)
-                    
-                    # Чтение PDF и преобразование в текст
-                    vacancy_text = read_pdf(file_path)
-                    if not vacancy_text:
-                        print(f"Пустой текст в файле: {file}")
+        Файлы из архивов не распаковываются; уже обработанные (по журналу архивов,
+        с той же контрольной суммой и размером) пропускаются.
+        
+        Args:
+            doc_type: Тип документа ('vacancy' или 'resume')
+            manifest: Журнал файлов, обработанных из архивов
+            
+        Returns:
+            Имена PDF-файлов и словари файлов в архивах ('archive', 'member', 'crc', 'size', 'key')
+        """
+        pdf_path = self.document_store.pdf_path(doc_type)
+        sources = []
+        for f in sorted(os.listdir(pdf_path)):
+            if f.endswith('.pdf'):
+                sources.append(f)
+            elif f.lower().endswith(ARCHIVE_EXTENSIONS):
+                new_members = 0
+                for member in list_archive_pdfs(os.path.join(pdf_path, f)):
+                    key = f"{os.path.basename(pdf_path)}/{f}/{member['member']}"
+                    entry = manifest.get(key)
+                    if entry and entry['crc'] == member['crc'] and entry['size'] == member['size']:
                         continue
-                    
-                    # Парсинг текста вакансии
-                    vacancy_id = file.split('.')[0]  # Имя файла без расширения .pdf
-                    
-                    # Парсинг текста с использованием LLM
-                    dict_vacancy = to_dict_parser(vacancy_text, parser_class=Vacancy, model=self.model)
-                    
-                    # Добавление дополнительных полей
-                    dict_vacancy['id'] = vacancy_id
-                    dict_vacancy['vacancy'] = vacancy_text
-                    
-                    # Сохранение в хранилище документов
-                    self.document_store.save_document_json(dict_vacancy, vacancy_id, 'vacancy')
-                    
-                    # Получение чанка для векторной базы
-                    chunk = self.document_store.document_to_chunk(vacancy_id, 'vacancy')
-                    if chunk:
-                        chunks_vacancies.append(chunk)
-                    
-                    print(f"Обработана вакансия: {file}")
-                except Exception as e:
-                    error_msg = f"Ошибка при обработке файла {file}: {str(e)}"
-                    logger.error(error_msg)
-                    print(error_msg)
-        
-        # Создание векторной базы данных вакансий
-        if chunks_vacancies:
-            try:
-                db_vacancies = create_vector_db(
-                    chunks_vacancies, 
-                    save_path=self.document_store.db_path, 
-                    index_name='db_vacancies'
-                )
-                print(f"Создана векторная база данных из {len(chunks_vacancies)} вакансий")
-            except Exception as e:
-                error_msg = f"Ошибка при создании векторной базы вакансий: {str(e)}"
-                logger.error(error_msg)
-                print(error_msg)
+                    sources.append(dict(member, archive=f, key=key))
+                    new_members += 1
+                if new_members:
+                    print(f"Архив {f}: новых PDF-файлов {new_members}")
+        return sources
     
-    def _process_resume_files(self):
+    def _process_documents(self, doc_type: str, files: List[str], executor: Optional[Executor] = None,
+                           dedup: bool = True, manifest: Optional[Dict[str, Any]] = None):
         """
-        Обрабатывает PDF-файлы резюме и создает векторную базу.
+        Обрабатывает PDF-файлы документов одного типа и создает векторную базу.
+        
+        Документы разбираются локально по заголовкам разделов; модель вызывается
+        только для документов с уверенностью разбора ниже parse_threshold.
+        
+        Почти-дубликаты уже обработанных документов (если дедупликация включена
+        для типа документа) не парсятся моделью и не добавляются в векторную базу:
+        их JSON строится по каноническому документу.
+        
+        Файлы из архивов читаются в память без распаковки на диск; обработанные
+        файлы записываются в журнал архивов и при следующих запусках пропускаются.
+        
+        JSON документов сохраняются пакетами по document_batch_size; пакет
+        фиксируется раньше, чем журнал архивов отмечает его файлы обработанными.
+        
+        Args:
+            doc_type: Тип документа ('vacancy' или 'resume')
+            files: Имена PDF-файлов и файлы в архивах (см. _pdf_sources)
+            executor: Пул для параллельного чтения PDF
+            dedup: Выполнять ли поиск почти-дубликатов
+            manifest: Журнал файлов, обработанных из архивов
+            
+        Returns:
+            Идентификаторы сохраненных документов
         """
-        chunks_resumes = []
+        from hr_models import schema
         
-        for file in os.listdir(self.document_store.resumes_pdf_path):
-            if file.endswith('.pdf'):
-                try:
-                    # Полный путь к файлу
-                    file_path = os.path.join(self.document_store.resumes_pdf_path, file)
-                    
-                    # Чтение PDF и преобразование в текст
-                    resume_text = read_pdf(file_path)
-                    if not resume_text:
-                        print(f"Пустой текст в файле резюме: {file}")
-                        continue
-                    
-                    # Парсинг текста резюме
-                    resume_id = file.split('.')[0]  # Имя файла без расширения .pdf
-                    
-                    # Парсинг текста с использованием LLM
-                    dict_resume = to_dict_parser(resume_text, parser_class=Resume, model=self.model)
-                    
-                    # Добавление дополнительных полей
-                    dict_resume['id'] = resume_id
-                    dict_resume['resume'] = resume_text
-                    
-                    # Сохранение в хранилище документов
-                    self.document_store.save_document_json(dict_resume, resume_id, 'resume')
-                    
-                    # Получение чанка для векторной базы
-                    chunk = self.document_store.document_to_chunk(resume_id, 'resume')
-                    if chunk:
-                        chunks_resumes.append(chunk)
-                    
-                    print(f"Обработано резюме: {file}")
-                except Exception as e:
-                    error_msg = f"Ошибка при обработке файла резюме {file}: {str(e)}"
-                    logger.error(error_msg)
-                    print(error_msg)
-        
-        # Создание векторной базы данных резюме
-        if chunks_resumes:
+        settings = DOCUMENT_SETTINGS[doc_type]
+        dedup_index = None
+        if dedup and settings['dedup']:
+            from ai_services.dedup import NearDuplicateIndex, minhash_signature
+            dedup_index = NearDuplicateIndex(os.path.join(self.data_path, 'dedup', f'{doc_type}.json'),
+                                             threshold=self.dedup_threshold)
+        duplicates = 0
+        parsed_by = {'heuristic': 0, 'llm': 0}
+        parser_class = getattr(schema, settings['parser_class'])
+        pdf_path = self.document_store.pdf_path(doc_type)
+        manifest = {} if manifest is None else manifest
+        sources = [(os.path.join(pdf_path, file['archive']), file['member']) if isinstance(file, dict)
+                   else os.path.join(pdf_path, file) for file in files]
+        
+        # Чтение PDF и преобразование в текст (параллельно, если передан пул)
+        texts = executor.map(read_pdf_source, sources) if executor else map(read_pdf_source, sources)
+        
+        # Записи журнала архивов для документов пакета: переносятся в журнал только после фиксации пакета
+        pending_marks: Dict[str, Any] = {}
+        
+        def mark_ingested(file, doc_id: str):
+            # Файл из архива записывается в журнал, чтобы не обрабатывать его повторно
+            if isinstance(file, dict):
+                pending_marks[file['key']] = {'crc': file['crc'], 'size': file['size'], 'doc_id': doc_id,
+                                              'ingested': datetime.now().isoformat(timespec='seconds')}
+        
+        batch = self.document_store.batch()
+        
+        def save_progress():
+            # Сначала документы, затем индекс дубликатов и журнал: файл не отмечается обработанным без JSON.
+            # Если пакет не сохранен, DocumentCommitError прерывает обработку до записи индекса и журнала
+            batch.commit()
+            manifest.update(pending_marks)
+            pending_marks.clear()
+            if dedup_index is not None:
+                dedup_index.save()
+            if any(isinstance(file, dict) for file in files):
+                self.document_store.save_archive_manifest(manifest)
+        
+        doc_ids = []
+        for item, text in zip(files, texts):
+            file = f"{item['archive']}/{item['member']}" if isinstance(item, dict) else item
+            if len(batch) >= self.document_batch_size:
+                save_progress()
             try:
-                db_resumes = create_vector_db(
-                    chunks_resumes, 
-                    save_path=self.document_store.db_path, 
-                    index_name='db_resumes'
-                )
-                print(f"Создана векторная база данных из {len(chunks_resumes)} резюме")
+                if not text:
+                    print(f"Пустой текст в файле {settings['label_genitive']}: {file}")
+                    continue
+                
+                doc_id = document_id(item)
+                
+                # Почти-дубликат связывается с каноническим документом без обращения к модели
+                if dedup_index is not None:
+                    signature = minhash_signature(text)
+                    canonical_id = dedup_index.find_duplicate(doc_id, signature)
+                    # Канонический документ может быть еще не зафиксирован и находиться в пакете
+                    canonical_doc = batch.load(canonical_id, doc_type) if canonical_id else None
+                    if canonical_doc:
+                        dict_doc = dict(canonical_doc, id=doc_id, duplicate_of=canonical_id)
+                        dict_doc[doc_type] = text
+                        batch.save(dict_doc, doc_id, doc_type)
+                        dedup_index.add(doc_id, signature, canonical_id)
+                        dedup_index.record_saving()
+                        doc_ids.append(doc_id)
+                        mark_ingested(item, doc_id)
+                        duplicates += 1
+                        print(f"Почти-дубликат {settings['label_genitive']} {canonical_id}: {file}")
+                        continue
+                
+                # Парсинг текста: локально, а при низкой уверенности - с использованием LLM
+                dict_doc = parse_document(text, parser_class=parser_class, model=self.model,
+                                          min_confidence=self.parse_threshold,
+                                          first_line_position=settings['first_line_position'])
+                parsed_by[dict_doc['parsed_by']] += 1
+                
+                # Добавление дополнительных полей
+                dict_doc['id'] = doc_id
+                dict_doc[doc_type] = text
+                
+                # Сохранение в хранилище документов (при фиксации пакета)
+                batch.save(dict_doc, doc_id, doc_type)
+                doc_ids.append(doc_id)
+                mark_ingested(item, doc_id)
+                if dedup_index is not None:
+                    dedup_index.add(doc_id, signature)
+                
+                print(f"{settings['done_message']}: {file}")
+            except BudgetExceededError:
+                save_progress()
+                raise
             except Exception as e:
-                error_msg = f"Ошибка при создании векторной базы резюме: {str(e)}"
+                error_msg = f"Ошибка при обработке файла {settings['label_genitive']} {file}: {str(e)}"
                 logger.error(error_msg)
                 print(error_msg)
+        
+        save_progress()
+        if parsed_by['heuristic'] or parsed_by['llm']:
+            print(f"Разобрано {settings['label_plural']} локально: {parsed_by['heuristic']}, "
+                  f"моделью: {parsed_by['llm']}")
+        if duplicates:
+            # Для каждого дубликата не выполнены парсинг моделью и эмбеддинг
+            print(f"Найдено почти-дубликатов {settings['label_genitive']}: {duplicates}, "
+                  f"сэкономлено запросов к модели: {duplicates} (парсинг) + {duplicates} (эмбеддинг)")
+        
+        # Обновление шардов векторной базы, в которые попали новые и измененные документы
+        if doc_ids:
+            self.update_vector_index(doc_type)
+        return doc_ids
+    
+    def update_vector_index(self, doc_type: str) -> Optional[Dict[str, Any]]:
+        """
+        Перестраивает шарды векторной базы документов одного типа, состав которых изменился.
+        
+        Args:
+            doc_type: Тип документа ('vacancy' или 'resume')
+            
+        Returns:
+            Сводка обновления или None в случае ошибки
+            
+        Raises:
+            BudgetExceededError: Если эмбеддинги превысили бы бюджет задания
+        """
+        from ai_services.sharding import ShardedIndex
+        
+        settings = DOCUMENT_SETTINGS[doc_type]
+        try:
+            summary = ShardedIndex(self.document_store.db_path, settings['index_name']).update(
+                self.document_store, doc_type)
+            print(f"Векторная база {settings['label_plural']}: документов {summary['documents']}, "
+                  f"шардов {summary['shards']}, перестроено {len(summary['rebuilt'])}, "
+                  f"новых эмбеддингов {summary['embedded']}"
+                  + (f" ({summary['docs_per_sec']:.1f} док/с)" if summary['embedded'] else ""))
+            return summary
+        except BudgetExceededError:
+            # Исчерпание бюджета задания останавливает обработку (см. process_pdf_files)
+            raise
+        except Exception as e:
+            error_msg = f"Ошибка при создании векторной базы {settings['label_plural']}: {str(e)}"
+            logger.error(error_msg)
+            print(error_msg)
+            return None
+    
+    def get_shard_router(self, index_name: str):
+        """
+        Возвращает маршрутизатор запросов по шардам индекса (шарды загружаются при первом
+        обращении и после изменения на диске).
+        
+        Args:
+            index_name: Имя индекса ('db_resumes' или 'db_vacancies')
+            
+        Returns:
+            Экземпляр ShardRouter
+        """
+        from ai_services.sharding import ShardRouter
+        
+        with self._cache_lock:
+            router = self._shard_routers.get(index_name)
+            if router is None:
+                router = self._shard_routers[index_name] = ShardRouter(self.document_store.db_path, index_name,
+                                                                      self.document_store)
+        return router
     
     def search_resumes_for_vacancy(self, vacancy_id: str, k: int = 3) -> List[Dict[str, Any]]:
         """
@@ -217,17 +501,13 @@ class HRSystem:
             if not vacancy_data:
                 raise ValueError(f"Вакансия с ID {vacancy_id} не найдена")
             
-            # Загрузка векторной базы резюме
-            db_resumes = load_vector_db(
-                load_path=self.document_store.db_path,
-                index_name='db_resumes'
-            )
-            
-            if not db_resumes:
+            # Шарды векторной базы резюме (из кэша, если они уже загружены)
+            router = self.get_shard_router('db_resumes')
+            if not router.databases():
                 raise ValueError("Не удалось загрузить векторную базу резюме")
             
-            # Поиск подходящих резюме
-            scores, resume_ids = similarity_search(vacancy_data['vacancy'], db_resumes, k=k)
+            # Параллельный поиск подходящих резюме по всем шардам
+            scores, resume_ids = router.search(vacancy_data['vacancy'], k=k)
             
             # Формирование результатов
             results = []
@@ -248,6 +528,142 @@ class HRSystem:
             print(error_msg)
             return []
     
+    @property
+    def skill_index_path(self) -> str:
+        """Директория индекса навыков."""
+        return os.path.join(self.data_path, 'skill_index')
+    
+    def get_skill_normalizer(self):
+        """
+        Возвращает нормализатор навыков, перечитывая словарь синонимов после изменения файла.
+        
+        Returns:
+            SkillNormalizer
+        """
+        from ai_services.skill_index import SkillNormalizer, load_skill_synonyms, SYNONYMS_FILE
+        
+        try:
+            mtime = os.path.getmtime(os.path.join(self.document_store.add_data_path, SYNONYMS_FILE))
+        except OSError:
+            mtime = None
+        
+        with self._cache_lock:
+            cached = self._skill_normalizer
+            if cached and cached[0] == mtime:
+                return cached[1]
+        
+        normalizer = SkillNormalizer(load_skill_synonyms(self.document_store.add_data_path))
+        with self._cache_lock:
+            self._skill_normalizer = (mtime, normalizer)
+        return normalizer
+    
+    def build_skill_index(self) -> Optional[Dict[str, Any]]:
+        """
+        Строит или обновляет индекс навыков резюме.
+        
+        Returns:
+            Сводка обновления или None в случае ошибки
+        """
+        from ai_services.skill_index import build_skill_index
+        
+        try:
+            summary = build_skill_index(self.document_store, 'resume', self.skill_index_path,
+                                        self.get_skill_normalizer())
+            print(f"Индекс навыков: резюме {summary['documents']}, разобрано {summary['parsed']}, "
+                  f"навыков {summary['skills']}")
+            return summary
+        except Exception as e:
+            error_msg = f"Ошибка при построении индекса навыков: {str(e)}"
+            logger.error(error_msg)
+            print(error_msg)
+            return None
+    
+    def get_skill_index(self):
+        """
+        Возвращает индекс навыков резюме, строя его при первом обращении и
+        открывая заново после обновления на диске или изменения словаря синонимов.
+        
+        Returns:
+            SkillIndex или None в случае ошибки
+        """
+        from ai_services.skill_index import SkillIndex
+        
+        normalizer = self.get_skill_normalizer()
+        index_file = os.path.join(self.skill_index_path, 'resume_skills.npz')
+        try:
+            mtime = os.path.getmtime(index_file)
+        except OSError:
+            mtime = None
+        
+        with self._cache_lock:
+            cached = self._skill_index
+            if cached and cached[0] == mtime and cached[1].fingerprint == normalizer.fingerprint:
+                return cached[1]
+        
+        try:
+            index = SkillIndex(self.skill_index_path) if mtime is not None else None
+            if index is None or index.fingerprint != normalizer.fingerprint:
+                if self.build_skill_index() is None:
+                    return None
+                mtime = os.path.getmtime(index_file)
+                index = SkillIndex(self.skill_index_path)
+        except Exception as e:
+            error_msg = f"Ошибка при загрузке индекса навыков: {str(e)}"
+            logger.error(error_msg)
+            return None
+        
+        with self._cache_lock:
+            self._skill_index = (mtime, index)
+        return index
+    
+    def search_resumes_by_skills(self, vacancy_id: str, k: int = 3) -> List[Dict[str, Any]]:
+        """
+        Предварительный отбор резюме под вакансию по покрытию навыков, без эмбеддингов и моделей.
+        
+        Args:
+            vacancy_id: Идентификатор вакансии
+            k: Количество результатов (по умолчанию 3)
+            
+        Returns:
+            Список результатов поиска; оценка - доля навыков вакансии с весами IDF
+        """
+        try:
+            vacancy_data = self.document_store.load_document_json(vacancy_id, 'vacancy')
+            if not vacancy_data:
+                raise ValueError(f"Вакансия с ID {vacancy_id} не найдена")
+            
+            index = self.get_skill_index()
+            if index is None:
+                raise ValueError("Не удалось загрузить индекс навыков резюме")
+            
+            normalizer = self.get_skill_normalizer()
+            required = normalizer.document_skills(vacancy_data, 'vacancy')
+            if not required:
+                raise ValueError(f"В вакансии {vacancy_id} не найдены навыки")
+            
+            with span('search.skills'):
+                ranked = index.rank(required, k=k)
+            
+            results = []
+            for i, (resume_id, score, matched) in enumerate(ranked, 1):
+                resume_data = self.document_store.load_document_json(resume_id, 'resume') or {}
+                results.append({
+                    'position': i,
+                    'resume_id': resume_id,
+                    'score': score,
+                    'position_title': resume_data.get('position', 'Не указана'),
+                    'skills': resume_data.get('skills', 'Не указаны'),
+                    'matched_skills': [normalizer.label(skill_id) for skill_id in matched],
+                    'missing_skills': [normalizer.label(skill_id) for skill_id in required if skill_id not in matched]
+                })
+            
+            return results
+        except Exception as e:
+            error_msg = f"Ошибка при поиске резюме по навыкам для вакансии {vacancy_id}: {str(e)}"
+            logger.error(error_msg)
+            print(error_msg)
+            return []
+    
     def search_vacancies_for_resume(self, resume_id: str, k: int = 3) -> List[Dict[str, Any]]:
         """
         Поиск подходящих вакансий под указанное резюме.
@@ -265,17 +681,13 @@ class HRSystem:
             if not resume_data:
                 raise ValueError(f"Резюме с ID {resume_id} не найдено")
             
-            # Загрузка векторной базы вакансий
-            db_vacancies = load_vector_db(
-                load_path=self.document_store.db_path,
-                index_name='db_vacancies'
-            )
-            
-            if not db_vacancies:
+            # Шарды векторной базы вакансий (из кэша, если они уже загружены)
+            router = self.get_shard_router('db_vacancies')
+            if not router.databases():
                 raise ValueError("Не удалось загрузить векторную базу вакансий")
             
-            # Поиск подходящих вакансий
-            scores, vacancy_ids = similarity_search(resume_data['resume'], db_vacancies, k=k)
+            # Параллельный поиск подходящих вакансий по всем шардам
+            scores, vacancy_ids = router.search(resume_data['resume'], k=k)
             
             # Формирование результатов
             results = []
@@ -296,106 +708,397 @@ class HRSystem:
             print(error_msg)
             return []
     
-    def conduct_interview(self, resume_id: str, vacancy_id: str) -> str:
+    def conduct_interview(self, resume_id: str, vacancy_id: str, incremental_analysis: bool = False) -> str:
         """
         Проводит собеседование с кандидатом.
         
         Args:
             resume_id: Идентификатор резюме
             vacancy_id: Идентификатор вакансии
+            incremental_analysis: Обновлять ли анализ ответов в фоне после каждого ответа
+            
+        Returns:
+            Путь к файлу с оценкой кандидата
+        """
+        # Все запросы к моделям учитываются в бюджете сессии собеседования
+        session_id = f"interview_{resume_id}_{vacancy_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        print(f"Сессия собеседования: {session_id}")
+        with usage_context(session_id=session_id):
+            assessment_file = self._conduct_interview(resume_id, vacancy_id, session_id, incremental_analysis)
+        print(f"Расходы сессии {session_id}: $ {ledger.spent(session_id=session_id):.5f}")
+        if assessment_file is None and self.checkpoints.load(session_id):
+            print(f"Продолжить собеседование: --action resume-interview --session-id {session_id}")
+        return assessment_file
+    
+    def resume_interview(self, session_id: str) -> str:
+        """
+        Продолжает прерванное собеседование с последнего незавершенного этапа.
+        
+        Результаты завершенных этапов (ответы кандидата, дополнительные вопросы,
+        ключевые требования, оценка) берутся из контрольной точки без повторных
+        запросов к модели.
+        
+        Args:
+            session_id: Идентификатор сессии
+            
+        Returns:
+            Путь к файлу с оценкой кандидата
+        """
+        state = self.checkpoints.load(session_id)
+        if not state:
+            print(f"Ошибка: сессия {session_id} не найдена")
+            return None
+        
+        if state.get('status') == 'done':
+            print(f"Собеседование {session_id} уже завершено. Итоговая оценка: {state.get('assessment_file')}")
+            return state.get('assessment_file')
+        
+        print(f"Продолжение собеседования {session_id} с этапа '{state['stage']}'")
+        with usage_context(session_id=session_id):
+            try:
+                session = self.create_interview_session(state['resume_id'], state['vacancy_id'],
+                                                        ConsoleChannel(), session_id)
+                session.restore(state)
+                assessment_file = run_sync(session.run())
+            except Exception as e:
+                error_msg = f"Ошибка при продолжении собеседования: {str(e)}"
+                logger.error(error_msg)
+                print(error_msg)
+                assessment_file = None
+        print(f"Расходы сессии {session_id}: $ {ledger.spent(session_id=session_id):.5f}")
+        return assessment_file
+    
+    def _conduct_interview(self, resume_id: str, vacancy_id: str, session_id: str,
+                           incremental_analysis: bool = False) -> str:
+        """
+        Выполняет этапы собеседования в консоли в контексте сессии учета расходов.
+        
+        Args:
+            resume_id: Идентификатор резюме
+            vacancy_id: Идентификатор вакансии
+            session_id: Идентификатор сессии
+            incremental_analysis: Обновлять ли анализ ответов в фоне после каждого ответа
             
         Returns:
             Путь к файлу с оценкой кандидата
         """
         try:
-            # Загрузка данных резюме и вакансии
-            resume_data = self.document_store.load_document_json(resume_id, 'resume')
-            vacancy_data = self.document_store.load_document_json(vacancy_id, 'vacancy')
+            session = self.create_interview_session(resume_id, vacancy_id, ConsoleChannel(), session_id,
+                                                    incremental_analysis=incremental_analysis)
+            return run_sync(session.run())
+        except Exception as e:
+            error_msg = f"Ошибка при проведении собеседования: {str(e)}"
+            logger.error(error_msg)
+            print(error_msg)
+            return None
+    
+    def create_interview_session(self, resume_id: str, vacancy_id: str, channel: InterviewChannel,
+                                 session_id: Optional[str] = None, verbose: bool = True,
+                                 incremental_analysis: bool = False) -> InterviewSession:
+        """
+        Создает сессию собеседования, работающую через указанный канал.
+        
+        Args:
+            resume_id: Идентификатор резюме
+            vacancy_id: Идентификатор вакансии
+            channel: Канал общения с кандидатом
+            session_id: Идентификатор сессии (по умолчанию формируется автоматически)
+            verbose: Выводить ли заголовки этапов в консоль
+            incremental_analysis: Обновлять ли анализ ответов в фоне после каждого ответа
             
-            if not resume_data or not vacancy_data:
-                raise ValueError("Не удалось загрузить данные резюме или вакансии")
+        Returns:
+            Сессия собеседования
             
-            # Определение позиции кандидата
-            candidate_position = vacancy_data.get('position', 'Специалист')
-            company_name = vacancy_data.get('company', 'компания')
-            resume_text = resume_data.get('resume', '')
-            vacancy_text = vacancy_data.get('vacancy', '')
+        Raises:
+            ValueError: Если не удалось загрузить резюме или вакансию
+        """
+        # Загрузка резюме и комплекта собеседования (данные вакансии, вопросы, описание, требования)
+        resume_data = self.document_store.load_document_json(resume_id, 'resume')
+        kit = self.get_interview_kit(vacancy_id)
+        
+        if not resume_data or not kit:
+            raise ValueError("Не удалось загрузить данные резюме или вакансии")
+        vacancy_data = kit['vacancy']
+        
+        if session_id is None:
+            session_id = f"interview_{resume_id}_{vacancy_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        
+        session = InterviewSession(
+            session_id,
+            resume_id,
+            vacancy_id,
+            resume_data,
+            vacancy_data,
+            kit['questions'],
+            kit['company_description'],
+            lambda: self.hr_answers_db(vacancy_data),
+            channel,
+            output_dir=self.data_path,
+            verbose=verbose,
+            key_requirements=kit['key_requirements'],
+            incremental_analysis=incremental_analysis,
+            report_store=self.reports,
+            answer_cache=self.answer_cache
+        )
+        session.checkpoint = self.checkpoints.save
+        return session
+    
+    def get_interview_kit(self, vacancy_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает комплект собеседования для вакансии, перестраивая его при необходимости.
+        
+        Если JSON вакансии и файл общих вопросов не менялись, комплект загружается
+        одним чтением. Ключевые требования запрашиваются у модели заново только
+        при изменении данных вакансии.
+        
+        Args:
+            vacancy_id: Идентификатор вакансии
             
-            # Загрузка общих вопросов
-            questions_file = os.path.join(self.document_store.add_data_path, 'general_questions.json')
+        Returns:
+            Комплект собеседования или None, если вакансия не найдена
+        """
+        kit = self.document_store.load_interview_kit(vacancy_id)
+        vacancy_mtime = self.document_store.document_mtime(vacancy_id, 'vacancy')
+        questions_mtime = self._general_questions_mtime()
+        if is_kit_current(kit, vacancy_mtime, questions_mtime):
+            return kit
+        
+        vacancy_data = self.document_store.load_document_json(vacancy_id, 'vacancy')
+        if not vacancy_data:
+            return None
+        candidate_position = vacancy_data.get('position', 'Специалист')
+        
+        key_requirements = reusable_key_requirements(kit, vacancy_fingerprint(vacancy_data))
+        if key_requirements is None:
+            print(f"Определение ключевых требований для вакансии {vacancy_id}...")
             try:
-                general_questions = load_general_questions(questions_file)
-            except Exception:
-                # Создаем базовый набор вопросов, если файл не найден
-                general_questions = {
-                    'Python_Dev': [
-                        "1. Расскажите о вашем опыте работы с Python.",
-                        "2. Какие фреймворки Python вы использовали?",
-                        "3. Расскажите о наиболее сложном проекте.",
-                        "4. Как вы организуете код?",
-                        "5. Какие инструменты тестирования вы использовали?"
-                    ],
-                    'Head_of_sales': [
-                        "1. Расскажите о вашем опыте управления продажами.",
-                        "2. Какие методики повышения эффективности продаж вы использовали?",
-                        "3. Как вы мотивируете команду?",
-                        "4. Расскажите о успешном проекте по увеличению продаж.",
-                        "5. Как вы работаете с ключевыми клиентами?"
-                    ],
-                    'HR_Director': [
-                        "1. Расскажите о вашем опыте в HR.",
-                        "2. Какие методики оценки персонала вы использовали?",
-                        "3. Как вы строите адаптацию новых сотрудников?",
-                        "4. Расскажите о сложном HR-проекте.",
-                        "5. Как вы работаете с корпоративной культурой?"
-                    ]
-                }
-                
-                # Сохраняем для будущего использования
-                os.makedirs(self.document_store.add_data_path, exist_ok=True)
-                with open(questions_file, 'w', encoding='utf-8') as f:
-                    json.dump(general_questions, f, ensure_ascii=False, indent=2)
-            
-            # Выбор вопросов для позиции
-            questions = select_questions_for_position(candidate_position, general_questions)
-            
-            print(f"
-=== Начало собеседования для кандидата на позицию {candidate_position} ===
-")
-            
-            # Проведение первой части собеседования
-            interview_summary = conduct_interview(resume_text, questions)
-            
-            # Генерация дополнительных вопросов
-            print("
-=== Анализ ответов и генерация дополнительных вопросов ===
-")
-            additional_questions = generate_additional_questions(
-                interview_summary, 
-                vacancy_text, 
-                candidate_position, 
-                model='gpt-4o'
-            )
+                key_requirements = define_key_requirements(vacancy_data.get('vacancy', ''), candidate_position)
+            except ModelCallError as e:
+                logger.error(f"Не удалось определить ключевые требования для вакансии {vacancy_id}: {str(e)}")
+                key_requirements = ''
+        
+        questions = self.question_bank().select(candidate_position, skills=vacancy_data.get('skills'))
+        kit = build_interview_kit(
+            vacancy_id,
+            vacancy_data,
+            questions,
+            self.company_description(vacancy_data),
+            key_requirements,
+            vacancy_mtime,
+            self._general_questions_mtime()
+        )
+        
+        # Комплект с неудачным результатом модели не сохраняется, чтобы повторить запрос в следующий раз
+        if key_requirements:
+            self.document_store.save_interview_kit(kit, vacancy_id)
+        return kit
+    
+    def prepare_vacancy(self, vacancy_id: str) -> bool:
+        """
+        Заранее строит комплект собеседования и базу ответов HR для вакансии.
+        
+        Args:
+            vacancy_id: Идентификатор вакансии
+            
+        Returns:
+            True, если комплект готов
+        """
+        kit = self.get_interview_kit(vacancy_id)
+        if not kit or not kit['key_requirements']:
+            print(f"Не удалось подготовить комплект собеседования для вакансии {vacancy_id}")
+            return False
+        
+        self.hr_answers_db(kit['vacancy'])
+        print(f"Комплект собеседования для вакансии {vacancy_id} готов")
+        return True
+    
+    def assess_batch(self, transcripts_dir: str, vacancy_id: Optional[str] = None,
+                     output_dir: Optional[str] = None, concurrency: int = 8) -> Dict[str, int]:
+        """
+        Оценивает сохраненные стенограммы собеседований пакетом.
+        
+        Повторный запуск с той же выходной директорией пропускает уже оцененные
+        стенограммы и повторяет неудачные.
+        
+        Args:
+            transcripts_dir: Директория со стенограммами (контрольные точки сессий или .txt)
+            vacancy_id: ID вакансии для стенограмм, в которых он не указан
+            output_dir: Директория для состояния пакета (по умолчанию data/assessments); если указана,
+                отчеты сохраняются в ее поддиректорию reports, иначе - в общее хранилище отчетов
+            concurrency: Максимальное число одновременно оцениваемых стенограмм
+            
+        Returns:
+            Счетчики стенограмм: done, skipped, failed
+        """
+        report_store = None if output_dir else self.reports
+        output_dir = output_dir or os.path.join(self.data_path, 'assessments')
+        transcripts = collect_transcripts(transcripts_dir, vacancy_id)
+        print(f"Найдено стенограмм: {len(transcripts)}")
+        
+        load_vacancy = lambda doc_id: self.document_store.load_document_json(doc_id, 'vacancy')
+        job_id = f"assess_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        with usage_context(job_id=job_id):
+            counters = run_sync(assess_transcripts(transcripts, load_vacancy, output_dir, concurrency=concurrency,
+                                                   report_store=report_store))
+        
+        reports_path = report_store.reports_path if report_store else os.path.join(output_dir, 'reports')
+        print(f"Оценено: {counters['done']}, пропущено: {counters['skipped']}, ошибок: {counters['failed']}. "
+              f"Отчеты: {reports_path}")
+        print(f"Расходы задания {job_id}: $ {ledger.spent(job_id=job_id):.5f}")
+        return counters
+    
+    @property
+    def similarity_path(self) -> str:
+        """Директория матрицы схожести резюме и вакансий."""
+        return os.path.join(self.data_path, 'similarity')
+    
+    def build_similarity_matrix(self, k: int = 10) -> Optional[Dict[str, Any]]:
+        """
+        Строит или обновляет матрицу схожести резюме и вакансий по сохраненным векторам.
+        
+        Args:
+            k: Количество лучших совпадений в таблицах
             
-            # Проведение второй части собеседования
-            print("
-=== Продолжение собеседования с дополнительными вопросами ===
-")
-            additional_responses = ask_additional_questions(additional_questions)
+        Returns:
+            Сводка обновления или None в случае ошибки
+        """
+        from ai_services.similarity_matrix import build_similarity_matrix
+        
+        try:
+            db_resumes = list(self.get_shard_router('db_resumes').databases().values())
+            db_vacancies = list(self.get_shard_router('db_vacancies').databases().values())
+            if not db_resumes or not db_vacancies:
+                raise ValueError("Нужны векторные базы резюме и вакансий")
             
-            # Объединение результатов собеседования
-            full_interview = interview_summary + "
-
-Дополнительные вопросы и ответы:
-
-" + "
-".join(additional_responses)
-            
-            # Презентация компании и вакансии
-            print("
-=== Презентация компании и вакансии ===
-")
-            company_description = f"""
+            summary = build_similarity_matrix(db_resumes, db_vacancies, self.similarity_path, k=k)
+            print(f"Матрица схожести: резюме {summary['resumes']}, вакансий {summary['vacancies']}, "
+                  f"пересчитано значений {summary['computed']}")
+            return summary
+        except Exception as e:
+            error_msg = f"Ошибка при построении матрицы схожести: {str(e)}"
+            logger.error(error_msg)
+            print(error_msg)
+            return None
+    
+    def get_similarity_matrix(self):
+        """
+        Возвращает матрицу схожести, открывая ее заново после обновления на диске.
+        
+        Returns:
+            SimilarityMatrix или None, если матрица не построена
+        """
+        from ai_services.similarity_matrix import SimilarityMatrix, META_FILE
+        
+        try:
+            mtime = os.path.getmtime(os.path.join(self.similarity_path, META_FILE))
+        except OSError:
+            return None
+        
+        with self._cache_lock:
+            cached = self._similarity_matrix
+            if cached and cached[0] == mtime:
+                return cached[1]
+        
+        try:
+            matrix = SimilarityMatrix(self.similarity_path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Ошибка при загрузке матрицы схожести: {str(e)}")
+            return None
+        with self._cache_lock:
+            self._similarity_matrix = (mtime, matrix)
+        return matrix
+    
+    def _general_questions_file(self) -> str:
+        """Возвращает путь к файлу общих вопросов для собеседований."""
+        return os.path.join(self.document_store.add_data_path, 'general_questions.json')
+    
+    def _general_questions_mtime(self) -> Optional[float]:
+        """Возвращает время изменения файла общих вопросов или None, если файла нет."""
+        try:
+            return os.path.getmtime(self._general_questions_file())
+        except OSError:
+            return None
+    
+    def load_general_questions(self) -> Dict[str, List[str]]:
+        """
+        Загружает общие вопросы для собеседований, создавая файл с базовым набором при его отсутствии.
+        
+        Returns:
+            Словарь с вопросами по категориям
+        """
+        questions_file = self._general_questions_file()
+        if os.path.exists(questions_file):
+            return load_general_questions(questions_file)
+        
+        # Создаем базовый набор вопросов, если файл не найден
+        general_questions = {
+            'Python_Dev': [
+                "1. Расскажите о вашем опыте работы с Python.",
+                "2. Какие фреймворки Python вы использовали?",
+                "3. Расскажите о наиболее сложном проекте.",
+                "4. Как вы организуете код?",
+                "5. Какие инструменты тестирования вы использовали?"
+            ],
+            'Head_of_sales': [
+                "1. Расскажите о вашем опыте управления продажами.",
+                "2. Какие методики повышения эффективности продаж вы использовали?",
+                "3. Как вы мотивируете команду?",
+                "4. Расскажите о успешном проекте по увеличению продаж.",
+                "5. Как вы работаете с ключевыми клиентами?"
+            ],
+            'HR_Director': [
+                "1. Расскажите о вашем опыте в HR.",
+                "2. Какие методики оценки персонала вы использовали?",
+                "3. Как вы строите адаптацию новых сотрудников?",
+                "4. Расскажите о сложном HR-проекте.",
+                "5. Как вы работаете с корпоративной культурой?"
+            ]
+        }
+        
+        # Сохраняем для будущего использования
+        os.makedirs(self.document_store.add_data_path, exist_ok=True)
+        with open(questions_file, 'w', encoding='utf-8') as f:
+            json.dump(general_questions, f, ensure_ascii=False, indent=2)
+        return general_questions
+    
+    def question_bank(self) -> QuestionBank:
+        """
+        Возвращает банк общих вопросов, перечитывая файл только после его изменения.
+        
+        Если задана переменная окружения QUESTION_BANK_EMBEDDINGS=1, роль позиции,
+        не найденная по ключевым словам, подбирается по сходству эмбеддингов.
+        
+        Returns:
+            Экземпляр QuestionBank
+        """
+        questions_file = self._general_questions_file()
+        if not os.path.exists(questions_file):
+            self.load_general_questions()
+        
+        embed = None
+        if os.getenv("QUESTION_BANK_EMBEDDINGS") == "1":
+            from ai_services.metered_embeddings import openai_embeddings
+            embed = openai_embeddings().embed_documents
+        
+        bank = load_question_bank(questions_file, embed=embed)
+        if bank is None:
+            # Файл поврежден - используются встроенные вопросы
+            bank = QuestionBank(load_general_questions(questions_file))
+        return bank
+    
+    def company_description(self, vacancy_data: Dict[str, Any]) -> str:
+        """
+        Формирует описание компании и вакансии для презентации кандидату.
+        
+        Args:
+            vacancy_data: Данные вакансии
+            
+        Returns:
+            Текст описания компании и вакансии
+        """
+        candidate_position = vacancy_data.get('position', 'Специалист')
+        company_name = vacancy_data.get('company', 'компания')
+        return f"""
             О компании "{company_name}"
             
             Компания "{company_name}" - одна из ведущих компаний в своей отрасли. Мы стремимся к инновациям и постоянному развитию, создавая продукты и услуги высокого качества. Наша команда состоит из квалифицированных специалистов, которые ценят профессионализм, творческий подход и взаимное уважение.
@@ -416,25 +1119,24 @@ class HRSystem:
             
             Присоединяйтесь к нашей команде и развивайтесь вместе с нами!
             """
+    
+    def hr_answers_db(self, vacancy_data: Dict[str, Any]):
+        """
+        Загружает или создает векторную базу с ответами HR на вопросы кандидатов.
+        
+        Args:
+            vacancy_data: Данные вакансии (используются для базового файла ответов)
             
-            present_company_and_vacancy(company_description)
-            
-            # Ответы на вопросы кандидата
-            print("
-=== Ответы на вопросы кандидата ===
-")
-            
-            # Загрузка или создание базы данных с ответами HR
-            hr_answers_file = os.path.join(self.document_store.add_data_path, 'hr_answers.txt')
-            try:
-                db_hr_answers = db_from_markdown_file(
-                    hr_answers_file,
-                    save_path=self.document_store.db_path,
-                    index_name='db_hr_answers'
-                )
-            except Exception as e:
-                # Если файл не найден или произошла ошибка, создаем базовый файл
-                basic_hr_answers = f"""
+        Returns:
+            Векторная база данных FAISS или None в случае ошибки
+        """
+        candidate_position = vacancy_data.get('position', 'Специалист')
+        company_name = vacancy_data.get('company', 'компания')
+        hr_answers_file = os.path.join(self.document_store.add_data_path, 'hr_answers.txt')
+        
+        if not os.path.exists(hr_answers_file):
+            # Если файл не найден, создаем базовый файл
+            basic_hr_answers = f"""
                 # Ответы HR на вопросы кандидатов
                 
                 # Ответы HR для позиции: {candidate_position}
@@ -451,57 +1153,32 @@ class HRSystem:
                 ## Выплаты и льготы
                 Мы предлагаем конкурентную заработную плату, официальное трудоустройство, ДМС, корпоративное обучение и другие бенефиты для сотрудников.
                 """
-                
-                with open(hr_answers_file, 'w', encoding='utf-8') as f:
-                    f.write(basic_hr_answers)
-                
-                db_hr_answers = db_from_markdown_file(
-                    hr_answers_file,
-                    save_path=self.document_store.db_path,
-                    index_name='db_hr_answers'
-                )
-            
-            handle_candidate_questions(candidate_position, db_hr_answers, model='gpt-4o')
-            
-            # Определение ключевых требований
-            print("
-=== Определение ключевых требований к кандидату ===
-")
-            key_requirements = define_key_requirements(vacancy_text, candidate_position)
-            
-            # Генерация итоговой оценки
-            print("
-=== Генерация итоговой оценки кандидата ===
-")
-            assessment = generate_final_assessment(
-                full_interview, 
-                vacancy_text, 
-                key_requirements, 
-                candidate_position, 
-                company_name
-            )
             
-            # Сохранение оценки в файл
-            assessment_file = save_assessment_report(
-                assessment, 
-                candidate_position, 
-                resume_id, 
-                company_name, 
-                'Локальная база', 
-                self.data_path
+            with open(hr_answers_file, 'w', encoding='utf-8') as f:
+                f.write(basic_hr_answers)
+        
+        # База перестраивается только при изменении файла с ответами
+        mtime = os.path.getmtime(hr_answers_file)
+        with self._cache_lock:
+            cached = self._hr_answers_db
+            if cached and cached[0] == mtime:
+                return cached[1]
+        
+        # Сохраненный индекс используется, если он построен после последнего изменения файла
+        index_file = os.path.join(self.document_store.db_path, 'db_hr_answers.faiss')
+        db = None
+        if os.path.exists(index_file) and os.path.getmtime(index_file) >= mtime:
+            db = load_vector_db(load_path=self.document_store.db_path, index_name='db_hr_answers')
+        if db is None:
+            db = db_from_markdown_file(
+                hr_answers_file,
+                save_path=self.document_store.db_path,
+                index_name='db_hr_answers'
             )
-            
-            print(f"
-=== Собеседование завершено! ===
-")
-            print(f"Итоговая оценка сохранена в файл: {assessment_file}")
-            
-            return assessment_file
-        except Exception as e:
-            error_msg = f"Ошибка при проведении собеседования: {str(e)}"
-            logger.error(error_msg)
-            print(error_msg)
-            return None
+        if db is not None:
+            with self._cache_lock:
+                self._hr_answers_db = (mtime, db)
+        return db
 
 # Основная функция для запуска системы из командной строки
 def main():
@@ -509,30 +1186,136 @@ def main():
     
     parser = argparse.ArgumentParser(description='НейроHR - система для проведения собеседований')
     parser.add_argument('--data-path', type=str, default='./data', help='Путь к директории с данными')
-    parser.add_argument('--action', type=str, choices=['process', 'search-resumes', 'search-vacancies', 'interview'],
+    parser.add_argument('--action', type=str, choices=['process', 'search-resumes', 'search-vacancies', 'interview',
+                                                       'resume-interview', 'prepare-vacancy', 'assess-batch',
+                                                       'similarity-matrix', 'usage-report', 'serve',
+                                                       'convert-indexes', 'reports'],
                        required=True, help='Действие для выполнения')
     parser.add_argument('--resume-id', type=str, help='ID резюме для поиска вакансий или собеседования')
     parser.add_argument('--vacancy-id', type=str, help='ID вакансии для поиска резюме или собеседования')
+    parser.add_argument('--incremental-analysis', action='store_true',
+                       help='Анализировать ответы в фоне после каждого ответа (для --action interview)')
+    parser.add_argument('--position', type=str, help='Позиция для отбора отчетов (для --action reports)')
+    parser.add_argument('--recommendation', type=str, choices=list(RECOMMENDATION_LABELS),
+                       help='Рекомендация для отбора отчетов (для --action reports)')
+    parser.add_argument('--date-from', type=str, help='Начало периода отчетов, ГГГГ-ММ-ДД (для --action reports)')
+    parser.add_argument('--date-to', type=str, help='Конец периода отчетов, ГГГГ-ММ-ДД (для --action reports)')
+    parser.add_argument('--import-reports', type=str,
+                       help='Директория с отчетами прежнего формата assessment_*.txt для добавления в индекс '
+                            '(для --action reports)')
+    parser.add_argument('--limit', type=int, default=100,
+                       help='Максимальное количество выводимых отчетов, новые первыми (для --action reports)')
+    parser.add_argument('--session-id', type=str, help='ID сессии собеседования (для --action resume-interview)')
     parser.add_argument('--count', type=int, default=3, help='Количество результатов поиска')
+    parser.add_argument('--search-mode', type=str, choices=['vector', 'skills'], default='vector',
+                       help='Поиск резюме по эмбеддингам или по покрытию навыков без моделей '
+                            '(для --action search-resumes)')
+    parser.add_argument('--skip-kits', action='store_true',
+                       help='Не строить комплекты собеседования при обработке вакансий (для --action process)')
+    parser.add_argument('--no-dedup', action='store_true',
+                       help='Не искать почти-дубликаты резюме перед парсингом (для --action process)')
+    parser.add_argument('--parse-threshold', type=float, default=None,
+                       help='Уверенность локального разбора, ниже которой документ парсится моделью '
+                            '(0 - модель не вызывается, 1.01 - всегда; для --action process)')
+    parser.add_argument('--transcripts-dir', type=str,
+                       help='Директория со стенограммами (для --action assess-batch, по умолчанию data/sessions)')
+    parser.add_argument('--output-dir', type=str,
+                       help='Директория для отчетов пакетной оценки (по умолчанию data/assessments) '
+                            'или таблиц матрицы схожести (по умолчанию data/similarity)')
+    parser.add_argument('--concurrency', type=int, default=8,
+                       help='Количество одновременно оцениваемых стенограмм (для --action assess-batch)')
+    parser.add_argument('--top-k', type=int, default=10,
+                       help='Количество лучших совпадений в таблицах матрицы схожести (для --action similarity-matrix)')
+    parser.add_argument('--embedding-model', type=str, default=os.getenv("EMBEDDING_MODEL", ""),
+                       help='Модель, которой вычислены векторы преобразуемых индексов (для --action convert-indexes)')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Адрес сервиса (для --action serve)')
+    parser.add_argument('--port', type=int, default=8000, help='Порт сервиса (для --action serve)')
+    parser.add_argument('--workers', type=int, default=16,
+                       help='Количество потоков для обращений к моделям (для --action serve)')
+    parser.add_argument('--metrics-file', type=str, default=os.getenv("METRICS_FILE"),
+                       help='Файл для экспорта метрик этапов (.json - JSON, иначе формат Prometheus)')
+    parser.add_argument('--profile', type=str, nargs='?', const='', default=None, metavar='DIR',
+                       help='Профилировать действие (CPU по функциям и этапам, память); файлы профиля '
+                            'сохраняются в DIR, по умолчанию data/profiles/<действие>_<время>')
+    parser.add_argument('--interview-budget', type=float, default=ledger.session_budget,
+                       help='Бюджет на одно собеседование в долларах')
+    parser.add_argument('--job-budget', type=float, default=ledger.job_budget,
+                       help='Бюджет на одно задание обработки в долларах')
+    parser.add_argument('--budget-policy', type=str, choices=['fail', 'downgrade'], default=ledger.policy,
+                       help='Поведение при превышении бюджета: остановка или замена модели на более дешевую')
     args = parser.parse_args()
     
+    # Настройка бюджетов
+    ledger.configure(session_budget=args.interview_budget, job_budget=args.job_budget,
+                     policy=args.budget_policy)
+    
+    # Включение сбора метрик
+    if args.metrics_file:
+        metrics.enable()
+    
+    # Профилирование действия
+    profiler = None
+    if args.profile is not None:
+        profile_dir = args.profile or os.path.join(
+            args.data_path, 'profiles', f"{args.action}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        profiler = ActionProfiler(profile_dir)
+        profiler.start()
+    
+    try:
+        with span(f'action.{args.action}'):
+            _run_action(args)
+    finally:
+        if profiler is not None:
+            summary = profiler.stop()
+            print(profiler.format_summary(summary))
+            print(f"Профиль сохранен в директорию: {profiler.output_dir} "
+                  f"(cpu.pstats, memory.txt, summary.txt, summary.json)")
+        if args.metrics_file:
+            metrics.export(args.metrics_file)
+            print(f"Метрики сохранены в файл: {args.metrics_file}")
+
+def _run_action(args):
+    """
+    Выполняет действие, выбранное в командной строке.
+    
+    Args:
+        args: Аргументы командной строки
+    """
+    # Загрузка зависимостей только для выбранного действия
+    action_key = f"{args.action}:{args.search_mode}"
+    with span('startup.imports'):
+        preload_action(action_key if action_key in ACTION_MODULES else args.action)
+    
     # Создание экземпляра системы
     hr_system = HRSystem(data_path=args.data_path)
     
     # Выполнение выбранного действия
     if args.action == 'process':
         # Обработка PDF-файлов
-        hr_system.process_pdf_files()
+        if args.parse_threshold is not None:
+            hr_system.parse_threshold = args.parse_threshold
+        hr_system.process_pdf_files(prepare_kits=not args.skip_kits, dedup=not args.no_dedup)
     elif args.action == 'search-resumes':
         # Поиск резюме под вакансию
         if not args.vacancy_id:
             print("Ошибка: не указан ID вакансии (--vacancy-id)")
             return
         
+        if args.search_mode == 'skills':
+            results = hr_system.search_resumes_by_skills(args.vacancy_id, k=args.count)
+            
+            print(f"\nРезультаты отбора резюме по навыкам для вакансии {args.vacancy_id}:")
+            for result in results:
+                print(f"{result['position']}. ID: {result['resume_id']}, "
+                      f"Позиция: {result['position_title']}, "
+                      f"Покрытие навыков: {result['score']:.2%}")
+                print(f"    Есть: {', '.join(result['matched_skills']) or '-'}; "
+                      f"нет: {', '.join(result['missing_skills']) or '-'}")
+            return
+        
         results = hr_system.search_resumes_for_vacancy(args.vacancy_id, k=args.count)
         
-        print(f"
-Результаты поиска резюме для вакансии {args.vacancy_id}:")
+        print(f"\nРезультаты поиска резюме для вакансии {args.vacancy_id}:")
         for result in results:
             print(f"{result['position']}. ID: {result['resume_id']}, "
                   f"Позиция: {result['position_title']}, "
@@ -545,8 +1328,7 @@ def main():
         
         results = hr_system.search_vacancies_for_resume(args.resume_id, k=args.count)
         
-        print(f"
-Результаты поиска вакансий для резюме {args.resume_id}:")
+        print(f"\nРезультаты поиска вакансий для резюме {args.resume_id}:")
         for result in results:
             print(f"{result['position']}. ID: {result['vacancy_id']}, "
                   f"Позиция: {result['position_title']}, "
@@ -558,7 +1340,104 @@ def main():
             print("Ошибка: не указаны ID резюме (--resume-id) и ID вакансии (--vacancy-id)")
             return
         
-        hr_system.conduct_interview(args.resume_id, args.vacancy_id)
+        hr_system.conduct_interview(args.resume_id, args.vacancy_id, incremental_analysis=args.incremental_analysis)
+    elif args.action == 'resume-interview':
+        # Продолжение прерванного собеседования
+        if not args.session_id:
+            sessions = hr_system.checkpoints.list_sessions(unfinished_only=True)
+            if not sessions:
+                print("Незавершенных собеседований нет")
+                return
+            print("Ошибка: не указан ID сессии (--session-id). Незавершенные собеседования:")
+            for session in sessions:
+                print(f"{session['session_id']}: этап '{session['stage']}', обновлено {session['updated']}")
+            return
+        
+        hr_system.resume_interview(args.session_id)
+    elif args.action == 'prepare-vacancy':
+        # Подготовка комплектов собеседования (для указанной вакансии или для всех)
+        vacancy_ids = [args.vacancy_id] if args.vacancy_id else hr_system.document_store.list_documents('vacancy')
+        job_id = f"prepare_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        with usage_context(job_id=job_id):
+            for vacancy_id in vacancy_ids:
+                hr_system.prepare_vacancy(vacancy_id)
+        print(f"Расходы задания {job_id}: $ {ledger.spent(job_id=job_id):.5f}")
+    elif args.action == 'assess-batch':
+        # Пакетная оценка сохраненных стенограмм
+        transcripts_dir = args.transcripts_dir or hr_system.checkpoints.sessions_path
+        hr_system.assess_batch(transcripts_dir, vacancy_id=args.vacancy_id,
+                               output_dir=args.output_dir, concurrency=args.concurrency)
+    elif args.action == 'similarity-matrix':
+        # Обновление матрицы схожести и выгрузка таблиц лучших совпадений
+        if hr_system.build_similarity_matrix(k=args.top_k) is None:
+            return
+        matrix = hr_system.get_similarity_matrix()
+        
+        if args.resume_id:
+            print(f"\nЛучшие вакансии для резюме {args.resume_id}:")
+            for i, (vacancy_id, score) in enumerate(matrix.top_vacancies_for_resume(args.resume_id, k=args.count), 1):
+                print(f"{i}. ID: {vacancy_id}, Схожесть: {score:.4f}")
+        if args.vacancy_id:
+            print(f"\nЛучшие резюме для вакансии {args.vacancy_id}:")
+            for i, (resume_id, score) in enumerate(matrix.top_resumes_for_vacancy(args.vacancy_id, k=args.count), 1):
+                print(f"{i}. ID: {resume_id}, Схожесть: {score:.4f}")
+        
+        for path in matrix.export_top_k(args.output_dir or hr_system.similarity_path):
+            print(f"Таблица лучших совпадений сохранена в файл: {path}")
+    elif args.action == 'usage-report':
+        # Сводка расходов на модели по этапам
+        groups = ledger.aggregate(by=('stage', 'model'))
+        
+        print("\nРасходы на модели по этапам:")
+        for group in groups:
+            unpriced = f" (без цены: {group['unpriced_calls']})" if group['unpriced_calls'] else ""
+            print(f"{group['stage']} / {group['model']}: запросов {group['calls']}, "
+                  f"токенов {group['prompt_tokens']} + {group['completion_tokens']}, "
+                  f"$ {group['cost_usd']:.5f}{unpriced}")
+        print(f"Всего: $ {ledger.spent():.5f}")
+        
+        # Запросы, которые не понадобились благодаря поиску почти-дубликатов
+        from ai_services.dedup import load_dedup_stats
+        for doc_type, stats in load_dedup_stats(os.path.join(hr_system.data_path, 'dedup')).items():
+            if stats.get('duplicates') and doc_type in DOCUMENT_SETTINGS:
+                print(f"Почти-дубликаты ({DOCUMENT_SETTINGS[doc_type]['label_genitive']}): {stats['duplicates']}, "
+                      f"сэкономлено запросов парсинга {stats['saved_parse_calls']}, "
+                      f"эмбеддингов {stats['saved_embeddings']}")
+    elif args.action == 'convert-indexes':
+        # Преобразование индексов прежних форматов в формат с отображением в память
+        from ai_services.slim_index import convert_indexes
+        
+        statuses = {'converted': 'преобразован', 'current': 'уже в новом формате',
+                    'skipped': 'пропущен', 'error': 'ошибка'}
+        for result in convert_indexes(hr_system.document_store.db_path, args.embedding_model):
+            details = f", документов {result['documents']}" if result['status'] == 'converted' else ""
+            details += f" ({result['message']})" if result['message'] else ""
+            print(f"{result['index']}: {statuses[result['status']]}{details}")
+    elif args.action == 'reports':
+        # Выборка отчетов об оценке по индексу
+        if args.import_reports:
+            imported = hr_system.reports.import_legacy(args.import_reports)
+            print(f"Добавлено в индекс отчетов прежнего формата: {imported}")
+        
+        filters = {'resume_id': args.resume_id, 'vacancy_id': args.vacancy_id, 'position': args.position,
+                   'recommendation': args.recommendation, 'date_from': args.date_from, 'date_to': args.date_to}
+        reports = hr_system.reports.find(limit=args.limit, **filters)
+        
+        print(f"\nОтчеты об оценке ({len(reports)}):")
+        for report in reports:
+            recommendation = RECOMMENDATION_LABELS.get(report['recommendation'], 'Не определена')
+            print(f"{report['created']} {report['report_id']}: резюме {report['resume_id']}, "
+                  f"вакансия {report['vacancy_id'] or '-'}, позиция {report['position']}, "
+                  f"рекомендация: {recommendation}")
+            print(f"    {report['file']}")
+        
+        print("\nПо рекомендациям:")
+        for recommendation, count in hr_system.reports.counts('recommendation', **filters).items():
+            print(f"{RECOMMENDATION_LABELS.get(recommendation, 'Не определена')}: {count}")
+    elif args.action == 'serve':
+        # Запуск долгоживущего HTTP/JSON сервиса
+        from service.server import serve
+        serve(hr_system, host=args.host, port=args.port, io_workers=args.workers)
     
 if __name__ == "__main__":
     main()
@@ -0,0 +1 @@
+# service package
@@ -0,0 +1,493 @@
+# -*- coding: utf-8 -*-
+"""
+Долгоживущий HTTP/JSON сервис поверх HRSystem.
+
+Сервис один раз загружает модули, векторные базы и документы и держит их в
+памяти между запросами. Запросы обрабатываются в одном цикле asyncio:
+обращения к моделям выполняются в пуле потоков, а CPU-нагруженная работа
+(чтение PDF при обработке) - в пуле процессов.
+
+Маршруты:
+    GET  /health                           - состояние сервиса
+    GET  /metrics                          - метрики этапов в формате Prometheus
+    GET  /search/resumes?vacancy_id=&k=&mode= - поиск резюме под вакансию (mode=skills - по навыкам, без моделей)
+    GET  /search/vacancies?resume_id=&k=   - поиск вакансий под резюме
+    GET  /matches/resumes?vacancy_id=&k=   - лучшие резюме для вакансии из матрицы схожести
+    GET  /matches/vacancies?resume_id=&k=  - лучшие вакансии для резюме из матрицы схожести
+    POST /ingest                           - запуск обработки PDF-файлов
+    GET  /ingest/<job_id>                  - состояние задания обработки
+    POST /interviews                       - начало собеседования {resume_id, vacancy_id, incremental_analysis}
+    GET  /interviews/<id>                  - состояние собеседования
+    GET  /interviews/<id>/messages?wait=   - реплики рекрутера (long-polling)
+    POST /interviews/<id>/reply            - ответ кандидата {text}
+    GET  /reports?resume_id=&vacancy_id=&position=&recommendation=&date_from=&date_to=&limit=&offset=
+                                           - выборка отчетов об оценке по индексу
+    GET  /reports/<report_id>              - отчет об оценке с разделами заключения
+
+Каждое собеседование - отдельная асинхронная сессия (InterviewSession) в
+цикле событий сервиса; ожидание ответа кандидата не занимает поток.
+Завершенные собеседования и задания обработки удаляются из памяти через
+SERVICE_FINISHED_TTL_MINUTES минут; состояние удаленного собеседования
+читается из его контрольной точки.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import logging
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qs
+from typing import Dict, Any, Optional, Tuple
+
+from hr_utils.metrics import metrics, span
+from hr_utils.usage_ledger import ledger, usage_context
+from interview.channels import QueueChannel
+
+logger = logging.getLogger('hr_system')
+
+# Максимальный размер тела запроса (байт)
+MAX_BODY_SIZE = 10 * 1024 * 1024
+
+# Максимальное время ожидания реплик при long-polling (секунд)
+MAX_POLL_WAIT = 60.0
+
+# Время хранения завершенных собеседований и заданий обработки в памяти (секунд)
+FINISHED_TTL = float(os.getenv("SERVICE_FINISHED_TTL_MINUTES", "60")) * 60
+
+# Интервал удаления завершенных собеседований и заданий обработки (секунд)
+EVICTION_INTERVAL = 60.0
+
+_STATUS_TEXT = {200: 'OK', 201: 'Created', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found',
+                405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large',
+                500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+    """Ошибка обработки запроса с HTTP-статусом."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class HRService:
+    """HTTP/JSON сервис с прогретыми кэшами и пулами исполнителей."""
+
+    def __init__(self, hr_system, io_workers: int = 16, cpu_workers: Optional[int] = None):
+        """
+        Инициализация сервиса.
+
+        Args:
+            hr_system: Экземпляр HRSystem
+            io_workers: Размер пула потоков для обращений к моделям
+            cpu_workers: Размер пула процессов для CPU-нагруженной работы (по умолчанию - число ядер)
+        """
+        self.hr_system = hr_system
+        self.io_pool = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix='hr-io')
+        self.cpu_pool = ProcessPoolExecutor(max_workers=cpu_workers)
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._ingest_task: Optional[asyncio.Future] = None
+        self._evictor: Optional[asyncio.Future] = None
+        self._routes = [
+            ('GET', re.compile(r'^/health$'), self.health),
+            ('GET', re.compile(r'^/metrics$'), self.get_metrics),
+            ('GET', re.compile(r'^/search/resumes$'), self.search_resumes),
+            ('GET', re.compile(r'^/search/vacancies$'), self.search_vacancies),
+            ('GET', re.compile(r'^/matches/resumes$'), self.match_resumes),
+            ('GET', re.compile(r'^/matches/vacancies$'), self.match_vacancies),
+            ('POST', re.compile(r'^/ingest$'), self.start_ingest),
+            ('GET', re.compile(r'^/ingest/(?P<job_id>[\w-]+)$'), self.get_ingest),
+            ('POST', re.compile(r'^/interviews$'), self.start_interview),
+            ('GET', re.compile(r'^/interviews/(?P<session_id>[\w-]+)$'), self.get_interview),
+            ('GET', re.compile(r'^/interviews/(?P<session_id>[\w-]+)/messages$'), self.get_messages),
+            ('POST', re.compile(r'^/interviews/(?P<session_id>[\w-]+)/reply$'), self.reply),
+            ('GET', re.compile(r'^/reports$'), self.list_reports),
+            ('GET', re.compile(r'^/reports/(?P<report_id>[\w-]+)$'), self.get_report),
+        ]
+
+    # ------------------------------------------------------------------
+    # Вспомогательные методы
+    # ------------------------------------------------------------------
+
+    async def run_blocking(self, func, *args, session_id: Optional[str] = None, **kwargs):
+        """
+        Выполняет блокирующую функцию в пуле потоков, не останавливая цикл событий.
+
+        Args:
+            func: Вызываемая функция
+            *args: Позиционные аргументы функции
+            session_id: Сессия для учета расходов на модели
+            **kwargs: Именованные аргументы функции
+
+        Returns:
+            Результат функции
+        """
+        def call():
+            with usage_context(session_id=session_id):
+                return func(*args, **kwargs)
+
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.io_pool, functools.partial(context.run, call))
+
+    def _session(self, session_id: str) -> Dict[str, Any]:
+        """Возвращает запись сессии собеседования."""
+        entry = self.sessions.get(session_id)
+        if entry is None:
+            raise HTTPError(404, f"Собеседование {session_id} не найдено")
+        return entry
+
+    @staticmethod
+    def _track(entry: Dict[str, Any], task: asyncio.Future):
+        """Сохраняет задачу в записи (чтобы задача не была удалена сборщиком мусора) и время ее завершения."""
+        entry['task'] = task
+        task.add_done_callback(lambda _: entry.setdefault('finished_at', time.monotonic()))
+
+    def evict_finished(self, ttl: float = FINISHED_TTL) -> int:
+        """
+        Удаляет из памяти собеседования и задания обработки, завершенные более ttl секунд назад.
+
+        Args:
+            ttl: Время хранения завершенной записи в секундах
+
+        Returns:
+            Количество удаленных записей
+        """
+        expired_before = time.monotonic() - ttl
+        evicted = 0
+        for entries in (self.sessions, self.jobs):
+            for key, entry in list(entries.items()):
+                if entry['task'].done() and entry.get('finished_at', expired_before) <= expired_before:
+                    del entries[key]
+                    evicted += 1
+        if evicted:
+            logger.info(f"Из памяти сервиса удалено завершенных собеседований и заданий: {evicted}")
+        return evicted
+
+    async def _evict_periodically(self):
+        while True:
+            await asyncio.sleep(EVICTION_INTERVAL)
+            self.evict_finished()
+
+    @staticmethod
+    def _required(body: Dict[str, Any], field: str):
+        """Возвращает обязательное поле тела запроса."""
+        value = body.get(field)
+        if value in (None, '', []):
+            raise HTTPError(400, f"Не указано поле '{field}'")
+        return value
+
+    # ------------------------------------------------------------------
+    # Служебные маршруты и поиск
+    # ------------------------------------------------------------------
+
+    async def health(self, query, body):
+        active = sum(1 for entry in self.sessions.values() if not entry['task'].done())
+        return 200, {'status': 'ok', 'sessions': len(self.sessions), 'active_sessions': active,
+                     'jobs': len(self.jobs)}
+
+    async def get_metrics(self, query, body):
+        return 200, metrics.to_prometheus()
+
+    async def search_resumes(self, query, body):
+        vacancy_id = self._required(query, 'vacancy_id')
+        k = int(query.get('k', 3))
+        mode = query.get('mode', 'vector')
+        if mode not in ('vector', 'skills'):
+            raise HTTPError(400, f"Неизвестный режим поиска: {mode}")
+        search = (self.hr_system.search_resumes_by_skills if mode == 'skills'
+                  else self.hr_system.search_resumes_for_vacancy)
+        results = await self.run_blocking(search, vacancy_id, k=k)
+        return 200, {'vacancy_id': vacancy_id, 'mode': mode, 'results': results}
+
+    async def search_vacancies(self, query, body):
+        resume_id = self._required(query, 'resume_id')
+        k = int(query.get('k', 3))
+        results = await self.run_blocking(self.hr_system.search_vacancies_for_resume, resume_id, k=k)
+        return 200, {'resume_id': resume_id, 'results': results}
+
+    def _similarity_matrix(self):
+        matrix = self.hr_system.get_similarity_matrix()
+        if matrix is None:
+            raise HTTPError(404, "Матрица схожести не построена")
+        return matrix
+
+    async def match_resumes(self, query, body):
+        # Таблицы лучших совпадений отображены в память: запрос не обращается к моделям
+        vacancy_id = self._required(query, 'vacancy_id')
+        k = int(query.get('k', 3))
+        matches = self._similarity_matrix().top_resumes_for_vacancy(vacancy_id, k=k)
+        results = [{'resume_id': resume_id, 'similarity': score} for resume_id, score in matches]
+        return 200, {'vacancy_id': vacancy_id, 'results': results}
+
+    async def match_vacancies(self, query, body):
+        resume_id = self._required(query, 'resume_id')
+        k = int(query.get('k', 3))
+        matches = self._similarity_matrix().top_vacancies_for_resume(resume_id, k=k)
+        results = [{'vacancy_id': vacancy_id, 'similarity': score} for vacancy_id, score in matches]
+        return 200, {'resume_id': resume_id, 'results': results}
+
+    # ------------------------------------------------------------------
+    # Обработка документов
+    # ------------------------------------------------------------------
+
+    async def start_ingest(self, query, body):
+        # Проверка и запуск задания выполняются без переключения задач, поэтому второй запрос получает 409
+        if self._ingest_task is not None and not self._ingest_task.done():
+            raise HTTPError(409, "Обработка документов уже выполняется")
+
+        job_id = uuid.uuid4().hex[:12]
+        job = {'job_id': job_id, 'status': 'running', 'started': datetime.now().isoformat(timespec='seconds')}
+
+        async def run():
+            try:
+                await self.run_blocking(self.hr_system.process_pdf_files, executor=self.cpu_pool)
+                job['status'] = 'done'
+            except Exception as e:
+                logger.error(f"Ошибка задания обработки {job_id}: {str(e)}")
+                job['status'] = 'failed'
+                job['error'] = str(e)
+            job['finished'] = datetime.now().isoformat(timespec='seconds')
+
+        self._ingest_task = asyncio.ensure_future(run())
+        self.jobs[job_id] = {'job': job}
+        self._track(self.jobs[job_id], self._ingest_task)
+        return 202, job
+
+    async def get_ingest(self, query, body, job_id):
+        entry = self.jobs.get(job_id)
+        if entry is None:
+            raise HTTPError(404, f"Задание {job_id} не найдено")
+        return 200, entry['job']
+
+    # ------------------------------------------------------------------
+    # Собеседование
+    # ------------------------------------------------------------------
+
+    async def start_interview(self, query, body):
+        resume_id = self._required(body, 'resume_id')
+        vacancy_id = self._required(body, 'vacancy_id')
+
+        session_id = f"interview_{resume_id}_{vacancy_id}_{uuid.uuid4().hex[:8]}"
+        channel = QueueChannel()
+        try:
+            # Построение комплекта собеседования (если его нет) учитывается в расходах сессии
+            session = await self.run_blocking(self.hr_system.create_interview_session, resume_id, vacancy_id,
+                                              channel, session_id, verbose=False,
+                                              incremental_analysis=bool(body.get('incremental_analysis')),
+                                              session_id=session_id)
+        except ValueError as e:
+            raise HTTPError(404, str(e))
+
+        # Сессия выполняется в цикле событий сервиса; контекст учета расходов копируется в задачу
+        with usage_context(session_id=session_id):
+            task = asyncio.ensure_future(session.run())
+        self.sessions[session_id] = {
+            'session': session,
+            'channel': channel,
+            'created': datetime.now().isoformat(timespec='seconds'),
+        }
+        self._track(self.sessions[session_id], task)
+        return 201, {'session_id': session_id, 'candidate_position': session.state['candidate_position']}
+
+    async def get_interview(self, query, body, session_id):
+        fields = ('session_id', 'stage', 'status', 'resume_id', 'vacancy_id', 'candidate_position',
+                  'questions', 'additional_questions', 'assessment', 'assessment_file', 'error')
+        entry = self.sessions.get(session_id)
+        if entry is None:
+            # Завершенное собеседование удалено из памяти: состояние читается из контрольной точки
+            state = await self.run_blocking(self.hr_system.checkpoints.load, session_id)
+            if state is None:
+                raise HTTPError(404, f"Собеседование {session_id} не найдено")
+            result = {field: state.get(field) for field in fields}
+            result['updated'] = state.get('updated')
+            result['awaiting_reply'] = False
+            result['cost_usd'] = ledger.spent(session_id=session_id)
+            return 200, result
+
+        state = entry['session'].state
+        result = {field: state[field] for field in fields}
+        result['created'] = entry['created']
+        result['awaiting_reply'] = entry['channel'].awaiting_reply
+        result['cost_usd'] = ledger.spent(session_id=session_id)
+        return 200, result
+
+    async def get_messages(self, query, body, session_id):
+        entry = self._session(session_id)
+        wait = min(float(query.get('wait', 30)), MAX_POLL_WAIT)
+        messages = await entry['channel'].next_messages(timeout=wait)
+        return 200, {'stage': entry['session'].state['stage'], 'messages': messages}
+
+    async def reply(self, query, body, session_id):
+        entry = self._session(session_id)
+        text = body.get('text')
+        if not isinstance(text, str):
+            raise HTTPError(400, "Не указано поле 'text'")
+        if entry['session'].done or entry['channel'].closed:
+            raise HTTPError(409, f"Собеседование {session_id} завершено")
+        entry['channel'].feed(text)
+        return 202, {'accepted': True}
+
+    # ------------------------------------------------------------------
+    # Отчеты об оценке
+    # ------------------------------------------------------------------
+
+    async def list_reports(self, query, body):
+        filters = {field: query.get(field) for field in ('resume_id', 'vacancy_id', 'position', 'recommendation',
+                                                         'date_from', 'date_to')}
+        reports = await self.run_blocking(self.hr_system.reports.find, limit=int(query.get('limit', 100)),
+                                          offset=int(query.get('offset', 0)), **filters)
+        counts = await self.run_blocking(self.hr_system.reports.counts, 'recommendation', **filters)
+        return 200, {'reports': reports, 'by_recommendation': counts}
+
+    async def get_report(self, query, body, report_id):
+        report = await self.run_blocking(self.hr_system.reports.get, report_id)
+        if report is None:
+            raise HTTPError(404, f"Отчет {report_id} не найден")
+        return 200, report
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    async def dispatch(self, method: str, target: str, raw_body: bytes) -> Tuple[int, Any]:
+        """
+        Находит обработчик маршрута и выполняет его.
+
+        Args:
+            method: HTTP-метод
+            target: Путь запроса со строкой параметров
+            raw_body: Тело запроса
+
+        Returns:
+            Кортеж (HTTP-статус, данные ответа)
+        """
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        path_matched = False
+        for route_method, pattern, handler in self._routes:
+            match = pattern.match(url.path)
+            if not match:
+                continue
+            path_matched = True
+            if route_method != method:
+                continue
+
+            try:
+                body = json.loads(raw_body.decode('utf-8')) if raw_body else {}
+            except ValueError:
+                raise HTTPError(400, "Тело запроса должно быть в формате JSON")
+            if not isinstance(body, dict):
+                raise HTTPError(400, "Тело запроса должно быть JSON-объектом")
+
+            with span(f'service.{handler.__name__}'):
+                return await handler(query, body, **match.groupdict())
+
+        if path_matched:
+            raise HTTPError(405, f"Метод {method} не поддерживается для {url.path}")
+        raise HTTPError(404, f"Маршрут {url.path} не найден")
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Обрабатывает одно HTTP-соединение (один запрос на соединение)."""
+        status, payload = 500, {'error': 'Внутренняя ошибка сервиса'}
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            length = int(headers.get('content-length', 0))
+            if length > MAX_BODY_SIZE:
+                raise HTTPError(413, "Слишком большое тело запроса")
+            raw_body = await reader.readexactly(length) if length else b''
+
+            status, payload = await self.dispatch(method.upper(), target, raw_body)
+        except HTTPError as e:
+            status, payload = e.status, {'error': e.message}
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            status, payload = 400, {'error': f"Некорректный запрос: {str(e)}"}
+        except Exception as e:
+            logger.error(f"Ошибка при обработке запроса: {str(e)}")
+            status, payload = 500, {'error': str(e)}
+        finally:
+            try:
+                if isinstance(payload, str):
+                    content, content_type = payload.encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+                else:
+                    content = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+                    content_type = 'application/json; charset=utf-8'
+                head = (f"HTTP/1.1 {status} {_STATUS_TEXT.get(status, '')}\r\n"
+                        f"Content-Type: {content_type}\r\n"
+                        f"Content-Length: {len(content)}\r\n"
+                        f"Connection: close\r\n\r\n")
+                writer.write(head.encode('latin-1') + content)
+                await writer.drain()
+            except Exception as e:
+                logger.error(f"Ошибка при отправке ответа: {str(e)}")
+            finally:
+                writer.close()
+
+    async def run(self, host: str = '127.0.0.1', port: int = 8000):
+        """
+        Запускает HTTP-сервер и обслуживает запросы до остановки.
+
+        Args:
+            host: Адрес для прослушивания
+            port: Порт для прослушивания
+        """
+        self._evictor = asyncio.ensure_future(self._evict_periodically())
+        server = await asyncio.start_server(self.handle_connection, host, port)
+
+        # Прогрев кэшей: шарды векторных баз загружаются до первого запроса
+        for index_name in ('db_resumes', 'db_vacancies'):
+            await self.run_blocking(lambda name=index_name: self.hr_system.get_shard_router(name).databases())
+
+        logger.info(f"Сервис НейроHR запущен: http://{host}:{port}")
+        print(f"Сервис НейроHR запущен: http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        """Останавливает пулы исполнителей."""
+        self.io_pool.shutdown(wait=False)
+        self.cpu_pool.shutdown(wait=False)
+
+
+def serve(hr_system, host: str = '127.0.0.1', port: int = 8000,
+          io_workers: int = 16, cpu_workers: Optional[int] = None):
+    """
+    Запускает сервис НейроHR и блокирует поток до остановки (Ctrl+C).
+
+    Args:
+        hr_system: Экземпляр HRSystem
+        host: Адрес для прослушивания
+        port: Порт для прослушивания
+        io_workers: Размер пула потоков для обращений к моделям
+        cpu_workers: Размер пула процессов для CPU-нагруженной работы
+    """
+    # В режиме сервиса метрики этапов всегда доступны по /metrics
+    metrics.enable()
+    
+    service = HRService(hr_system, io_workers=io_workers, cpu_workers=cpu_workers)
+    try:
+        asyncio.run(service.run(host, port))
+    except KeyboardInterrupt:
+        print("Сервис остановлен")
+    finally:
+        service.close()
@@ -15,6 +15,7 @@ setup(
         "langchain-openai>=0.0.5",
         "langchain-core>=0.1.15",
         "faiss-cpu>=1.7.4",
+        "numpy>=1.21.0",
         "rarfile>=4.0",
         "PyPDF2>=3.0.0",
         "pydub>=0.25.1",